@@ -1,64 +1,167 @@
-from flask import Flask, request, jsonify, render_template, session, redirect, url_for, send_file, flash
-from google import genai
-from google.genai.types import Tool, GenerateContentConfig, GoogleSearch
+from flask import Blueprint, Flask, Response, current_app, g, stream_with_context, request, jsonify, render_template, session, redirect, url_for, send_file, flash
 from dotenv import load_dotenv
-from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import and_, or_
 from werkzeug.security import generate_password_hash, check_password_hash
-import os, json, re
-from datetime import datetime
-import pytz
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
-from reportlab.lib.units import inch
+from werkzeug.utils import secure_filename
+import os, json, re, threading, time
+import base64
 import tempfile
+from datetime import datetime, timedelta
+import pytz
 import uuid
+import click
+from itinerary_cache import ItineraryCache, make_cache_key
+from model_client import get_model_pool
+from generation_jobs import JobManager, QueueFullError
+from json_stream import DailyPlanStreamParser
+from response_parser import itinerary_summary, parse_itinerary_response, parse_json_object, to_number
+from migrations import convert_itinerary_storage, run_migrations
+from db_config import DEFAULT_INSTANCE_PATH, configure_app, database_uri, get_engine, install_sqlite_pragmas, use_engine
+from itinerary_storage import STORAGE_FORMATS, activity_rows
+from itinerary_cache import normalize_request, normalize_text
+from itinerary_fanout import DayRangeError, generate_fanout
+from pdf_cache import PdfCache, RENDERER_VERSION, itinerary_content_hash
+from pdf_templates import template_choices, template_name
+from pdf_export import ZipExport, create_export_pool, render_combined_to_path
+from route_knowledge import RouteKnowledgeStore, estimate_tokens
+from prompt_builder import PromptBuilder
+from exchange_rates import BASE_CURRENCY, DEFAULT_RATES_FILE, RateTable, UnknownCurrencyError, format_money, parse_ecb_rates
+from warmup import WARM_MARKER, WarmupScheduler, claim_daily_run, parse_hours, popular_requests
+from metrics import ModelCallLog, Registry
+from model_resilience import CircuitBreaker, CircuitOpenError, ModelUnavailableError, RateLimiter, ResilientCaller, is_upstream_failure
+from single_flight import SingleFlight
+from temp_itinerary_store import DatabaseTempItineraryStore, FileTempItineraryStore, KeyValueTempItineraryStore
+from models import (db, CachedItinerary, GenerationJobRecord, GenerationLock, Itinerary, ItineraryActivity, ModelCall,
+                    RouteKnowledge, TempItinerary, User)
 
 # Load environment
 load_dotenv()
-api_key = os.environ.get("GOOGLE_API_KEY")  # Using the environment variable from Vercel
-if not api_key:
-    raise EnvironmentError("Please set the GOOGLE_API_KEY environment variable.")
 
-# Initialize GenAI client
-client = genai.Client(api_key=api_key)
+# The shared GenAI client pool (model_client.get_model_pool) is created on the
+# first model call; GOOGLE_API_KEY is only required from then on
 MODEL_ID = "gemini-2.0-flash"
-google_search_tool = Tool(google_search=GoogleSearch())
-
-# Initialize Flask app
-app = Flask(__name__)
-app.config['SECRET_KEY'] = os.urandom(24)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///travelapp.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-# Initialize database
-db = SQLAlchemy(app)
-
-# Define database models
-class User(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    email = db.Column(db.String(100), unique=True, nullable=False)
-    password = db.Column(db.String(200), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    itineraries = db.relationship('Itinerary', backref='user', lazy=True, cascade="all, delete-orphan")
-
-class Itinerary(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    home_country = db.Column(db.String(100), nullable=False)
-    destination = db.Column(db.String(100), nullable=False)
-    duration = db.Column(db.String(20), nullable=False)
-    budget = db.Column(db.String(50), nullable=False)
-    interests = db.Column(db.Text)
-    itinerary_data = db.Column(db.Text, nullable=False)
-    party_size = db.Column(db.Integer, nullable=False)
-    
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
-# Create tables
-with app.app_context():
-    db.create_all()
+# Prompts come from prompt_builder in PROMPT_VERSION '2' (a typed schema) or
+# '1' (the original hand-written prompt). GEMINI_GROUNDING picks the prompts
+# grounded on Google Search: 'all', 'route' (those asking for flight, visa and
+# customs details) or 'none'; the others use the model's JSON mode with the
+# schema as response_schema.
+prompts = PromptBuilder(
+    version=os.environ.get("PROMPT_VERSION", "2"),
+    grounding=os.environ.get("GEMINI_GROUNDING", "route"),
+)
+
+# Each model attempt may take GEMINI_ATTEMPT_TIMEOUT seconds and a whole call
+# (with retries) GEMINI_DEADLINE. Rate limits, 5xx, timeouts and malformed
+# replies are retried up to GEMINI_MAX_ATTEMPTS times with jittered backoff.
+# GEMINI_BREAKER_THRESHOLD upstream failures in a row stop calls for
+# GEMINI_BREAKER_RESET seconds. GEMINI_MAX_CALLS_PER_MINUTE (0 = unlimited)
+# caps call starts per process; GEMINI_POOL_SIZE caps concurrent calls.
+model_breaker = CircuitBreaker(
+    failure_threshold=int(os.environ.get("GEMINI_BREAKER_THRESHOLD", 5)),
+    reset_seconds=float(os.environ.get("GEMINI_BREAKER_RESET", 30)),
+)
+model_caller = ResilientCaller(
+    model_breaker,
+    limiter=RateLimiter(int(os.environ.get("GEMINI_MAX_CALLS_PER_MINUTE", 0))),
+    max_attempts=int(os.environ.get("GEMINI_MAX_ATTEMPTS", 3)),
+    attempt_timeout=float(os.environ.get("GEMINI_ATTEMPT_TIMEOUT", 60)),
+    deadline=float(os.environ.get("GEMINI_DEADLINE", 150)),
+    base_delay=float(os.environ.get("GEMINI_BACKOFF_BASE", 1)),
+    max_delay=float(os.environ.get("GEMINI_BACKOFF_MAX", 10)),
+)
+
+# Route knowledge (flights, visas, customs) is reused for ROUTE_KNOWLEDGE_TTL
+# seconds, then served while refreshing in the background up to ROUTE_KNOWLEDGE_MAX_AGE
+ROUTE_KNOWLEDGE_TTL = int(os.environ.get("ROUTE_KNOWLEDGE_TTL", 7 * 24 * 3600))
+ROUTE_KNOWLEDGE_MAX_AGE = int(os.environ.get("ROUTE_KNOWLEDGE_MAX_AGE", 30 * 24 * 3600))
+
+# PDFs are rendered in memory and only spill to a temp file above this size
+PDF_SPOOL_MAX_BYTES = int(os.environ.get("PDF_SPOOL_MAX_BYTES", 8 * 1024 * 1024))
+
+# How saved itineraries are stored: 'zlib' (compressed with the shared
+# dictionary in zdicts/), 'jsonb' (a JSON document column, the default on
+# PostgreSQL) or 'json'; existing rows are read in any format
+ITINERARY_STORAGE = os.environ.get("ITINERARY_STORAGE")
+
+# Bulk exports render on EXPORT_WORKERS processes with at most EXPORT_MAX_PENDING
+# renders queued; a combined PDF holds at most EXPORT_COMBINED_MAX itineraries
+EXPORT_WORKERS = int(os.environ.get("EXPORT_WORKERS", 2))
+EXPORT_MAX_PENDING = int(os.environ.get("EXPORT_MAX_PENDING", 8))
+EXPORT_COMBINED_MAX = int(os.environ.get("EXPORT_COMBINED_MAX", 25))
+
+# Anonymous users' itineraries are kept server-side for TEMP_ITINERARY_TTL
+# seconds in TEMP_ITINERARY_STORE: 'database', 'filesystem' (TEMP_ITINERARY_DIR)
+# or 'redis' (REDIS_URL); the session cookie only carries the id
+TEMP_ITINERARY_STORE = os.environ.get("TEMP_ITINERARY_STORE", "database")
+TEMP_ITINERARY_TTL = int(os.environ.get("TEMP_ITINERARY_TTL", 24 * 3600))
+
+# Trips of at least FANOUT_MIN_DAYS days (0 disables) are generated in
+# FANOUT_CHUNK_DAYS-day pieces, FANOUT_CONCURRENCY of them at a time
+FANOUT_MIN_DAYS = int(os.environ.get("FANOUT_MIN_DAYS", 10))
+FANOUT_CHUNK_DAYS = int(os.environ.get("FANOUT_CHUNK_DAYS", 3))
+FANOUT_CONCURRENCY = int(os.environ.get("FANOUT_CONCURRENCY", 4))
+
+if not ITINERARY_STORAGE:
+    ITINERARY_STORAGE = "jsonb" if database_uri().startswith("postgresql") else "zlib"
+
+# Routes and CLI commands; create_app registers them on the app
+main = Blueprint('main', __name__, cli_group=None)
+
+def create_temp_itinerary_store(kind):
+    if kind == "database":
+        return DatabaseTempItineraryStore(db, TempItinerary, ttl_seconds=TEMP_ITINERARY_TTL)
+    if kind == "filesystem":
+        directory = os.environ.get("TEMP_ITINERARY_DIR", os.path.join(DEFAULT_INSTANCE_PATH, "temp_itineraries"))
+        return FileTempItineraryStore(directory, ttl_seconds=TEMP_ITINERARY_TTL)
+    if kind == "redis":
+        try:
+            import redis
+        except ImportError:
+            raise EnvironmentError("TEMP_ITINERARY_STORE=redis needs the redis package (pip install redis).")
+        client = redis.Redis.from_url(os.environ.get("REDIS_URL", "redis://localhost:6379/0"))
+        return KeyValueTempItineraryStore(client, ttl_seconds=TEMP_ITINERARY_TTL)
+    raise EnvironmentError(f"Unknown TEMP_ITINERARY_STORE: {kind}")
+
+temp_itinerary_store = create_temp_itinerary_store(TEMP_ITINERARY_STORE)
+
+# Cache generated itineraries so identical requests skip the Gemini call.
+# ITINERARY_CACHE_MEMORY_TTL bounds how long a worker serves an entry from
+# memory before rechecking the shared table, i.e. how long entries dropped
+# by `flask cache-invalidate` in another process can still be served.
+itinerary_cache = ItineraryCache(
+    db=db,
+    model=CachedItinerary,
+    ttl_seconds=int(os.environ.get("ITINERARY_CACHE_TTL", 24 * 3600)),
+    max_entries=int(os.environ.get("ITINERARY_CACHE_SIZE", 256)),
+    max_persistent_entries=int(os.environ.get("ITINERARY_CACHE_DB_SIZE", 5000)),
+    stale_seconds=int(os.environ.get("ITINERARY_CACHE_STALE", 7 * 24 * 3600)),
+    memory_ttl_seconds=int(os.environ.get("ITINERARY_CACHE_MEMORY_TTL", 60)),
+)
+
+# Prometheus metrics served on /metrics (per process); every model call is
+# also written to the model_call table
+metrics_registry = Registry()
+model_call_log = ModelCallLog(
+    metrics_registry,
+    table=ModelCall.__table__,
+    engine=get_engine,
+    retention_days=int(os.environ.get("MODEL_CALL_RETENTION_DAYS", 30)),
+)
+request_seconds = metrics_registry.histogram(
+    "travelplanner_http_request_seconds",
+    "Time to respond to a request (to the first byte for streamed responses)",
+    ("route", "method", "status"),
+)
+
+# Concurrent identical generations share one Gemini call, across threads and
+# (through the generation_lock table) across worker processes
+generation_flight = SingleFlight(
+    db=db,
+    model=GenerationLock,
+    lease_seconds=int(os.environ.get("GENERATION_LOCK_LEASE", 300)),
+    wait_seconds=int(os.environ.get("GENERATION_LOCK_WAIT", 300)),
+)
 
 # Time zone dictionary for major countries
 TIMEZONE_MAP = {
@@ -116,299 +219,519 @@ def get_time_difference(home_country, destination_country):
     except:
         return "Time zone information not available"
 
-def generate_itinerary(home_country, destination, duration, budget, interests, party_size):
-    """Generate a travel itinerary using Google's Gemini API"""
-    
-    # Create a prompt for the AI
-    prompt = f"""
-    Create a detailed travel itinerary for a trip from {home_country} to {destination} for {duration} days with a budget of {budget}.
-    The traveler is interested in: {interests}.
-    The party is of {party_size} people.
-    Format the response as a JSON object with the following structure:
-    {{
-        "flight_info": {{
-            "estimated_flight_duration": "X hours",
-            "recommended_airlines": ["Airline 1", "Airline 2"],
-            "flight_link": ["Link to Airline 1", "Link to Airline 2"],
-            "estimated_flight_cost": 0
-        }},
-        "daily_plans": [
-            {{
-                "day": 1,
-                "date": "Day of the week",
-                "activities": [
-                    {{
-                        "time": "Morning",
-                        "description": "Activity description",
-                        "location": "Location name",
-                        "category": "Activity/Food/Transportation/Accommodation",
-                        "estimated_cost": 0
-                    }},
-                    // More activities for the day
-                ]
-            }},
-            // More days
-        ],
-        "budget_breakdown": {{
-            "Flights": 0,
-            "Accommodation": 0,
-            "Food": 0,
-            "Transportation": 0,
-            "Activities": 0,
-            "Miscellaneous": 0,
-            "Total": 0
-        }},
-        "travel_tips": [
-            "Tip 1",
-            "Tip 2"
-        ],
-        "visa_requirements": "Brief description of visa requirements",
-        "local_customs": "Brief description of important local customs"
-    }}
-    
-    Ensure the budget breakdown is realistic and the total matches the sum of all categories.
-    Make sure all costs are within the total budget of {budget}.
-    Only respond with the JSON object, no additional text.
-    The currency is USD
+def build_prompt_for_route(home_country, destination, duration, budget, interests, party_size):
+    """Pick the full or trip-only prompt depending on what the route knowledge table holds.
+
+    Returns ``(prompt, route_knowledge)``; ``route_knowledge`` is None on a miss.
     """
-    print("PROMPT")
+    route_knowledge = route_knowledge_store.lookup(home_country, destination, party_size)
+    if route_knowledge is None:
+        prompt = prompts.itinerary(home_country, destination, duration, budget, interests, party_size)
+        return prompt, None
+
+    prompt = prompts.trip(home_country, destination, duration, budget, interests, party_size, route_knowledge)
+    full_prompt = prompts.itinerary(home_country, destination, duration, budget, interests, party_size)
+    route_knowledge_store.record_prompt_savings(estimate_tokens(full_prompt.text) - estimate_tokens(prompt.text))
+    return prompt, route_knowledge
+
+def apply_route_knowledge(home_country, destination, itinerary_data, route_knowledge, party_size):
+    """Merge known route sections (looked up for this party) into the itinerary, or learn them from it"""
+    if route_knowledge is None:
+        route_knowledge_store.remember(home_country, destination, itinerary_data, party_size)
+    else:
+        itinerary_data.update(route_knowledge)
+    return add_airline_links(itinerary_data)
+
+def parse_itinerary_text(response_text):
+    """Parse the model's reply into ``(itinerary dict, repairs made)``"""
+    # Locate, repair and validate the JSON object in the response
+    result = parse_itinerary_response(response_text)
+    if result.repaired:
+        print(f"Repaired itinerary response: {', '.join(result.issues)}")
+    return result.data, result.issues
+
+def fetch_route_knowledge(home_country, destination, purpose="route_knowledge", request_id=None):
+    """Ask the model for just a route's flight, visa and customs sections"""
+    return call_model(prompts.route_knowledge(home_country, destination), purpose, parse=parse_json_object,
+                      request_id=request_id)
+
+def add_airline_links(itinerary_data):
+    """Pair each recommended airline with its booking link for result.html"""
+    # Combine airlines and flight links into a list of tuples
+    flight_info = itinerary_data.get("flight_info", {})
+    recommended_airlines = flight_info.get("recommended_airlines", [])
+    flight_links = flight_info.get("flight_link", [])
+
+    # Combine airlines with their corresponding links
+    airlines_with_links = list(zip(recommended_airlines, flight_links))
+
+    # Add the combined list to the itinerary_data
+    itinerary_data["flight_info"]["airlines_with_links"] = airlines_with_links
+
+    return itinerary_data
+
+def call_model(prompt, purpose, parse=None, request_id=None):
+    """Send one prompt_builder Prompt through the shared client and record its tokens and timings.
+
+    Returns the reply text, or the value from ``parse(text)`` when
+    ``parse`` is given; it returns ``(value, issues)``, where issues are
+    the repairs the reply needed. The parse is timed as part of the call's
+    record and a reply that fails to parse is retried like a failed call.
+    Every attempt is recorded with the prompt's version. Raises
+    ModelUnavailableError when model_caller gives up.
+    """
+    def attempt(timeout, retries):
+        started = time.perf_counter()
+        try:
+            response = get_model_pool().generate_content(
+                model=MODEL_ID,
+                contents=[prompt.text],
+                config=prompts.config(prompt),
+                timeout=timeout
+            )
+        except Exception:
+            model_call_log.record(purpose, MODEL_ID, model_seconds=time.perf_counter() - started,
+                                  retries=retries, failed=True, request_id=request_id,
+                                  prompt_version=prompt.version)
+            raise
+        model_seconds = time.perf_counter() - started
+
+        result = response.text
+        parse_seconds = None
+        issues = []
+        failed = False
+        try:
+            if parse is not None:
+                parse_started = time.perf_counter()
+                try:
+                    result, issues = parse(result)
+                finally:
+                    parse_seconds = time.perf_counter() - parse_started
+        except Exception:
+            failed = True
+            raise
+        finally:
+            model_call_log.record(purpose, MODEL_ID, response=response, model_seconds=model_seconds,
+                                  parse_seconds=parse_seconds, retries=retries, failed=failed,
+                                  request_id=request_id, prompt_version=prompt.version,
+                                  repaired=bool(issues))
+        return result
+
+    return model_caller.call(attempt)
+
+def require_json_text(text):
+    """Return ``(text, issues)`` if it holds a JSON object, so malformed replies are retried"""
+    _, issues = parse_json_object(text)
+    return text, issues
+
+def call_model_text(prompt, purpose="itinerary", request_id=None):
+    """Send one prompt through the shared client and return the reply text (a JSON object)"""
+    return call_model(prompt, purpose, parse=require_json_text, request_id=request_id)
+
+def use_fanout(duration):
     try:
-        # Initialize the Gemini model with Google Search tool
-        client = genai.Client(api_key=api_key)
-        MODEL_ID = "gemini-2.0-flash"
-        google_search_tool = Tool(google_search=GoogleSearch())
+        return FANOUT_MIN_DAYS > 0 and int(duration) >= FANOUT_MIN_DAYS
+    except (TypeError, ValueError):
+        return False
 
-        
-        # Generate content with search capability
-        response = client.models.generate_content(
-            model=MODEL_ID,
-            contents=[prompt],
-            config=GenerateContentConfig(tools=[google_search_tool], response_modalities=["TEXT"])
-        )
-        
-        # Extract and parse the JSON response
-        response_text = response.text
-        
-        # Clean up the response if it contains markdown code blocks
-        if "```json" in response_text:
-            response_text = response_text.split("```json")[1].split("```")[0].strip()
-        elif "```" in response_text:
-            response_text = response_text.split("```")[1].split("```")[0].strip()
-                   # Parse the JSON
-        itinerary_data = json.loads(response_text)
-
-        # Combine airlines and flight links into a list of tuples
-        flight_info = itinerary_data.get("flight_info", {})
-        recommended_airlines = flight_info.get("recommended_airlines", [])
-        flight_links = flight_info.get("flight_link", [])
-
-        # Combine airlines with their corresponding links
-        airlines_with_links = list(zip(recommended_airlines, flight_links))
-
-        # Add the combined list to the itinerary_data
-        itinerary_data["flight_info"]["airlines_with_links"] = airlines_with_links
- 
-        
-        
-        return itinerary_data
+def release_db_connection():
+    """End the request's transaction so its pooled connection is free while the model runs"""
+    db.session.commit()
+
+def generate_itinerary(home_country, destination, duration, budget, interests, party_size, request_id=None,
+                       purpose="itinerary"):
+    """Generate a travel itinerary using Google's Gemini API; model calls are recorded under ``purpose``"""
     
+    # Long trips are generated as a skeleton plus concurrent day ranges
+    if use_fanout(duration):
+        try:
+            route_knowledge = route_knowledge_store.lookup(home_country, destination, party_size)
+            release_db_connection()
+            # Every skeleton and chunk call is recorded under this request's id
+            fanout_purpose = "fanout" if purpose == "itinerary" else purpose
+            call_fanout_model = lambda prompt: call_model_text(prompt, fanout_purpose, request_id)
+            itinerary_data = generate_fanout(
+                call_fanout_model, prompts, home_country, destination, duration, budget, interests, party_size,
+                chunk_days=FANOUT_CHUNK_DAYS,
+                concurrency=FANOUT_CONCURRENCY,
+                route_knowledge=route_knowledge
+            )
+            return apply_route_knowledge(home_country, destination, itinerary_data, route_knowledge, party_size)
+        except ModelUnavailableError:
+            raise
+        except DayRangeError as e:
+            # Chunks that cannot be stitched together; plan the whole trip in one call instead
+            print(f"Fan-out failed, generating in one call: {e}")
+        except Exception as e:
+            print(f"Error generating itinerary: {e}")
+            raise Exception(f"Failed to generate itinerary: {str(e)}")
+
+    # Create a prompt for the AI, leaving out sections the route table already has
+    prompt, route_knowledge = build_prompt_for_route(home_country, destination, duration, budget, interests, party_size)
+    release_db_connection()
+    try:
+        # Generate content through the shared client (grounded or in JSON mode,
+        # as the prompt says), then extract and parse the JSON response
+        itinerary_data = call_model(prompt, purpose, parse=parse_itinerary_text, request_id=request_id)
+        return apply_route_knowledge(home_country, destination, itinerary_data, route_knowledge, party_size)
+    
+    except ModelUnavailableError:
+        raise
     except Exception as e:
         print(f"Error generating itinerary: {e}")
         raise Exception(f"Failed to generate itinerary: {str(e)}")
 
-def create_pdf(itinerary_data, home_country, destination, duration, budget, interests, time_difference, party_size):
-    """Create a PDF file from the itinerary data with proper text wrapping"""
-    
-    # Create a temporary file
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
-    pdf_path = temp_file.name
-    temp_file.close()
-    
-    # Create the PDF document
-    doc = SimpleDocTemplate(pdf_path, pagesize=letter)
-    styles = getSampleStyleSheet()
-    
-    # Create custom styles with text wrapping
-    title_style = styles['Heading1']
-    heading2_style = styles['Heading2']
-    heading3_style = styles['Heading3']
-    
-    # Enhanced text wrapping style
-    wrapped_style = ParagraphStyle(
-        'WrappedStyle',
-        parent=styles['Normal'],
-        spaceBefore=6,
-        spaceAfter=6,
-        wordWrap='CJK',  # Improved word wrapping
-        allowWidows=0,
-        allowOrphans=0
+def itinerary_cache_key(home_country, destination, duration, budget, interests, party_size):
+    return make_cache_key(
+        home_country, destination, duration, budget, interests, party_size,
+        prompts.cache_version, MODEL_ID
     )
-    
-    # Create the content
-    content = []
-    
-    # Title and logo (placeholder)
-    content.append(Paragraph(f"Travel Itinerary: {home_country} to {destination}", title_style))
-    content.append(Spacer(1, 0.25*inch))
-    
-    # Trip details
-    content.append(Paragraph("Trip Details", heading2_style))
-    
-    trip_details = [
-        ["Duration", f"{duration} days"],
-        ["Budget", budget],
-        ["Time Difference", time_difference],
-        ["Interests", interests],
-        ["Party Size", party_size]
-    ]
-    
-    trip_table = Table(trip_details, colWidths=[1.5*inch, 5*inch])
-    trip_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('PADDING', (0, 0), (-1, -1), 6),
-    ]))
-    
-    content.append(trip_table)
-    content.append(Spacer(1, 0.25*inch))
-    
-    # Flight information
-    if "flight_info" in itinerary_data:
-        content.append(Paragraph("Flight Information", heading2_style))
-        
-        flight_details = [
-            ["Estimated Duration", itinerary_data["flight_info"].get("estimated_flight_duration", "N/A")],
-            ["Recommended\nAirlines", ", ".join(itinerary_data["flight_info"].get("recommended_airlines", ["N/A"]))],
-            ["Estimated Cost", f"${itinerary_data['flight_info'].get('estimated_flight_cost', 'N/A')}"]
-        ]
-        
-        flight_table = Table(flight_details, colWidths=[1.5*inch, 5*inch])
-        flight_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
-            ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('PADDING', (0, 0), (-1, -1), 6),
-        ]))
-        
-        content.append(flight_table)
-        content.append(Spacer(1, 0.25*inch))
-    
-    # Visa and customs information
-    content.append(Paragraph("Travel Requirements", heading2_style))
-    
-    # Ensure text wrapping for visa requirements
-    visa_info = Paragraph(f"<b>Visa Requirements:</b> {itinerary_data.get('visa_requirements', 'Information not available')}", wrapped_style)
-    content.append(visa_info)
-    content.append(Spacer(1, 0.1*inch))
-    
-    # Ensure text wrapping for local customs
-    customs_info = Paragraph(f"<b>Local Customs:</b> {itinerary_data.get('local_customs', 'Information not available')}", wrapped_style)
-    content.append(customs_info)
-    content.append(Spacer(1, 0.25*inch))
-    
-    # Daily plans
-    content.append(Paragraph("Daily Itinerary", heading2_style))
-    content.append(Spacer(1, 0.1*inch))
-    
-    for day in itinerary_data['daily_plans']:
-        content.append(Paragraph(f"Day {day['day']} - {day.get('date', '')}", heading3_style))
-        
-        # Create a table for activities
-        data = [["Time", "Activity", "Location", "Category", "Cost"]]
-        
-        for activity in day['activities']:
-            # Ensure text wrapping for description
-            description = Paragraph(activity['description'], wrapped_style)
-            location = Paragraph(activity.get('location', 'N/A'), wrapped_style)
-            data.append([
-                activity['time'],
-                description,
-                location,
-                activity['category'],
-                f"${activity['estimated_cost']}"
-            ])
-        
-        # Create the table with appropriate column widths
-        table = Table(data, colWidths=[0.8*inch, 2.5*inch, 1.2*inch, 1*inch, 0.8*inch])
-        
-        # Style the table
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            # Allow text wrapping in the description column
-            ('ALIGN', (1, 1), (1, -1), 'LEFT'),
-            ('ALIGN', (2, 1), (2, -1), 'LEFT'),
-        ]))
-        
-        content.append(table)
-        content.append(Spacer(1, 0.2*inch))
-    
-    # Budget breakdown
-    content.append(Paragraph("Budget Breakdown", heading2_style))
-    content.append(Spacer(1, 0.1*inch))
-    
-    budget_data = [["Category", "Amount"]]
-    for category, amount in itinerary_data['budget_breakdown'].items():
-        budget_data.append([category, f"${amount}"])
-    
-    budget_table = Table(budget_data, colWidths=[3*inch, 1.5*inch])
-    budget_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        # Highlight the total row
-        ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
-        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-    ]))
-    
-    content.append(budget_table)
-    content.append(Spacer(1, 0.2*inch))
-    
-    # Travel tips
-    content.append(Paragraph("Travel Tips", heading2_style))
-    content.append(Spacer(1, 0.1*inch))
-    
-    for tip in itinerary_data['travel_tips']:
-        # Ensure text wrapping for tips
-        content.append(Paragraph(f"• {tip}", wrapped_style))
-    
-    # Build the PDF
-    doc.build(content)
-    
-    return pdf_path
+
+# Requests close to a cached trip are served that trip with its costs
+# rescaled to their budget and party size instead of a new generation: same
+# route and duration, a budget within SIMILAR_BUDGET_RATIO and a party size
+# within SIMILAR_PARTY_RATIO of it, and interests with a cosine similarity of
+# at least SIMILAR_THRESHOLD. SIMILAR_REUSE=off disables it; users opt out per
+# request with exact_match. NumPy is only imported with the first lookup.
+SIMILAR_REUSE = os.environ.get("SIMILAR_REUSE", "on").lower() not in ("0", "off", "false", "no")
+similar_index = None
+similar_index_lock = threading.Lock()
+
+def get_similar_index():
+    global similar_index
+    with similar_index_lock:
+        if similar_index is None:
+            from similar_itineraries import SimilarityIndex
+            similar_index = SimilarityIndex(
+                # Only itineraries of the current prompt and model, like the cache key
+                candidates=lambda destination: itinerary_cache.indexed_requests(
+                    destination, prompts.cache_version, MODEL_ID
+                ),
+                load=itinerary_cache.peek,
+                threshold=float(os.environ.get("SIMILAR_THRESHOLD", 0.8)),
+                max_budget_ratio=float(os.environ.get("SIMILAR_BUDGET_RATIO", 1.25)),
+                max_party_ratio=float(os.environ.get("SIMILAR_PARTY_RATIO", 2)),
+                registry=metrics_registry,
+            )
+        return similar_index
+
+def similar_reuse_stats():
+    if similar_index is None:
+        return {'enabled': SIMILAR_REUSE, 'loaded': False}
+    return dict(similar_index.stats(), enabled=SIMILAR_REUSE, loaded=True)
+
+# Itineraries are generated (and cached) in BASE_CURRENCY and converted to the
+# currency picked on the form with the rates in EXCHANGE_RATES_FILE, which is
+# reread when it changes; `flask --app app refresh-rates` updates it from the
+# ECB's daily reference rates (EXCHANGE_RATES_URL). Stored itineraries are
+# re-priced for another currency or party size by /api/itineraries/<id>/pricing
+# and /download/<id>?currency=&party_size=. NumPy is imported with the first re-pricing.
+rate_table = RateTable(os.environ.get("EXCHANGE_RATES_FILE", DEFAULT_RATES_FILE))
+pricing_engine = None
+pricing_engine_lock = threading.Lock()
+
+def get_pricing_engine():
+    global pricing_engine
+    with pricing_engine_lock:
+        if pricing_engine is None:
+            from pricing import PricingEngine
+            pricing_engine = PricingEngine(rate_table)
+        return pricing_engine
+
+def pricing_stats():
+    stats = {'rates': rate_table.stats()}
+    if pricing_engine is not None:
+        stats.update(pricing_engine.stats())
+    return stats
+
+def model_budget(budget, currency):
+    """The budget in BASE_CURRENCY, which prompts, the cache and the similarity index work in"""
+    if currency == BASE_CURRENCY:
+        return budget
+    return str(round(rate_table.convert(to_number(budget), currency, BASE_CURRENCY)))
+
+def convert_budget(budget, from_currency, to_currency):
+    """A budget as entered, shown in another currency"""
+    amount = to_number(budget)
+    if not amount or from_currency == to_currency:
+        return budget
+    return format_money(round(rate_table.convert(amount, from_currency, to_currency)), to_currency)
+
+def price_for_request(itinerary_data, params):
+    """A generated itinerary (in BASE_CURRENCY) in the currency picked on the form"""
+    if params['currency'] == BASE_CURRENCY:
+        return itinerary_data
+    return get_pricing_engine().reprice(itinerary_data, currency=params['currency'])
+
+def price_day(day, params):
+    """One streamed day in the currency picked on the form"""
+    if params['currency'] == BASE_CURRENCY:
+        return day
+    return get_pricing_engine().reprice({'daily_plans': [day]}, currency=params['currency'])['daily_plans'][0]
+
+# Rendered PDFs, keyed by itinerary id, content hash and renderer version
+pdf_cache = PdfCache(
+    os.environ.get("PDF_CACHE_DIR", os.path.join(DEFAULT_INSTANCE_PATH, "pdf_cache")),
+    max_bytes=int(os.environ.get("PDF_CACHE_MAX_MB", 256)) * 1024 * 1024,
+    max_files=int(os.environ.get("PDF_CACHE_MAX_FILES", 2000)),
+)
+
+# PDF templates with their styles built once and shared by every download;
+# ReportLab is only imported with the first PDF
+pdf_renderer = None
+pdf_renderer_lock = threading.Lock()
+
+def get_pdf_renderer():
+    global pdf_renderer
+    with pdf_renderer_lock:
+        if pdf_renderer is None:
+            from pdf_generator import PdfRenderer
+            pdf_renderer = PdfRenderer(spool_max_bytes=PDF_SPOOL_MAX_BYTES)
+        return pdf_renderer
+
+# Process pool for bulk exports, started on the first export
+export_pool = None
+export_pool_lock = threading.Lock()
+
+def get_export_pool():
+    global export_pool
+    with export_pool_lock:
+        if export_pool is None:
+            export_pool = create_export_pool(EXPORT_WORKERS)
+        return export_pool
+
+# Flight, visa and customs sections shared by every trip on the same route
+route_knowledge_store = RouteKnowledgeStore(
+    db=db,
+    model=RouteKnowledge,
+    fetch=fetch_route_knowledge,
+    freshness_seconds=ROUTE_KNOWLEDGE_TTL,
+    max_age_seconds=ROUTE_KNOWLEDGE_MAX_AGE,
+)
+
+def get_or_generate_itinerary(home_country, destination, duration, budget, interests, party_size, bypass_cache=False,
+                              exact_match=False, currency=BASE_CURRENCY):
+    """Serve an itinerary from the cache, generating (and caching) it on a miss.
+
+    Unless ``exact_match``, a cached itinerary of a similar trip is adapted before generating;
+    its notice quotes amounts in ``currency``.
+    """
+    args = (home_country, destination, duration, budget, interests, party_size)
+    cache_key = itinerary_cache_key(*args)
+
+    requested_at = datetime.utcnow()
+    request_id = str(uuid.uuid4())
+    if bypass_cache:
+        itinerary_cache.record_bypass()
+        # Fresh requests only share generations that started after they were made
+        flight_key = cache_key + ':fresh'
+        recheck = lambda: itinerary_cache.peek(cache_key, newer_than=requested_at)
+    else:
+        cached = itinerary_cache.get(cache_key)
+        if cached is not None:
+            model_call_log.record("itinerary", MODEL_ID, cache_hit=True, request_id=request_id)
+            return served_warm(cached)
+        similar = None if exact_match else find_similar_itinerary(*args, currency=currency)
+        if similar is not None:
+            model_call_log.record("similar", MODEL_ID, cache_hit=True, request_id=request_id)
+            return similar
+        flight_key = cache_key
+        recheck = lambda: itinerary_cache.peek(cache_key)
+
+    def generate_and_cache():
+        itinerary_data = generate_itinerary(*args, request_id=request_id)
+        cache_itinerary(cache_key, itinerary_data, args)
+        return itinerary_data
+
+    # Waiting on another request's generation should not hold a connection either
+    release_db_connection()
+    try:
+        # recheck may pick up a warmed itinerary stored by another process
+        return served_warm(generation_flight.do(flight_key, generate_and_cache, recheck))
+    except ModelUnavailableError as e:
+        itinerary_data = degraded_itinerary(cache_key, destination)
+        if itinerary_data is None:
+            raise
+        print(f"Serving a cached itinerary for {destination}: {e}")
+        return itinerary_data
+
+def degraded_itinerary(cache_key, destination):
+    """A cached itinerary with a notice, to show while the model is unavailable"""
+    itinerary_data, exact = itinerary_cache.fallback(cache_key, destination)
+    if itinerary_data is None:
+        return None
+    itinerary_data.pop(WARM_MARKER, None)
+    if exact:
+        itinerary_data['notice'] = ("The itinerary planner is unavailable right now, so this is the itinerary "
+                                    "we planned earlier for the same trip.")
+    else:
+        itinerary_data['notice'] = (f"The itinerary planner is unavailable right now, so this is a recent "
+                                    f"itinerary for {destination} planned for a different trip. Adjust it to "
+                                    f"your dates and budget, or try again in a few minutes.")
+    return itinerary_data
+
+def cache_itinerary(cache_key, itinerary_data, args):
+    """Cache a generated itinerary with its request, so similar requests can be served from it"""
+    request = dict(normalize_request(*args), prompt_version=prompts.cache_version, model_id=MODEL_ID)
+    itinerary_cache.set(cache_key, itinerary_data, args[1], request=request)
+    if similar_index is not None:
+        similar_index.forget(request['destination'])
+
+def find_similar_itinerary(home_country, destination, duration, budget, interests, party_size,
+                           currency=BASE_CURRENCY):
+    """A cached itinerary of a near-identical trip, its costs rescaled to this one; None without one.
+
+    ``budget`` is in BASE_CURRENCY; the notice shows the matched trip's budget in ``currency``.
+    """
+    if not SIMILAR_REUSE:
+        return None
+    found = get_similar_index().find(
+        normalize_request(home_country, destination, duration, budget, interests, party_size)
+    )
+    if found is None:
+        return None
+    itinerary_data, match = found
+    matched_budget = format_money(round(rate_table.convert(match['budget'], BASE_CURRENCY, currency)), currency)
+    itinerary_data['notice'] = (f"This itinerary was planned for a very similar trip (a budget of "
+                                f"{matched_budget} for a party of {match['party_size']}), with its costs "
+                                f"rescaled to your budget and party size. Choose \"Only use an itinerary planned "
+                                f"for exactly this trip\" to have one planned just for you.")
+    return served_warm(itinerary_data)
+
+def served_warm(itinerary_data):
+    """Drop the warm-up marker from an itinerary about to be served, counting warm hits"""
+    if itinerary_data.pop(WARM_MARKER, None) is not None:
+        warmup_scheduler.record_hit()
+    return itinerary_data
+
+def warm_route(home_country, destination, request_id):
+    """Refresh a route's knowledge for the warm-up if it is missing or stale; returns whether the model was called"""
+    if not route_knowledge_store.needs_refresh(home_country, destination):
+        return False
+    release_db_connection()
+    route_knowledge_store.remember(
+        home_country, destination, fetch_route_knowledge(home_country, destination, "warmup", request_id)
+    )
+    return True
+
+def warm_itinerary(trip, request_id):
+    """Generate and cache a trip for the warm-up unless a fresh itinerary is cached; returns whether it generated"""
+    args = (trip['home_country'], trip['destination'], trip['duration'], trip['budget'], trip['interests'],
+            trip['party_size'])
+    cache_key = itinerary_cache_key(*args)
+    # An entry past half its TTL would expire during the day it is warmed for
+    fresh_since = datetime.utcnow() - timedelta(seconds=itinerary_cache.ttl_seconds / 2)
+    if itinerary_cache.peek(cache_key, newer_than=fresh_since) is not None:
+        return False
+
+    def generate_and_cache():
+        itinerary_data = generate_itinerary(*args, request_id=request_id, purpose='warmup')
+        cache_itinerary(cache_key, dict(itinerary_data, **{WARM_MARKER: datetime.utcnow().isoformat()}), args)
+        return itinerary_data
+
+    release_db_connection()
+    # Shares the call with a live request (or another process) generating the same trip
+    generation_flight.do(cache_key, generate_and_cache, lambda: itinerary_cache.peek(cache_key, newer_than=fresh_since))
+    return True
+
+def model_tokens_used(request_id):
+    """Tokens reported for the model calls recorded under ``request_id``"""
+    return db.session.query(db.func.coalesce(db.func.sum(ModelCall.total_tokens), 0)).filter(
+        ModelCall.request_id == request_id
+    ).scalar()
+
+def find_warmup_requests():
+    return popular_requests(
+        db, Itinerary,
+        since=datetime.utcnow() - timedelta(days=int(os.environ.get("WARMUP_LOOKBACK_DAYS", 14))),
+        max_routes=int(os.environ.get("WARMUP_ROUTES", 30)),
+        per_route=int(os.environ.get("WARMUP_PER_ROUTE", 3)),
+        min_requests=int(os.environ.get("WARMUP_MIN_REQUESTS", 2)),
+    )
+
+# Popular trips are generated ahead of time once a day during WARMUP_HOURS
+# (local hours, e.g. '2-5'; unset disables it). The trips are the
+# WARMUP_PER_ROUTE most requested duration/budget buckets of the WARMUP_ROUTES
+# busiest routes over WARMUP_LOOKBACK_DAYS days, with at least
+# WARMUP_MIN_REQUESTS requests each. A pass spends at most
+# WARMUP_TOKEN_BUDGET tokens with WARMUP_CONCURRENCY generations at a time,
+# and one worker process runs it (through the generation_lock table).
+# `flask --app app warm-up` runs a pass now, e.g. from cron.
+warmup_scheduler = WarmupScheduler(
+    find_requests=find_warmup_requests,
+    warm_route=warm_route,
+    warm_itinerary=warm_itinerary,
+    tokens_used=model_tokens_used,
+    token_budget=int(os.environ.get("WARMUP_TOKEN_BUDGET", 200000)),
+    concurrency=int(os.environ.get("WARMUP_CONCURRENCY", 2)),
+    hours=parse_hours(os.environ.get("WARMUP_HOURS")),
+    claim_run=lambda day: claim_daily_run(db, GenerationLock, day),
+    registry=metrics_registry,
+)
+
+def create_pdf(itinerary_data, home_country, destination, duration, budget, interests, time_difference, party_size, output=None, template=None,
+               currency=None, priced_party_size=None):
+    """Create a PDF from the itinerary data with proper text wrapping.
+
+    ``output`` may be a path or a writable file object. By default the PDF is
+    built in memory (spilling to disk only above PDF_SPOOL_MAX_BYTES) and the
+    buffer is returned rewound, ready to stream. ``template`` names one of
+    the layouts in pdf_generator.TEMPLATES. ``currency`` and
+    ``priced_party_size`` re-price the itinerary (see pricing.PricingEngine)
+    before it is rendered.
+    """
+    if currency or priced_party_size:
+        from_currency = itinerary_data.get('currency') or BASE_CURRENCY
+        itinerary_data = get_pricing_engine().reprice(itinerary_data, currency, priced_party_size,
+                                                      from_party_size=party_size)
+        budget = convert_budget(budget, from_currency, itinerary_data['currency'])
+        party_size = priced_party_size or party_size
+    details = {
+        'home_country': home_country,
+        'destination': destination,
+        'duration': duration,
+        'budget': budget,
+        'interests': interests,
+        'time_difference': time_difference,
+        'party_size': party_size,
+    }
+    return get_pdf_renderer().render(itinerary_data, details, template=template, output=output)
+
+@main.app_template_filter('money')
+def money_filter(amount, currency=None):
+    return format_money(amount, currency)
+
+@main.app_template_filter('in_currency')
+def in_currency_filter(amount, currency=None):
+    """A saved BASE_CURRENCY amount (or budget) converted to ``currency`` and formatted, e.g. in the history"""
+    number = to_number(amount)
+    if isinstance(amount, str) and not number:
+        # A budget that is not a number is shown as entered
+        return amount
+    currency = currency or BASE_CURRENCY
+    try:
+        number = rate_table.convert(number, BASE_CURRENCY, currency)
+    except UnknownCurrencyError:
+        # The currency has since left the rate table
+        currency = BASE_CURRENCY
+    return format_money(f"{number:.0f}", currency)
 
 # Login required decorator
 def login_required(f):
     def decorated_function(*args, **kwargs):
         if 'user_id' not in session:
             flash('Please log in to access this page', 'warning')
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
         return f(*args, **kwargs)
     decorated_function.__name__ = f.__name__
     return decorated_function
 
-@app.route('/')
+@main.route('/')
 def index():
-    return render_template('index.html', countries=COUNTRIES)
+    return render_template('index.html', countries=COUNTRIES, pdf_templates=template_choices(),
+                           currencies=rate_table.currencies())
 
-@app.route('/register', methods=['GET', 'POST'])
+@main.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         email = request.form.get('email')
@@ -418,17 +741,17 @@ def register():
         # Validate input
         if not email or not password:
             flash('Email and password are required', 'danger')
-            return redirect(url_for('register'))
+            return redirect(url_for('main.register'))
             
         if password != confirm_password:
             flash('Passwords do not match', 'danger')
-            return redirect(url_for('register'))
+            return redirect(url_for('main.register'))
             
         # Check if user already exists
         existing_user = User.query.filter_by(email=email).first()
         if existing_user:
             flash('Email already registered', 'danger')
-            return redirect(url_for('register'))
+            return redirect(url_for('main.register'))
             
         # Create new user
         hashed_password = generate_password_hash(password)
@@ -437,11 +760,11 @@ def register():
         db.session.commit()
         
         flash('Registration successful! Please log in.', 'success')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
         
     return render_template('register.html')
 
-@app.route('/login', methods=['GET', 'POST'])
+@main.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         email = request.form.get('email')
@@ -453,113 +776,565 @@ def login():
         # Check credentials
         if not user or not check_password_hash(user.password, password):
             flash('Invalid email or password', 'danger')
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
             
         # Set session
         session['user_id'] = user.id
         session['user_email'] = user.email
         
         flash('Login successful!', 'success')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
         
     return render_template('login.html')
 
-@app.route('/logout')
+@main.route('/logout')
 def logout():
     session.clear()
     flash('You have been logged out', 'info')
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
 
-@app.route('/dashboard')
+@main.route('/dashboard')
 @login_required
 def dashboard():
-    return render_template('dashboard.html', countries=COUNTRIES)
+    return render_template('dashboard.html', countries=COUNTRIES, pdf_templates=template_choices(),
+                           currencies=rate_table.currencies())
+
+def read_generation_form(form):
+    """Collect the itinerary inputs submitted from the dashboard/index form.
+
+    Raises UnknownCurrencyError for a currency the rate table lacks.
+    """
+    budget = form.get('budget')
+    currency = (form.get('currency') or BASE_CURRENCY).upper()
+    if currency not in rate_table.currencies():
+        raise UnknownCurrencyError(f"Unknown currency: {currency}")
+    return {
+        'home_country': form.get('home_country'),
+        'destination': form.get('destination'),
+        'duration': form.get('duration'),
+        'budget': budget,
+        'interests': form.get('interests'),
+        'style': form.get('style'),  # For PDF style
+        'currency': currency,  # Costs are converted to it
+        'party_size': int(form.get('party_size', 1)),  # Default to 1 if not provided
+        'total_budget': float(budget),
+        'bypass_cache': form.get('bypass_cache', '').lower() in ('1', 'true', 'on', 'yes'),
+        'exact_match': form.get('exact_match', '').lower() in ('1', 'true', 'on', 'yes')
+    }
 
-@app.route('/generate', methods=['POST'])
+def generation_args(params):
+    """The subset of the form inputs passed to get_or_generate_itinerary, with the budget in BASE_CURRENCY"""
+    return {
+        'home_country': params['home_country'],
+        'destination': params['destination'],
+        'duration': params['duration'],
+        'budget': model_budget(params['budget'], params['currency']),
+        'interests': params['interests'],
+        'party_size': params['party_size'],
+        'bypass_cache': params['bypass_cache'],
+        'exact_match': params.get('exact_match', False),
+        'currency': params['currency']
+    }
+
+def save_itinerary(params, itinerary_data, user_id):
+    """Persist an itinerary (in BASE_CURRENCY) for a logged in user and return its id"""
+    total_cost, day_count = itinerary_summary(itinerary_data)
+    new_itinerary = Itinerary(
+        user_id=user_id,
+        home_country=params['home_country'],
+        destination=params['destination'],
+        duration=params['duration'],
+        budget=model_budget(params['budget'], params['currency']),
+        interests=params['interests'],
+        party_size=params['party_size'],
+        currency=params['currency'],
+        total_cost=total_cost,
+        day_count=day_count
+    )
+    new_itinerary.store_itinerary_json(json.dumps(itinerary_data), ITINERARY_STORAGE)
+    destination = normalize_text(params['destination'])
+    for row in activity_rows(itinerary_data):
+        new_itinerary.activities.append(ItineraryActivity(user_id=user_id, destination=destination, **row))
+    db.session.add(new_itinerary)
+    db.session.commit()
+    return new_itinerary.id
+
+def store_itinerary(params, itinerary_data, user_id, itinerary_id=None):
+    """Save to the database for logged in users, otherwise keep it in the temp store.
+
+    Amounts are kept in BASE_CURRENCY, like the cache; ``currency`` is the
+    one they are shown in.
+    """
+    if user_id:
+        return save_itinerary(params, itinerary_data, user_id)
+
+    # For non-logged in users, create a temporary ID; only the id goes in the session
+    itinerary_id = itinerary_id or str(uuid.uuid4())
+    temp_itinerary_store.put(itinerary_id, {
+        'home_country': params['home_country'],
+        'destination': params['destination'],
+        'duration': params['duration'],
+        'style': params['style'],
+        'currency': params['currency'],
+        'total_budget': params['total_budget'],
+        'budget': model_budget(params['budget'], params['currency']),
+        'interests': params['interests'],
+        'party_size': params['party_size'],
+        'itinerary_data': json.dumps(itinerary_data),
+        'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    })
+    # The streaming route sets the id before its response starts, so only touch
+    # the session when it changes; older cookies still carry the whole itinerary
+    if session.get('temp_itinerary_id') != itinerary_id:
+        session['temp_itinerary_id'] = itinerary_id
+    if 'temp_itinerary' in session:
+        del session['temp_itinerary']
+    return itinerary_id
+
+def render_itinerary(params, itinerary_data, itinerary_id):
+    return render_template('result.html', 
+                          itinerary=itinerary_data, 
+                          home_country=params['home_country'],
+                          destination=params['destination'],
+                          duration=params['duration'],
+                          budget=params['budget'],
+                          interests=params['interests'],
+                          time_difference=get_time_difference(params['home_country'], params['destination']),
+                          itinerary_id=itinerary_id,
+                          party_size=params['party_size'],
+                          pdf_style=template_name(params['style']))
+
+def wants_json():
+    return request.accept_mimetypes.best == 'application/json'
+
+def run_generation_job(params):
+    """Worker-side half of an async /generate request; the result is in BASE_CURRENCY"""
+    return get_or_generate_itinerary(**generation_args(params))
+
+def persist_generation_job(job):
+    """Save a finished job once for every logged in user who requested it"""
+    for requester in job.requesters:
+        if requester:
+            job.requesters[requester] = save_itinerary(job.params, job.result, requester)
+
+# Background generation so /generate does not hold a worker for the whole LLM call.
+# Jobs run in the process that accepted them; their state and results are
+# kept in the generation_job_record table so any worker can answer polls.
+job_manager = JobManager(
+    runner=run_generation_job,
+    on_complete=persist_generation_job,
+    max_workers=int(os.environ.get("GENERATION_WORKERS", 4)),
+    max_queue=int(os.environ.get("GENERATION_QUEUE_SIZE", 16)),
+    db=db,
+    model=GenerationJobRecord,
+)
+
+def job_status_payload(job):
+    payload = job.to_dict()
+    payload['status_url'] = url_for('main.job_status', job_id=job.id)
+    payload['events_url'] = url_for('main.job_events', job_id=job.id)
+    if job.finished:
+        payload['result_url'] = url_for('main.job_result', job_id=job.id)
+    return payload
+
+def enqueue_generation(params, user_id):
+    """Queue an async generation and answer with its job id (202) or 429 when full"""
+    args = generation_args(params)
+    key = itinerary_cache_key(
+        args['home_country'], args['destination'], args['duration'],
+        args['budget'], args['interests'], args['party_size']
+    )
+    # Requests in another currency get their own (converted) result
+    if params['currency'] != BASE_CURRENCY:
+        key += ':' + params['currency']
+    if params['bypass_cache']:
+        key += ':fresh'
+    elif params['exact_match']:
+        key += ':exact'
+
+    try:
+        job = job_manager.submit(key, params, user_id=user_id)
+    except QueueFullError as e:
+        if wants_json():
+            response = jsonify({'error': str(e)})
+        else:
+            response = current_app.make_response(render_template('error.html', error=str(e)))
+        response.status_code = 429
+        response.headers['Retry-After'] = '10'
+        return response
+
+    if wants_json():
+        return jsonify(job_status_payload(job)), 202
+    return render_template('pending.html',
+                          job_id=job.id,
+                          home_country=params['home_country'],
+                          destination=params['destination']), 202
+
+@main.route('/generate', methods=['POST'])
 def generate():
     # Check if user is logged in
     user_id = session.get('user_id')
     
     # Get form data
-    home_country = request.form.get('home_country')
-    destination = request.form.get('destination')
-    duration = request.form.get('duration')
-    budget = request.form.get('budget')
-    interests = request.form.get('interests')
-    style = request.form.get('style')  # For PDF style
-    currency = request.form.get('currency')  # For selected currency
-    party_size = int(request.form.get('party_size', 1))  # Default to 1 if not provided
-    total_budget = float(budget)
+    try:
+        params = read_generation_form(request.form)
+    except UnknownCurrencyError as e:
+        if wants_json():
+            return jsonify({'error': str(e)}), 400
+        return render_template('error.html', error=str(e)), 400
 
-    # Calculate time difference
-    time_difference = get_time_difference(home_country, destination)
+    # Render the streaming page, which fetches /generate/stream itself
+    if request.form.get('stream'):
+        return render_template('stream.html',
+                              form=request.form,
+                              home_country=params['home_country'],
+                              destination=params['destination'],
+                              duration=params['duration'],
+                              budget=params['budget'],
+                              interests=params['interests'],
+                              party_size=params['party_size'],
+                              pdf_style=template_name(params['style']),
+                              time_difference=get_time_difference(params['home_country'], params['destination']))
+
+    # Hand the generation to the background workers when requested
+    if request.form.get('mode') == 'async':
+        return enqueue_generation(params, user_id)
     
     # Generate itinerary using AI
     try:
-        itinerary_data = generate_itinerary(
-            home_country, 
-            destination, 
-            duration, 
-            budget,
-            interests,
-            party_size
-        )
-        
-        # Save to database if user is logged in
-        if user_id:
-            new_itinerary = Itinerary(
-                user_id=user_id,
-                home_country=home_country,
-                destination=destination,
-                duration=duration,
-                budget=budget,
-                interests=interests,
-                itinerary_data=json.dumps(itinerary_data),
-                party_size=party_size
-            )
-            db.session.add(new_itinerary)
-            db.session.commit()
-            itinerary_id = new_itinerary.id
-        else:
-            # For non-logged in users, create a temporary ID
-            itinerary_id = str(uuid.uuid4())
-            # Store in session for temporary access
-            session['temp_itinerary'] = {
-                'id': itinerary_id,
-                'home_country': home_country,
-                'destination': destination,
-                'duration': duration,
-                'style': style,
-                'currency': currency,
-                'total_budget': total_budget,
-                'budget': budget,
-                'interests': interests,
-                'party_size': party_size,
-                'itinerary_data': json.dumps(itinerary_data),
-                'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            }
-        
-        return render_template('result.html', 
-                              itinerary=itinerary_data, 
-                              home_country=home_country,
-                              destination=destination,
-                              duration=duration,
-                              budget=budget,
-                              interests=interests,
-                              time_difference=time_difference,
-                              itinerary_id=itinerary_id,
-                              party_size=party_size)
+        itinerary_data = get_or_generate_itinerary(**generation_args(params))
+        itinerary_id = store_itinerary(params, itinerary_data, user_id)
+        return render_itinerary(params, price_for_request(itinerary_data, params), itinerary_id)
+    except ModelUnavailableError as e:
+        response = current_app.make_response((render_template('error.html', error=str(e)), 503))
+        response.retry_after = e.retry_after
+        return response
     except Exception as e:
         return render_template('error.html', error=str(e))
 
-@app.route('/history')
+# Time-to-first-day for streamed generations, reported on /health
+stream_stats = {
+    'streams': 0,
+    'cache_hits': 0,
+    'failures': 0,
+    'first_days': 0,
+    'time_to_first_day_seconds': 0.0,
+    'max_time_to_first_day_seconds': 0.0
+}
+stream_stats_lock = threading.Lock()
+
+def record_stream(cached=False, failed=False, time_to_first_day=None):
+    with stream_stats_lock:
+        stream_stats['streams'] += 1
+        stream_stats['cache_hits'] += int(cached)
+        stream_stats['failures'] += int(failed)
+        if time_to_first_day is not None:
+            stream_stats['first_days'] += 1
+            stream_stats['time_to_first_day_seconds'] += time_to_first_day
+            stream_stats['max_time_to_first_day_seconds'] = max(
+                stream_stats['max_time_to_first_day_seconds'], time_to_first_day
+            )
+
+def streaming_stats():
+    with stream_stats_lock:
+        stats = dict(stream_stats)
+    first_days = stats['first_days'] or 1
+    stats['avg_time_to_first_day_seconds'] = round(stats['time_to_first_day_seconds'] / first_days, 4)
+    stats['time_to_first_day_seconds'] = round(stats['time_to_first_day_seconds'], 4)
+    stats['max_time_to_first_day_seconds'] = round(stats['max_time_to_first_day_seconds'], 4)
+    return stats
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@main.route('/generate/stream', methods=['POST'])
+def generate_stream():
+    """Stream the itinerary as Server-Sent Events, one `day` event per finished day"""
+    user_id = session.get('user_id')
+    try:
+        params = read_generation_form(request.form)
+    except UnknownCurrencyError as e:
+        # The streaming page reads the body as events whatever the status
+        return Response(sse_event('error', {'error': str(e)}), status=400, mimetype='text/event-stream')
+    started = time.perf_counter()
+    # The session cookie is sent with the first byte of the stream, so an
+    # anonymous user's itinerary id has to be settled before streaming starts
+    temp_itinerary_id = None
+    if not user_id:
+        temp_itinerary_id = str(uuid.uuid4())
+        session['temp_itinerary_id'] = temp_itinerary_id
+        if 'temp_itinerary' in session:
+            del session['temp_itinerary']
+
+    def stream():
+        first_day_at = None
+        cached = False
+        request_id = str(uuid.uuid4())
+        try:
+            args = (params['home_country'], params['destination'], params['duration'],
+                    model_budget(params['budget'], params['currency']), params['interests'], params['party_size'])
+            cache_key = itinerary_cache_key(*args)
+            itinerary_data = None
+            purpose = 'stream'
+            if params['bypass_cache']:
+                itinerary_cache.record_bypass()
+            else:
+                itinerary_data = itinerary_cache.get(cache_key)
+                if itinerary_data is None and not params['exact_match']:
+                    itinerary_data = find_similar_itinerary(*args, currency=params['currency'])
+                    if itinerary_data is not None:
+                        purpose = 'similar'
+
+            if itinerary_data is None and not model_breaker.allow():
+                # Fail fast while the circuit is open, standing in a cached itinerary when there is one
+                itinerary_data = degraded_itinerary(cache_key, params['destination'])
+                if itinerary_data is None:
+                    raise CircuitOpenError("The itinerary planner is unavailable right now. Please try again shortly.")
+
+            if itinerary_data is not None:
+                cached = True
+                itinerary_data = served_warm(itinerary_data)
+                model_call_log.record(purpose, MODEL_ID, cache_hit=True, request_id=request_id)
+                for day in itinerary_data.get('daily_plans', []):
+                    if first_day_at is None:
+                        first_day_at = time.perf_counter() - started
+                    yield sse_event('day', price_day(day, params))
+            else:
+                # Prompted with the budget in BASE_CURRENCY, like the sync path
+                prompt, route_knowledge = build_prompt_for_route(*args)
+                parser = DailyPlanStreamParser()
+                chunks = []
+                # The last chunk carries the usage totals for the whole stream
+                last_chunk = None
+                model_started = time.perf_counter()
+                # Streams are not retried once days are on screen, but they count towards the breaker
+                stream_healthy = True
+                try:
+                    chunk_stream = get_model_pool().generate_content_stream(
+                        MODEL_ID, [prompt.text], prompts.config(prompt), timeout=model_caller.attempt_timeout
+                    )
+                    for chunk in chunk_stream:
+                        last_chunk = chunk
+                        text = chunk.text or ''
+                        chunks.append(text)
+                        for day in parser.feed(text):
+                            if first_day_at is None:
+                                first_day_at = time.perf_counter() - started
+                            yield sse_event('day', price_day(day, params))
+                except Exception as e:
+                    stream_healthy = not is_upstream_failure(e)
+                    raise
+                finally:
+                    model_breaker.record(healthy=stream_healthy)
+                model_seconds = time.perf_counter() - model_started
+                parse_started = time.perf_counter()
+                parse_failed = True
+                issues = []
+                try:
+                    parsed, issues = parse_itinerary_text(''.join(chunks))
+                    parse_failed = False
+                finally:
+                    model_call_log.record('stream', MODEL_ID, response=last_chunk, model_seconds=model_seconds,
+                                          parse_seconds=time.perf_counter() - parse_started, failed=parse_failed,
+                                          request_id=request_id, prompt_version=prompt.version,
+                                          repaired=bool(issues))
+                itinerary_data = apply_route_knowledge(
+                    params['home_country'], params['destination'], parsed, route_knowledge, params['party_size']
+                )
+                cache_itinerary(cache_key, itinerary_data, args)
+
+            itinerary_id = store_itinerary(params, itinerary_data, user_id, temp_itinerary_id)
+            record_stream(cached=cached, time_to_first_day=first_day_at)
+            yield sse_event('metrics', {
+                'cached': cached,
+                'time_to_first_day_seconds': round(first_day_at, 4) if first_day_at is not None else None,
+                'total_seconds': round(time.perf_counter() - started, 4)
+            })
+            yield sse_event('done', {'itinerary': price_for_request(itinerary_data, params),
+                                     'itinerary_id': itinerary_id})
+        except Exception as e:
+            print(f"Error streaming itinerary: {e}")
+            record_stream(cached=cached, failed=True, time_to_first_day=first_day_at)
+            yield sse_event('error', {'error': f"Failed to generate itinerary: {str(e)}"})
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@main.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job_status_payload(job))
+
+@main.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    """Server-Sent Events stream that reports the job status until it finishes"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    payload = job_status_payload(job)
+    result_url = url_for('main.job_result', job_id=job.id)
+
+    def stream():
+        yield f"event: status\ndata: {json.dumps(payload)}\n\n"
+        last_status = job.status
+        while not job.wait(timeout=5):
+            if job.status != last_status:
+                last_status = job.status
+                yield f"event: status\ndata: {json.dumps(job.to_dict())}\n\n"
+            else:
+                yield ": keep-alive\n\n"
+        final = job.to_dict()
+        final['result_url'] = result_url
+        yield f"event: status\ndata: {json.dumps(final)}\n\n"
+
+    # A job run by another worker is polled from the database
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@main.route('/jobs/<job_id>/result')
+def job_result(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return render_template('error.html', error='This itinerary request has expired. Please generate it again.'), 404
+    if not job.finished:
+        return render_template('pending.html',
+                              job_id=job.id,
+                              home_country=job.params['home_country'],
+                              destination=job.params['destination'])
+    if job.status == 'failed':
+        return render_template('error.html', error=job.error)
+
+    user_id = session.get('user_id')
+    itinerary_id = job.requesters.get(user_id) if user_id else None
+    if itinerary_id is None:
+        itinerary_id = store_itinerary(job.params, job.result, user_id)
+        if user_id:
+            job_manager.add_requester(job, user_id, itinerary_id)
+    return render_itinerary(job.params, price_for_request(job.result, job.params), itinerary_id)
+
+@main.before_app_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    # The warm-up thread only runs in processes that serve requests
+    warmup_scheduler.start()
+
+@main.after_app_request
+def record_request_time(response):
+    started = g.get('request_started')
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        request_seconds.observe(time.perf_counter() - started, route=route,
+                                method=request.method, status=response.status_code)
+    return response
+
+@main.route('/metrics')
+def metrics():
+    """Prometheus text exposition of this process's metrics"""
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
+def model_pool_stats():
+    try:
+        return get_model_pool().stats()
+    except EnvironmentError as e:
+        return {'error': str(e)}
+
+@main.route('/health')
+def health():
+    return jsonify({
+        'status': 'ok',
+        'model_pool': model_pool_stats(),
+        'itinerary_cache': itinerary_cache.stats(),
+        'generation_jobs': job_manager.stats(),
+        'single_flight': generation_flight.stats(),
+        'model_resilience': model_caller.stats(),
+        'prompts': prompts.stats(),
+        'streaming': streaming_stats(),
+        'route_knowledge': route_knowledge_store.stats(),
+        'warmup': warmup_scheduler.stats(),
+        'pricing': pricing_stats(),
+        'similar_reuse': similar_reuse_stats(),
+        'pdf_cache': pdf_cache.stats(),
+        'temp_itineraries': temp_itinerary_store.stats()
+    })
+
+# Columns shown in the history listing; itinerary_data is never loaded for it
+HISTORY_COLUMNS = (
+    Itinerary.id, Itinerary.home_country, Itinerary.destination, Itinerary.duration,
+    Itinerary.budget, Itinerary.party_size, Itinerary.total_cost, Itinerary.day_count,
+    Itinerary.currency, Itinerary.created_at,
+)
+HISTORY_PAGE_SIZE = 20
+HISTORY_MAX_PAGE_SIZE = 100
+
+def encode_history_cursor(row):
+    value = f"{row.created_at.isoformat()}|{row.id}"
+    return base64.urlsafe_b64encode(value.encode('utf-8')).decode('ascii')
+
+def decode_history_cursor(cursor):
+    """``(created_at, id)`` of the last row on the previous page, or None if invalid"""
+    try:
+        created_at, itinerary_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+        return datetime.fromisoformat(created_at), int(itinerary_id)
+    except ValueError:
+        return None
+
+def history_page(user_id, cursor=None, limit=HISTORY_PAGE_SIZE):
+    """One page of a user's itineraries, newest first, and the cursor of the next page.
+
+    Keyset pagination on (created_at, id) follows the ix_itinerary_user_created
+    index, so later pages cost the same as the first however long the history is.
+    """
+    query = Itinerary.query.with_entities(*HISTORY_COLUMNS).filter(Itinerary.user_id == user_id)
+    position = decode_history_cursor(cursor) if cursor else None
+    if position:
+        created_at, last_id = position
+        query = query.filter(or_(
+            Itinerary.created_at < created_at,
+            and_(Itinerary.created_at == created_at, Itinerary.id < last_id)
+        ))
+    rows = query.order_by(Itinerary.created_at.desc(), Itinerary.id.desc()).limit(limit + 1).all()
+    next_cursor = encode_history_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+def history_limit():
+    try:
+        limit = int(request.args.get('limit', HISTORY_PAGE_SIZE))
+    except ValueError:
+        limit = HISTORY_PAGE_SIZE
+    return max(1, min(limit, HISTORY_MAX_PAGE_SIZE))
+
+@main.route('/history')
 @login_required
 def history():
     user_id = session.get('user_id')
-    itineraries = Itinerary.query.filter_by(user_id=user_id).order_by(Itinerary.created_at.desc()).all()
-    return render_template('history.html', history=itineraries)
+    itineraries, next_cursor = history_page(user_id, request.args.get('cursor'), history_limit())
+    return render_template('history.html', history=itineraries, next_cursor=next_cursor,
+                           paged=bool(request.args.get('cursor')))
 
-@app.route('/delete/<int:itinerary_id>', methods=['POST'])
+@main.route('/api/history')
+@login_required
+def history_api():
+    user_id = session.get('user_id')
+    itineraries, next_cursor = history_page(user_id, request.args.get('cursor'), history_limit())
+    return jsonify({
+        'items': [{
+            'id': row.id,
+            'home_country': row.home_country,
+            'destination': row.destination,
+            'duration': row.duration,
+            'budget': row.budget,
+            'party_size': row.party_size,
+            'total_cost': row.total_cost,
+            'day_count': row.day_count,
+            'currency': row.currency or BASE_CURRENCY,
+            'created_at': row.created_at.isoformat(),
+        } for row in itineraries],
+        'next_cursor': next_cursor,
+    })
+
+@main.route('/delete/<int:itinerary_id>', methods=['POST'])
 @login_required
 def delete_itinerary(itinerary_id):
     user_id = session.get('user_id')
@@ -569,61 +1344,419 @@ def delete_itinerary(itinerary_id):
     db.session.commit()
     
     flash('Itinerary deleted successfully', 'success')
-    return redirect(url_for('history'))
+    return redirect(url_for('main.history'))
+
+def find_itinerary(itinerary_id):
+    """The logged in user's saved itinerary, or the session's temporary one, as a dict; None if there is none"""
+    user_id = session.get('user_id')
+    if user_id:
+        itinerary = Itinerary.query.filter_by(id=itinerary_id, user_id=user_id).first()
+        if not itinerary:
+            return None
+        return {
+            'itinerary_data': itinerary.itinerary_json,
+            'home_country': itinerary.home_country,
+            'destination': itinerary.destination,
+            'duration': itinerary.duration,
+            'budget': itinerary.budget,
+            'interests': itinerary.interests,
+            'party_size': itinerary.party_size,
+            'currency': itinerary.currency or BASE_CURRENCY,
+            'created_at': itinerary.created_at,
+            'style': None,
+        }
+
+    # For non-logged in users, the session names the one itinerary they may fetch
+    if session.get('temp_itinerary_id') != itinerary_id:
+        return None
+    temp_itinerary = temp_itinerary_store.get(itinerary_id)
+    if not temp_itinerary:
+        return None
+    return {
+        'itinerary_data': temp_itinerary['itinerary_data'],
+        'home_country': temp_itinerary['home_country'],
+        'destination': temp_itinerary['destination'],
+        'duration': temp_itinerary['duration'],
+        'budget': temp_itinerary['budget'],
+        'interests': temp_itinerary['interests'],
+        'party_size': temp_itinerary['party_size'],
+        'currency': temp_itinerary.get('currency', BASE_CURRENCY),
+        'created_at': datetime.strptime(temp_itinerary['created_at'], '%Y-%m-%d %H:%M:%S'),
+        'style': temp_itinerary.get('style'),
+    }
 
-@app.route('/download/<itinerary_id>')
+def pricing_args(args):
+    """``(currency, party_size)`` asked for in a query string; either may be None"""
+    currency = (args.get('currency') or '').strip().upper() or None
+    if currency is not None and currency not in rate_table.currencies():
+        raise UnknownCurrencyError(f"Unknown currency: {currency}")
+    party_size = args.get('party_size', type=int)
+    if party_size is not None and not 1 <= party_size <= 50:
+        raise ValueError("party_size must be between 1 and 50")
+    return currency, party_size
+
+@main.route('/api/itineraries/<itinerary_id>/pricing')
+def itinerary_pricing(itinerary_id):
+    """A stored itinerary re-priced in ?currency= (by default its own) and/or for ?party_size=, as JSON"""
+    record = find_itinerary(itinerary_id)
+    if record is None:
+        return jsonify({'error': 'Itinerary not found'}), 404
+    try:
+        currency, party_size = pricing_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    currency = currency or record['currency']
+
+    started = time.perf_counter()
+    itinerary_data = json.loads(record['itinerary_data'])
+    from_currency = itinerary_data.get('currency') or BASE_CURRENCY
+    itinerary_data = get_pricing_engine().reprice(itinerary_data, currency, party_size,
+                                                  from_party_size=record['party_size'])
+    return jsonify({
+        'itinerary_id': itinerary_id,
+        'currency': itinerary_data['currency'],
+        'party_size': party_size or record['party_size'],
+        'budget': convert_budget(record['budget'], from_currency, itinerary_data['currency']),
+        'rates_as_of': rate_table.stats()['as_of'],
+        'itinerary': itinerary_data,
+        'seconds': round(time.perf_counter() - started, 4),
+    })
+
+@main.route('/download/<itinerary_id>')
 def download_pdf(itinerary_id):
     # Check if user is logged in
     user_id = session.get('user_id')
     
     # Get itinerary data
-    if user_id:
-        # For logged in users, get from database
-        itinerary = Itinerary.query.filter_by(id=itinerary_id, user_id=user_id).first()
-        if not itinerary:
-            flash('Itinerary not found', 'danger')
-            return redirect(url_for('history'))
-            
-        itinerary_data = json.loads(itinerary.itinerary_data)
-        home_country = itinerary.home_country
-        party_size = itinerary.party_size
-        destination = itinerary.destination
-        duration = itinerary.duration
-        budget = itinerary.budget
-        interests = itinerary.interests
-    else:
-        # For non-logged in users, get from session
-        temp_itinerary = session.get('temp_itinerary')
-        if not temp_itinerary or temp_itinerary['id'] != itinerary_id:
-            flash('Itinerary not found', 'danger')
-            return redirect(url_for('index'))
-            
-        itinerary_data = json.loads(temp_itinerary['itinerary_data'])
-        home_country = temp_itinerary['home_country']
-        party_size = temp_itinerary['party_size']
-        destination = temp_itinerary['destination']
-        duration = temp_itinerary['duration']
-        budget = temp_itinerary['budget']
-        interests = temp_itinerary['interests']
+    record = find_itinerary(itinerary_id)
+    if record is None:
+        flash('Itinerary not found', 'danger')
+        return redirect(url_for('main.history') if user_id else url_for('main.index'))
+    raw_itinerary_data = record['itinerary_data']
+    home_country = record['home_country']
+    party_size = record['party_size']
+    destination = record['destination']
+    duration = record['duration']
+    budget = record['budget']
+    interests = record['interests']
+    created_at = record['created_at']
+    style = template_name(request.args.get('style') or record['style'])
+
+    # ?currency= and ?party_size= re-price the PDF; by default it is in the itinerary's currency
+    try:
+        currency, priced_party_size = pricing_args(request.args)
+    except ValueError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('main.history') if user_id else url_for('main.index'))
+    currency = currency or record['currency']
+    pricing = (currency, priced_party_size) if currency != BASE_CURRENCY or priced_party_size else ()
     
     # Calculate time difference
     time_difference = get_time_difference(home_country, destination)
-    
-    # Generate PDF
-    pdf_path = create_pdf(
-        itinerary_data, 
-        home_country, 
-        destination, 
-        duration, 
-        budget, 
-        interests,
-        time_difference,
-        party_size
+
+    # Itineraries never change, so the content hash identifies the rendered PDF
+    content_hash = itinerary_content_hash(
+        raw_itinerary_data, home_country, destination, duration, budget, interests, party_size, time_difference, style,
+        *pricing
     )
+    etag = f"{content_hash[:32]}-v{RENDERER_VERSION}"
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+        response.set_etag(etag)
+        response.cache_control.private = True
+        return response
+
+    # Reuse an earlier render of a saved itinerary when there is one
+    pdf = pdf_cache.get(itinerary_id, content_hash) if user_id else None
+    if pdf is None:
+        # Generate PDF in memory
+        pdf = create_pdf(
+            json.loads(raw_itinerary_data), 
+            home_country, 
+            destination, 
+            duration, 
+            budget, 
+            interests,
+            time_difference,
+            party_size,
+            template=style,
+            currency=currency,
+            priced_party_size=priced_party_size
+        )
+        # Anonymous itineraries are one-offs, so only saved ones are kept on disk
+        if user_id:
+            pdf_cache.put_file(itinerary_id, content_hash, pdf)
+            pdf.seek(0)
     
     # Send file to user
-    return send_file(pdf_path, as_attachment=True, download_name=f"itinerary_{destination}_{datetime.now().strftime('%Y%m%d')}.pdf")
+    response = send_file(
+        pdf,
+        mimetype='application/pdf',
+        as_attachment=True,
+        download_name=f"itinerary_{destination}_{datetime.now().strftime('%Y%m%d')}.pdf",
+        etag=etag,
+        last_modified=created_at,
+        conditional=True,
+        max_age=0
+    )
+    response.cache_control.private = True
+    return response
+
+def itinerary_pdf_details(itinerary):
+    """The create_pdf details of a saved itinerary"""
+    return {
+        'home_country': itinerary.home_country,
+        'destination': itinerary.destination,
+        'duration': itinerary.duration,
+        'budget': itinerary.budget,
+        'interests': itinerary.interests,
+        'time_difference': get_time_difference(itinerary.home_country, itinerary.destination),
+        'party_size': itinerary.party_size,
+    }
+
+def itinerary_pdf_hash(itinerary, details, style):
+    # Same fields, in the same order, as download_pdf hashes
+    currency = itinerary.currency or BASE_CURRENCY
+    pricing = (currency, None) if currency != BASE_CURRENCY else ()
+    return itinerary_content_hash(
+        itinerary.itinerary_json, details['home_country'], details['destination'], details['duration'],
+        details['budget'], details['interests'], details['party_size'], details['time_difference'], style,
+        *pricing
+    )
+
+def priced_pdf_source(itinerary, details):
+    """``(itinerary_json, details)`` of a saved itinerary to render, re-priced in its currency"""
+    currency = itinerary.currency or BASE_CURRENCY
+    if currency == BASE_CURRENCY:
+        return itinerary.itinerary_json, details
+    itinerary_data = json.loads(itinerary.itinerary_json)
+    from_currency = itinerary_data.get('currency') or BASE_CURRENCY
+    details = dict(details, budget=convert_budget(details['budget'], from_currency, currency))
+    return json.dumps(get_pricing_engine().reprice(itinerary_data, currency)), details
+
+@main.route('/export')
+@login_required
+def export_itineraries():
+    """Download the selected (or all) saved itineraries as a ZIP or one combined PDF"""
+    user_id = session.get('user_id')
+    export_format = request.args.get('format', 'zip')
+    style = template_name(request.args.get('style'))
+    selected = [int(value) for value in request.args.getlist('ids') if value.isdigit()]
+
+    query = Itinerary.query.filter_by(user_id=user_id)
+    if selected:
+        query = query.filter(Itinerary.id.in_(selected))
+    query = query.order_by(Itinerary.created_at.desc())
+    stamp = datetime.now().strftime('%Y%m%d')
+
+    if export_format == 'pdf':
+        count = query.count()
+        if not count:
+            flash('No itineraries to export', 'warning')
+            return redirect(url_for('main.history'))
+        if count > EXPORT_COMBINED_MAX:
+            flash(f'A combined PDF can hold at most {EXPORT_COMBINED_MAX} itineraries; '
+                  'select fewer or export a ZIP instead', 'warning')
+            return redirect(url_for('main.history'))
+        entries = [priced_pdf_source(itinerary, itinerary_pdf_details(itinerary)) for itinerary in query]
+        fd, pdf_path = tempfile.mkstemp(suffix='.pdf')
+        os.close(fd)
+        try:
+            get_export_pool().submit(render_combined_to_path, entries, style, pdf_path).result()
+            pdf = open(pdf_path, 'rb')
+        finally:
+            # The open handle keeps the data readable until the response is sent
+            os.unlink(pdf_path)
+        return send_file(pdf, mimetype='application/pdf', as_attachment=True,
+                         download_name=f"itineraries_{stamp}.pdf", max_age=0)
+
+    def items():
+        # Rows are loaded a page at a time so large histories are never all in memory
+        for itinerary in query.yield_per(50):
+            details = itinerary_pdf_details(itinerary)
+            content_hash = itinerary_pdf_hash(itinerary, details, style)
+            arcname = f"{itinerary.id}_{secure_filename(itinerary.destination) or 'itinerary'}.pdf"
+            cached_path = pdf_cache.get(itinerary.id, content_hash)
+            if cached_path is not None:
+                yield arcname, cached_path, None
+            else:
+                itinerary_json, details = priced_pdf_source(itinerary, details)
+                yield arcname, None, (itinerary.id, content_hash, itinerary_json, details, style)
+
+    export = ZipExport(get_export_pool(), pdf_cache, max_pending=EXPORT_MAX_PENDING)
+    response = Response(stream_with_context(export.stream(items())), mimetype='application/zip')
+    response.headers['Content-Disposition'] = f'attachment; filename="itineraries_{stamp}.zip"'
+    return response
+
+@main.route('/api/activities')
+@login_required
+def activities_api():
+    """Search the user's saved activities, e.g. ?destination=Tokyo&max_cost=50 (costs in BASE_CURRENCY)"""
+    user_id = session.get('user_id')
+    query = ItineraryActivity.query.filter_by(user_id=user_id)
+    if request.args.get('destination'):
+        query = query.filter(ItineraryActivity.destination == normalize_text(request.args['destination']))
+    if request.args.get('category'):
+        query = query.filter(ItineraryActivity.category == request.args['category'])
+    max_cost = request.args.get('max_cost', type=float)
+    if max_cost is not None:
+        query = query.filter(ItineraryActivity.estimated_cost <= max_cost)
+    limit = max(1, min(request.args.get('limit', 100, type=int), 500))
+    activities = query.order_by(ItineraryActivity.estimated_cost.asc(), ItineraryActivity.id.asc()).limit(limit)
+    return jsonify({'activities': [{
+        'itinerary_id': activity.itinerary_id,
+        'destination': activity.destination,
+        'day': activity.day,
+        'time': activity.time,
+        'description': activity.description,
+        'location': activity.location,
+        'category': activity.category,
+        'estimated_cost': activity.estimated_cost,
+    } for activity in activities]})
+
+@main.cli.command('convert-itinerary-storage')
+@click.argument('storage_format', type=click.Choice(STORAGE_FORMATS))
+def convert_itinerary_storage_command(storage_format):
+    """Re-encode saved itineraries as STORAGE_FORMAT (json, zlib or jsonb)"""
+    with db.engine.begin() as connection:
+        converted = convert_itinerary_storage(connection, storage_format)
+    print(f"Converted {converted} itineraries to {storage_format}")
+
+@main.cli.command('cache-invalidate')
+@click.argument('destination')
+def cache_invalidate_command(destination):
+    """Drop every cached itinerary for DESTINATION.
+
+    Running workers stop serving them from memory within ITINERARY_CACHE_MEMORY_TTL seconds.
+    """
+    removed = itinerary_cache.invalidate_destination(destination)
+    click.echo(f"Removed {removed} cached itineraries for {destination}")
+
+@main.cli.command('refresh-routes')
+@click.option('--limit', default=50, help='Maximum number of routes to refresh')
+def refresh_routes_command(limit):
+    """Refresh route knowledge that is past its freshness window"""
+    for home_country, destination in route_knowledge_store.stale_routes(limit):
+        try:
+            route_knowledge_store.refresh(home_country, destination)
+            click.echo(f"Refreshed {home_country} -> {destination}")
+        except Exception as e:
+            click.echo(f"Failed to refresh {home_country} -> {destination}: {e}")
+
+@main.cli.command('warm-up')
+@click.option('--token-budget', type=int, default=None, help='Tokens this pass may spend (default WARMUP_TOKEN_BUDGET)')
+@click.option('--dry-run', is_flag=True, help='Only list the trips that would be warmed')
+def warm_up_command(token_budget, dry_run):
+    """Pre-generate itineraries and route knowledge for the most requested trips"""
+    if dry_run:
+        for trip in find_warmup_requests():
+            click.echo(f"{trip['requests']:5}  {trip['home_country']} -> {trip['destination']}, {trip['duration']} days, "
+                       f"budget {trip['budget']}, party of {trip['party_size']}, {trip['interests']}")
+        return
+    click.echo(json.dumps(warmup_scheduler.run(token_budget=token_budget), indent=2))
+
+@main.cli.command('refresh-rates')
+@click.option('--url', default=lambda: os.environ.get(
+    "EXCHANGE_RATES_URL", "https://www.ecb.europa.eu/stats/eurofxref/eurofxref-daily.xml"
+), help='ECB-format daily reference rates XML')
+def refresh_rates_command(url):
+    """Update the exchange rate table from the ECB's daily reference rates; other currencies keep their rates"""
+    import httpx
+    try:
+        response = httpx.get(url, timeout=30, follow_redirects=True)
+        response.raise_for_status()
+        as_of, rates = parse_ecb_rates(response.text)
+    except Exception as e:
+        raise click.ClickException(f"Failed to fetch exchange rates from {url}: {e}")
+    total = rate_table.write(rates, as_of=as_of, source=url)
+    click.echo(f"Updated {len(rates)} of {total} rates in {rate_table.path} (as of {as_of})")
+
+@main.cli.command('sweep-temp-itineraries')
+def sweep_temp_itineraries_command():
+    """Delete anonymous itineraries that are past TEMP_ITINERARY_TTL"""
+    removed = temp_itinerary_store.sweep()
+    click.echo(f"Removed {removed} expired temporary itineraries")
+
+@main.cli.command('model-usage')
+@click.option('--days', default=7, help='How many days back to summarize')
+def model_usage_command(days):
+    """Summarize recorded model calls per purpose and prompt version: tokens, search use, repairs and latency"""
+    since = datetime.utcnow() - timedelta(days=days)
+    rows = db.session.query(
+        ModelCall.purpose,
+        ModelCall.prompt_version,
+        db.func.count(ModelCall.id),
+        db.func.sum(db.case((ModelCall.cache_hit.is_(True), 1), else_=0)),
+        db.func.sum(db.case((ModelCall.failed.is_(True), 1), else_=0)),
+        db.func.sum(db.case((ModelCall.repaired.is_(True), 1), else_=0)),
+        db.func.sum(ModelCall.prompt_tokens),
+        db.func.sum(ModelCall.output_tokens),
+        db.func.sum(ModelCall.search_queries),
+        db.func.avg(ModelCall.model_seconds),
+        db.func.avg(ModelCall.parse_seconds),
+        db.func.count(db.distinct(ModelCall.request_id)),
+    ).filter(ModelCall.created_at >= since).group_by(
+        ModelCall.purpose, ModelCall.prompt_version
+    ).order_by(ModelCall.purpose, ModelCall.prompt_version).all()
+    click.echo(f"{'purpose':16} {'prompt':8} {'calls':>6} {'hits':>6} {'failed':>6} {'repaired':>8} "
+               f"{'prompt tok':>11} {'output tok':>11} {'searches':>8} {'model s':>8} {'parse ms':>8} {'requests':>8}")
+    for (purpose, prompt_version, calls, hits, failed, repaired, prompt, output, searches, model_s, parse_s,
+         requests) in rows:
+        click.echo(f"{purpose:16} {prompt_version or '-':8} {calls:6} {hits or 0:6} {failed or 0:6} {repaired or 0:8} "
+                   f"{prompt or 0:11} {output or 0:11} {searches or 0:8} {model_s or 0:8.2f} "
+                   f"{(parse_s or 0) * 1000:8.2f} {requests:8}")
+
+@main.cli.command('cache-stats')
+def cache_stats_command():
+    """Print itinerary cache hit/miss/eviction counters"""
+    click.echo(json.dumps(itinerary_cache.stats(), indent=2))
+
+def init_database():
+    """Create missing tables and apply pending migrations (inside an app context)"""
+    db.create_all()
+    run_migrations(db)
+
+@main.cli.command('migrate')
+def migrate_command():
+    """Create missing tables and bring the database schema up to date"""
+    init_database()
+    click.echo("Database is up to date")
+
+def create_app(config=None):
+    """Build the Flask app.
+
+    Creating it does not touch the database or the network: tables are
+    created and migrated by ``flask --app app migrate`` (or
+    ``init_database()``), the Gemini client and ReportLab are loaded on the
+    first model call and the first PDF, and GOOGLE_API_KEY is only required
+    by model calls (/health reports it missing). ``config`` overrides the settings read from the
+    environment.
+    """
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = os.urandom(24)
+    configure_app(app)
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    if config:
+        app.config.update(config)
+
+    db.init_app(app)
+    with app.app_context():
+        # WAL, busy timeout and cache pragmas on every connection; db_helper shares the engine
+        install_sqlite_pragmas(db.engine)
+        use_engine(db.engine)
+
+    # Background generations, route refreshes and the warm-up run in this app's context
+    job_manager.app_context = app.app_context
+    route_knowledge_store.app_context = app.app_context
+    warmup_scheduler.app_context = app.app_context
+
+    app.register_blueprint(main)
+    return app
 
 if __name__ == '__main__':
+    app = create_app()
+    # The development server migrates on start; deployments run `flask --app app migrate` first
+    with app.app_context():
+        init_database()
     port = int(os.environ.get("PORT", 5000))
     app.run(host='0.0.0.0', port=port)
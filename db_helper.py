@@ -1,58 +1,46 @@
-import sqlite3
 import json
 from datetime import datetime
 
+from sqlalchemy import Column, DateTime, Integer, MetaData, Table, Text, func, select
+
+from db_config import get_engine
+
+# These helpers share the app's engine (see db_config), so they get the same
+# pooled connections and settings as the app on SQLite or PostgreSQL.
+
+metadata = MetaData()
+
+itineraries = Table(
+    'itineraries', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('destination', Text, nullable=False),
+    Column('duration', Text, nullable=False),
+    Column('budget', Text, nullable=False),
+    Column('interests', Text),
+    Column('itinerary_data', Text, nullable=False),
+    Column('created_at', DateTime, server_default=func.now()),
+)
+
 def init_db():
-    conn = sqlite3.connect('itineraries.db')
-    cursor = conn.cursor()
-    
     # Create table if it doesn't exist
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS itineraries (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        destination TEXT NOT NULL,
-        duration TEXT NOT NULL,
-        budget TEXT NOT NULL,
-        interests TEXT,
-        itinerary_data TEXT NOT NULL,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-    
-    conn.commit()
-    conn.close()
+    metadata.create_all(get_engine())
 
 def save_itinerary(destination, duration, budget, interests, itinerary_data):
-    conn = sqlite3.connect('itineraries.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-    INSERT INTO itineraries (destination, duration, budget, interests, itinerary_data, created_at)
-    VALUES (?, ?, ?, ?, ?, ?)
-    ''', (
-        destination, 
-        duration, 
-        budget, 
-        interests, 
-        json.dumps(itinerary_data),
-        datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    ))
-    
-    itinerary_id = cursor.lastrowid
-    
-    conn.commit()
-    conn.close()
-    
-    return itinerary_id
+    with get_engine().begin() as conn:
+        result = conn.execute(itineraries.insert().values(
+            destination=destination,
+            duration=duration,
+            budget=budget,
+            interests=interests,
+            itinerary_data=json.dumps(itinerary_data),
+            created_at=datetime.now().replace(microsecond=0)
+        ))
+        return result.inserted_primary_key[0]
 
 def get_user_history():
-    conn = sqlite3.connect('itineraries.db')
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    
-    cursor.execute('SELECT id, destination, duration, budget, created_at FROM itineraries ORDER BY created_at DESC')
-    history = [dict(row) for row in cursor.fetchall()]
-    
-    conn.close()
-    
-    return history
+    query = select(
+        itineraries.c.id, itineraries.c.destination, itineraries.c.duration,
+        itineraries.c.budget, itineraries.c.created_at
+    ).order_by(itineraries.c.created_at.desc())
+    with get_engine().connect() as conn:
+        return [dict(row._mapping) for row in conn.execute(query)]
@@ -0,0 +1,142 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import xml.etree.ElementTree as ElementTree
+
+# Itineraries are generated in the base currency; every rate is in units of a
+# currency per unit of it
+BASE_CURRENCY = "USD"
+
+DEFAULT_RATES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "exchange_rates.json")
+
+# Symbols the PDF fonts can draw; other currencies are shown by their code
+CURRENCY_SYMBOLS = {"USD": "$", "EUR": "€", "GBP": "£", "JPY": "¥"}
+
+
+class UnknownCurrencyError(ValueError):
+    pass
+
+
+def format_money(amount, currency=None):
+    """``$120`` in the base currency, ``€120`` or ``120 CHF`` in others"""
+    currency = currency or BASE_CURRENCY
+    symbol = CURRENCY_SYMBOLS.get(currency)
+    return f"{symbol}{amount}" if symbol else f"{amount} {currency}"
+
+
+def parse_ecb_rates(xml_text):
+    """``(date, rates)`` from the ECB's daily reference rates XML, rebased on BASE_CURRENCY"""
+    root = ElementTree.fromstring(xml_text)
+    per_euro = {"EUR": 1.0}
+    date = None
+    for element in root.iter():
+        if element.get("time"):
+            date = element.get("time")
+        if element.get("currency"):
+            per_euro[element.get("currency")] = float(element.get("rate"))
+    if BASE_CURRENCY not in per_euro:
+        raise ValueError(f"The reference rates have no {BASE_CURRENCY} rate")
+    base = per_euro[BASE_CURRENCY]
+    return date, {currency: round(rate / base, 6) for currency, rate in per_euro.items()}
+
+
+class RateTable:
+    """Exchange rates read from a JSON file that can be replaced while the app runs.
+
+    The file holds ``{"base": "USD", "as_of": ..., "source": ...,
+    "rates": {"EUR": 0.92, ...}}``. Its modification time is checked at most
+    every ``check_seconds`` and the table is reread when it changed, so a
+    refreshed file (see ``write``) is picked up by every worker without a
+    restart. Lookups never touch the network.
+    """
+
+    def __init__(self, path=DEFAULT_RATES_FILE, check_seconds=60):
+        self.path = path
+        self.check_seconds = check_seconds
+        self._lock = threading.Lock()
+        self._rates = {BASE_CURRENCY: 1.0}
+        self._as_of = None
+        self._source = None
+        self._mtime = None
+        self._checked_at = None
+        self._counters = {
+            "loads": 0,
+            "load_failures": 0,
+        }
+
+    def _load(self):
+        with open(self.path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("base", BASE_CURRENCY) != BASE_CURRENCY:
+            raise ValueError(f"{self.path} is not based on {BASE_CURRENCY}")
+        rates = {code.upper(): float(rate) for code, rate in data["rates"].items() if float(rate) > 0}
+        rates[BASE_CURRENCY] = 1.0
+        return rates, data.get("as_of"), data.get("source")
+
+    def _refresh(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < self.check_seconds:
+                return
+            self._checked_at = now
+            try:
+                mtime = os.path.getmtime(self.path)
+                if mtime == self._mtime:
+                    return
+                self._rates, self._as_of, self._source = self._load()
+                self._mtime = mtime
+                self._counters["loads"] += 1
+            except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+                # Keep the rates loaded last; the next check retries
+                self._counters["load_failures"] += 1
+                print(f"Could not load exchange rates from {self.path}: {e}")
+
+    def currencies(self):
+        self._refresh()
+        with self._lock:
+            return sorted(self._rates)
+
+    def rate(self, from_currency, to_currency):
+        """Units of ``to_currency`` per unit of ``from_currency``"""
+        self._refresh()
+        with self._lock:
+            rates = self._rates
+        for currency in (from_currency, to_currency):
+            if currency not in rates:
+                raise UnknownCurrencyError(f"Unknown currency: {currency}")
+        return rates[to_currency] / rates[from_currency]
+
+    def convert(self, amount, from_currency, to_currency):
+        return amount * self.rate(from_currency, to_currency)
+
+    def write(self, rates, as_of=None, source=None):
+        """Replace the file (atomically) with ``rates`` merged over the current ones"""
+        self._refresh()
+        with self._lock:
+            merged = dict(self._rates)
+        merged.update({code.upper(): rate for code, rate in rates.items()})
+        payload = {"base": BASE_CURRENCY, "as_of": as_of, "source": source, "rates": dict(sorted(merged.items()))}
+        directory = os.path.dirname(os.path.abspath(self.path))
+        descriptor, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "w", encoding="utf-8") as f:
+                json.dump(payload, f, indent=2)
+                f.write("\n")
+            os.replace(temp_path, self.path)
+        except Exception:
+            os.unlink(temp_path)
+            raise
+        with self._lock:
+            self._checked_at = None
+        return len(merged)
+
+    def stats(self):
+        self._refresh()
+        with self._lock:
+            stats = dict(self._counters)
+            stats["currencies"] = len(self._rates)
+            stats["as_of"] = self._as_of
+            stats["source"] = self._source
+        return stats
@@ -0,0 +1,273 @@
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue is at capacity and a new job cannot be accepted"""
+
+
+class GenerationJob:
+    """A single itinerary generation running in the background"""
+
+    def __init__(self, key, params, job_id=None, load=None, poll_seconds=0.5):
+        self.id = job_id or str(uuid.uuid4())
+        self.key = key
+        self.params = params
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        # user_id -> saved Itinerary id; None collects anonymous requesters
+        self.requesters = {}
+        self._done = threading.Event()
+        # Set on jobs run by another process: ``load(job_id)`` rereads them
+        self._load = load
+        self._poll_seconds = poll_seconds
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed")
+
+    def wait(self, timeout=None):
+        """Block until the job finishes or ``timeout`` elapses; returns ``finished``"""
+        if self._load is None:
+            self._done.wait(timeout)
+            return self.finished
+        deadline = time.monotonic() + (timeout or 0)
+        while not self.finished:
+            fresh = self._load(self.id)
+            if fresh is not None:
+                self.status, self.result, self.error = fresh.status, fresh.result, fresh.error
+                self.started_at, self.finished_at = fresh.started_at, fresh.finished_at
+                self.requesters = fresh.requesters
+            if self.finished or time.monotonic() >= deadline:
+                break
+            time.sleep(self._poll_seconds)
+        return self.finished
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobManager:
+    """Bounded background worker pool for itinerary generation.
+
+    ``runner(params)`` produces the itinerary and runs on one of
+    ``max_workers`` threads. At most ``max_queue`` further jobs may wait for
+    a worker; beyond that ``submit`` raises ``QueueFullError``. Jobs with the
+    same key that are still queued or running are shared rather than
+    duplicated. ``on_complete(job)`` runs on the worker after a successful
+    generation, e.g. to persist the result. Both run inside
+    ``app_context()`` when one is given.
+
+    With ``db`` and ``model`` (see ``GenerationJobRecord``) every job and
+    its result are also written to a table, so ``get`` finds jobs that
+    another worker process accepted and runs. Such a job's ``wait`` polls
+    the table; one still unfinished ``stale_seconds`` after it was created
+    (its process died) is reported as failed.
+    """
+
+    def __init__(self, runner, on_complete=None, max_workers=4, max_queue=16, retention_seconds=900,
+                 app_context=None, db=None, model=None, stale_seconds=600, poll_seconds=0.5):
+        self.runner = runner
+        self.on_complete = on_complete
+        self.app_context = app_context
+        self.db = db
+        self.model = model
+        self.stale_seconds = stale_seconds
+        self.poll_seconds = poll_seconds
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.retention_seconds = retention_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="generation")
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._active_by_key = {}
+        self._counters = {
+            "submitted": 0,
+            "deduplicated": 0,
+            "rejected": 0,
+            "completed": 0,
+            "failed": 0,
+            "shared_lookups": 0,
+        }
+
+    @property
+    def persistent(self):
+        return self.db is not None and self.model is not None
+
+    def submit(self, key, params, user_id=None):
+        """Queue a generation for ``params``; returns the (possibly shared) job"""
+        with self._lock:
+            self._prune()
+            job = self._active_by_key.get(key)
+            if job is not None:
+                job.requesters.setdefault(user_id, None)
+                self._counters["deduplicated"] += 1
+                return job
+
+            if len(self._active_by_key) >= self.max_workers + self.max_queue:
+                self._counters["rejected"] += 1
+                raise QueueFullError("Too many itineraries are being generated right now. Please try again shortly.")
+
+            job = GenerationJob(key, params)
+            job.requesters[user_id] = None
+            self._jobs[job.id] = job
+            self._active_by_key[key] = job
+            self._counters["submitted"] += 1
+
+        self._prune_persistent()
+        self._save(job)
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        """The job, whichever worker process runs it; None once it is unknown or expired"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None or not self.persistent:
+            return job
+        self._count("shared_lookups")
+        return self._load(job_id)
+
+    def add_requester(self, job, user_id, itinerary_id):
+        """Record the itinerary saved from ``job`` for ``user_id``, for whichever worker serves them next"""
+        with self._lock:
+            job.requesters[user_id] = itinerary_id
+        if not self.persistent:
+            return
+        try:
+            row = self.db.session.get(self.model, job.id)
+            if row is not None:
+                requesters = dict((requester, saved) for requester, saved in json.loads(row.requesters))
+                requesters[user_id] = itinerary_id
+                row.requesters = json.dumps(list(requesters.items()))
+                self.db.session.commit()
+        except Exception as e:
+            self.db.session.rollback()
+            print(f"Could not record a requester of generation job {job.id}: {e}")
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def _save(self, job):
+        """Write the job's state to the shared table"""
+        if not self.persistent:
+            return
+        with self._lock:
+            requesters = list(job.requesters.items())
+        try:
+            row = self.db.session.get(self.model, job.id)
+            if row is None:
+                row = self.model(id=job.id, key=job.key, params=json.dumps(job.params), created_at=job.created_at)
+                self.db.session.add(row)
+            row.status = job.status
+            row.result = json.dumps(job.result) if job.result is not None else None
+            row.error = job.error
+            row.requesters = json.dumps(requesters)
+            row.started_at = job.started_at
+            row.finished_at = job.finished_at
+            self.db.session.commit()
+        except Exception as e:
+            # Other workers will not see this update, but this one still serves the job
+            self.db.session.rollback()
+            print(f"Could not save generation job {job.id}: {e}")
+
+    def _load(self, job_id):
+        """The shared table's copy of a job run by any process, or None"""
+        row = self.db.session.get(self.model, job_id)
+        if row is None:
+            return None
+        # Read the committed row, not this session's cached one, when polling
+        self.db.session.refresh(row)
+        job = GenerationJob(row.key, json.loads(row.params), job_id=row.id, load=self._load,
+                            poll_seconds=self.poll_seconds)
+        job.status = row.status
+        job.result = json.loads(row.result) if row.result is not None else None
+        job.error = row.error
+        job.requesters = dict((requester, saved) for requester, saved in json.loads(row.requesters))
+        job.created_at, job.started_at, job.finished_at = row.created_at, row.started_at, row.finished_at
+        self.db.session.commit()
+        if not job.finished and time.time() - job.created_at > self.stale_seconds:
+            job.status = "failed"
+            job.error = "This itinerary request was interrupted. Please generate it again."
+        return job
+
+    def _prune_persistent(self):
+        """Delete shared rows past the retention window, and abandoned ones"""
+        if not self.persistent:
+            return
+        now = time.time()
+        try:
+            self.model.query.filter(
+                (self.model.finished_at < now - self.retention_seconds)
+                | (self.model.created_at < now - self.stale_seconds - self.retention_seconds)
+            ).delete(synchronize_session=False)
+            self.db.session.commit()
+        except Exception as e:
+            self.db.session.rollback()
+            print(f"Could not prune generation jobs: {e}")
+
+    def _run(self, job):
+        if self.app_context is not None:
+            with self.app_context():
+                self._run_job(job)
+        else:
+            self._run_job(job)
+
+    def _run_job(self, job):
+        job.status = "running"
+        job.started_at = time.time()
+        self._save(job)
+        try:
+            job.result = self.runner(job.params)
+            if self.on_complete is not None:
+                # Stop accepting new requesters before persisting for them
+                with self._lock:
+                    self._active_by_key.pop(job.key, None)
+                self.on_complete(job)
+            job.status = "done"
+            counter = "completed"
+        except Exception as e:
+            print(f"Generation job {job.id} failed: {e}")
+            job.error = str(e)
+            job.status = "failed"
+            counter = "failed"
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                if self._active_by_key.get(job.key) is job:
+                    del self._active_by_key[job.key]
+                self._counters[counter] += 1
+            self._save(job)
+            job._done.set()
+
+    def _prune(self):
+        """Forget finished jobs older than the retention window (caller holds the lock)"""
+        cutoff = time.time() - self.retention_seconds
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["active"] = len(self._active_by_key)
+            stats["retained"] = len(self._jobs)
+        stats["max_workers"] = self.max_workers
+        stats["max_queue"] = self.max_queue
+        return stats
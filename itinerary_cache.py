@@ -0,0 +1,289 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError
+
+
+def normalize_text(value):
+    """Lowercase and collapse whitespace so cosmetic differences share a key"""
+    return re.sub(r"\s+", " ", str(value or "")).strip().lower()
+
+
+def _normalize_interests(interests):
+    """Split interests on commas/'and', drop duplicates and sort them"""
+    parts = re.split(r",|;|\band\b|&", normalize_text(interests))
+    return sorted({part.strip() for part in parts if part.strip()})
+
+
+def _normalize_number(value):
+    """Pull the numeric part out of inputs like '$2,000' or ' 7 '"""
+    match = re.search(r"\d+(?:\.\d+)?", str(value or "").replace(",", ""))
+    if not match:
+        return normalize_text(value)
+    number = float(match.group())
+    return int(number) if number.is_integer() else number
+
+
+def normalize_request(home_country, destination, duration, budget, interests, party_size):
+    """Return the canonical form of the inputs that shape an itinerary"""
+    return {
+        "home_country": normalize_text(home_country),
+        "destination": normalize_text(destination),
+        "duration": _normalize_number(duration),
+        "budget": _normalize_number(budget),
+        "interests": _normalize_interests(interests),
+        "party_size": _normalize_number(party_size),
+    }
+
+
+def make_cache_key(home_country, destination, duration, budget, interests, party_size,
+                   prompt_version, model_id):
+    """Hash the normalized request together with the prompt and model versions"""
+    payload = normalize_request(home_country, destination, duration, budget, interests, party_size)
+    payload["prompt_version"] = prompt_version
+    payload["model_id"] = model_id
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class ItineraryCache:
+    """Two-tier cache for generated itineraries.
+
+    The first tier is an in-process LRU keyed by the request hash. The second
+    tier is an optional SQLAlchemy model (see ``CachedItinerary`` in app.py)
+    so entries survive restarts and are shared between workers. Both tiers
+    honour the same TTL and are bounded in size. Expired persistent entries
+    are kept ``stale_seconds`` longer for ``fallback``, which stands in
+    for the model when it is unavailable. Persistent entries stored with
+    their normalized request are listed by ``indexed_requests`` for the
+    similarity index.
+
+    ``invalidate_destination`` only clears the in-process tier of the
+    process that calls it, so other workers keep a memory entry for at
+    most ``memory_ttl_seconds`` before going back to the shared table.
+    """
+
+    def __init__(self, db=None, model=None, ttl_seconds=86400, max_entries=256,
+                 max_persistent_entries=5000, stale_seconds=7 * 86400, memory_ttl_seconds=60):
+        self.db = db
+        self.model = model
+        self.ttl_seconds = ttl_seconds
+        self.memory_ttl_seconds = memory_ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.max_entries = max_entries
+        self.max_persistent_entries = max_persistent_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {
+            "hits": 0,
+            "memory_hits": 0,
+            "persistent_hits": 0,
+            "misses": 0,
+            "sets": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "bypasses": 0,
+            "invalidations": 0,
+            "fallbacks": 0,
+        }
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    @property
+    def persistent(self):
+        return self.db is not None and self.model is not None
+
+    def get(self, key):
+        """Return the cached itinerary for ``key`` or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, destination, payload = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._counters["hits"] += 1
+                    self._counters["memory_hits"] += 1
+                    return json.loads(payload)
+                del self._entries[key]
+                self._counters["expirations"] += 1
+
+        if self.persistent:
+            row = self._find(key)
+            if row is not None:
+                if row.expires_at > datetime.utcnow():
+                    row.last_accessed = datetime.utcnow()
+                    row.hit_count = (row.hit_count or 0) + 1
+                    self.db.session.commit()
+                    remaining = (row.expires_at - datetime.utcnow()).total_seconds()
+                    self._remember(key, row.destination, row.itinerary_data, now + remaining)
+                    self._count("hits")
+                    self._count("persistent_hits")
+                    return json.loads(row.itinerary_data)
+                # Left for fallback(); _evict_persistent drops it once it is past stale_seconds
+                self._count("expirations")
+
+        self._count("misses")
+        return None
+
+    def peek(self, key, newer_than=None):
+        """Return the shared (persistent) entry for ``key`` without counting a lookup.
+
+        Used to pick up an itinerary another worker process just stored;
+        entries stored before ``newer_than`` are ignored.
+        """
+        if not self.persistent:
+            return None
+        row = self._find(key)
+        if row is None or row.expires_at <= datetime.utcnow():
+            return None
+        if newer_than is not None and row.created_at < newer_than:
+            return None
+        return json.loads(row.itinerary_data)
+
+    def fallback(self, key, destination):
+        """Best stand-in when no itinerary can be generated.
+
+        Returns ``(itinerary_data, exact)``: the (possibly expired) entry for
+        ``key`` itself, else the newest entry for the same destination, else
+        ``(None, False)``.
+        """
+        if not self.persistent:
+            return None, False
+        row = self._find(key)
+        exact = row is not None
+        if row is None:
+            row = (self.model.query.filter_by(destination=normalize_text(destination))
+                   .order_by(self.model.created_at.desc()).first())
+        if row is None:
+            return None, False
+        self._count("fallbacks")
+        return json.loads(row.itinerary_data), exact
+
+    def indexed_requests(self, destination, prompt_version=None, model_id=None):
+        """``(key, normalized request)`` of the unexpired persistent entries for ``destination``.
+
+        With ``prompt_version``/``model_id``, only entries cached under them
+        (see make_cache_key) are returned, so a new prompt or model is never
+        served itineraries of the old one.
+        """
+        if not self.persistent:
+            return []
+        rows = self.model.query.with_entities(self.model.cache_key, self.model.request_data).filter(
+            self.model.destination == normalize_text(destination),
+            self.model.expires_at > datetime.utcnow(),
+            self.model.request_data.isnot(None),
+        )
+        entries = []
+        for key, request_data in rows:
+            request = json.loads(request_data)
+            if prompt_version is not None and request.get("prompt_version") != prompt_version:
+                continue
+            if model_id is not None and request.get("model_id") != model_id:
+                continue
+            entries.append((key, request))
+        return entries
+
+    def set(self, key, itinerary_data, destination, request=None):
+        """Store an itinerary in both tiers; ``request`` (normalized, with its prompt_version and
+        model_id) makes it findable by indexed_requests"""
+        payload = json.dumps(itinerary_data)
+        destination = normalize_text(destination)
+        self._remember(key, destination, payload, time.time() + self.ttl_seconds)
+        self._count("sets")
+
+        if self.persistent:
+            request_data = json.dumps(request) if request is not None else None
+            try:
+                self._store(key, destination, payload, request_data)
+            except IntegrityError:
+                # Another worker inserted this key since we looked; overwrite its row
+                self.db.session.rollback()
+                self._store(key, destination, payload, request_data)
+            self._evict_persistent()
+
+    def _find(self, key):
+        return self.model.query.filter_by(cache_key=key).first()
+
+    def _store(self, key, destination, payload, request_data):
+        now = datetime.utcnow()
+        row = self._find(key)
+        if row is None:
+            row = self.model(cache_key=key)
+            self.db.session.add(row)
+        row.destination = destination
+        row.itinerary_data = payload
+        row.request_data = request_data
+        row.created_at = now
+        row.last_accessed = now
+        row.expires_at = now + timedelta(seconds=self.ttl_seconds)
+        self.db.session.commit()
+
+    def _remember(self, key, destination, payload, expires_at):
+        # Without a shared table the memory tier is the cache, so it keeps the full TTL
+        if self.persistent:
+            expires_at = min(expires_at, time.time() + self.memory_ttl_seconds)
+        with self._lock:
+            self._entries[key] = (expires_at, destination, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def _evict_persistent(self):
+        """Drop expired rows, then the least recently used ones over the limit"""
+        stale_cutoff = datetime.utcnow() - timedelta(seconds=self.stale_seconds)
+        expired = self.model.query.filter(self.model.expires_at <= stale_cutoff).delete()
+        overflow = self.model.query.count() - self.max_persistent_entries
+        evicted = 0
+        if overflow > 0:
+            stale_ids = [
+                row.id for row in self.model.query.with_entities(self.model.id)
+                .order_by(self.model.last_accessed.asc()).limit(overflow)
+            ]
+            evicted = self.model.query.filter(self.model.id.in_(stale_ids)).delete(synchronize_session=False)
+        self.db.session.commit()
+        self._count("expirations", expired)
+        self._count("evictions", evicted)
+
+    def record_bypass(self):
+        self._count("bypasses")
+
+    def invalidate_destination(self, destination):
+        """Remove every cached itinerary for ``destination``; returns the count"""
+        destination = normalize_text(destination)
+        with self._lock:
+            keys = [key for key, entry in self._entries.items() if entry[1] == destination]
+            for key in keys:
+                del self._entries[key]
+        removed = len(keys)
+
+        if self.persistent:
+            persistent_removed = self.model.query.filter_by(destination=destination).delete()
+            self.db.session.commit()
+            removed = max(removed, persistent_removed)
+
+        self._count("invalidations", removed)
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.persistent:
+            self.model.query.delete()
+            self.db.session.commit()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["memory_entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
@@ -0,0 +1,114 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from response_parser import (BUDGET_CATEGORIES, ItineraryParseError, budget_category, parse_json_object,
+                             to_number, validate_itinerary)
+
+# Categories that are spent day by day and therefore come from the day chunks
+DAILY_CATEGORIES = ["Accommodation", "Food", "Transportation", "Activities"]
+
+
+class DayRangeError(ItineraryParseError):
+    """Raised when a chunk keeps planning other days than the ones it was asked for"""
+
+
+def plan_day_ranges(duration, chunk_days):
+    """Split ``duration`` days into inclusive ``(first_day, last_day)`` ranges"""
+    return [(start, min(start + chunk_days - 1, duration))
+            for start in range(1, duration + 1, chunk_days)]
+
+
+def check_day_range(days, first_day, last_day):
+    """``days`` ordered by day number; raises DayRangeError unless they are exactly ``first_day``..``last_day``"""
+    numbers = [to_number(day.get("day")) for day in days]
+    if sorted(numbers) != list(range(first_day, last_day + 1)):
+        raise DayRangeError(f"Asked for days {first_day}-{last_day}, got days {numbers}")
+    return sorted(days, key=lambda day: to_number(day.get("day")))
+
+
+def day_allowance(envelope, duration, first_day, last_day):
+    """Each daily category's share of the budget envelope for days ``first_day``..``last_day``"""
+    days = last_day - first_day + 1
+    return {category: round(envelope.get(category, 0) * days / duration) for category in DAILY_CATEGORIES}
+
+
+def reconcile_budget(itinerary_data, budget):
+    """Rebuild the budget breakdown from the merged days so it adds up.
+
+    Daily categories are summed from the activities, flights come from the
+    skeleton and Miscellaneous keeps the skeleton's envelope. When the sum
+    overshoots ``budget`` the activity costs are scaled down to fit.
+    """
+    envelope = itinerary_data.get("budget_breakdown", {})
+    flights = to_number(itinerary_data.get("flight_info", {}).get("estimated_flight_cost", envelope.get("Flights", 0)))
+    miscellaneous = to_number(envelope.get("Miscellaneous", 0))
+    activities = [activity for day in itinerary_data["daily_plans"] for activity in day["activities"]]
+
+    total_budget = to_number(budget)
+    daily_spend = sum(to_number(activity.get("estimated_cost", 0)) for activity in activities)
+    available = total_budget - flights - miscellaneous
+    if total_budget and daily_spend > available > 0:
+        scale = available / daily_spend
+        for activity in activities:
+            activity["estimated_cost"] = round(to_number(activity.get("estimated_cost", 0)) * scale)
+
+    breakdown = dict.fromkeys(BUDGET_CATEGORIES, 0)
+    breakdown["Flights"] = flights
+    breakdown["Miscellaneous"] = miscellaneous
+    for activity in activities:
+        breakdown[budget_category(activity)] += to_number(activity.get("estimated_cost", 0))
+    breakdown["Total"] = sum(breakdown.values())
+    itinerary_data["budget_breakdown"] = breakdown
+    return itinerary_data
+
+
+def generate_fanout(call_model, prompts, home_country, destination, duration, budget, interests, party_size,
+                    chunk_days=3, concurrency=4, route_knowledge=None, chunk_attempts=2):
+    """Generate a long itinerary as one skeleton call plus concurrent day chunks.
+
+    ``call_model(prompt)`` returns the model's text for a prompt built by
+    ``prompts`` (a prompt_builder.PromptBuilder). The skeleton is requested
+    first so each chunk gets its share of the budget envelope; the chunks then
+    run on up to ``concurrency`` threads, so wall-clock time tracks the
+    slowest chunk rather than the length of the whole itinerary. A chunk
+    whose days are not the ones it asked for is requested again, up to
+    ``chunk_attempts`` times in all, and then raises DayRangeError so the
+    caller can plan the trip in one call instead.
+    """
+    duration = int(duration)
+    skeleton, _ = parse_json_object(call_model(prompts.skeleton(
+        home_country, destination, duration, budget, interests, party_size, route_knowledge
+    )))
+    if route_knowledge is not None:
+        skeleton.update(route_knowledge)
+    envelope = {category: to_number(amount)
+                for category, amount in skeleton.get("budget_breakdown", {}).items()}
+
+    def plan_range(day_range):
+        first_day, last_day = day_range
+        prompt = prompts.days(
+            home_country, destination, duration, budget, interests, party_size,
+            first_day, last_day, day_allowance(envelope, duration, first_day, last_day)
+        )
+        for attempt in range(1, chunk_attempts + 1):
+            chunk, _ = parse_json_object(call_model(prompt))
+            days = [day for day in chunk.get("daily_plans", []) if isinstance(day, dict)]
+            try:
+                return check_day_range(days, first_day, last_day)
+            except DayRangeError as e:
+                if attempt == chunk_attempts:
+                    raise
+                print(f"Retrying fan-out chunk: {e}")
+
+    ranges = plan_day_ranges(duration, chunk_days)
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(ranges)))) as executor:
+        chunks = list(executor.map(plan_range, ranges))
+
+    itinerary_data = {
+        "flight_info": skeleton.get("flight_info", {}),
+        "daily_plans": [day for chunk in chunks for day in chunk],
+        "budget_breakdown": envelope,
+        "travel_tips": skeleton.get("travel_tips", []),
+        "visa_requirements": skeleton.get("visa_requirements", ""),
+        "local_customs": skeleton.get("local_customs", ""),
+    }
+    return reconcile_budget(validate_itinerary(itinerary_data), budget)
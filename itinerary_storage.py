@@ -0,0 +1,144 @@
+import json
+import os
+import re
+import zlib
+from collections import Counter
+from functools import lru_cache
+
+from sqlalchemy import JSON
+from sqlalchemy.dialects.postgresql import JSONB
+
+from response_parser import BUDGET_CATEGORIES
+
+# Row formats: plain JSON text, zlib with the preset dictionary of a version,
+# or a JSON document column (JSONB on PostgreSQL)
+JSON_FORMAT = "json"
+ZLIB_FORMAT = "zlib"
+JSONB_FORMAT = "jsonb"
+STORAGE_FORMATS = (JSON_FORMAT, ZLIB_FORMAT, JSONB_FORMAT)
+
+# Column type of Itinerary.itinerary_document
+DOCUMENT_TYPE = JSON().with_variant(JSONB(), "postgresql")
+
+# Bump when a new dictionary is trained; rows record the version they used
+DICTIONARY_VERSION = 1
+DICTIONARY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "zdicts")
+
+# Keys with their punctuation (e.g. ', "estimated_cost": ') and short quoted
+# values (times of day, categories) are what every itinerary repeats
+FRAGMENT_PATTERN = re.compile(r'[,{] ?"[a-z_]+": |"[^"\\,\s][^"\\]{0,23}"')
+
+
+def dictionary_path(version):
+    return os.path.join(DICTIONARY_DIR, f"itinerary-v{version}.bin")
+
+
+@lru_cache(maxsize=None)
+def load_dictionary(version):
+    with open(dictionary_path(version), "rb") as f:
+        return f.read()
+
+
+def train_dictionary(samples, max_size=16 * 1024):
+    """Build a zlib preset dictionary from itinerary JSON texts.
+
+    zlib has no trainer, so this keeps the JSON fragments that recur across
+    itineraries (keys with their punctuation and short values), weighted by
+    how many bytes they would save. The most valuable fragments go last,
+    where zlib can reference them with the shortest distances.
+    """
+    counts = Counter()
+    for sample in samples:
+        counts.update(FRAGMENT_PATTERN.findall(sample))
+    ranked = sorted((fragment for fragment, count in counts.items() if count > 1),
+                    key=lambda fragment: counts[fragment] * len(fragment), reverse=True)
+    chosen = []
+    size = 0
+    for fragment in ranked:
+        encoded = fragment.encode("utf-8")
+        if size + len(encoded) > max_size:
+            break
+        chosen.append(encoded)
+        size += len(encoded)
+    return b"".join(reversed(chosen))
+
+
+def storage_tag(storage_format):
+    """The value stored in ``Itinerary.storage_format`` for new rows"""
+    if storage_format == ZLIB_FORMAT:
+        return f"{ZLIB_FORMAT}:{DICTIONARY_VERSION}"
+    return storage_format
+
+
+def encode_itinerary(itinerary_json, storage_format):
+    """Return the Itinerary column values that store an itinerary's JSON text"""
+    if storage_format not in STORAGE_FORMATS:
+        raise ValueError(f"Unknown itinerary storage format: {storage_format}")
+    # itinerary_data is NOT NULL, so rows stored elsewhere keep an empty string there
+    columns = {
+        "storage_format": storage_tag(storage_format),
+        "itinerary_data": "",
+        "itinerary_blob": None,
+        "itinerary_document": None,
+    }
+    if storage_format == JSON_FORMAT:
+        columns["itinerary_data"] = itinerary_json
+    elif storage_format == ZLIB_FORMAT:
+        compressor = zlib.compressobj(level=9, zdict=load_dictionary(DICTIONARY_VERSION))
+        columns["itinerary_blob"] = compressor.compress(itinerary_json.encode("utf-8")) + compressor.flush()
+    else:
+        columns["itinerary_document"] = json.loads(itinerary_json)
+    return columns
+
+
+def decode_itinerary(tag, text, blob, document=None):
+    """Return the itinerary JSON text stored in an Itinerary row's columns"""
+    if not tag or tag == JSON_FORMAT:
+        return text
+    storage_format, _, version = tag.partition(":")
+    if storage_format == JSONB_FORMAT:
+        if isinstance(document, str):
+            document = json.loads(document)
+        return json.dumps(restore_key_order(document))
+    if storage_format != ZLIB_FORMAT:
+        raise ValueError(f"Unknown itinerary storage format: {tag}")
+    decompressor = zlib.decompressobj(zdict=load_dictionary(int(version)))
+    return (decompressor.decompress(blob) + decompressor.flush()).decode("utf-8")
+
+
+def restore_key_order(itinerary_data):
+    """Put the budget breakdown back in display order.
+
+    JSONB does not keep key order, and the breakdown is the one mapping
+    that is shown in key order (result page and PDF table).
+    """
+    breakdown = itinerary_data.get("budget_breakdown")
+    if isinstance(breakdown, dict):
+        # Known categories first, then any others, with the total last
+        rank = {category: position for position, category in enumerate(BUDGET_CATEGORIES)}
+        rank["Total"] = len(BUDGET_CATEGORIES) + 1
+        itinerary_data["budget_breakdown"] = dict(sorted(
+            breakdown.items(), key=lambda item: rank.get(item[0], len(BUDGET_CATEGORIES))
+        ))
+    return itinerary_data
+
+
+def activity_rows(itinerary_data):
+    """Flatten the daily plans into one dict per activity for the side table"""
+    rows = []
+    for day in itinerary_data.get("daily_plans", []):
+        for position, activity in enumerate(day.get("activities", [])):
+            try:
+                cost = float(activity.get("estimated_cost") or 0)
+            except (TypeError, ValueError):
+                cost = 0.0
+            rows.append({
+                "day": day.get("day"),
+                "position": position,
+                "time": str(activity.get("time", ""))[:50],
+                "description": activity.get("description", ""),
+                "location": str(activity.get("location", ""))[:200],
+                "category": str(activity.get("category", ""))[:50],
+                "estimated_cost": cost,
+            })
+    return rows
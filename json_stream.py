@@ -0,0 +1,106 @@
+import json
+
+from response_parser import strip_comments_and_commas
+
+
+class DailyPlanStreamParser:
+    """Incrementally scan a streamed itinerary and emit each finished day.
+
+    Text is fed in arbitrary chunks as it arrives from the model. The parser
+    keeps a small state machine (string/escape flags and a stack of open
+    brackets) so every character is looked at once, and as soon as an
+    object inside the top-level ``daily_plans`` array closes it is decoded
+    and returned from ``feed``. Anything before the first ``{`` (such as a
+    markdown code fence) is ignored.
+    """
+
+    def __init__(self, array_key="daily_plans"):
+        self.array_key = array_key
+        self.text = ""
+        self.position = 0
+        self.stack = []
+        self.in_string = False
+        self.escape = False
+        self.string_start = None
+        self.last_key = None
+        self.array_depth = None
+        self.item_start = None
+        self.items_emitted = 0
+        self.started = False
+
+    def feed(self, chunk):
+        """Consume ``chunk`` and return the list of day objects it completed"""
+        if not chunk:
+            return []
+        self.text += chunk
+        completed = []
+        text = self.text
+
+        for index in range(self.position, len(text)):
+            char = text[index]
+
+            if not self.started:
+                if char == "{":
+                    self.started = True
+                else:
+                    continue
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == "\\":
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+                    # Remember string tokens in the top-level object as keys
+                    if len(self.stack) == 1 and self.stack[0] == "{":
+                        self.last_key = text[self.string_start + 1:index]
+                continue
+
+            if char == '"':
+                self.in_string = True
+                self.string_start = index
+            elif char in "{[":
+                if (char == "{" and self.array_depth is not None
+                        and len(self.stack) == self.array_depth):
+                    self.item_start = index
+                if (char == "[" and self.array_depth is None and len(self.stack) == 1
+                        and self.last_key == self.array_key):
+                    self.array_depth = len(self.stack) + 1
+                self.stack.append(char)
+            elif char in "}]":
+                if self.stack:
+                    self.stack.pop()
+                if self.array_depth is not None:
+                    if char == "}" and self.item_start is not None and len(self.stack) == self.array_depth:
+                        item = self._decode(text[self.item_start:index + 1])
+                        self.item_start = None
+                        if item is not None:
+                            completed.append(item)
+                            self.items_emitted += 1
+                    elif char == "]" and len(self.stack) == self.array_depth - 1:
+                        # The daily_plans array is closed; stop tracking items
+                        self.array_depth = -1
+
+        self.position = len(text)
+        return completed
+
+    @staticmethod
+    def _decode(fragment):
+        try:
+            return json.loads(fragment)
+        except ValueError:
+            pass
+        # Days copied from the prompt's schema may carry comments or trailing commas
+        cleaned, issues = strip_comments_and_commas(fragment)
+        if not issues:
+            return None
+        try:
+            return json.loads(cleaned)
+        except ValueError:
+            return None
+
+    @property
+    def complete(self):
+        """True once the outermost JSON object has been closed"""
+        return self.started and not self.stack
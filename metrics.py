@@ -0,0 +1,223 @@
+import threading
+from datetime import datetime, timedelta
+
+# Seconds; model calls take several seconds, page requests milliseconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80, 160)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    pairs += [f'{name}="{_escape(value)}"' for name, value in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with labels, rendered in the Prometheus text format"""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_number(value)}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels, rendered in the Prometheus text format"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._lock = threading.Lock()
+        # labels -> [bucket counts..., sum, count]
+        self._values = {}
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for position, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[position] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            values = {key: list(series) for key, series in self._values.items()}
+        for key, series in sorted(values.items()):
+            for position, bound in enumerate(self.buckets):
+                labels = _format_labels(self.labelnames, key, [("le", _format_number(bound))])
+                yield f"{self.name}_bucket{labels} {series[position]}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_number(series[-2])}"
+            yield f"{self.name}_count{labels} {series[-1]}"
+
+
+class Registry:
+    """The metrics one process exposes on /metrics"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+def response_usage(response):
+    """Token and grounding figures from a Gemini response (or the last chunk of a stream)"""
+    usage = getattr(response, "usage_metadata", None)
+    usage_figures = {
+        "prompt_tokens": getattr(usage, "prompt_token_count", None) or 0,
+        "output_tokens": getattr(usage, "candidates_token_count", None) or 0,
+        "tool_prompt_tokens": getattr(usage, "tool_use_prompt_token_count", None) or 0,
+        "total_tokens": getattr(usage, "total_token_count", None) or 0,
+        "search_queries": 0,
+        "grounded": False,
+    }
+    for candidate in getattr(response, "candidates", None) or []:
+        grounding = getattr(candidate, "grounding_metadata", None)
+        if grounding is None:
+            continue
+        queries = getattr(grounding, "web_search_queries", None) or []
+        usage_figures["search_queries"] += len(queries)
+        usage_figures["grounded"] = usage_figures["grounded"] or bool(
+            queries or getattr(grounding, "grounding_chunks", None))
+    return usage_figures
+
+
+class ModelCallLog:
+    """Per-call accounting of model calls and itinerary cache hits.
+
+    Each record is counted in the Prometheus ``registry`` and inserted into
+    ``table`` (see ``ModelCall`` in app.py) through ``engine()``, which
+    works from any thread, including the fanout workers. Rows older than
+    ``retention_days`` are pruned every ``prune_every`` records. A failed
+    insert is logged and never fails the generation.
+    """
+
+    def __init__(self, registry, table=None, engine=None, retention_days=30, prune_every=1000):
+        self.table = table
+        self.engine = engine
+        self.retention_days = retention_days
+        self.prune_every = prune_every
+        self._lock = threading.Lock()
+        self._since_prune = 0
+        self.calls = registry.counter(
+            "travelplanner_model_calls_total", "Model calls and itinerary cache hits",
+            ("purpose", "outcome"))
+        self.tokens = registry.counter(
+            "travelplanner_model_tokens_total", "Tokens reported by the model",
+            ("purpose", "kind"))
+        self.search_queries = registry.counter(
+            "travelplanner_model_search_queries_total", "Google Search queries the model grounded on",
+            ("purpose",))
+        self.retries = registry.counter(
+            "travelplanner_model_retries_total", "Model call attempts beyond the first", ("purpose",))
+        self.repairs = registry.counter(
+            "travelplanner_model_repairs_total", "Replies whose JSON had to be repaired",
+            ("purpose", "prompt_version"))
+        self.model_seconds = registry.histogram(
+            "travelplanner_model_call_seconds", "Time waiting on the model", ("purpose",))
+        self.parse_seconds = registry.histogram(
+            "travelplanner_model_parse_seconds", "Time parsing the model's reply", ("purpose",),
+            buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25))
+
+    def record(self, purpose, model=None, response=None, model_seconds=None, parse_seconds=None,
+               retries=0, cache_hit=False, failed=False, request_id=None, prompt_version=None, repaired=False):
+        """Count one model call (or cache hit) and persist it; returns the record"""
+        record = {
+            "request_id": request_id,
+            "purpose": purpose,
+            "model": model,
+            "prompt_version": prompt_version,
+            "repaired": repaired,
+            "model_seconds": model_seconds,
+            "parse_seconds": parse_seconds,
+            "retries": retries,
+            "cache_hit": cache_hit,
+            "failed": failed,
+            "created_at": datetime.utcnow(),
+        }
+        record.update(response_usage(response))
+
+        outcome = "cache_hit" if cache_hit else "failed" if failed else "ok"
+        self.calls.inc(purpose=purpose, outcome=outcome)
+        for kind in ("prompt", "output", "tool_prompt"):
+            if record[f"{kind}_tokens"]:
+                self.tokens.inc(record[f"{kind}_tokens"], purpose=purpose, kind=kind)
+        if record["search_queries"]:
+            self.search_queries.inc(record["search_queries"], purpose=purpose)
+        if retries:
+            self.retries.inc(retries, purpose=purpose)
+        if repaired:
+            self.repairs.inc(purpose=purpose, prompt_version=prompt_version)
+        if model_seconds is not None:
+            self.model_seconds.observe(model_seconds, purpose=purpose)
+        if parse_seconds is not None:
+            self.parse_seconds.observe(parse_seconds, purpose=purpose)
+
+        self._persist(record)
+        return record
+
+    def _persist(self, record):
+        if self.table is None or self.engine is None:
+            return
+        try:
+            with self.engine().begin() as connection:
+                connection.execute(self.table.insert().values(**record))
+                with self._lock:
+                    self._since_prune += 1
+                    prune = self._since_prune >= self.prune_every
+                    if prune:
+                        self._since_prune = 0
+                if prune:
+                    cutoff = datetime.utcnow() - timedelta(days=self.retention_days)
+                    connection.execute(self.table.delete().where(self.table.c.created_at < cutoff))
+        except Exception as e:
+            print(f"Failed to record model call: {e}")
+
@@ -0,0 +1,215 @@
+import json
+import os
+import sqlite3
+from datetime import datetime
+
+from sqlalchemy import LargeBinary, bindparam, inspect, text
+
+import db_helper
+from db_config import LEGACY_ITINERARIES_DB
+from itinerary_cache import normalize_text
+from itinerary_storage import (DOCUMENT_TYPE, ZLIB_FORMAT, activity_rows, decode_itinerary, encode_itinerary,
+                               storage_tag)
+from response_parser import itinerary_summary
+
+# (version, description, function) in the order they were written
+MIGRATIONS = []
+
+
+def migration(version, description):
+    """Register ``function(connection)`` as schema version ``version``"""
+    def register(function):
+        MIGRATIONS.append((version, description, function))
+        return function
+    return register
+
+
+def add_column(connection, table, column, column_type):
+    """Add a column unless the table already has it (e.g. create_all just built it).
+
+    ``column_type`` is SQL text or a SQLAlchemy type, which is compiled for
+    the connection's database.
+    """
+    columns = {existing["name"] for existing in inspect(connection).get_columns(table)}
+    if column not in columns:
+        if not isinstance(column_type, str):
+            column_type = column_type.compile(dialect=connection.dialect)
+        connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}"))
+
+
+@migration(1, "Itinerary listing summary columns and (user_id, created_at) index")
+def itinerary_listing(connection):
+    add_column(connection, "itinerary", "total_cost", "FLOAT")
+    add_column(connection, "itinerary", "day_count", "INTEGER")
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_itinerary_user_created ON itinerary (user_id, created_at, id)"
+    ))
+
+    # Fill in the summaries of existing rows a batch at a time
+    last_id = 0
+    while True:
+        rows = connection.execute(text(
+            "SELECT id, itinerary_data FROM itinerary WHERE id > :last_id ORDER BY id LIMIT 500"
+        ), {"last_id": last_id}).fetchall()
+        if not rows:
+            break
+        for row in rows:
+            try:
+                total_cost, day_count = itinerary_summary(json.loads(row.itinerary_data))
+            except ValueError:
+                continue
+            connection.execute(text(
+                "UPDATE itinerary SET total_cost = :total_cost, day_count = :day_count WHERE id = :id"
+            ), {"total_cost": total_cost, "day_count": day_count, "id": row.id})
+        last_id = rows[-1].id
+
+
+def convert_itinerary_storage(connection, storage_format, batch_size=200):
+    """Re-encode every itinerary row not yet in ``storage_format``; returns the count.
+
+    Rows without entries in the itinerary_activity side table get them
+    while their JSON is decoded anyway.
+    """
+    tag = storage_tag(storage_format)
+    # Migration 2 runs this before migration 3 has added itinerary_document
+    columns = {column["name"] for column in inspect(connection).get_columns("itinerary")}
+    document_column = "itinerary_document" if "itinerary_document" in columns else "NULL"
+    select = text(
+        f"SELECT id, user_id, destination, storage_format, itinerary_data, itinerary_blob, "
+        f"{document_column} AS itinerary_document FROM itinerary "
+        "WHERE id > :last_id AND (storage_format IS NULL OR storage_format != :tag) "
+        "ORDER BY id LIMIT :limit"
+    )
+    if document_column != "NULL":
+        select = select.columns(itinerary_document=DOCUMENT_TYPE)
+        update = text(
+            "UPDATE itinerary SET storage_format = :storage_format, itinerary_data = :itinerary_data, "
+            "itinerary_blob = :itinerary_blob, itinerary_document = :itinerary_document WHERE id = :id"
+        ).bindparams(bindparam("itinerary_document", type_=DOCUMENT_TYPE))
+    else:
+        update = text(
+            "UPDATE itinerary SET storage_format = :storage_format, itinerary_data = :itinerary_data, "
+            "itinerary_blob = :itinerary_blob WHERE id = :id"
+        )
+    update = update.bindparams(bindparam("itinerary_blob", type_=LargeBinary()))
+
+    converted = 0
+    last_id = 0
+    while True:
+        rows = connection.execute(select, {"last_id": last_id, "tag": tag, "limit": batch_size}).fetchall()
+        if not rows:
+            return converted
+        for row in rows:
+            itinerary_json = decode_itinerary(row.storage_format, row.itinerary_data, row.itinerary_blob,
+                                              row.itinerary_document)
+            try:
+                itinerary_data = json.loads(itinerary_json)
+            except ValueError:
+                continue
+            has_activities = connection.execute(text(
+                "SELECT 1 FROM itinerary_activity WHERE itinerary_id = :id LIMIT 1"
+            ), {"id": row.id}).first()
+            activities = [] if has_activities else activity_rows(itinerary_data)
+            for activity in activities:
+                activity.update(itinerary_id=row.id, user_id=row.user_id,
+                                destination=normalize_text(row.destination))
+            if activities:
+                connection.execute(text(
+                    "INSERT INTO itinerary_activity (itinerary_id, user_id, destination, day, position, "
+                    "time, description, location, category, estimated_cost) VALUES (:itinerary_id, "
+                    ":user_id, :destination, :day, :position, :time, :description, :location, "
+                    ":category, :estimated_cost)"
+                ), activities)
+            values = encode_itinerary(itinerary_json, storage_format)
+            if document_column == "NULL":
+                values.pop("itinerary_document")
+            connection.execute(update, dict(values, id=row.id))
+            converted += 1
+        last_id = rows[-1].id
+
+
+@migration(2, "Compressed itinerary storage and the itinerary_activity side table")
+def compressed_itineraries(connection):
+    add_column(connection, "itinerary", "itinerary_blob", LargeBinary())
+    add_column(connection, "itinerary", "storage_format", "VARCHAR(16) DEFAULT 'json'")
+    # create_all has already created itinerary_activity; fill it and compress in place
+    convert_itinerary_storage(connection, ZLIB_FORMAT)
+
+
+@migration(3, "Itinerary JSON document column (JSONB on PostgreSQL)")
+def itinerary_documents(connection):
+    add_column(connection, "itinerary", "itinerary_document", DOCUMENT_TYPE)
+
+
+@migration(4, "Model call prompt version and repair columns")
+def model_call_prompt_versions(connection):
+    add_column(connection, "model_call", "prompt_version", "VARCHAR(16)")
+    add_column(connection, "model_call", "repaired", "BOOLEAN DEFAULT FALSE")
+
+
+@migration(5, "Cached itinerary request column for the similarity index")
+def cached_itinerary_requests(connection):
+    add_column(connection, "cached_itinerary", "request_data", "TEXT")
+
+
+@migration(6, "Itinerary display currency column")
+def itinerary_currency(connection):
+    add_column(connection, "itinerary", "currency", "VARCHAR(3) DEFAULT 'USD'")
+
+
+@migration(7, "Route knowledge flight costs per person")
+def route_knowledge_per_person(connection):
+    # Stored flight costs were the total of whichever party first learned the
+    # route; forget them so they are learned again per person
+    connection.execute(text("DELETE FROM route_knowledge"))
+
+
+@migration(8, "Import db_helper's itineraries from the legacy itineraries.db file")
+def legacy_helper_itineraries(connection):
+    if not os.path.exists(LEGACY_ITINERARIES_DB):
+        return
+    legacy = sqlite3.connect(LEGACY_ITINERARIES_DB)
+    try:
+        if not legacy.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'itineraries'").fetchone():
+            return
+        rows = legacy.execute(
+            "SELECT destination, duration, budget, interests, itinerary_data, created_at FROM itineraries ORDER BY id"
+        ).fetchall()
+    finally:
+        legacy.close()
+
+    db_helper.itineraries.create(connection, checkfirst=True)
+    # Rows saved since the move may hold the old ids already, so these get new ones
+    for start in range(0, len(rows), 500):
+        connection.execute(db_helper.itineraries.insert(), [{
+            "destination": destination, "duration": duration, "budget": budget, "interests": interests,
+            "itinerary_data": itinerary_data,
+            "created_at": datetime.fromisoformat(created_at) if created_at else None,
+        } for destination, duration, budget, interests, itinerary_data, created_at in rows[start:start + 500]])
+    print(f"Imported {len(rows)} itineraries from {LEGACY_ITINERARIES_DB}")
+
+
+def run_migrations(db):
+    """Apply the migrations this database has not seen yet.
+
+    ``db.create_all()`` only creates missing tables, so columns and indexes
+    added to existing tables are applied here, each in its own transaction.
+    Applied versions are recorded in the ``schema_migrations`` table.
+    """
+    with db.engine.begin() as connection:
+        connection.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations "
+            "(version INTEGER PRIMARY KEY, description VARCHAR(200), applied_at TIMESTAMP)"
+        ))
+        applied = {row.version for row in connection.execute(text("SELECT version FROM schema_migrations"))}
+
+    for version, description, function in sorted(MIGRATIONS, key=lambda entry: entry[0]):
+        if version in applied:
+            continue
+        with db.engine.begin() as connection:
+            function(connection)
+            connection.execute(text(
+                "INSERT INTO schema_migrations (version, description, applied_at) "
+                "VALUES (:version, :description, :applied_at)"
+            ), {"version": version, "description": description, "applied_at": datetime.utcnow()})
+        print(f"Applied migration {version}: {description}")
@@ -0,0 +1,196 @@
+import os
+import threading
+import time
+
+import httpx
+
+# google.genai takes most of a second to import, so it is imported when the
+# first client is created rather than with this module
+
+
+class PoolTimeoutError(TimeoutError):
+    """Raised when no pool slot frees up within the caller's timeout"""
+
+
+class ModelClientPool:
+    """Shared Gemini client backed by one keep-alive HTTP connection pool.
+
+    Every code path that talks to the model goes through ``generate_content``
+    so TLS sessions and connections are reused between requests. At most
+    ``pool_size`` calls are in flight at once; further callers wait for a
+    free slot, for no longer than the call's timeout. Time spent opening
+    connections (TCP + TLS) is tracked separately from time spent waiting
+    on the model.
+    """
+
+    def __init__(self, api_key, pool_size=8, timeout=120, keepalive_expiry=300, base_url=None):
+        self.api_key = api_key
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.keepalive_expiry = keepalive_expiry
+        self.base_url = base_url
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._client = None
+        self._http_client = None
+        self._stats = {
+            "calls": 0,
+            "failures": 0,
+            "in_flight": 0,
+            "max_in_flight": 0,
+            "connections_opened": 0,
+            "slot_timeouts": 0,
+            "wait_seconds": 0.0,
+            "connect_seconds": 0.0,
+            "generation_seconds": 0.0,
+        }
+
+    @property
+    def client(self):
+        """The underlying ``genai.Client``, created on first use"""
+        if self._client is None:
+            from google import genai
+            from google.genai.types import HttpOptions
+            with self._lock:
+                if self._client is None:
+                    self._http_client = httpx.Client(
+                        limits=httpx.Limits(
+                            max_connections=self.pool_size,
+                            max_keepalive_connections=self.pool_size,
+                            keepalive_expiry=self.keepalive_expiry,
+                        ),
+                        timeout=self.timeout,
+                        event_hooks={"request": [self._attach_trace]},
+                    )
+                    self._client = genai.Client(
+                        api_key=self.api_key,
+                        http_options=HttpOptions(
+                            base_url=self.base_url,
+                            timeout=int(self.timeout * 1000),
+                            httpx_client=self._http_client,
+                        ),
+                    )
+        return self._client
+
+    def _attach_trace(self, request):
+        request.extensions["trace"] = self._trace
+
+    def _trace(self, event_name, info):
+        # httpcore reports connection setup as *.started / *.complete pairs;
+        # only calls that actually open a connection see these events.
+        if event_name in ("connection.connect_tcp.started", "connection.start_tls.started"):
+            self._local.connect_started = time.perf_counter()
+        elif event_name in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+            started = getattr(self._local, "connect_started", None)
+            if started is not None:
+                self._local.connect_seconds = getattr(self._local, "connect_seconds", 0.0) + time.perf_counter() - started
+                self._local.connect_started = None
+            if event_name == "connection.connect_tcp.complete":
+                with self._lock:
+                    self._stats["connections_opened"] += 1
+
+    @staticmethod
+    def _with_timeout(config, timeout):
+        if timeout is None:
+            return config
+        from google.genai.types import HttpOptions
+        return config.model_copy(update={"http_options": HttpOptions(timeout=int(timeout * 1000))})
+
+    def _acquire(self, timeout=None):
+        wait_started = time.perf_counter()
+        if not self._slots.acquire(timeout=timeout):
+            with self._lock:
+                self._stats["slot_timeouts"] += 1
+            raise PoolTimeoutError(f"No free model connection within {timeout:.1f}s")
+        waited = time.perf_counter() - wait_started
+        with self._lock:
+            self._stats["in_flight"] += 1
+            self._stats["max_in_flight"] = max(self._stats["max_in_flight"], self._stats["in_flight"])
+            self._stats["wait_seconds"] += waited
+        self._local.connect_seconds = 0.0
+        return time.perf_counter()
+
+    def _release(self, started, failed):
+        elapsed = time.perf_counter() - started
+        connect = self._local.connect_seconds
+        with self._lock:
+            self._stats["calls"] += 1
+            self._stats["in_flight"] -= 1
+            self._stats["connect_seconds"] += connect
+            self._stats["generation_seconds"] += max(elapsed - connect, 0.0)
+            if failed:
+                self._stats["failures"] += 1
+        self._slots.release()
+
+    def generate_content(self, model, contents, config, timeout=None):
+        """Run ``client.models.generate_content`` through the pool"""
+        config = self._with_timeout(config, timeout)
+        started = self._acquire(timeout)
+        failed = True
+        try:
+            response = self.client.models.generate_content(model=model, contents=contents, config=config)
+            failed = False
+            return response
+        finally:
+            self._release(started, failed)
+
+    def generate_content_stream(self, model, contents, config, timeout=None):
+        """Yield chunks from ``client.models.generate_content_stream``.
+
+        The pool slot is held until the stream is exhausted or closed.
+        """
+        config = self._with_timeout(config, timeout)
+        started = self._acquire(timeout)
+        failed = True
+        try:
+            for chunk in self.client.models.generate_content_stream(model=model, contents=contents, config=config):
+                yield chunk
+            failed = False
+        except GeneratorExit:
+            failed = False
+            raise
+        finally:
+            self._release(started, failed)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["pool_size"] = self.pool_size
+        stats["client_ready"] = self._client is not None
+        calls = stats["calls"] or 1
+        stats["avg_connect_seconds"] = round(stats["connect_seconds"] / calls, 4)
+        stats["avg_generation_seconds"] = round(stats["generation_seconds"] / calls, 4)
+        for key in ("wait_seconds", "connect_seconds", "generation_seconds"):
+            stats[key] = round(stats[key], 4)
+        return stats
+
+    def close(self):
+        with self._lock:
+            if self._http_client is not None:
+                self._http_client.close()
+            self._client = None
+            self._http_client = None
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_model_pool():
+    """Return the process-wide ``ModelClientPool``, configured from the environment"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                api_key = os.environ.get("GOOGLE_API_KEY")
+                if not api_key:
+                    raise EnvironmentError("Please set the GOOGLE_API_KEY environment variable.")
+                _pool = ModelClientPool(
+                    api_key=api_key,
+                    pool_size=int(os.environ.get("GEMINI_POOL_SIZE", 8)),
+                    timeout=float(os.environ.get("GEMINI_TIMEOUT", 120)),
+                    keepalive_expiry=float(os.environ.get("GEMINI_KEEPALIVE", 300)),
+                    base_url=os.environ.get("GEMINI_BASE_URL"),
+                )
+    return _pool
@@ -0,0 +1,232 @@
+import random
+import threading
+import time
+
+import httpx
+
+from model_client import PoolTimeoutError
+from response_parser import ItineraryParseError
+
+# Rate limits, timeouts and server errors are worth another attempt
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class ModelUnavailableError(Exception):
+    """The model cannot be used right now: circuit open, quota, or retries exhausted"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(ModelUnavailableError):
+    """Raised without calling the model while the circuit breaker is open"""
+
+
+def is_retryable(error):
+    """Whether another attempt may succeed (rate limit, 5xx, timeout, network, malformed reply)"""
+    # Imported here so the app can start without loading google.genai
+    from google.genai import errors as genai_errors
+    if isinstance(error, genai_errors.APIError):
+        return error.code in RETRYABLE_STATUS or (error.code or 0) >= 500
+    return isinstance(error, (httpx.TimeoutException, httpx.TransportError, TimeoutError, ConnectionError,
+                              ItineraryParseError))
+
+
+def is_upstream_failure(error):
+    """Whether the error says the model service itself is unhealthy.
+
+    Malformed replies are retried but come from a working service, and
+    other 4xx errors are our own mistakes, so neither opens the circuit.
+    """
+    return is_retryable(error) and not isinstance(error, ItineraryParseError)
+
+
+class CircuitBreaker:
+    """Stops calling the model after ``failure_threshold`` upstream failures in a row.
+
+    While open, calls fail fast for ``reset_seconds``; then one trial call
+    is let through (half-open) and its outcome closes or reopens the circuit.
+    """
+
+    def __init__(self, failure_threshold=5, reset_seconds=30, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._counters = {"opened": 0, "rejected": 0, "trials": 0}
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state
+
+    def retry_after(self):
+        """Seconds until the next trial call is allowed (0 when closed)"""
+        with self._lock:
+            if self._state == "closed":
+                return 0
+            return max(0, int(self._opened_at + self.reset_seconds - self.clock()) + 1)
+
+    def allow(self):
+        """Whether a call may go ahead now"""
+        with self._lock:
+            if self._state == "closed":
+                return True
+            if self._state == "open" and self.clock() >= self._opened_at + self.reset_seconds:
+                self._state = "half_open"
+                self._trial_in_flight = False
+            if self._state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                self._counters["trials"] += 1
+                return True
+            self._counters["rejected"] += 1
+            return False
+
+    def record(self, healthy):
+        """Report a call's outcome; ``healthy`` is False for upstream failures only"""
+        with self._lock:
+            if healthy:
+                self._state = "closed"
+                self._failures = 0
+                self._trial_in_flight = False
+                return
+            self._failures += 1
+            if self._state == "half_open" or self._failures >= self.failure_threshold:
+                if self._state != "open":
+                    self._counters["opened"] += 1
+                self._state = "open"
+                self._opened_at = self.clock()
+                self._trial_in_flight = False
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["state"] = self._state
+            stats["consecutive_failures"] = self._failures
+        stats["failure_threshold"] = self.failure_threshold
+        stats["reset_seconds"] = self.reset_seconds
+        return stats
+
+
+class RateLimiter:
+    """Token bucket allowing ``per_minute`` call starts per minute (0 disables it)"""
+
+    def __init__(self, per_minute, clock=time.monotonic, sleep=time.sleep):
+        self.per_minute = per_minute
+        self.clock = clock
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = float(per_minute)
+        self._updated = clock()
+
+    def acquire(self, deadline):
+        """Take a token, waiting until ``deadline`` (a clock value) at most; returns success"""
+        if not self.per_minute:
+            return True
+        while True:
+            with self._lock:
+                now = self.clock()
+                self._tokens = min(self.per_minute, self._tokens + (now - self._updated) * self.per_minute / 60)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) * 60 / self.per_minute
+            if now + wait > deadline:
+                return False
+            self.sleep(wait)
+
+
+class ResilientCaller:
+    """Runs model calls with per-attempt timeouts, retries, a circuit breaker and a rate limit.
+
+    ``call(attempt)`` invokes ``attempt(timeout, retries)`` until it
+    succeeds. ``timeout`` is the seconds this attempt may take (at most
+    ``attempt_timeout``, less when the overall ``deadline`` is closer), and
+    ``retries`` counts the attempts before it. Retryable errors are retried
+    up to ``max_attempts`` times with full-jitter exponential backoff
+    (a random wait up to ``base_delay * 2**n``, capped at ``max_delay``).
+    ModelUnavailableError is raised when the circuit is open, the rate
+    limit or pool cannot admit the call in time, or upstream failures
+    outlast the retries. Malformed replies that outlast the retries raise
+    their own parse error.
+    """
+
+    def __init__(self, breaker, limiter=None, max_attempts=3, attempt_timeout=60, deadline=150,
+                 base_delay=1.0, max_delay=10.0, clock=time.monotonic, sleep=time.sleep):
+        self.breaker = breaker
+        self.limiter = limiter
+        self.max_attempts = max_attempts
+        self.attempt_timeout = attempt_timeout
+        self.deadline = deadline
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.clock = clock
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        self._counters = {"calls": 0, "retries": 0, "gave_up": 0, "deadline_exceeded": 0, "throttled": 0}
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def backoff(self, retries):
+        """Seconds to wait before retry number ``retries`` (1 for the first retry)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (retries - 1)))
+
+    def call(self, attempt):
+        self._count("calls")
+        deadline = self.clock() + self.deadline
+        retries = 0
+        while True:
+            if not self.breaker.allow():
+                raise CircuitOpenError("The itinerary planner is unavailable right now. Please try again shortly.",
+                                       retry_after=self.breaker.retry_after())
+            if self.limiter is not None and not self.limiter.acquire(deadline):
+                self._count("throttled")
+                raise ModelUnavailableError("Too many itineraries are being planned right now. Please try again shortly.",
+                                            retry_after=60)
+            remaining = deadline - self.clock()
+            try:
+                result = attempt(min(self.attempt_timeout, remaining), retries)
+            except PoolTimeoutError as e:
+                # Our own connection pool is saturated; the model may be fine
+                self.breaker.record(healthy=True)
+                raise ModelUnavailableError("The itinerary planner is busy right now. Please try again shortly.",
+                                            retry_after=10) from e
+            except Exception as e:
+                self.breaker.record(healthy=not is_upstream_failure(e))
+                if not is_retryable(e):
+                    raise
+                retries += 1
+                delay = self.backoff(retries)
+                out_of_time = self.clock() + delay >= deadline
+                if retries >= self.max_attempts or out_of_time:
+                    self._count("deadline_exceeded" if out_of_time else "gave_up")
+                    if not is_upstream_failure(e):
+                        raise
+                    raise ModelUnavailableError(
+                        "The itinerary planner is not responding right now. Please try again shortly.",
+                        retry_after=self.breaker.retry_after() or 30
+                    ) from e
+                print(f"Model call failed ({type(e).__name__}: {e}); retry {retries} in {delay:.1f}s")
+                self._count("retries")
+                self.sleep(delay)
+                continue
+            self.breaker.record(healthy=True)
+            return result
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats["breaker"] = self.breaker.stats()
+        stats["max_attempts"] = self.max_attempts
+        stats["attempt_timeout"] = self.attempt_timeout
+        stats["deadline"] = self.deadline
+        stats["max_calls_per_minute"] = self.limiter.per_minute if self.limiter is not None else 0
+        return stats
@@ -0,0 +1,144 @@
+from datetime import datetime
+
+from flask_sqlalchemy import SQLAlchemy
+
+from itinerary_storage import DOCUMENT_TYPE, decode_itinerary, encode_itinerary
+
+# Bound to the app in create_app (app.py)
+db = SQLAlchemy()
+
+class User(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    email = db.Column(db.String(100), unique=True, nullable=False)
+    password = db.Column(db.String(200), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    itineraries = db.relationship('Itinerary', backref='user', lazy=True, cascade="all, delete-orphan")
+
+class Itinerary(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    home_country = db.Column(db.String(100), nullable=False)
+    destination = db.Column(db.String(100), nullable=False)
+    duration = db.Column(db.String(20), nullable=False)
+    budget = db.Column(db.String(50), nullable=False)
+    interests = db.Column(db.Text)
+    # JSON text, or '' when the itinerary is compressed into itinerary_blob
+    # (see itinerary_storage); read it through itinerary_json
+    itinerary_data = db.Column(db.Text, nullable=False)
+    itinerary_blob = db.Column(db.LargeBinary)
+    itinerary_document = db.Column(DOCUMENT_TYPE)
+    storage_format = db.Column(db.String(16), default='json')
+    party_size = db.Column(db.Integer, nullable=False)
+    # Costs, the budget and total_cost are in BASE_CURRENCY (USD); currency is
+    # the one picked on the form, which they are shown in
+    currency = db.Column(db.String(3), default='USD')
+    # Precomputed at save time so the history listing never parses itinerary_data
+    total_cost = db.Column(db.Float)
+    day_count = db.Column(db.Integer)
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    activities = db.relationship('ItineraryActivity', backref='itinerary', lazy=True, cascade="all, delete-orphan")
+
+    __table_args__ = (db.Index('ix_itinerary_user_created', 'user_id', 'created_at', 'id'),)
+
+    @property
+    def itinerary_json(self):
+        return decode_itinerary(self.storage_format, self.itinerary_data, self.itinerary_blob,
+                                self.itinerary_document)
+
+    def store_itinerary_json(self, itinerary_json, storage_format):
+        for column, value in encode_itinerary(itinerary_json, storage_format).items():
+            setattr(self, column, value)
+
+class ItineraryActivity(db.Model):
+    """One activity of a saved itinerary, so activities can be queried without decoding itineraries"""
+    id = db.Column(db.Integer, primary_key=True)
+    itinerary_id = db.Column(db.Integer, db.ForeignKey('itinerary.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    destination = db.Column(db.String(100), nullable=False)
+    day = db.Column(db.Integer)
+    position = db.Column(db.Integer)
+    time = db.Column(db.String(50))
+    description = db.Column(db.Text)
+    location = db.Column(db.String(200))
+    category = db.Column(db.String(50))
+    estimated_cost = db.Column(db.Float)
+
+    __table_args__ = (db.Index('ix_activity_user_destination_cost', 'user_id', 'destination', 'estimated_cost'),)
+
+class CachedItinerary(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    cache_key = db.Column(db.String(64), unique=True, nullable=False, index=True)
+    destination = db.Column(db.String(100), nullable=False, index=True)
+    itinerary_data = db.Column(db.Text, nullable=False)
+    # The normalized request (JSON), for finding similar trips
+    request_data = db.Column(db.Text)
+    hit_count = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_accessed = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class RouteKnowledge(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    home_country = db.Column(db.String(100), nullable=False)
+    destination = db.Column(db.String(100), nullable=False)
+    flight_info = db.Column(db.Text, nullable=False)
+    visa_requirements = db.Column(db.Text)
+    local_customs = db.Column(db.Text)
+    output_tokens = db.Column(db.Integer, default=0)
+    fetched_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    __table_args__ = (db.UniqueConstraint('home_country', 'destination'),)
+
+class ModelCall(db.Model):
+    """One model call (or itinerary cache hit) with its tokens and timings; see metrics.ModelCallLog"""
+    id = db.Column(db.Integer, primary_key=True)
+    # Shared by the calls made for one itinerary request (e.g. fanout chunks)
+    request_id = db.Column(db.String(36), index=True)
+    purpose = db.Column(db.String(32), nullable=False)
+    model = db.Column(db.String(64))
+    # prompt_builder version and mode of the prompt, e.g. '2-json'
+    prompt_version = db.Column(db.String(16))
+    prompt_tokens = db.Column(db.Integer, default=0)
+    output_tokens = db.Column(db.Integer, default=0)
+    tool_prompt_tokens = db.Column(db.Integer, default=0)
+    total_tokens = db.Column(db.Integer, default=0)
+    search_queries = db.Column(db.Integer, default=0)
+    grounded = db.Column(db.Boolean, default=False)
+    model_seconds = db.Column(db.Float)
+    parse_seconds = db.Column(db.Float)
+    retries = db.Column(db.Integer, default=0)
+    cache_hit = db.Column(db.Boolean, default=False)
+    failed = db.Column(db.Boolean, default=False)
+    # The reply's JSON needed repair (comments, trailing commas, truncation)
+    repaired = db.Column(db.Boolean, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+class GenerationLock(db.Model):
+    """Held by the process generating an itinerary so other processes wait for its result"""
+    key = db.Column(db.String(80), primary_key=True)
+    owner = db.Column(db.String(32), nullable=False)
+    acquired_at = db.Column(db.DateTime, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+class GenerationJobRecord(db.Model):
+    """A background generation (see generation_jobs.JobManager), so any worker can report on it"""
+    id = db.Column(db.String(36), primary_key=True)
+    key = db.Column(db.String(200), nullable=False)
+    status = db.Column(db.String(16), nullable=False)
+    params = db.Column(db.Text, nullable=False)
+    result = db.Column(db.Text)
+    error = db.Column(db.Text)
+    # JSON list of [user_id, saved itinerary id] pairs
+    requesters = db.Column(db.Text, nullable=False, default='[]')
+    # Epoch seconds, as reported by /jobs/<id>
+    created_at = db.Column(db.Float, nullable=False, index=True)
+    started_at = db.Column(db.Float)
+    finished_at = db.Column(db.Float)
+
+class TempItinerary(db.Model):
+    """An anonymous user's itinerary, keyed by the id kept in their session"""
+    id = db.Column(db.String(36), primary_key=True)
+    payload = db.Column(db.Text, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
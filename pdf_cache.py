@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+# Bump whenever create_pdf's output changes so stale renders are not served
+RENDERER_VERSION = "3"
+
+
+def itinerary_content_hash(itinerary_data, *details):
+    """Hash everything that ends up in the PDF"""
+    if not isinstance(itinerary_data, str):
+        itinerary_data = json.dumps(itinerary_data, sort_keys=True)
+    digest = hashlib.sha256(itinerary_data.encode("utf-8"))
+    for detail in details:
+        digest.update(b"\0" + str(detail).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class PdfCache:
+    """Bounded on-disk cache of rendered itinerary PDFs.
+
+    Files are named after (itinerary id, content hash, renderer version),
+    so a changed itinerary or renderer never matches an old file. Renders
+    are written to a temporary file in the cache directory and renamed into
+    place, and the least recently used files are deleted once the cache
+    exceeds ``max_bytes`` or ``max_files``.
+    """
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024, max_files=2000):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0}
+        os.makedirs(directory, exist_ok=True)
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def path_for(self, itinerary_id, content_hash, renderer_version=RENDERER_VERSION):
+        safe_id = "".join(ch for ch in str(itinerary_id) if ch.isalnum() or ch == "-")
+        return os.path.join(self.directory, f"{safe_id}-{content_hash[:32]}-v{renderer_version}.pdf")
+
+    def get(self, itinerary_id, content_hash, renderer_version=RENDERER_VERSION):
+        """Path of the cached render, or None"""
+        path = self.path_for(itinerary_id, content_hash, renderer_version)
+        try:
+            # Touch the file so eviction sees it as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            self._count("misses")
+            return None
+        self._count("hits")
+        return path
+
+    def temp_path(self):
+        """A new empty file in the cache directory to render into before ``commit``"""
+        fd, temp_path = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        os.close(fd)
+        return temp_path
+
+    def commit(self, itinerary_id, content_hash, temp_path, renderer_version=RENDERER_VERSION):
+        """Move a finished render from ``temp_path`` into place and return its path"""
+        path = self.path_for(itinerary_id, content_hash, renderer_version)
+        os.replace(temp_path, path)
+        self.evict()
+        return path
+
+    def put(self, itinerary_id, content_hash, render, renderer_version=RENDERER_VERSION):
+        """Render with ``render(path)`` into the cache and return the final path"""
+        temp_path = self.temp_path()
+        try:
+            render(temp_path)
+        except Exception:
+            os.unlink(temp_path)
+            raise
+        return self.commit(itinerary_id, content_hash, temp_path, renderer_version)
+
+    def put_file(self, itinerary_id, content_hash, fileobj, renderer_version=RENDERER_VERSION):
+        """Copy an already rendered PDF from ``fileobj`` into the cache"""
+
+        def render(path):
+            with open(path, "wb") as f:
+                shutil.copyfileobj(fileobj, f)
+
+        return self.put(itinerary_id, content_hash, render, renderer_version)
+
+    def get_or_render(self, itinerary_id, content_hash, render, renderer_version=RENDERER_VERSION):
+        path = self.get(itinerary_id, content_hash, renderer_version)
+        if path is None:
+            path = self.put(itinerary_id, content_hash, render, renderer_version)
+        return path
+
+    def _entries(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".pdf"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def evict(self):
+        """Delete least recently used renders until the cache is within bounds"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        count = len(entries)
+        evicted = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes and count <= self.max_files:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            count -= 1
+            evicted += 1
+        self._count("evictions", evicted)
+
+    def stats(self):
+        entries = self._entries()
+        with self._lock:
+            stats = dict(self._counters)
+        stats["files"] = len(entries)
+        stats["bytes"] = sum(size for _, size, _ in entries)
+        stats["max_bytes"] = self.max_bytes
+        return stats
@@ -0,0 +1,141 @@
+import io
+import json
+import multiprocessing
+import os
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+# Worker processes keep their own renderer so styles are built once per process
+_renderer = None
+
+
+def _get_renderer():
+    global _renderer
+    if _renderer is None:
+        from pdf_generator import PdfRenderer
+        _renderer = PdfRenderer()
+    return _renderer
+
+
+def render_to_path(itinerary_json, details, template, path):
+    """Process pool task: render one itinerary into ``path``"""
+    _get_renderer().render(json.loads(itinerary_json), details, template=template, output=path)
+    return path
+
+
+def render_combined_to_path(entries, template, path):
+    """Process pool task: render ``(itinerary_json, details)`` pairs into one PDF at ``path``"""
+    _get_renderer().render_combined(
+        [(json.loads(itinerary_json), details) for itinerary_json, details in entries],
+        template=template, output=path
+    )
+    return path
+
+
+def create_export_pool(max_workers):
+    # Spawned workers only import this module and pdf_generator, not the app
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+class _ChunkSink(io.RawIOBase):
+    """Unseekable file that collects what ZipFile writes so it can be streamed"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        chunks, self.chunks = self.chunks, []
+        return b"".join(chunks)
+
+
+class ZipExport:
+    """Streams a ZIP of itinerary PDFs, rendering missing ones in a process pool.
+
+    ``items`` yields ``(arcname, cached_path, render_task)`` where
+    ``cached_path`` is an existing PDF or None and ``render_task`` is
+    ``(itinerary_id, content_hash, itinerary_json, details, template)``
+    for a render that is still needed. At most ``max_pending`` renders
+    are in flight and each finished PDF is copied into the archive from
+    disk in small blocks, so memory does not grow with the history size.
+    Renders go through ``pdf_cache`` and stay cached for later downloads.
+    """
+
+    def __init__(self, pool, pdf_cache, max_pending=8):
+        self.pool = pool
+        self.pdf_cache = pdf_cache
+        self.max_pending = max_pending
+        self.rendered = 0
+        self.reused = 0
+
+    def stream(self, items):
+        sink = _ChunkSink()
+        pending = {}
+        failed = []
+        try:
+            with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+
+                def finish(futures):
+                    for future in futures:
+                        arcname, itinerary_id, content_hash, temp_path = pending.pop(future)
+                        try:
+                            future.result()
+                        except Exception as e:
+                            print(f"Error rendering {arcname} for export: {e}")
+                            _unlink(temp_path)
+                            failed.append(arcname)
+                            continue
+                        path = self.pdf_cache.commit(itinerary_id, content_hash, temp_path)
+                        archive.write(path, arcname)
+                        self.rendered += 1
+
+                for arcname, cached_path, render_task in items:
+                    if cached_path is not None:
+                        archive.write(cached_path, arcname)
+                        self.reused += 1
+                    else:
+                        while len(pending) >= self.max_pending:
+                            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                            finish(done)
+                            yield from _drained(sink)
+                        itinerary_id, content_hash, itinerary_json, details, template = render_task
+                        temp_path = self.pdf_cache.temp_path()
+                        future = self.pool.submit(render_to_path, itinerary_json, details, template, temp_path)
+                        pending[future] = (arcname, itinerary_id, content_hash, temp_path)
+                    # Hand finished renders over as soon as they are ready
+                    finish([future for future in list(pending) if future.done()])
+                    yield from _drained(sink)
+
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    finish(done)
+                    yield from _drained(sink)
+
+                if failed:
+                    archive.writestr("export_errors.txt",
+                                     "These itineraries could not be rendered:\n" + "\n".join(failed) + "\n")
+            yield from _drained(sink)
+        finally:
+            # The client went away mid-export: drop renders nobody will collect
+            for future, (_, _, _, temp_path) in pending.items():
+                future.cancel()
+                future.add_done_callback(lambda _, temp_path=temp_path: _unlink(temp_path))
+
+
+def _drained(sink):
+    data = sink.drain()
+    if data:
+        yield data
+
+
+def _unlink(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
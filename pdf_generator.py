@@ -1,100 +1,51 @@
 from reportlab.lib.pagesizes import letter
 from reportlab.lib import colors
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Flowable, PageBreak
+from reportlab.platypus.tableofcontents import TableOfContents
 from reportlab.lib.units import inch
-import os
 import tempfile
 
-def create_pdf(itinerary_data, destination, duration, budget, interests, party_size):
-    """Create a PDF file from the itinerary data"""
-    
-    # Create a temporary file
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
-    pdf_path = temp_file.name
-    temp_file.close()
-    
-    # Create the PDF document
-    doc = SimpleDocTemplate(pdf_path, pagesize=letter)
-    styles = getSampleStyleSheet()
-    
-    # Create custom styles with text wrapping
-    title_style = styles['Heading1']
-    heading2_style = styles['Heading2']
-    normal_style = styles['Normal']
-    
-    # Add text wrapping to normal style
-    wrapped_style = ParagraphStyle(
-        'WrappedStyle',
-        parent=normal_style,
-        spaceBefore=6,
-        spaceAfter=6
-    )
-    
-    # Create the content
-    content = []
-    
-    # Title
-    content.append(Paragraph(f"Travel Itinerary: {destination}", title_style))
-    content.append(Spacer(1, 0.25*inch))
-    
-    # Trip details
-    content.append(Paragraph(f"Duration: {duration} days", wrapped_style))
-    content.append(Paragraph(f"Budget: {budget}", wrapped_style))
-    content.append(Paragraph(f"Interests: {interests}", wrapped_style))
-    content.append(Paragraph(f"Party Size: {party_size}", wrapped_style))
-    content.append(Spacer(1, 0.25*inch))
-    
-    # Daily plans
-    content.append(Paragraph("Daily Itinerary", heading2_style))
-    content.append(Spacer(1, 0.1*inch))
-    
-    for day in itinerary_data['daily_plans']:
-        content.append(Paragraph(f"Day {day['day']}", styles['Heading3']))
-        
-        # Create a table for activities
-        data = [["Time", "Activity", "Category", "Cost"]]
-        
-        for activity in day['activities']:
-            # Ensure text wrapping for description
-            description = Paragraph(activity['description'], wrapped_style)
-            data.append([
-                activity['time'],
-                description,
-                activity['category'],
-                f"${activity['estimated_cost']}"
-            ])
-        
-        # Create the table with appropriate column widths
-        table = Table(data, colWidths=[0.8*inch, 3.5*inch, 1.2*inch, 0.8*inch])
-        
-        # Style the table
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            # Allow text wrapping in the description column
-            ('ALIGN', (1, 1), (1, -1), 'LEFT'),
-        ]))
-        
-        content.append(table)
-        content.append(Spacer(1, 0.2*inch))
-    
-    # Budget breakdown
-    content.append(Paragraph("Budget Breakdown", heading2_style))
-    content.append(Spacer(1, 0.1*inch))
-    
-    budget_data = [["Category", "Amount"]]
-    for category, amount in itinerary_data['budget_breakdown'].items():
-        budget_data.append([category, f"${amount}"])
-    
-    budget_table = Table(budget_data, colWidths=[3*inch, 1.5*inch])
-    budget_table.setStyle(TableStyle([
+from exchange_rates import format_money
+from pdf_templates import DEFAULT_TEMPLATE, TEMPLATE_LABELS
+
+# PDFs are built in memory and only spill to a temp file above this size
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+
+# Layouts by name; see register_template
+TEMPLATES = {}
+
+# Table styles shared by every template
+DETAILS_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
+    ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('PADDING', (0, 0), (-1, -1), 6),
+])
+
+BUDGET_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    # Highlight the total row
+    ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
+    ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+])
+
+DETAILS_COL_WIDTHS = [1.5*inch, 5*inch]
+BUDGET_COL_WIDTHS = [3*inch, 1.5*inch]
+
+
+def activities_table_style(wrapped_columns):
+    """Style for a day's activity table with left-aligned wrapping columns"""
+    commands = [
         ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
         ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
         ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
@@ -102,22 +53,317 @@ def create_pdf(itinerary_data, destination, duration, budget, interests, party_s
         ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
         ('BACKGROUND', (0, 1), (-1, -1), colors.white),
         ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        # Highlight the total row
-        ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
-        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-    ]))
-    
-    content.append(budget_table)
-    content.append(Spacer(1, 0.2*inch))
-    
-    # Tips
-    content.append(Paragraph("Travel Tips", heading2_style))
-    content.append(Spacer(1, 0.1*inch))
-    
-    for tip in itinerary_data['tips']:
-        content.append(Paragraph(f"• {tip}", wrapped_style))
-    
-    # Build the PDF
-    doc.build(content)
-    
-    return pdf_path
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ]
+    # Allow text wrapping in the description columns
+    commands.extend(('ALIGN', (column, 1), (column, -1), 'LEFT') for column in wrapped_columns)
+    return TableStyle(commands)
+
+
+def register_template(template_class):
+    """Class decorator adding a PdfTemplate subclass to TEMPLATES under its name.
+
+    The name must be listed in pdf_templates.TEMPLATE_LABELS, which gives its label.
+    """
+    template_class.label = TEMPLATE_LABELS[template_class.name]
+    TEMPLATES[template_class.name] = template_class
+    return template_class
+
+
+class PdfTemplate:
+    """A PDF layout for itineraries.
+
+    Paragraph styles are built once per template in ``__init__`` and the
+    table styles and column widths are class attributes, so a render only
+    creates the flowables for its own itinerary. Subclasses implement
+    ``build_content``.
+    """
+
+    name = None
+    label = None
+
+    def __init__(self):
+        styles = getSampleStyleSheet()
+        self.title_style = styles['Heading1']
+        self.heading2_style = styles['Heading2']
+        self.heading3_style = styles['Heading3']
+        self.normal_style = styles['Normal']
+
+    def build_content(self, itinerary_data, details):
+        """Return the flowables for ``itinerary_data``.
+
+        ``details`` holds the request: home_country, destination, duration,
+        budget, interests, time_difference and party_size.
+        """
+        raise NotImplementedError
+
+    def budget_section(self, itinerary_data):
+        content = [Paragraph("Budget Breakdown", self.heading2_style), Spacer(1, 0.1*inch)]
+        budget_data = [["Category", "Amount"]]
+        for category, amount in itinerary_data['budget_breakdown'].items():
+            budget_data.append([category, format_money(amount, itinerary_data.get('currency'))])
+        budget_table = Table(budget_data, colWidths=BUDGET_COL_WIDTHS)
+        budget_table.setStyle(BUDGET_TABLE_STYLE)
+        content.append(budget_table)
+        content.append(Spacer(1, 0.2*inch))
+        return content
+
+    def tips_section(self, itinerary_data, style):
+        content = [Paragraph("Travel Tips", self.heading2_style), Spacer(1, 0.1*inch)]
+        # Older itineraries stored their tips under 'tips'
+        tips = itinerary_data.get('travel_tips', itinerary_data.get('tips', []))
+        for tip in tips:
+            # Ensure text wrapping for tips
+            content.append(Paragraph(f"• {tip}", style))
+        return content
+
+
+@register_template
+class ClassicTemplate(PdfTemplate):
+    """Trip and flight tables, requirements and a five-column day table"""
+
+    name = "classic"
+    day_col_widths = [0.8*inch, 2.5*inch, 1.2*inch, 1*inch, 0.8*inch]
+    day_table_style = activities_table_style(wrapped_columns=(1, 2))
+
+    def __init__(self):
+        super().__init__()
+        # Enhanced text wrapping style
+        self.wrapped_style = ParagraphStyle(
+            'WrappedStyle',
+            parent=self.normal_style,
+            spaceBefore=6,
+            spaceAfter=6,
+            wordWrap='CJK',  # Improved word wrapping
+            allowWidows=0,
+            allowOrphans=0
+        )
+
+    def build_content(self, itinerary_data, details):
+        content = []
+
+        # Title and logo (placeholder)
+        content.append(Paragraph(f"Travel Itinerary: {details['home_country']} to {details['destination']}",
+                                 self.title_style))
+        content.append(Spacer(1, 0.25*inch))
+
+        # Trip details
+        content.append(Paragraph("Trip Details", self.heading2_style))
+        trip_details = [
+            ["Duration", f"{details['duration']} days"],
+            ["Budget", details['budget']],
+            ["Time Difference", details['time_difference']],
+            ["Interests", details['interests']],
+            ["Party Size", details['party_size']]
+        ]
+        trip_table = Table(trip_details, colWidths=DETAILS_COL_WIDTHS)
+        trip_table.setStyle(DETAILS_TABLE_STYLE)
+        content.append(trip_table)
+        content.append(Spacer(1, 0.25*inch))
+
+        # Flight information
+        if "flight_info" in itinerary_data:
+            content.append(Paragraph("Flight Information", self.heading2_style))
+            flight_details = [
+                ["Estimated Duration", itinerary_data["flight_info"].get("estimated_flight_duration", "N/A")],
+                ["Recommended\nAirlines", ", ".join(itinerary_data["flight_info"].get("recommended_airlines", ["N/A"]))],
+                ["Estimated Cost", format_money(itinerary_data['flight_info'].get('estimated_flight_cost', 'N/A'),
+                                                 itinerary_data.get('currency'))]
+            ]
+            flight_table = Table(flight_details, colWidths=DETAILS_COL_WIDTHS)
+            flight_table.setStyle(DETAILS_TABLE_STYLE)
+            content.append(flight_table)
+            content.append(Spacer(1, 0.25*inch))
+
+        # Visa and customs information
+        content.append(Paragraph("Travel Requirements", self.heading2_style))
+        content.append(Paragraph(
+            f"<b>Visa Requirements:</b> {itinerary_data.get('visa_requirements', 'Information not available')}",
+            self.wrapped_style))
+        content.append(Spacer(1, 0.1*inch))
+        content.append(Paragraph(
+            f"<b>Local Customs:</b> {itinerary_data.get('local_customs', 'Information not available')}",
+            self.wrapped_style))
+        content.append(Spacer(1, 0.25*inch))
+
+        # Daily plans
+        content.append(Paragraph("Daily Itinerary", self.heading2_style))
+        content.append(Spacer(1, 0.1*inch))
+        for day in itinerary_data['daily_plans']:
+            content.append(Paragraph(f"Day {day['day']} - {day.get('date', '')}", self.heading3_style))
+            data = [["Time", "Activity", "Location", "Category", "Cost"]]
+            for activity in day['activities']:
+                data.append([
+                    activity['time'],
+                    Paragraph(activity['description'], self.wrapped_style),
+                    Paragraph(activity.get('location', 'N/A'), self.wrapped_style),
+                    activity['category'],
+                    format_money(activity['estimated_cost'], itinerary_data.get('currency'))
+                ])
+            table = Table(data, colWidths=self.day_col_widths)
+            table.setStyle(self.day_table_style)
+            content.append(table)
+            content.append(Spacer(1, 0.2*inch))
+
+        content.extend(self.budget_section(itinerary_data))
+        content.extend(self.tips_section(itinerary_data, self.wrapped_style))
+        return content
+
+
+@register_template
+class CompactTemplate(PdfTemplate):
+    """Trip details as plain lines and a four-column day table without locations"""
+
+    name = "compact"
+    day_col_widths = [0.8*inch, 3.5*inch, 1.2*inch, 0.8*inch]
+    day_table_style = activities_table_style(wrapped_columns=(1,))
+
+    def __init__(self):
+        super().__init__()
+        # Add text wrapping to normal style
+        self.wrapped_style = ParagraphStyle(
+            'WrappedStyle',
+            parent=self.normal_style,
+            spaceBefore=6,
+            spaceAfter=6
+        )
+
+    def build_content(self, itinerary_data, details):
+        content = []
+
+        # Title
+        content.append(Paragraph(f"Travel Itinerary: {details['destination']}", self.title_style))
+        content.append(Spacer(1, 0.25*inch))
+
+        # Trip details
+        content.append(Paragraph(f"Duration: {details['duration']} days", self.wrapped_style))
+        content.append(Paragraph(f"Budget: {details['budget']}", self.wrapped_style))
+        content.append(Paragraph(f"Interests: {details['interests']}", self.wrapped_style))
+        content.append(Paragraph(f"Party Size: {details['party_size']}", self.wrapped_style))
+        content.append(Spacer(1, 0.25*inch))
+
+        # Daily plans
+        content.append(Paragraph("Daily Itinerary", self.heading2_style))
+        content.append(Spacer(1, 0.1*inch))
+        for day in itinerary_data['daily_plans']:
+            content.append(Paragraph(f"Day {day['day']}", self.heading3_style))
+            data = [["Time", "Activity", "Category", "Cost"]]
+            for activity in day['activities']:
+                data.append([
+                    activity['time'],
+                    Paragraph(activity['description'], self.wrapped_style),
+                    activity['category'],
+                    format_money(activity['estimated_cost'], itinerary_data.get('currency'))
+                ])
+            table = Table(data, colWidths=self.day_col_widths)
+            table.setStyle(self.day_table_style)
+            content.append(table)
+            content.append(Spacer(1, 0.2*inch))
+
+        content.extend(self.budget_section(itinerary_data))
+        content.extend(self.tips_section(itinerary_data, self.wrapped_style))
+        return content
+
+
+class TocMarker(Flowable):
+    """Invisible flowable that records a table of contents entry where it lands"""
+
+    def __init__(self, text):
+        super().__init__()
+        self.text = text
+
+    def wrap(self, available_width, available_height):
+        return 0, 0
+
+    def draw(self):
+        pass
+
+
+class TocDocTemplate(SimpleDocTemplate):
+    def afterFlowable(self, flowable):
+        if isinstance(flowable, TocMarker):
+            self.notify('TOCEntry', (0, flowable.text, self.page))
+
+
+class PdfRenderer:
+    """Renders itineraries with templates that are set up once and shared.
+
+    Every registered template is instantiated when the renderer is created,
+    so styles are not rebuilt per PDF. Styles are only read while rendering,
+    so one renderer can serve concurrent requests.
+    """
+
+    def __init__(self, spool_max_bytes=SPOOL_MAX_BYTES, pagesize=letter):
+        self.spool_max_bytes = spool_max_bytes
+        self.pagesize = pagesize
+        self.templates = {name: template_class() for name, template_class in TEMPLATES.items()}
+
+    def template_name(self, name):
+        """``name`` if it is a known template, otherwise the default"""
+        return name if name in self.templates else DEFAULT_TEMPLATE
+
+    def choices(self):
+        """``(name, label)`` pairs for template pickers"""
+        return [(name, template.label) for name, template in self.templates.items()]
+
+    def render(self, itinerary_data, details, template=None, output=None):
+        """Render into ``output`` (a path or file object) and return it.
+
+        By default the PDF is built in a spooled in-memory buffer that is
+        returned rewound.
+        """
+        if output is None:
+            output = tempfile.SpooledTemporaryFile(max_size=self.spool_max_bytes)
+        doc = SimpleDocTemplate(output, pagesize=self.pagesize)
+        doc.build(self.templates[self.template_name(template)].build_content(itinerary_data, details))
+        if hasattr(output, 'seek'):
+            output.seek(0)
+        return output
+
+    def render_combined(self, entries, template=None, output=None):
+        """Render several ``(itinerary_data, details)`` pairs into one PDF.
+
+        Each itinerary starts on a new page and is listed with its page
+        number in a table of contents on the first page.
+        """
+        if output is None:
+            output = tempfile.SpooledTemporaryFile(max_size=self.spool_max_bytes)
+        layout = self.templates[self.template_name(template)]
+        toc = TableOfContents()
+        toc.levelStyles = [layout.normal_style]
+        content = [Paragraph("Your Itineraries", layout.title_style), toc]
+        for itinerary_data, details in entries:
+            content.append(PageBreak())
+            content.append(TocMarker(f"{details['home_country']} to {details['destination']} "
+                                     f"({details['duration']} days)"))
+            content.extend(layout.build_content(itinerary_data, details))
+        doc = TocDocTemplate(output, pagesize=self.pagesize)
+        # Two passes: the first collects page numbers for the table of contents
+        doc.multiBuild(content)
+        if hasattr(output, 'seek'):
+            output.seek(0)
+        return output
+
+
+_default_renderer = None
+
+
+def create_pdf(itinerary_data, destination, duration, budget, interests, party_size, output=None):
+    """Create a PDF from the itinerary data with the compact template.
+
+    ``output`` may be a path or a writable file object; by default the PDF is
+    built in a spooled in-memory buffer that is returned rewound.
+    """
+    global _default_renderer
+    if _default_renderer is None:
+        _default_renderer = PdfRenderer()
+    details = {
+        'home_country': '',
+        'destination': destination,
+        'duration': duration,
+        'budget': budget,
+        'interests': interests,
+        'time_difference': '',
+        'party_size': party_size,
+    }
+    return _default_renderer.render(itinerary_data, details, template="compact", output=output)
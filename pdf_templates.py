@@ -0,0 +1,18 @@
+# The PDF layouts users can pick from, importable without ReportLab so pages
+# can list them before a PDF is rendered. pdf_generator registers one
+# template class per name.
+TEMPLATE_LABELS = {
+    "classic": "Classic",
+    "compact": "Compact",
+}
+DEFAULT_TEMPLATE = "classic"
+
+
+def template_name(name):
+    """``name`` if it is a known template, otherwise the default"""
+    return name if name in TEMPLATE_LABELS else DEFAULT_TEMPLATE
+
+
+def template_choices():
+    """``(name, label)`` pairs for template pickers"""
+    return list(TEMPLATE_LABELS.items())
@@ -0,0 +1,107 @@
+import json
+import threading
+import time
+
+import numpy as np
+
+from exchange_rates import BASE_CURRENCY
+from response_parser import BUDGET_CATEGORIES, budget_category, to_number
+
+# Budget breakdown categories whose cost grows with the party size; the
+# others (a room, a rental car) are shared
+PER_PERSON_CATEGORIES = ("Flights", "Food", "Activities")
+PER_PERSON = np.array([category in PER_PERSON_CATEGORIES for category in BUDGET_CATEGORIES])
+
+
+def party_factors(from_party, to_party):
+    """Multiplier per BUDGET_CATEGORIES entry for the same trip with another party size"""
+    return np.where(PER_PERSON, to_party / from_party, 1.0)
+
+
+def cost_slots(data):
+    """``(container, key)`` of every cost in an itinerary, and the BUDGET_CATEGORIES index of each"""
+    slots, categories = [], []
+    flight_info = data.get("flight_info")
+    if isinstance(flight_info, dict) and "estimated_flight_cost" in flight_info:
+        slots.append((flight_info, "estimated_flight_cost"))
+        categories.append(BUDGET_CATEGORIES.index("Flights"))
+    for day in data.get("daily_plans", []):
+        for activity in day.get("activities", []):
+            if "estimated_cost" in activity:
+                slots.append((activity, "estimated_cost"))
+                categories.append(BUDGET_CATEGORIES.index(budget_category(activity)))
+    breakdown = data.get("budget_breakdown")
+    if isinstance(breakdown, dict):
+        for category in breakdown:
+            if category != "Total":
+                slots.append((breakdown, category))
+                categories.append(BUDGET_CATEGORIES.index(category) if category in BUDGET_CATEGORIES
+                                  else BUDGET_CATEGORIES.index("Miscellaneous"))
+    return slots, np.array(categories, dtype=int)
+
+
+def apply_factors(data, factors):
+    """Multiply every cost in ``data`` (in place) by its category's factor in one pass, then recompute Total"""
+    slots, categories = cost_slots(data)
+    if not slots:
+        return data
+    values = np.array([to_number(container[key]) for container, key in slots], dtype=float)
+    values *= factors[categories]
+    # Whole units, except for costs small enough that cents matter
+    values = np.where(values >= 10, np.round(values), np.round(values, 2))
+    for (container, key), value in zip(slots, values.tolist()):
+        container[key] = int(value) if value.is_integer() else value
+    breakdown = data.get("budget_breakdown")
+    if isinstance(breakdown, dict) and "Total" in breakdown:
+        breakdown["Total"] = sum(amount for category, amount in breakdown.items() if category != "Total")
+    return data
+
+
+class PricingEngine:
+    """Re-prices stored itineraries in another currency or for another party size without the model.
+
+    An itinerary's costs are in its ``currency`` key, or BASE_CURRENCY when
+    it has none; ``rates`` (an exchange_rates.RateTable) converts them.
+    """
+
+    def __init__(self, rates):
+        self.rates = rates
+        self._lock = threading.Lock()
+        self._counters = {
+            "reprices": 0,
+            "conversions": 0,
+            "party_reprices": 0,
+            "seconds": 0.0,
+        }
+
+    def reprice(self, itinerary_data, currency=None, party_size=None, from_party_size=None):
+        """Copy of ``itinerary_data`` with its costs in ``currency`` for a party of ``party_size``.
+
+        ``from_party_size`` is the party the itinerary was planned for;
+        per-person categories are scaled from it. Raises
+        UnknownCurrencyError for a currency the rate table lacks.
+        """
+        started = time.perf_counter()
+        from_currency = itinerary_data.get("currency") or BASE_CURRENCY
+        currency = currency or from_currency
+        factors = np.full(len(BUDGET_CATEGORIES), self.rates.rate(from_currency, currency))
+        new_party = bool(party_size and from_party_size and party_size != from_party_size)
+        if new_party:
+            factors *= party_factors(from_party_size, party_size)
+
+        data = json.loads(json.dumps(itinerary_data))
+        apply_factors(data, factors)
+        data["currency"] = currency
+        with self._lock:
+            self._counters["reprices"] += 1
+            self._counters["conversions"] += int(currency != from_currency)
+            self._counters["party_reprices"] += int(new_party)
+            self._counters["seconds"] += time.perf_counter() - started
+        return data
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats["avg_ms"] = round(stats["seconds"] / stats["reprices"] * 1000, 3) if stats["reprices"] else 0.0
+        stats["seconds"] = round(stats["seconds"], 4)
+        return stats
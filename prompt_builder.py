@@ -0,0 +1,469 @@
+from response_parser import BUDGET_CATEGORIES
+from route_knowledge import ROUTE_SECTIONS
+
+# "1" is the original hand-written prompt with the schema spelled out (and
+# `//` comments); "2" defines the reply with the schema below. Bump
+# COMPACT_VERSION whenever the schema or the wording of version 2 changes so
+# cached itineraries produced by an older prompt are not served.
+LEGACY_VERSION = "1"
+COMPACT_VERSION = "2"
+PROMPT_VERSIONS = (LEGACY_VERSION, COMPACT_VERSION)
+
+# Which prompts are grounded on Google Search: every one, only those asking
+# for a route's flight, visa and customs sections, or none. Gemini does not
+# take a response schema together with tools, so grounded prompts carry a
+# compact rendering of the schema and the rest use the model's JSON mode.
+GROUNDING_MODES = ("all", "route", "none")
+
+ACTIVITY_CATEGORIES = ("Activity", "Food", "Transportation", "Accommodation")
+
+
+def string(description=None, enum=None):
+    schema = {"type": "STRING"}
+    if description:
+        schema["description"] = description
+    if enum:
+        schema["enum"] = list(enum)
+    return schema
+
+
+def number(description=None):
+    return {"type": "NUMBER", "description": description} if description else {"type": "NUMBER"}
+
+
+def integer(description=None):
+    return {"type": "INTEGER", "description": description} if description else {"type": "INTEGER"}
+
+
+def array(items):
+    return {"type": "ARRAY", "items": items}
+
+
+def obj(properties):
+    """An object whose properties are all required and kept in the given order"""
+    return {"type": "OBJECT", "properties": properties, "required": list(properties),
+            "property_ordering": list(properties)}
+
+
+# The itinerary as the app reads it, in the schema format Gemini takes as response_schema
+ACTIVITY = obj({
+    "time": string("Morning, Afternoon or Evening"),
+    "description": string(),
+    "location": string(),
+    "category": string(enum=ACTIVITY_CATEGORIES),
+    "estimated_cost": number(),
+})
+DAY = obj({
+    "day": integer(),
+    "date": string("day of the week"),
+    "activities": array(ACTIVITY),
+})
+ITINERARY_SECTIONS = {
+    "flight_info": obj({
+        "estimated_flight_duration": string("e.g. 11 hours"),
+        "recommended_airlines": array(string()),
+        "flight_link": array(string("booking URL, one per airline")),
+        "estimated_flight_cost": number(),
+    }),
+    "daily_plans": array(DAY),
+    "budget_breakdown": obj({category: number() for category in BUDGET_CATEGORIES + ["Total"]}),
+    "travel_tips": array(string()),
+    "visa_requirements": string("brief"),
+    "local_customs": string("brief"),
+}
+
+SCALAR_NAMES = {"STRING": "str", "NUMBER": "number", "INTEGER": "int"}
+
+
+def itinerary_schema(sections):
+    """Response schema of an object holding the named itinerary sections"""
+    return obj({name: ITINERARY_SECTIONS[name] for name in sections})
+
+
+def compact_schema(schema):
+    """One-line JSON sketch of ``schema`` for prompts that cannot send it as response_schema"""
+    kind = schema["type"]
+    if kind == "OBJECT":
+        return "{" + ",".join(f'"{name}":{compact_schema(value)}'
+                              for name, value in schema["properties"].items()) + "}"
+    if kind == "ARRAY":
+        return "[" + compact_schema(schema["items"]) + "]"
+    if schema.get("enum"):
+        return "|".join(f'"{value}"' for value in schema["enum"])
+    if schema.get("description"):
+        return f'{SCALAR_NAMES[kind]}({schema["description"]})'
+    return SCALAR_NAMES[kind]
+
+
+BUDGET_RULES = [
+    "Keep the budget breakdown realistic, with a Total equal to the sum of the categories.",
+    "Keep all costs within the total budget.",
+]
+
+
+# The route table keeps flight costs per person (see RouteKnowledgeStore.remember)
+ROUTE_FLIGHT_COST_RULE = "Give estimated_flight_cost as the round-trip economy fare for one traveler, not a group."
+
+
+def trip_request(home_country, destination, duration, budget, interests, party_size):
+    return (f"Create a detailed {duration}-day travel itinerary from {home_country} to {destination} "
+            f"for {party_size} people with a total budget of {budget}. Interests: {interests}.")
+
+
+class Prompt:
+    """A prompt's text and how it is sent.
+
+    ``sections`` are the itinerary keys the reply holds. Grounded prompts
+    are sent with Google Search and the schema in their text; the others
+    with ``schema`` as the response schema. ``version`` identifies the
+    wording and mode for model call records.
+    """
+
+    def __init__(self, kind, text, sections, grounded, version):
+        self.kind = kind
+        self.text = text
+        self.sections = tuple(sections)
+        self.grounded = grounded
+        self.version = version
+
+    @property
+    def schema(self):
+        return itinerary_schema(self.sections)
+
+
+class PromptBuilder:
+    """Builds every prompt the app sends to the model in one prompt ``version``.
+
+    ``grounding`` (see GROUNDING_MODES) picks which prompts are grounded on
+    Google Search; version "1" prompts always are. ``config(prompt)``
+    returns the GenerateContentConfig to send a prompt with.
+    """
+
+    def __init__(self, version=COMPACT_VERSION, grounding="route"):
+        if version not in PROMPT_VERSIONS:
+            raise EnvironmentError(f"Unknown PROMPT_VERSION: {version}")
+        if grounding not in GROUNDING_MODES:
+            raise EnvironmentError(f"Unknown GEMINI_GROUNDING: {grounding}")
+        self.version = version
+        self.grounding = grounding
+        self._configs = {}
+
+    @property
+    def cache_version(self):
+        """Key part for caches of model output, changing with the wording and the grounding"""
+        if self.version == LEGACY_VERSION:
+            return LEGACY_VERSION
+        return f"{self.version}-{self.grounding}"
+
+    def stats(self):
+        return {"version": self.version, "grounding": self.grounding, "cache_version": self.cache_version}
+
+    def grounded(self, sections):
+        if self.version == LEGACY_VERSION or self.grounding == "all":
+            return True
+        return self.grounding == "route" and any(section in ROUTE_SECTIONS for section in sections)
+
+    def build(self, kind, request, sections, rules=()):
+        """Version 2 prompt: the request, the rules and, when grounded, the compact schema"""
+        grounded = self.grounded(sections)
+        lines = [request.strip()] + list(rules) + ["All amounts are in USD."]
+        if grounded:
+            lines.append("Reply with only this JSON object, no other text: "
+                         + compact_schema(itinerary_schema(sections)))
+        text = "\n".join(lines)
+        return Prompt(kind, text, sections, grounded, f"{self.version}-{'search' if grounded else 'json'}")
+
+    def config(self, prompt):
+        """GenerateContentConfig for ``prompt``, built once per kind of reply so google.genai is only imported then"""
+        key = (prompt.sections, prompt.grounded)
+        config = self._configs.get(key)
+        if config is None:
+            from google.genai.types import GenerateContentConfig, GoogleSearch, Tool
+            if prompt.grounded:
+                config = GenerateContentConfig(tools=[Tool(google_search=GoogleSearch())],
+                                               response_modalities=["TEXT"])
+            else:
+                config = GenerateContentConfig(response_mime_type="application/json",
+                                               response_schema=prompt.schema, response_modalities=["TEXT"])
+            self._configs[key] = config
+        return config
+
+    def itinerary(self, home_country, destination, duration, budget, interests, party_size):
+        """The full itinerary"""
+        sections = tuple(ITINERARY_SECTIONS)
+        if self.version == LEGACY_VERSION:
+            return self.legacy("itinerary", legacy_itinerary_prompt(
+                home_country, destination, duration, budget, interests, party_size), sections)
+        return self.build("itinerary", trip_request(home_country, destination, duration, budget, interests,
+                                                    party_size), sections, BUDGET_RULES)
+
+    def trip(self, home_country, destination, duration, budget, interests, party_size, route_knowledge):
+        """The trip-specific sections when the route's flight, visa and customs details are already known"""
+        sections = ("daily_plans", "budget_breakdown", "travel_tips")
+        flight_cost = route_knowledge["flight_info"].get("estimated_flight_cost", 0)
+        if self.version == LEGACY_VERSION:
+            return self.legacy("trip", legacy_trip_prompt(
+                home_country, destination, duration, budget, interests, party_size, flight_cost), sections)
+        request = trip_request(home_country, destination, duration, budget, interests, party_size)
+        return self.build("trip", request, sections,
+                          [f"Flights are already booked at about {flight_cost}; use that for Flights."] + BUDGET_RULES)
+
+    def route_knowledge(self, home_country, destination):
+        """A route's flight, visa and customs sections, outside of a trip request"""
+        if self.version == LEGACY_VERSION:
+            return self.legacy("route_knowledge", legacy_route_knowledge_prompt(home_country, destination),
+                               ROUTE_SECTIONS)
+        return self.build("route_knowledge",
+                          f"Give current travel information for travelers from {home_country} visiting {destination}.",
+                          ROUTE_SECTIONS, [ROUTE_FLIGHT_COST_RULE])
+
+    def skeleton(self, home_country, destination, duration, budget, interests, party_size, route_knowledge=None):
+        """The trip-wide sections of a fanout itinerary; only the budget and tips when the route is known"""
+        if route_knowledge is not None:
+            sections = ("budget_breakdown", "travel_tips")
+            flight_cost = route_knowledge["flight_info"].get("estimated_flight_cost", 0)
+            rules = [f"Flights are already booked at about {flight_cost}; use that for Flights."]
+        else:
+            sections = ("flight_info", "budget_breakdown", "travel_tips", "visa_requirements", "local_customs")
+            flight_cost = None
+            rules = []
+        if self.version == LEGACY_VERSION:
+            return self.legacy("skeleton", legacy_skeleton_prompt(
+                home_country, destination, duration, budget, interests, party_size, flight_cost), sections)
+        rules += ["Do not plan individual days; the budget breakdown is the envelope for the whole trip "
+                  f"and its total must not exceed {budget}."]
+        return self.build("skeleton", trip_request(home_country, destination, duration, budget, interests,
+                                                   party_size), sections, rules)
+
+    def days(self, home_country, destination, duration, budget, interests, party_size, first_day, last_day,
+             allowance):
+        """The daily plans of days ``first_day``..``last_day``; ``allowance`` maps categories to amounts"""
+        sections = ("daily_plans",)
+        days = last_day - first_day + 1
+        allowance = ", ".join(f"{category}: about {amount}" for category, amount in allowance.items())
+        if self.version == LEGACY_VERSION:
+            return self.legacy("days", legacy_days_prompt(
+                home_country, destination, duration, budget, interests, party_size, first_day, last_day,
+                allowance), sections)
+        request = (f"Plan days {first_day} to {last_day} of a {duration}-day trip from {home_country} to "
+                   f"{destination} for {party_size} people (total budget {budget}). Interests: {interests}.")
+        return self.build("days", request, sections, [
+            "The other days are planned separately; cover sights and neighbourhoods suited to this part of the trip.",
+            f"Spending allowance for these {days} days: {allowance}.",
+            f"Include exactly {days} days numbered {first_day} to {last_day}.",
+        ])
+
+    def legacy(self, kind, text, sections):
+        return Prompt(kind, text, sections, True, LEGACY_VERSION)
+
+
+def legacy_itinerary_prompt(home_country, destination, duration, budget, interests, party_size):
+    return f"""
+    Create a detailed travel itinerary for a trip from {home_country} to {destination} for {duration} days with a budget of {budget}.
+    The traveler is interested in: {interests}.
+    The party is of {party_size} people.
+    Format the response as a JSON object with the following structure:
+    {{
+        "flight_info": {{
+            "estimated_flight_duration": "X hours",
+            "recommended_airlines": ["Airline 1", "Airline 2"],
+            "flight_link": ["Link to Airline 1", "Link to Airline 2"],
+            "estimated_flight_cost": 0
+        }},
+        "daily_plans": [
+            {{
+                "day": 1,
+                "date": "Day of the week",
+                "activities": [
+                    {{
+                        "time": "Morning",
+                        "description": "Activity description",
+                        "location": "Location name",
+                        "category": "Activity/Food/Transportation/Accommodation",
+                        "estimated_cost": 0
+                    }},
+                    // More activities for the day
+                ]
+            }},
+            // More days
+        ],
+        "budget_breakdown": {{
+            "Flights": 0,
+            "Accommodation": 0,
+            "Food": 0,
+            "Transportation": 0,
+            "Activities": 0,
+            "Miscellaneous": 0,
+            "Total": 0
+        }},
+        "travel_tips": [
+            "Tip 1",
+            "Tip 2"
+        ],
+        "visa_requirements": "Brief description of visa requirements",
+        "local_customs": "Brief description of important local customs"
+    }}
+
+    Ensure the budget breakdown is realistic and the total matches the sum of all categories.
+    Make sure all costs are within the total budget of {budget}.
+    Only respond with the JSON object, no additional text.
+    The currency is USD
+    """
+
+
+def legacy_trip_prompt(home_country, destination, duration, budget, interests, party_size, flight_cost):
+    return f"""
+    Create a detailed travel itinerary for a trip from {home_country} to {destination} for {duration} days with a budget of {budget}.
+    The traveler is interested in: {interests}.
+    The party is of {party_size} people.
+    Flights are already planned at an estimated {flight_cost}; use that for the Flights category.
+    Format the response as a JSON object with the following structure:
+    {{
+        "daily_plans": [
+            {{
+                "day": 1,
+                "date": "Day of the week",
+                "activities": [
+                    {{
+                        "time": "Morning",
+                        "description": "Activity description",
+                        "location": "Location name",
+                        "category": "Activity/Food/Transportation/Accommodation",
+                        "estimated_cost": 0
+                    }}
+                ]
+            }}
+        ],
+        "budget_breakdown": {{
+            "Flights": 0,
+            "Accommodation": 0,
+            "Food": 0,
+            "Transportation": 0,
+            "Activities": 0,
+            "Miscellaneous": 0,
+            "Total": 0
+        }},
+        "travel_tips": [
+            "Tip 1",
+            "Tip 2"
+        ]
+    }}
+
+    Ensure the budget breakdown is realistic and the total matches the sum of all categories.
+    Make sure all costs are within the total budget of {budget}.
+    Only respond with the JSON object, no additional text.
+    The currency is USD
+    """
+
+
+def legacy_route_knowledge_prompt(home_country, destination):
+    return f"""
+    Provide up-to-date travel information for travelers from {home_country} visiting {destination}.
+    Format the response as a JSON object with the following structure:
+    {{
+        "flight_info": {{
+            "estimated_flight_duration": "X hours",
+            "recommended_airlines": ["Airline 1", "Airline 2"],
+            "flight_link": ["Link to Airline 1", "Link to Airline 2"],
+            "estimated_flight_cost": 0
+        }},
+        "visa_requirements": "Brief description of visa requirements",
+        "local_customs": "Brief description of important local customs"
+    }}
+    The estimated_flight_cost is the round-trip economy fare for one traveler, not a group.
+
+    Only respond with the JSON object, no additional text.
+    The currency is USD
+    """
+
+
+def legacy_skeleton_prompt(home_country, destination, duration, budget, interests, party_size, flight_cost=None):
+    if flight_cost is not None:
+        return f"""
+    Plan the budget of a {duration}-day trip from {home_country} to {destination} with a total budget of {budget}.
+    The traveler is interested in: {interests}.
+    The party is of {party_size} people.
+    Flights are already planned at an estimated {flight_cost}; use that for the Flights category.
+    Do not plan individual days. Format the response as a JSON object with the following structure:
+    {{
+        "budget_breakdown": {{
+            "Flights": 0,
+            "Accommodation": 0,
+            "Food": 0,
+            "Transportation": 0,
+            "Activities": 0,
+            "Miscellaneous": 0,
+            "Total": 0
+        }},
+        "travel_tips": ["Tip 1", "Tip 2"]
+    }}
+
+    The budget breakdown is the spending envelope for the whole trip; the total must not exceed {budget}.
+    Only respond with the JSON object, no additional text.
+    The currency is USD
+    """
+    return f"""
+    Plan the trip-wide details of a {duration}-day trip from {home_country} to {destination} with a total budget of {budget}.
+    The traveler is interested in: {interests}.
+    The party is of {party_size} people.
+    Do not plan individual days. Format the response as a JSON object with the following structure:
+    {{
+        "flight_info": {{
+            "estimated_flight_duration": "X hours",
+            "recommended_airlines": ["Airline 1", "Airline 2"],
+            "flight_link": ["Link to Airline 1", "Link to Airline 2"],
+            "estimated_flight_cost": 0
+        }},
+        "budget_breakdown": {{
+            "Flights": 0,
+            "Accommodation": 0,
+            "Food": 0,
+            "Transportation": 0,
+            "Activities": 0,
+            "Miscellaneous": 0,
+            "Total": 0
+        }},
+        "travel_tips": ["Tip 1", "Tip 2"],
+        "visa_requirements": "Brief description of visa requirements",
+        "local_customs": "Brief description of important local customs"
+    }}
+
+    The budget breakdown is the spending envelope for the whole trip; the total must not exceed {budget}.
+    Only respond with the JSON object, no additional text.
+    The currency is USD
+    """
+
+
+def legacy_days_prompt(home_country, destination, duration, budget, interests, party_size, first_day, last_day,
+                       allowance):
+    days = last_day - first_day + 1
+    return f"""
+    Plan days {first_day} to {last_day} of a {duration}-day trip from {home_country} to {destination} (total budget {budget}).
+    The traveler is interested in: {interests}.
+    The party is of {party_size} people.
+    The other days are planned separately, so cover different sights and neighbourhoods appropriate to this part of the trip.
+    Spending allowance for these {days} days: {allowance}.
+    Format the response as a JSON object with the following structure:
+    {{
+        "daily_plans": [
+            {{
+                "day": {first_day},
+                "date": "Day of the week",
+                "activities": [
+                    {{
+                        "time": "Morning",
+                        "description": "Activity description",
+                        "location": "Location name",
+                        "category": "Activity/Food/Transportation/Accommodation",
+                        "estimated_cost": 0
+                    }}
+                ]
+            }}
+        ]
+    }}
+
+    Include exactly {days} days numbered {first_day} to {last_day}.
+    Only respond with the JSON object, no additional text.
+    The currency is USD
+    """
+
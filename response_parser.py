@@ -0,0 +1,276 @@
+import json
+import re
+
+# Text used for sections the model left out or that were lost to truncation
+MISSING_TEXT = "Information not available"
+BUDGET_CATEGORIES = ["Flights", "Accommodation", "Food", "Transportation", "Activities", "Miscellaneous"]
+
+
+class ItineraryParseError(Exception):
+    """Raised when a model response cannot be turned into a usable itinerary"""
+
+
+class ParseResult:
+    """Outcome of ``parse_itinerary_response``.
+
+    ``repaired`` is True when the JSON had to be fixed up (comments, trailing
+    commas or a truncated tail) and ``issues`` lists what was done so callers
+    can log or count it.
+    """
+
+    def __init__(self, data, repaired, issues):
+        self.data = data
+        self.repaired = repaired
+        self.issues = issues
+
+
+# One token per match; strings and comments are consumed whole so the
+# scanner never has to look inside them character by character.
+TOKEN_PATTERN = re.compile(r"""
+    (?P<string>"(?:[^"\\]|\\.)*")
+  | (?P<open>[{\[])
+  | (?P<close>[}\]])
+  | (?P<comma>,)
+  | (?P<space>\s+)
+  | (?P<comment>//[^\n]*|/\*.*?(?:\*/|\Z))
+  | (?P<partial>".*\Z)
+  | (?P<other>[^"{}\[\],/\s]+|/)
+""", re.S | re.X)
+
+
+# Comments and trailing commas outside strings; strings are matched first
+# (group 1) so that their contents are left alone.
+CLEANUP_PATTERN = re.compile(r"""
+    ("(?:[^"\\]|\\.)*")
+  | (//[^\n]*|/\*.*?\*/)
+  | ,(?=(?:\s|//[^\n]*|/\*.*?\*/)*[}\]])
+""", re.S | re.X)
+
+
+def strip_comments_and_commas(json_text):
+    """Remove comments and trailing commas in one regex pass; returns ``(text, issues)``"""
+    issues = []
+
+    def replace(match):
+        if match.group(1) is not None:
+            return match.group(1)
+        issue = "comments" if match.group(2) is not None else "trailing_commas"
+        if issue not in issues:
+            issues.append(issue)
+        return ""
+
+    return CLEANUP_PATTERN.sub(replace, json_text), issues
+
+
+def extract_json(text):
+    """Locate the first JSON object in ``text`` and return ``(json_text, issues)``.
+
+    The text is scanned once. Outside of strings, ``//`` and ``/* */``
+    comments and trailing commas are dropped, and anything after the
+    object closes (closing code fences, commentary) is ignored. When the
+    text ends before the object does, the output is cut back to the last
+    point where every open value was complete and the open brackets are
+    closed, so a truncated response still yields every finished day.
+    """
+    start = text.find("{")
+    if start == -1:
+        raise ItineraryParseError("No JSON object found in the model response")
+
+    out = []
+    issues = []
+    stack = []
+    pending_comma = False
+    safe_length = 0
+    safe_stack = ()
+    position = start
+    match_token = TOKEN_PATTERN.match
+
+    while position < len(text):
+        match = match_token(text, position)
+        kind = match.lastgroup
+        token = match.group()
+        position = match.end()
+
+        if kind == "space":
+            continue
+        if kind == "comment":
+            if "comments" not in issues:
+                issues.append("comments")
+            continue
+        if kind == "partial":
+            break
+
+        if pending_comma:
+            if kind == "close":
+                if "trailing_commas" not in issues:
+                    issues.append("trailing_commas")
+            else:
+                out.append(",")
+            pending_comma = False
+
+        if kind == "comma":
+            # Everything before a comma is complete, so it is a safe cut point
+            safe_length = len(out)
+            safe_stack = tuple(stack)
+            pending_comma = True
+        elif kind == "open":
+            stack.append("}" if token == "{" else "]")
+            out.append(token)
+            safe_length = len(out)
+            safe_stack = tuple(stack)
+        elif kind == "close":
+            if not stack or stack[-1] != token:
+                raise ItineraryParseError(f"Unbalanced '{token}' in the model response")
+            stack.pop()
+            out.append(token)
+            if not stack:
+                return "".join(out), issues
+            safe_length = len(out)
+            safe_stack = tuple(stack)
+        else:
+            out.append(token)
+
+    # The response ended inside the object: keep what was complete and close it
+    issues.append("truncated")
+    return "".join(out[:safe_length]) + "".join(reversed(safe_stack)), issues
+
+
+def to_number(value):
+    """Best-effort conversion of costs like '$1,200' or '45.5' to a number"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    digits = "".join(ch for ch in str(value) if ch.isdigit() or ch == ".")
+    try:
+        number = float(digits)
+    except ValueError:
+        return 0
+    return int(number) if number.is_integer() else number
+
+
+def validate_itinerary(data, issues=None):
+    """Check ``data`` against the itinerary schema, filling recoverable gaps.
+
+    Missing descriptive sections get placeholders, costs are coerced to
+    numbers and a missing budget breakdown is rebuilt from the activity
+    costs. Raises ``ItineraryParseError`` when there are no usable days.
+    """
+    issues = issues if issues is not None else []
+    if not isinstance(data, dict):
+        raise ItineraryParseError("The model response is not a JSON object")
+
+    days = data.get("daily_plans")
+    if not isinstance(days, list):
+        raise ItineraryParseError("The model response has no daily_plans list")
+    days = [day for day in days if isinstance(day, dict) and isinstance(day.get("activities"), list)]
+    if not days:
+        raise ItineraryParseError("The model response has no complete days")
+    if len(days) != len(data["daily_plans"]):
+        issues.append("dropped_incomplete_days")
+
+    for number, day in enumerate(days, start=1):
+        day.setdefault("day", number)
+        day.setdefault("date", "")
+        activities = []
+        for activity in day["activities"]:
+            if not isinstance(activity, dict) or not activity.get("description"):
+                continue
+            activity.setdefault("time", "")
+            activity.setdefault("location", "N/A")
+            activity.setdefault("category", "Activity")
+            activity["estimated_cost"] = to_number(activity.get("estimated_cost", 0))
+            activities.append(activity)
+        day["activities"] = activities
+    data["daily_plans"] = days
+
+    flight_info = data.get("flight_info")
+    if not isinstance(flight_info, dict):
+        flight_info = {}
+        issues.append("missing_flight_info")
+    flight_info.setdefault("estimated_flight_duration", "N/A")
+    flight_info.setdefault("recommended_airlines", [])
+    flight_info.setdefault("flight_link", [])
+    flight_info["estimated_flight_cost"] = to_number(flight_info.get("estimated_flight_cost", 0))
+    data["flight_info"] = flight_info
+
+    breakdown = data.get("budget_breakdown")
+    if not isinstance(breakdown, dict) or not breakdown:
+        breakdown = rebuild_budget_breakdown(data)
+        issues.append("rebuilt_budget_breakdown")
+    data["budget_breakdown"] = {category: to_number(amount) for category, amount in breakdown.items()}
+
+    if not isinstance(data.get("travel_tips"), list):
+        data["travel_tips"] = []
+    for key in ("visa_requirements", "local_customs"):
+        if not isinstance(data.get(key), str) or not data[key]:
+            data[key] = MISSING_TEXT
+    return data
+
+
+def budget_category(activity):
+    """Map an activity's category onto its budget breakdown category"""
+    category = str(activity.get("category", "")).split("/")[0].strip()
+    if category == "Activity":
+        return "Activities"
+    return category if category in BUDGET_CATEGORIES else "Miscellaneous"
+
+
+def rebuild_budget_breakdown(data):
+    """Sum activity costs per category when the model's breakdown was lost"""
+    totals = dict.fromkeys(BUDGET_CATEGORIES, 0)
+    totals["Flights"] = to_number(data.get("flight_info", {}).get("estimated_flight_cost", 0))
+    for day in data["daily_plans"]:
+        for activity in day["activities"]:
+            totals[budget_category(activity)] += to_number(activity.get("estimated_cost", 0))
+    totals["Total"] = sum(totals.values())
+    return totals
+
+
+def parse_json_object(text):
+    """Return ``(data, issues)`` for the first JSON object in model output"""
+    if not text:
+        raise ItineraryParseError("The model returned an empty response")
+    # Fast path: well-formed output only needs the surrounding text trimmed
+    start, end = text.find("{"), text.rfind("}")
+    data = None
+    issues = []
+    if start != -1 and end > start:
+        try:
+            data = json.loads(text[start:end + 1])
+        except ValueError:
+            # Next cheapest: the object is complete but has comments/trailing commas
+            cleaned, issues = strip_comments_and_commas(text[start:end + 1])
+            try:
+                data = json.loads(cleaned) if issues else None
+            except ValueError:
+                data = None
+            if data is None:
+                issues = []
+
+    if data is None:
+        json_text, issues = extract_json(text)
+        try:
+            data = json.loads(json_text)
+        except ValueError as e:
+            raise ItineraryParseError(f"Could not parse the model response as JSON: {e}")
+    return data, issues
+
+
+def parse_itinerary_response(text):
+    """Turn raw model output into a validated itinerary ``ParseResult``"""
+    data, issues = parse_json_object(text)
+    data = validate_itinerary(data, issues)
+    return ParseResult(data, bool(issues), issues)
+
+
+def itinerary_summary(data):
+    """Return ``(total_cost, day_count)`` for listings that should not parse the itinerary"""
+    if not isinstance(data, dict):
+        return 0, 0
+    breakdown = data.get("budget_breakdown")
+    breakdown = breakdown if isinstance(breakdown, dict) else {}
+    if "Total" in breakdown:
+        total = to_number(breakdown["Total"])
+    else:
+        total = sum(to_number(amount) for amount in breakdown.values())
+    days = data.get("daily_plans")
+    return total, len(days) if isinstance(days, list) else 0
@@ -0,0 +1,178 @@
+import json
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError
+
+from itinerary_cache import normalize_text
+from response_parser import to_number
+
+# Sections that depend only on (home_country, destination)
+ROUTE_SECTIONS = ("flight_info", "visa_requirements", "local_customs")
+
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token) for savings metrics"""
+    return (len(text) + 3) // 4
+
+
+def scale_flight_cost(flight_info, factor):
+    """Copy of ``flight_info`` with its flight cost multiplied by ``factor``"""
+    flight_info = dict(flight_info)
+    if "estimated_flight_cost" in flight_info:
+        cost = to_number(flight_info["estimated_flight_cost"]) * factor
+        flight_info["estimated_flight_cost"] = round(cost) if cost >= 10 else round(cost, 2)
+    return flight_info
+
+
+class RouteKnowledgeStore:
+    """Per (home_country, destination) store for flight, visa and customs info.
+
+    Entries younger than ``freshness_seconds`` are served as is. Older
+    entries are still served up to ``max_age_seconds`` while ``fetch`` runs
+    in a background thread to refresh them; beyond that they count as a
+    miss. ``fetch(home_country, destination)`` returns a dict with the
+    ``ROUTE_SECTIONS`` keys. Background refreshes run inside
+    ``app_context()`` when one is given.
+
+    The flight cost is stored per person, since routes are shared by
+    parties of every size.
+    """
+
+    def __init__(self, db, model, fetch=None, freshness_seconds=7 * 86400, max_age_seconds=30 * 86400,
+                 app_context=None):
+        self.db = db
+        self.model = model
+        self.fetch = fetch
+        self.freshness_seconds = freshness_seconds
+        self.max_age_seconds = max_age_seconds
+        self.app_context = app_context
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._counters = {
+            "hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "stored": 0,
+            "refreshes": 0,
+            "refresh_failures": 0,
+            "prompt_tokens_saved": 0,
+            "output_tokens_saved": 0,
+        }
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def _find(self, home_country, destination):
+        return self.model.query.filter_by(
+            home_country=normalize_text(home_country),
+            destination=normalize_text(destination)
+        ).first()
+
+    def lookup(self, home_country, destination, party_size=1):
+        """Return the stored sections for a route, flight cost for ``party_size`` people, or None on a miss"""
+        row = self._find(home_country, destination)
+        if row is None:
+            self._count("misses")
+            return None
+
+        age = (datetime.utcnow() - row.fetched_at).total_seconds()
+        if age > self.max_age_seconds:
+            self._count("misses")
+            return None
+        if age > self.freshness_seconds:
+            self._count("stale_hits")
+            self.refresh_in_background(home_country, destination)
+        else:
+            self._count("hits")
+        self._count("output_tokens_saved", row.output_tokens or 0)
+        return {
+            "flight_info": scale_flight_cost(json.loads(row.flight_info), to_number(party_size) or 1),
+            "visa_requirements": row.visa_requirements,
+            "local_customs": row.local_customs,
+        }
+
+    def needs_refresh(self, home_country, destination):
+        """Whether a route is missing or past its freshness window, without counting a lookup"""
+        row = self._find(home_country, destination)
+        return row is None or (datetime.utcnow() - row.fetched_at).total_seconds() > self.freshness_seconds
+
+    def record_prompt_savings(self, tokens):
+        """Count prompt tokens not sent because the route sections were known"""
+        self._count("prompt_tokens_saved", max(tokens, 0))
+
+    def remember(self, home_country, destination, itinerary_data, party_size=1):
+        """Store the route sections of a freshly generated itinerary planned for ``party_size`` people"""
+        sections = {key: itinerary_data.get(key) for key in ROUTE_SECTIONS}
+        if not isinstance(sections["flight_info"], dict):
+            return
+        flight_info = {key: value for key, value in sections["flight_info"].items()
+                       if key != "airlines_with_links"}
+        flight_info = scale_flight_cost(flight_info, 1 / (to_number(party_size) or 1))
+        flight_json = json.dumps(flight_info)
+
+        row = self._find(home_country, destination)
+        if row is None:
+            row = self.model(home_country=normalize_text(home_country),
+                             destination=normalize_text(destination))
+            self.db.session.add(row)
+        row.flight_info = flight_json
+        row.visa_requirements = sections["visa_requirements"] or ""
+        row.local_customs = sections["local_customs"] or ""
+        row.output_tokens = estimate_tokens(
+            flight_json + row.visa_requirements + row.local_customs
+        )
+        row.fetched_at = datetime.utcnow()
+        try:
+            self.db.session.commit()
+        except IntegrityError:
+            # Another request stored this route at the same moment; its sections are as fresh
+            self.db.session.rollback()
+            return
+        self._count("stored")
+
+    def refresh(self, home_country, destination):
+        """Fetch and store a route's sections now"""
+        self.remember(home_country, destination, self.fetch(home_country, destination))
+        self._count("refreshes")
+
+    def refresh_in_background(self, home_country, destination):
+        if self.fetch is None:
+            return
+        route = (normalize_text(home_country), normalize_text(destination))
+        with self._lock:
+            if route in self._refreshing:
+                return
+            self._refreshing.add(route)
+
+        def run():
+            try:
+                if self.app_context is not None:
+                    with self.app_context():
+                        self.refresh(home_country, destination)
+                else:
+                    self.refresh(home_country, destination)
+            except Exception as e:
+                print(f"Error refreshing route knowledge for {home_country} -> {destination}: {e}")
+                self._count("refresh_failures")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(route)
+
+        threading.Thread(target=run, name="route-knowledge-refresh", daemon=True).start()
+
+    def stale_routes(self, limit=50):
+        """Routes past their freshness window, oldest first"""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.freshness_seconds)
+        rows = (self.model.query.filter(self.model.fetched_at < cutoff)
+                .order_by(self.model.fetched_at.asc()).limit(limit))
+        return [(row.home_country, row.destination) for row in rows]
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        lookups = stats["hits"] + stats["stale_hits"] + stats["misses"]
+        served = stats["hits"] + stats["stale_hits"]
+        stats["hit_rate"] = round(served / lookups, 4) if lookups else 0.0
+        return stats
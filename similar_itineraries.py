@@ -0,0 +1,205 @@
+import json
+import math
+import re
+import threading
+import time
+
+import numpy as np
+
+from pricing import apply_factors, party_factors
+from response_parser import BUDGET_CATEGORIES, to_number
+
+STOP_WORDS = {"a", "an", "and", "at", "for", "in", "of", "on", "the", "to", "with"}
+
+
+def interest_terms(interests):
+    """Words of normalized interests (see normalize_request), singular and without stop words"""
+    terms = set()
+    for interest in interests:
+        for word in re.findall(r"[a-z0-9]+", interest):
+            if word in STOP_WORDS:
+                continue
+            if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+                word = word[:-1]
+            terms.add(word)
+    return sorted(terms)
+
+
+def cost_factors(breakdown, from_budget, from_party, to_budget, to_party):
+    """Multiplier per BUDGET_CATEGORIES entry that moves a trip's costs to another budget and party size.
+
+    Per-person categories scale with the party size, then every category is
+    scaled so the trip uses the same share of the new budget as it did of
+    its own.
+    """
+    amounts = np.array([to_number(breakdown.get(category, 0)) for category in BUDGET_CATEGORIES], dtype=float)
+    factors = party_factors(from_party, to_party)
+    scaled_total = (amounts * factors).sum()
+    fit = to_budget / from_budget
+    if scaled_total > 0:
+        fit *= amounts.sum() / scaled_total
+    return factors * fit
+
+
+def rescale_costs(itinerary_data, from_budget, from_party, to_budget, to_party):
+    """Copy of ``itinerary_data`` with every cost moved to ``to_budget`` and ``to_party`` in one pass"""
+    data = json.loads(json.dumps(itinerary_data))
+    factors = cost_factors(data.get("budget_breakdown") or {}, from_budget, from_party, to_budget, to_party)
+    return apply_factors(data, factors)
+
+
+class RouteIndex:
+    """Vectors and numbers of one destination's indexed requests"""
+
+    def __init__(self, entries):
+        self.loaded_at = time.monotonic()
+        self.keys = [key for key, _ in entries]
+        requests = [request for _, request in entries]
+        self.home_countries = np.array([request["home_country"] for request in requests], dtype=object)
+        self.durations = np.array([self._number(request["duration"]) for request in requests])
+        self.budgets = np.array([self._number(request["budget"]) for request in requests])
+        self.party_sizes = np.array([self._number(request["party_size"]) for request in requests])
+
+        # Interests as sparse vectors (term columns), held as one L2-normalized matrix
+        terms = [interest_terms(request["interests"]) for request in requests]
+        self.vocabulary = {}
+        for row in terms:
+            for term in row:
+                self.vocabulary.setdefault(term, len(self.vocabulary))
+        self.vectors = np.zeros((len(requests), max(1, len(self.vocabulary))))
+        for number, row in enumerate(terms):
+            if row:
+                self.vectors[number, [self.vocabulary[term] for term in row]] = 1 / math.sqrt(len(row))
+        self.has_interests = np.array([bool(row) for row in terms])
+
+    @staticmethod
+    def _number(value):
+        return float(value) if isinstance(value, (int, float)) else math.nan
+
+    def similarities(self, interests):
+        """Cosine similarity of every indexed request's interests to ``interests``"""
+        terms = interest_terms(interests)
+        if not terms:
+            # Two requests without interests match; one without matches nothing
+            return np.where(self.has_interests, 0.0, 1.0)
+        columns = [self.vocabulary[term] for term in terms if term in self.vocabulary]
+        if not columns:
+            return np.zeros(len(self.keys))
+        return self.vectors[:, columns].sum(axis=1) / math.sqrt(len(terms))
+
+
+class SimilarityIndex:
+    """Adapts a cached itinerary close enough to a request instead of generating one.
+
+    ``candidates(destination)`` returns ``(cache_key, normalized request)``
+    pairs of the cached itineraries for a destination (see
+    ``ItineraryCache.indexed_requests``), and ``load(cache_key)`` the
+    itinerary or None once it has expired. A match has the same home
+    country and duration, a budget within ``max_budget_ratio`` and a party
+    size within ``max_party_ratio`` of the request, and interests with a
+    cosine similarity of at least ``threshold``; the most similar, then the
+    closest in budget, wins. A destination's index is rebuilt after
+    ``refresh_seconds`` or once ``forget(destination)`` is called.
+    """
+
+    def __init__(self, candidates, load, threshold=0.8, max_budget_ratio=1.25, max_party_ratio=2.0,
+                 refresh_seconds=60, max_routes=512, registry=None):
+        self.candidates = candidates
+        self.load = load
+        self.threshold = threshold
+        self.max_budget_ratio = max_budget_ratio
+        self.max_party_ratio = max_party_ratio
+        self.refresh_seconds = refresh_seconds
+        self.max_routes = max_routes
+        self._routes = {}
+        self._lock = threading.Lock()
+        self._counters = {
+            "lookups": 0,
+            "matches": 0,
+            "misses": 0,
+            "below_threshold": 0,
+            "expired": 0,
+            "rebuilds": 0,
+        }
+        self._matches = registry.counter(
+            "travelplanner_similar_matches_total", "Requests served an itinerary adapted from a similar cached trip"
+        ) if registry is not None else None
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def forget(self, destination):
+        """Rebuild ``destination``'s index on its next lookup (e.g. after caching a new itinerary)"""
+        with self._lock:
+            self._routes.pop(destination, None)
+
+    def _route(self, destination):
+        with self._lock:
+            route = self._routes.get(destination)
+        if route is not None and time.monotonic() - route.loaded_at < self.refresh_seconds:
+            return route
+        route = RouteIndex(self.candidates(destination))
+        with self._lock:
+            self._routes.pop(destination, None)
+            self._routes[destination] = route
+            while len(self._routes) > self.max_routes:
+                self._routes.pop(next(iter(self._routes)))
+            self._counters["rebuilds"] += 1
+        return route
+
+    def find(self, request):
+        """Best match for a normalized request, with its costs rescaled to it: ``(itinerary_data, match)`` or None.
+
+        ``match`` holds the matched request's budget and party size, and
+        the similarity of its interests.
+        """
+        self._count("lookups")
+        budget, party_size, duration = request["budget"], request["party_size"], request["duration"]
+        if not all(isinstance(value, (int, float)) and value > 0 for value in (budget, party_size, duration)):
+            self._count("misses")
+            return None
+
+        route = self._route(request["destination"])
+        if not route.keys:
+            self._count("misses")
+            return None
+        with np.errstate(invalid="ignore", divide="ignore"):
+            budget_distance = np.abs(np.log(route.budgets / budget))
+            eligible = ((route.home_countries == request["home_country"])
+                        & (route.durations == duration)
+                        & (budget_distance <= math.log(self.max_budget_ratio))
+                        & (np.abs(np.log(route.party_sizes / party_size)) <= math.log(self.max_party_ratio)))
+        if not eligible.any():
+            self._count("misses")
+            return None
+
+        similarity = np.where(eligible, route.similarities(request["interests"]), -1.0)
+        order = np.lexsort((budget_distance, -similarity))
+        for index in order:
+            if similarity[index] < self.threshold:
+                break
+            itinerary_data = self.load(route.keys[index])
+            if itinerary_data is None:
+                self._count("expired")
+                continue
+            self._count("matches")
+            if self._matches is not None:
+                self._matches.inc()
+            match = {
+                "budget": float(route.budgets[index]),
+                "party_size": int(route.party_sizes[index]),
+                "similarity": round(float(similarity[index]), 4),
+            }
+            return rescale_costs(itinerary_data, match["budget"], match["party_size"], budget, party_size), match
+        # Every close enough match had expired, or none was close enough
+        self._count("misses" if similarity.max() >= self.threshold else "below_threshold")
+        return None
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["indexed_destinations"] = len(self._routes)
+        stats["hit_rate"] = round(stats["matches"] / stats["lookups"], 4) if stats["lookups"] else 0.0
+        stats["threshold"] = self.threshold
+        return stats
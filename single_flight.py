@@ -0,0 +1,163 @@
+import json
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError
+
+
+class _Call:
+    """One in-flight generation that other threads can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        # The result as JSON, so no caller can change what the others get
+        self.frozen = None
+        self.error = None
+
+
+class SingleFlight:
+    """Run one generation per key at a time and share its result.
+
+    Inside a process, callers with a key that is already in flight wait for
+    that call and get its result (or its exception). Across processes, the
+    thread that runs the call first takes a row in the lock table
+    (``model``, see ``GenerationLock`` in app.py). A process that finds the
+    row taken polls until it is released and then asks ``recheck()`` for
+    the result the other process stored. If recheck has nothing (the other
+    process failed) it generates itself. Locks expire after
+    ``lease_seconds`` so a crashed worker cannot block a key, and nobody
+    waits longer than ``wait_seconds`` before generating on its own.
+    """
+
+    def __init__(self, db=None, model=None, lease_seconds=300, wait_seconds=300, poll_interval=0.5):
+        self.db = db
+        self.model = model
+        self.lease_seconds = lease_seconds
+        self.wait_seconds = wait_seconds
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._counters = {
+            "leaders": 0,
+            "coalesced": 0,
+            "remote_waits": 0,
+            "remote_coalesced": 0,
+            "takeovers": 0,
+            "timeouts": 0,
+            "failures": 0,
+        }
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    @property
+    def persistent(self):
+        return self.db is not None and self.model is not None
+
+    def do(self, key, fn, recheck=None):
+        """Return ``fn()``, sharing one call among concurrent callers with the same key.
+
+        ``recheck()`` returns the result another process stored for the key,
+        or None. The result must be JSON-serializable; every caller gets its
+        own copy of it.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self._counters["coalesced"] += 1
+
+        if not leader:
+            if not call.done.wait(self.wait_seconds):
+                self._count("timeouts")
+                return fn()
+            if call.error is not None:
+                raise call.error
+            return json.loads(call.frozen)
+
+        try:
+            # Frozen before anyone can modify it; the leader gets a copy like everyone else
+            call.frozen = json.dumps(self._lead(key, fn, recheck))
+            return json.loads(call.frozen)
+        except Exception as e:
+            call.error = e
+            self._count("failures")
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
+
+    def _lead(self, key, fn, recheck):
+        """Run ``fn`` for this process, first waiting out any other process generating ``key``"""
+        if not self.persistent:
+            self._count("leaders")
+            return fn()
+
+        deadline = time.monotonic() + self.wait_seconds
+        waited = False
+        while True:
+            token = self._acquire(key)
+            if token is not None:
+                try:
+                    # Another process may have finished between our cache miss and the lock
+                    result = recheck() if recheck is not None else None
+                    if result is not None:
+                        self._count("remote_coalesced")
+                        return result
+                    self._count("leaders")
+                    return fn()
+                finally:
+                    self._release(key, token)
+
+            if not waited:
+                waited = True
+                self._count("remote_waits")
+            if time.monotonic() >= deadline:
+                self._count("timeouts")
+                self._count("leaders")
+                return fn()
+            time.sleep(self.poll_interval)
+
+    def _acquire(self, key):
+        """Take the lock row for ``key``; returns its owner token or None if it is held"""
+        table = self.model.__table__
+        now = datetime.utcnow()
+        with self.db.engine.begin() as connection:
+            expired = connection.execute(
+                table.delete().where(table.c.key == key, table.c.expires_at <= now)
+            ).rowcount
+        if expired:
+            self._count("takeovers", expired)
+
+        token = uuid.uuid4().hex
+        try:
+            with self.db.engine.begin() as connection:
+                connection.execute(table.insert().values(
+                    key=key, owner=token, acquired_at=now,
+                    expires_at=now + timedelta(seconds=self.lease_seconds)
+                ))
+        except IntegrityError:
+            return None
+        return token
+
+    def _release(self, key, token):
+        table = self.model.__table__
+        try:
+            with self.db.engine.begin() as connection:
+                connection.execute(table.delete().where(table.c.key == key, table.c.owner == token))
+        except Exception as e:
+            # The lease runs out on its own
+            print(f"Failed to release generation lock {key}: {e}")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["in_flight"] = len(self._calls)
+        return stats
@@ -0,0 +1,178 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+
+class TempItineraryStore:
+    """Server-side home of anonymous users' itineraries.
+
+    Only the itinerary id travels in the session cookie; the inputs and the
+    itinerary itself are kept here for ``ttl_seconds`` under that id.
+    Backends implement ``_write``, ``_read``, ``_delete`` and ``_sweep``
+    (which drops expired entries and returns how many). Expired entries are
+    swept at most every ``sweep_interval`` seconds as new ones are written.
+    """
+
+    def __init__(self, ttl_seconds=24 * 3600, sweep_interval=600):
+        self.ttl_seconds = ttl_seconds
+        self.sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+        self._next_sweep = 0.0
+        self._counters = {"stored": 0, "hits": 0, "misses": 0, "expired": 0}
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def put(self, itinerary_id, entry):
+        """Keep ``entry`` (a JSON-serializable dict) for the TTL"""
+        self._write(str(itinerary_id), json.dumps(entry), time.time() + self.ttl_seconds)
+        self._count("stored")
+        with self._lock:
+            due = time.time() >= self._next_sweep
+            if due:
+                self._next_sweep = time.time() + self.sweep_interval
+        if due:
+            self.sweep()
+
+    def get(self, itinerary_id):
+        """The stored entry, or None once it has expired"""
+        payload = self._read(str(itinerary_id)) if itinerary_id else None
+        if payload is None:
+            self._count("misses")
+            return None
+        self._count("hits")
+        return json.loads(payload)
+
+    def delete(self, itinerary_id):
+        self._delete(str(itinerary_id))
+
+    def sweep(self):
+        """Drop expired entries; returns how many were removed"""
+        removed = self._sweep()
+        self._count("expired", removed)
+        return removed
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats["backend"] = self.backend
+        stats["ttl_seconds"] = self.ttl_seconds
+        return stats
+
+
+class DatabaseTempItineraryStore(TempItineraryStore):
+    """Entries in a SQLAlchemy model with ``id``, ``payload`` and ``expires_at``
+    columns (see ``TempItinerary`` in app.py), shared by every worker"""
+
+    backend = "database"
+
+    def __init__(self, db, model, **kwargs):
+        super().__init__(**kwargs)
+        self.db = db
+        self.model = model
+
+    def _write(self, key, payload, expires_at):
+        row = self.db.session.get(self.model, key)
+        if row is None:
+            row = self.model(id=key)
+            self.db.session.add(row)
+        row.payload = payload
+        row.expires_at = datetime.utcfromtimestamp(expires_at)
+        self.db.session.commit()
+
+    def _read(self, key):
+        row = self.db.session.get(self.model, key)
+        if row is None or row.expires_at <= datetime.utcnow():
+            return None
+        return row.payload
+
+    def _delete(self, key):
+        self.model.query.filter_by(id=key).delete()
+        self.db.session.commit()
+
+    def _sweep(self):
+        removed = self.model.query.filter(self.model.expires_at <= datetime.utcnow()).delete()
+        self.db.session.commit()
+        return removed
+
+
+class FileTempItineraryStore(TempItineraryStore):
+    """One JSON file per entry in ``directory``; the file's mtime is its expiry"""
+
+    backend = "filesystem"
+
+    def __init__(self, directory, **kwargs):
+        super().__init__(**kwargs)
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        safe_key = "".join(ch for ch in key if ch.isalnum() or ch == "-")
+        return os.path.join(self.directory, f"{safe_key}.json")
+
+    def _write(self, key, payload, expires_at):
+        path = self._path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(payload)
+        os.utime(temp_path, (expires_at, expires_at))
+        os.replace(temp_path, path)
+
+    def _read(self, key):
+        path = self._path(key)
+        try:
+            if os.path.getmtime(path) <= time.time():
+                return None
+            with open(path, encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _delete(self, key):
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _sweep(self):
+        removed = 0
+        now = time.time()
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.stat().st_mtime <= now:
+                        os.unlink(entry.path)
+                        removed += 1
+                except FileNotFoundError:
+                    continue
+        return removed
+
+
+class KeyValueTempItineraryStore(TempItineraryStore):
+    """Entries in a Redis-like client (``setex``/``get``/``delete``), which
+    expires them itself"""
+
+    backend = "key-value"
+
+    def __init__(self, client, prefix="temp-itinerary:", **kwargs):
+        super().__init__(**kwargs)
+        self.client = client
+        self.prefix = prefix
+
+    def _write(self, key, payload, expires_at):
+        self.client.setex(self.prefix + key, max(1, int(expires_at - time.time())), payload)
+
+    def _read(self, key):
+        payload = self.client.get(self.prefix + key)
+        if isinstance(payload, bytes):
+            payload = payload.decode("utf-8")
+        return payload
+
+    def _delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def _sweep(self):
+        return 0
@@ -0,0 +1,131 @@
+import json
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+
+# app reads its configuration when it is imported
+SCRATCH = tempfile.mkdtemp(prefix="travelplanner-tests-")
+os.environ.pop("DATABASE_URL", None)
+os.environ.pop("WARMUP_HOURS", None)
+os.environ["SQLITE_DB_PATH"] = os.path.join(SCRATCH, "import.db")
+os.environ["PDF_CACHE_DIR"] = os.path.join(SCRATCH, "pdf_cache")
+os.environ["LEGACY_ITINERARIES_DB"] = os.path.join(SCRATCH, "itineraries.db")
+os.environ["GOOGLE_API_KEY"] = "test-key"
+
+SAMPLE_ITINERARY = {
+    "flight_info": {"estimated_flight_duration": "13 hours", "recommended_airlines": ["ANA"],
+                    "flight_link": ["https://example.com"], "estimated_flight_cost": 900},
+    "daily_plans": [
+        {"day": 1, "date": "Monday", "activities": [
+            {"time": "Morning", "description": "Temple visit", "location": "Asakusa",
+             "category": "Activity", "estimated_cost": 0},
+            {"time": "Evening", "description": "Sushi dinner", "location": "Ginza",
+             "category": "Food", "estimated_cost": 120},
+        ]},
+        {"day": 2, "date": "Tuesday", "activities": [
+            {"time": "Afternoon", "description": "Ramen lunch", "location": "Shinjuku",
+             "category": "Food", "estimated_cost": 15},
+        ]},
+    ],
+    "budget_breakdown": {"Flights": 900, "Accommodation": 300, "Food": 135, "Transportation": 40,
+                         "Activities": 0, "Miscellaneous": 25, "Total": 1400},
+    "travel_tips": ["Carry cash"],
+    "visa_requirements": "Visa-free for 90 days",
+    "local_customs": "Bow when greeting",
+}
+
+# Round numbers, so converted amounts can be checked exactly
+RATES = {"EUR": 0.5, "JPY": 150.0}
+
+
+@pytest.fixture
+def app_module(tmp_path, monkeypatch):
+    """The app module with its rate table on RATES and no process-wide state left from other tests"""
+    import app
+    from exchange_rates import RateTable
+
+    rates_path = tmp_path / "exchange_rates.json"
+    rates_path.write_text(json.dumps({"base": "USD", "as_of": None, "source": "tests", "rates": RATES}))
+    monkeypatch.setattr(app, "rate_table", RateTable(str(rates_path)))
+    monkeypatch.setattr(app, "pricing_engine", None)
+    monkeypatch.setattr(app, "similar_index", None)
+    return app
+
+
+@pytest.fixture
+def application(app_module, tmp_path):
+    """The Flask app on a fresh SQLite database"""
+    application = app_module.create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'app.db'}",
+        "TESTING": True,
+    })
+    with application.app_context():
+        app_module.init_database()
+        app_module.itinerary_cache.clear()
+    return application
+
+
+@pytest.fixture
+def user_client(app_module, application):
+    """A test client logged in as a new user"""
+    with application.app_context():
+        user = app_module.User(email="traveller@example.com", password="x")
+        app_module.db.session.add(user)
+        app_module.db.session.commit()
+        user_id = user.id
+    client = application.test_client()
+    with client.session_transaction() as session:
+        session["user_id"] = user_id
+    return client
+
+
+class RecordingPool:
+    """Stands in for the model pool: answers every call with ``reply`` and keeps the prompts"""
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.prompts = []
+
+    def generate_content(self, model, contents, config, timeout=None):
+        self.prompts.append((contents[0], config))
+        return SimpleNamespace(text=self.reply)
+
+    def generate_content_stream(self, model, contents, config, timeout=None):
+        self.prompts.append((contents[0], config))
+        middle = len(self.reply) // 2
+        return iter([SimpleNamespace(text=self.reply[:middle]), SimpleNamespace(text=self.reply[middle:])])
+
+
+@pytest.fixture
+def pool(app_module, monkeypatch):
+    """A RecordingPool replying with SAMPLE_ITINERARY in place of Gemini"""
+    pool = RecordingPool(json.dumps(SAMPLE_ITINERARY))
+    monkeypatch.setattr(app_module, "get_model_pool", lambda: pool)
+    return pool
+
+
+def stream_events(response):
+    """``(event, data)`` pairs of a Server-Sent Events response"""
+    body = response.get_data(as_text=True)
+    return [(block.split("\n")[0][len("event: "):], json.loads(block.split("\n")[1][len("data: "):]))
+            for block in body.strip().split("\n\n") if block.startswith("event: ")]
+
+
+@pytest.fixture
+def fake_gemini():
+    """tools/fake_gemini.py serving the recorded corpus on a free port, with a fixed 50 ms latency"""
+    import fake_gemini
+
+    fake = fake_gemini.FakeGemini(fake_gemini.load_responses(fake_gemini.DEFAULT_CORPUS), lambda: 0.05)
+    server = fake_gemini.start_server(fake)
+    fake.base_url = f"http://127.0.0.1:{server.server_port}"
+    yield fake
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,46 @@
+import threading
+
+from sqlalchemy import text
+
+import db_config
+import db_helper
+from conftest import SAMPLE_ITINERARY
+
+
+def test_every_connection_gets_the_pragmas(app_module, application):
+    with application.app_context():
+        engine = app_module.db.engine
+        assert db_config.get_engine() is engine
+        with engine.connect() as connection:
+            pragma = lambda name: connection.execute(text(f"PRAGMA {name}")).scalar()
+            assert pragma("journal_mode") == "wal"
+            assert pragma("synchronous") == 1
+            assert pragma("busy_timeout") == db_config.SQLITE_PRAGMAS["busy_timeout"]
+            assert pragma("temp_store") == 2
+
+
+def test_concurrent_writers_wait_for_the_lock(app_module, application):
+    with application.app_context():
+        db_helper.init_db()
+    errors = []
+
+    def write():
+        try:
+            for _ in range(25):
+                db_helper.save_itinerary("Paris", "3", "1000", "art", SAMPLE_ITINERARY)
+        except Exception as e:
+            errors.append(e)
+
+    writers = [threading.Thread(target=write) for _ in range(4)]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join(30)
+    assert errors == []
+    assert len(db_helper.get_user_history()) == 100
+
+
+def test_sqlite_pool_options(tmp_path):
+    options = db_config.engine_options(f"sqlite:///{tmp_path / 'app.db'}")
+    assert options["pool_size"] == db_config.POOL_SIZE and options["connect_args"]["check_same_thread"] is False
+    assert "pool_size" not in db_config.engine_options("sqlite:///:memory:")
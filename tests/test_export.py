@@ -0,0 +1,58 @@
+import io
+import zipfile
+
+import pytest
+
+from test_pricing import TRIP_FORM
+
+
+@pytest.fixture
+def saved_ids(app_module, application, user_client, pool):
+    for destination in ("Tokyo, Japan", "Paris, France"):
+        user_client.post("/generate", data=dict(TRIP_FORM, destination=destination, currency="USD",
+                                                budget="2000"))
+    with application.app_context():
+        return [itinerary.id for itinerary in app_module.Itinerary.query.order_by(app_module.Itinerary.id)]
+
+
+def test_zip_holds_a_pdf_per_itinerary(app_module, user_client, saved_ids, tmp_path, monkeypatch):
+    from pdf_cache import PdfCache
+
+    monkeypatch.setattr(app_module, "pdf_cache", PdfCache(str(tmp_path / "pdf_cache")))
+    # One of them is already cached from a download
+    user_client.get(f"/download/{saved_ids[0]}")
+
+    response = user_client.get("/export?format=zip")
+    assert response.status_code == 200 and response.mimetype == "application/zip"
+    archive = zipfile.ZipFile(io.BytesIO(response.data))
+    assert sorted(archive.namelist()) == [f"{saved_ids[0]}_Tokyo_Japan.pdf", f"{saved_ids[1]}_Paris_France.pdf"]
+    assert all(archive.read(name).startswith(b"%PDF-") for name in archive.namelist())
+    # The export filled the cache with the other one
+    assert app_module.pdf_cache.stats()["files"] == 2
+
+    selected = zipfile.ZipFile(io.BytesIO(user_client.get(f"/export?format=zip&ids={saved_ids[1]}").data))
+    assert selected.namelist() == [f"{saved_ids[1]}_Paris_France.pdf"]
+
+
+def test_combined_pdf_is_capped(app_module, application, user_client, saved_ids, monkeypatch):
+    response = user_client.get("/export?format=pdf")
+    assert response.status_code == 200 and response.data.startswith(b"%PDF-")
+
+    monkeypatch.setattr(app_module, "EXPORT_COMBINED_MAX", 1)
+    assert user_client.get("/export?format=pdf").status_code == 302
+    assert user_client.get(f"/export?format=pdf&ids={saved_ids[0]}").status_code == 200
+
+
+def test_export_only_includes_your_own_itineraries(app_module, application, saved_ids):
+    with application.app_context():
+        other = app_module.User(email="other@example.com", password="x")
+        app_module.db.session.add(other)
+        app_module.db.session.commit()
+        other_id = other.id
+    client = application.test_client()
+    with client.session_transaction() as session:
+        session["user_id"] = other_id
+
+    archive = zipfile.ZipFile(io.BytesIO(client.get(f"/export?format=zip&ids={saved_ids[0]}").data))
+    assert archive.namelist() == []
+    assert client.get("/export?format=pdf").status_code == 302
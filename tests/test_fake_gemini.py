@@ -0,0 +1,108 @@
+import asyncio
+import json
+import threading
+
+import httpx
+import pytest
+from werkzeug.serving import make_server
+
+import fake_gemini
+import loadtest
+from fake_gemini import MALFORMED_REPLY
+from model_client import ModelClientPool
+from response_parser import parse_itinerary_response
+
+GENERATE = "/v1beta/models/gemini-2.0-flash:generateContent"
+STREAM = "/v1beta/models/gemini-2.0-flash:streamGenerateContent?alt=sse"
+REQUEST = {"contents": [{"role": "user", "parts": [{"text": "Plan a trip to Tokyo"}]}]}
+
+
+def reply_text(body):
+    return body["candidates"][0]["content"]["parts"][0]["text"]
+
+
+def test_replies_carry_a_recorded_response_and_token_counts(fake_gemini):
+    body = httpx.post(fake_gemini.base_url + GENERATE,
+                      json=dict(REQUEST, tools=[{"googleSearch": {}}])).json()
+    assert reply_text(body) in fake_gemini.responses
+    assert body["candidates"][0]["groundingMetadata"]["webSearchQueries"]
+    usage = body["usageMetadata"]
+    assert usage["totalTokenCount"] == usage["promptTokenCount"] + usage["candidatesTokenCount"]
+    assert fake_gemini.stats()["output_tokens"] == usage["candidatesTokenCount"]
+
+
+def test_json_mode_returns_bare_json(fake_gemini):
+    body = httpx.post(fake_gemini.base_url + GENERATE,
+                      json=dict(REQUEST, generationConfig={"responseMimeType": "application/json"})).json()
+    assert "daily_plans" in json.loads(reply_text(body))
+
+
+def test_streamed_reply_reassembles_to_one_response(fake_gemini):
+    fake_gemini.stream_chunk = 50
+    response = httpx.post(fake_gemini.base_url + STREAM, json=REQUEST)
+    chunks = [json.loads(line[len("data: "):]) for line in response.text.splitlines() if line.startswith("data: ")]
+    assert len(chunks) > 1
+    assert "".join(reply_text(chunk) for chunk in chunks) in fake_gemini.responses
+    # Only the last chunk finishes the reply and carries the usage
+    assert "usageMetadata" in chunks[-1] and "usageMetadata" not in chunks[0]
+    assert fake_gemini.stats()["streamed"] == 1
+
+
+def test_injected_errors_and_malformed_replies(fake_gemini):
+    fake_gemini.error_rate, fake_gemini.error_statuses = 1.0, (429,)
+    response = httpx.post(fake_gemini.base_url + GENERATE, json=REQUEST)
+    assert response.status_code == 429 and response.headers["Retry-After"] == "1"
+    assert response.json()["error"]["status"] == "RESOURCE_EXHAUSTED"
+
+    fake_gemini.error_rate, fake_gemini.malformed_rate = 0.0, 1.0
+    body = httpx.post(fake_gemini.base_url + GENERATE, json=REQUEST).json()
+    assert reply_text(body) == MALFORMED_REPLY
+    stats = httpx.get(fake_gemini.base_url + "/stats").json()
+    assert (stats["calls"], stats["errors"], stats["malformed"]) == (2, 1, 1)
+
+
+def test_unparseable_recordings_are_left_out_unless_asked():
+    recorded = fake_gemini.load_responses(fake_gemini.DEFAULT_CORPUS, include_unparseable=True)
+    replayed = fake_gemini.load_responses(fake_gemini.DEFAULT_CORPUS)
+    assert len(replayed) < len(recorded)
+    for text in replayed:
+        parse_itinerary_response(text)
+
+
+@pytest.mark.parametrize("spec, low, high", [("fixed:0.5", 0.5, 0.5), ("uniform:1,2", 1, 2),
+                                             ("lognormal:6,0.5", 0, float("inf"))])
+def test_latency_specs(spec, low, high):
+    latency = fake_gemini.parse_latency(spec)
+    assert all(low <= latency() <= high for _ in range(20))
+
+
+@pytest.mark.parametrize("spec", ["fixed", "uniform:1", "normal:1,2", "fixed:soon"])
+def test_invalid_latency_specs_are_rejected(spec):
+    with pytest.raises(Exception, match="Invalid latency"):
+        fake_gemini.parse_latency(spec)
+
+
+def test_percentiles_use_the_nearest_rank():
+    ordered = [float(n) for n in range(1, 101)]
+    assert (loadtest.percentile(ordered, 50), loadtest.percentile(ordered, 99)) == (50.0, 99.0)
+    assert loadtest.percentile([0.2], 95) == 0.2 and loadtest.percentile([], 50) == 0.0
+
+
+def test_load_run_against_the_app_and_the_fake(app_module, application, fake_gemini, monkeypatch):
+    model_pool = ModelClientPool("test-key", pool_size=4, base_url=fake_gemini.base_url)
+    monkeypatch.setattr(app_module, "get_model_pool", lambda: model_pool)
+    server = make_server("127.0.0.1", 0, application, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    args = loadtest.build_parser().parse_args(["--users", "2", "--generations", "1", "--destinations", "1",
+                                               "--ramp-up", "0", "--timeout", "30",
+                                               "--base-url", f"http://127.0.0.1:{server.server_port}"])
+    try:
+        summary, _ = asyncio.run(loadtest.run_load(args))
+    finally:
+        server.shutdown()
+        model_pool.close()
+
+    assert {route: row["errors"] for route, row in summary.items()} == {
+        "POST /register": 0, "POST /login": 0, "POST /generate": 0, "GET /history": 0, "GET /download/<id>": 0}
+    assert summary["GET /download/<id>"]["requests"] == 2
+    assert 1 <= fake_gemini.stats()["calls"] <= 2
@@ -0,0 +1,91 @@
+import copy
+import threading
+import time
+
+from conftest import SAMPLE_ITINERARY
+from generation_jobs import JobManager, QueueFullError
+from test_pricing import TRIP_FORM
+
+import pytest
+
+
+def test_identical_jobs_are_shared_and_the_queue_is_bounded():
+    release = threading.Event()
+    manager = JobManager(runner=lambda params: release.wait(5) and params, max_workers=1, max_queue=1)
+    first = manager.submit("a", {"n": 1}, user_id=1)
+    assert manager.submit("a", {"n": 1}, user_id=2) is first
+    manager.submit("b", {"n": 2})
+    with pytest.raises(QueueFullError):
+        manager.submit("c", {"n": 3})
+
+    release.set()
+    assert first.wait(5) and first.status == "done"
+    assert set(first.requesters) == {1, 2}
+    assert manager.stats()["deduplicated"] == 1
+
+
+def test_another_worker_reports_a_job_from_the_shared_table(app_module, application):
+    release = threading.Event()
+    runner = lambda params: release.wait(5) and {"destination": params["destination"]}
+    accepting = JobManager(runner=runner, db=app_module.db, model=app_module.GenerationJobRecord,
+                           app_context=application.app_context)
+    # A second process: same table, its own (empty) memory
+    other = JobManager(runner=runner, db=app_module.db, model=app_module.GenerationJobRecord,
+                       poll_seconds=0.05)
+
+    with application.app_context():
+        job = accepting.submit("key", {"destination": "Lisbon"}, user_id=7)
+        seen = other.get(job.id)
+        assert seen is not None and seen.status in ("queued", "running")
+        assert not seen.wait(timeout=0.1)
+
+        release.set()
+        assert seen.wait(timeout=5)
+        assert seen.status == "done" and seen.result == {"destination": "Lisbon"}
+
+        other.add_requester(seen, 8, 42)
+        assert accepting.get(job.id).requesters[7] is None
+        assert JobManager(runner=runner, db=app_module.db,
+                          model=app_module.GenerationJobRecord).get(job.id).requesters == {7: None, 8: 42}
+        assert other.get("no-such-job") is None
+
+
+def test_abandoned_job_is_reported_failed(app_module, application):
+    manager = JobManager(runner=lambda params: params, db=app_module.db, model=app_module.GenerationJobRecord,
+                         stale_seconds=60)
+    with application.app_context():
+        app_module.db.session.add(app_module.GenerationJobRecord(
+            id="lost", key="key", status="running", params="{}", created_at=time.time() - 120))
+        app_module.db.session.commit()
+        job = manager.get("lost")
+        assert job.status == "failed" and "interrupted" in job.error
+
+
+def test_async_generation_polled_on_another_worker(app_module, application, user_client, monkeypatch):
+    release = threading.Event()
+
+    def generate(**args):
+        release.wait(5)
+        return copy.deepcopy(SAMPLE_ITINERARY)
+
+    monkeypatch.setattr(app_module, "get_or_generate_itinerary", generate)
+    response = user_client.post("/generate", data=dict(TRIP_FORM, mode="async"),
+                                headers={"Accept": "application/json"})
+    assert response.status_code == 202
+    job_id = response.get_json()["job_id"]
+
+    # Polls now reach a worker that never saw the job
+    with app_module.job_manager._lock:
+        app_module.job_manager._jobs.clear()
+    assert user_client.get(f"/jobs/{job_id}").get_json()["status"] in ("queued", "running")
+
+    release.set()
+    events = user_client.get(f"/jobs/{job_id}/events").get_data(as_text=True)
+    assert '"status": "done"' in events
+    with app_module.job_manager._lock:
+        app_module.job_manager._jobs.clear()
+    assert user_client.get(f"/jobs/{job_id}/result").status_code == 200
+    with application.app_context():
+        # Saved once, by the worker that ran the job
+        assert app_module.Itinerary.query.count() == 1
+    assert user_client.get("/jobs/no-such-job").status_code == 404
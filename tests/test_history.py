@@ -0,0 +1,55 @@
+import json
+from datetime import datetime, timedelta
+
+from conftest import SAMPLE_ITINERARY
+
+
+def add_itineraries(app_module, user_id, count):
+    """``count`` itineraries, the last two saved in the same second; returns their ids, newest first"""
+    start = datetime(2024, 5, 1, 10, 0, 0)
+    saved = []
+    for index in range(count):
+        created_at = start + timedelta(hours=min(index, count - 2))
+        itinerary = app_module.Itinerary(
+            user_id=user_id, home_country="United States", destination=f"City {index}", duration="2",
+            budget="2000", interests="food", party_size=2, total_cost=1400, day_count=2, created_at=created_at)
+        itinerary.store_itinerary_json(json.dumps(SAMPLE_ITINERARY), app_module.ITINERARY_STORAGE)
+        app_module.db.session.add(itinerary)
+        app_module.db.session.flush()
+        saved.append((created_at, itinerary.id))
+    app_module.db.session.commit()
+    return [itinerary_id for _, itinerary_id in sorted(saved, reverse=True)]
+
+
+def test_pages_follow_the_cursor_without_gaps_or_repeats(app_module, application, user_client):
+    with application.app_context():
+        newest_first = add_itineraries(app_module, 1, 7)
+
+    seen, cursor = [], None
+    while True:
+        page = user_client.get("/api/history", query_string={"limit": 3, "cursor": cursor or ""}).get_json()
+        assert len(page["items"]) <= 3
+        seen += [item["id"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == newest_first
+
+    item = user_client.get("/api/history?limit=1").get_json()["items"][0]
+    assert (item["total_cost"], item["day_count"], item["currency"]) == (1400, 2, "USD")
+
+
+def test_listing_never_loads_the_itinerary(app_module, application, user_client):
+    with application.app_context():
+        add_itineraries(app_module, 1, 2)
+        rows, next_cursor = app_module.history_page(1, limit=5)
+        assert next_cursor is None
+        assert "itinerary_data" not in rows[0]._fields and "itinerary_blob" not in rows[0]._fields
+
+
+def test_bad_cursor_and_limit_fall_back_to_the_first_page(app_module, application, user_client):
+    with application.app_context():
+        newest_first = add_itineraries(app_module, 1, 3)
+    page = user_client.get("/api/history?cursor=not-a-cursor&limit=lots").get_json()
+    assert [item["id"] for item in page["items"]] == newest_first
+    assert "City" in user_client.get("/history?limit=0").get_data(as_text=True)
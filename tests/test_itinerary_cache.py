@@ -0,0 +1,77 @@
+from conftest import SAMPLE_ITINERARY
+from itinerary_cache import ItineraryCache, make_cache_key
+
+
+def key_for(destination, budget="2000"):
+    return make_cache_key("United States", destination, "2", budget, "food", 2, "2", "gemini")
+
+
+def test_key_ignores_cosmetic_differences():
+    assert make_cache_key(" united  states", "Tokyo, Japan", "2 ", "$2,000", "Food and museums", "2", "2", "m") == \
+        make_cache_key("United States", "tokyo, japan", "2", "2000", "museums, food", 2, "2", "m")
+    assert key_for("Tokyo, Japan") != key_for("Tokyo, Japan", budget="3000")
+
+
+def test_memory_tier_ttl_and_lru_eviction(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("itinerary_cache.time.time", lambda: now[0])
+    cache = ItineraryCache(ttl_seconds=60, max_entries=2)
+
+    cache.set("a", SAMPLE_ITINERARY, "Tokyo, Japan")
+    cache.set("b", {"n": 2}, "Paris, France")
+    assert cache.get("a") == SAMPLE_ITINERARY
+    cache.set("c", {"n": 3}, "Rome, Italy")
+    # "b" was the least recently used
+    assert cache.get("b") is None and cache.get("c") == {"n": 3}
+
+    now[0] += 61
+    assert cache.get("a") is None
+    stats = cache.stats()
+    assert (stats["evictions"], stats["expirations"], stats["hits"], stats["misses"]) == (1, 1, 2, 2)
+
+
+def test_persistent_tier_is_shared_and_invalidated(app_module, application):
+    with application.app_context():
+        writer = ItineraryCache(db=app_module.db, model=app_module.CachedItinerary)
+        reader = ItineraryCache(db=app_module.db, model=app_module.CachedItinerary)
+        writer.set(key_for("Tokyo, Japan"), SAMPLE_ITINERARY, "Tokyo, Japan")
+        writer.set(key_for("Paris, France"), {"n": 2}, "Paris, France")
+
+        assert reader.get(key_for("Tokyo, Japan")) == SAMPLE_ITINERARY
+        assert reader.stats()["persistent_hits"] == 1
+
+        assert writer.invalidate_destination("  tokyo, JAPAN") == 1
+        reader._entries.clear()
+        assert reader.get(key_for("Tokyo, Japan")) is None
+        assert reader.get(key_for("Paris, France")) == {"n": 2}
+
+
+def test_persistent_tier_evicts_least_recently_used(app_module, application):
+    with application.app_context():
+        cache = ItineraryCache(db=app_module.db, model=app_module.CachedItinerary, max_persistent_entries=2)
+        for destination in ("Tokyo, Japan", "Paris, France", "Rome, Italy"):
+            cache.set(key_for(destination), {"destination": destination}, destination)
+        assert app_module.CachedItinerary.query.count() == 2
+        assert cache.peek(key_for("Tokyo, Japan")) is None
+
+
+def test_set_overwrites_a_row_inserted_concurrently(app_module, application):
+    class RacingCache(ItineraryCache):
+        """Misses the row the first time, as if another worker inserted it right after the lookup"""
+        raced = False
+
+        def _find(self, key):
+            if not self.raced:
+                self.raced = True
+                return None
+            return super()._find(key)
+
+    with application.app_context():
+        key = key_for("Tokyo, Japan")
+        ItineraryCache(db=app_module.db, model=app_module.CachedItinerary).set(key, {"n": 1}, "Tokyo, Japan")
+        cache = RacingCache(db=app_module.db, model=app_module.CachedItinerary)
+        cache.set(key, SAMPLE_ITINERARY, "Tokyo, Japan")
+
+        assert cache.raced
+        assert app_module.CachedItinerary.query.count() == 1
+        assert cache.peek(key) == SAMPLE_ITINERARY
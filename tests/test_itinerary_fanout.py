@@ -0,0 +1,79 @@
+import json
+import re
+import threading
+
+import pytest
+
+from conftest import SAMPLE_ITINERARY
+from itinerary_fanout import DayRangeError, generate_fanout, plan_day_ranges
+from prompt_builder import PromptBuilder
+
+SKELETON = {key: SAMPLE_ITINERARY[key]
+            for key in ("flight_info", "budget_breakdown", "travel_tips", "visa_requirements", "local_customs")}
+
+
+class FakeModel:
+    """Answers the skeleton and each day range; ``numbering(first, last, attempt)`` picks the day numbers"""
+
+    def __init__(self, numbering=lambda first, last, attempt: range(first, last + 1)):
+        self.numbering = numbering
+        self.attempts = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, prompt):
+        match = re.search(r"days (\d+) to (\d+)", prompt.text)
+        if match is None:
+            return json.dumps(SKELETON)
+        first, last = int(match.group(1)), int(match.group(2))
+        with self.lock:
+            attempt = self.attempts[first] = self.attempts.get(first, 0) + 1
+        days = [{"day": day, "date": "Monday", "activities": [
+            {"time": "Morning", "description": f"Sight {day}", "location": "Centre",
+             "category": "Activity", "estimated_cost": 10}]}
+            for day in self.numbering(first, last, attempt)]
+        return json.dumps({"daily_plans": days})
+
+
+def fanout(model, duration=7):
+    return generate_fanout(model, PromptBuilder(), "United States", "Tokyo, Japan", duration, "5000", "food", 2,
+                           chunk_days=3)
+
+
+def test_day_ranges_cover_the_trip():
+    assert plan_day_ranges(7, 3) == [(1, 3), (4, 6), (7, 7)]
+
+
+def test_chunks_are_stitched_in_order_and_the_budget_adds_up():
+    # Days of a chunk may come back in any order
+    itinerary = fanout(FakeModel(lambda first, last, attempt: reversed(range(first, last + 1))))
+    assert [day["day"] for day in itinerary["daily_plans"]] == list(range(1, 8))
+    breakdown = itinerary["budget_breakdown"]
+    assert breakdown["Activities"] == 70
+    assert breakdown["Total"] == sum(amount for category, amount in breakdown.items() if category != "Total")
+
+
+def test_chunk_with_the_wrong_days_is_retried():
+    # The first answer for days 4-6 restarts at day 1
+    model = FakeModel(lambda first, last, attempt: range(1, 4) if first == 4 and attempt == 1
+                      else range(first, last + 1))
+    itinerary = fanout(model)
+    assert [day["day"] for day in itinerary["daily_plans"]] == list(range(1, 8))
+    assert model.attempts == {1: 1, 4: 2, 7: 1}
+
+
+def test_chunk_that_keeps_the_wrong_days_raises():
+    model = FakeModel(lambda first, last, attempt: range(first, last) if first == 4 else range(first, last + 1))
+    with pytest.raises(DayRangeError):
+        fanout(model)
+    assert model.attempts[4] == 2
+
+
+def test_app_falls_back_to_one_call(app_module, application, pool, monkeypatch):
+    monkeypatch.setattr(app_module, "FANOUT_MIN_DAYS", 2)
+    # Every chunk reply from the pool is the whole two-day sample, so days 1-2 never match day range 1-1
+    monkeypatch.setattr(app_module, "FANOUT_CHUNK_DAYS", 1)
+    with application.app_context():
+        itinerary = app_module.generate_itinerary("United States", "Tokyo, Japan", "2", "2000", "food", 2)
+    assert [day["day"] for day in itinerary["daily_plans"]] == [1, 2]
+    assert [prompt for prompt, _ in pool.prompts if "Plan days" in prompt]
+    assert "Plan days" not in pool.prompts[-1][0]
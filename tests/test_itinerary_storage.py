@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+from conftest import SAMPLE_ITINERARY
+from itinerary_storage import (JSON_FORMAT, JSONB_FORMAT, ZLIB_FORMAT, activity_rows, decode_itinerary,
+                               encode_itinerary, storage_tag)
+from migrations import convert_itinerary_storage
+
+ITINERARY_JSON = json.dumps(SAMPLE_ITINERARY)
+
+
+@pytest.mark.parametrize("storage_format", [JSON_FORMAT, ZLIB_FORMAT])
+def test_text_formats_round_trip_exactly(storage_format):
+    columns = encode_itinerary(ITINERARY_JSON, storage_format)
+    assert columns["storage_format"] == storage_tag(storage_format)
+    assert decode_itinerary(columns["storage_format"], columns["itinerary_data"], columns["itinerary_blob"],
+                            columns["itinerary_document"]) == ITINERARY_JSON
+
+
+def test_compressed_rows_are_smaller():
+    columns = encode_itinerary(ITINERARY_JSON, ZLIB_FORMAT)
+    assert columns["itinerary_data"] == "" and len(columns["itinerary_blob"]) < len(ITINERARY_JSON) / 2
+
+
+def test_document_keeps_the_budget_breakdown_order():
+    columns = encode_itinerary(ITINERARY_JSON, JSONB_FORMAT)
+    # JSONB hands the keys back in its own order
+    document = json.loads(json.dumps(columns["itinerary_document"], sort_keys=True))
+    decoded = json.loads(decode_itinerary(JSONB_FORMAT, "", None, document))
+    assert decoded == SAMPLE_ITINERARY
+    assert list(decoded["budget_breakdown"]) == list(SAMPLE_ITINERARY["budget_breakdown"])
+
+
+def test_unknown_formats_are_refused():
+    with pytest.raises(ValueError):
+        encode_itinerary(ITINERARY_JSON, "bzip2")
+    with pytest.raises(ValueError):
+        decode_itinerary("bzip2", "", b"")
+
+
+def test_activity_rows_flatten_the_days():
+    rows = activity_rows(SAMPLE_ITINERARY)
+    assert [(row["day"], row["position"], row["estimated_cost"]) for row in rows] == \
+        [(1, 0, 0.0), (1, 1, 120.0), (2, 0, 15.0)]
+
+
+def test_rows_are_converted_in_place(app_module, application, user_client, pool):
+    from test_pricing import TRIP_FORM
+
+    user_client.post("/generate", data=dict(TRIP_FORM, currency="USD", budget="2000"))
+    with application.app_context():
+        db = app_module.db
+        with db.engine.begin() as connection:
+            assert convert_itinerary_storage(connection, JSON_FORMAT) == 1
+            assert convert_itinerary_storage(connection, JSON_FORMAT) == 0
+        itinerary = app_module.Itinerary.query.one()
+        assert itinerary.storage_format == JSON_FORMAT and itinerary.itinerary_blob is None
+        assert json.loads(itinerary.itinerary_json)["daily_plans"] == SAMPLE_ITINERARY["daily_plans"]
+        assert len(itinerary.activities) == 3
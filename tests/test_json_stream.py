@@ -0,0 +1,41 @@
+import json
+
+from conftest import SAMPLE_ITINERARY, stream_events
+from json_stream import DailyPlanStreamParser
+
+
+def test_days_are_emitted_as_soon_as_they_close():
+    text = "```json\n" + json.dumps(SAMPLE_ITINERARY, indent=2) + "\n```"
+    parser = DailyPlanStreamParser()
+
+    emitted = [(index, day) for index, char in enumerate(text) for day in parser.feed(char)]
+    assert [day for _, day in emitted] == SAMPLE_ITINERARY["daily_plans"]
+    # Day 1 is out before day 2 has started arriving
+    assert text.index('"Sushi dinner"') < emitted[0][0] < text.index('"day": 2')
+    assert parser.complete and parser.items_emitted == 2
+
+
+def test_brackets_inside_strings_and_other_arrays_are_ignored():
+    reply = {"travel_tips": [{"day": 0}], "daily_plans": [
+        {"day": 1, "activities": [{"description": "Stroll \"the {Mall}]\" [sic]", "estimated_cost": 0}]}]}
+    parser = DailyPlanStreamParser()
+    text = json.dumps(reply)
+    days = parser.feed(text[:40]) + parser.feed(text[40:])
+    assert days == reply["daily_plans"]
+
+
+def test_schema_comments_and_trailing_commas_are_repaired():
+    text = '{"daily_plans": [{"day": 1, "activities": [], // more later\n}, {"day": 2, "activities": [],},'
+    parser = DailyPlanStreamParser()
+    assert [day["day"] for day in parser.feed(text)] == [1, 2]
+    assert not parser.complete
+
+
+def test_stream_route_sends_each_day_before_the_itinerary(app_module, application, pool):
+    events = stream_events(application.test_client().post("/generate/stream", data={
+        "home_country": "United States", "destination": "Tokyo, Japan", "duration": "2", "budget": "2000",
+        "interests": "food", "party_size": "2", "bypass_cache": "on"}))
+    names = [name for name, _ in events]
+    assert names.index("day") < names.index("done") and names.count("day") == 2
+    assert [data["day"] for name, data in events if name == "day"] == [1, 2]
+    assert events[-1][1]["itinerary"]["daily_plans"] == SAMPLE_ITINERARY["daily_plans"]
@@ -0,0 +1,64 @@
+import json
+from types import SimpleNamespace
+
+from conftest import SAMPLE_ITINERARY
+from metrics import Registry, response_usage
+from test_pricing import TRIP_FORM
+
+
+class MeteredPool:
+    """Replies with SAMPLE_ITINERARY and the usage and grounding metadata Gemini reports"""
+
+    def generate_content(self, model, contents, config, timeout=None):
+        return SimpleNamespace(
+            text=json.dumps(SAMPLE_ITINERARY),
+            usage_metadata=SimpleNamespace(prompt_token_count=300, candidates_token_count=500,
+                                           tool_use_prompt_token_count=40, total_token_count=840),
+            candidates=[SimpleNamespace(grounding_metadata=SimpleNamespace(
+                web_search_queries=["flights to tokyo", "tokyo food"], grounding_chunks=None))])
+
+
+def test_prometheus_text_format():
+    registry = Registry()
+    calls = registry.counter("calls_total", "Calls", ("purpose",))
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1))
+    calls.inc(purpose='say "hi"')
+    calls.inc(2, purpose='say "hi"')
+    latency.observe(0.5)
+    lines = registry.render().splitlines()
+    assert 'calls_total{purpose="say \\"hi\\""} 3' in lines
+    assert 'latency_seconds_bucket{le="0.1"} 0' in lines and 'latency_seconds_bucket{le="+Inf"} 1' in lines
+    assert "latency_seconds_sum 0.5" in lines and "# TYPE latency_seconds histogram" in lines
+
+
+def test_usage_is_read_from_the_response():
+    usage = response_usage(MeteredPool().generate_content(None, None, None))
+    assert (usage["prompt_tokens"], usage["output_tokens"], usage["tool_prompt_tokens"]) == (300, 500, 40)
+    assert usage["search_queries"] == 2 and usage["grounded"]
+    assert response_usage(SimpleNamespace(text="{}"))["total_tokens"] == 0
+
+
+def test_every_call_and_cache_hit_is_recorded(app_module, application, monkeypatch):
+    monkeypatch.setattr(app_module, "get_model_pool", lambda: MeteredPool())
+    client = application.test_client()
+    form = dict(TRIP_FORM, currency="USD", budget="2000")
+    client.post("/generate", data=form)
+    client.post("/generate", data=form)
+
+    with application.app_context():
+        calls = app_module.ModelCall.query.order_by(app_module.ModelCall.id).all()
+    generated, hit = calls
+    assert (generated.purpose, generated.cache_hit, generated.prompt_tokens, generated.output_tokens) == \
+        ("itinerary", False, 300, 500)
+    assert generated.search_queries == 2 and generated.model_seconds is not None
+    assert generated.prompt_version == "2-search"
+    assert hit.cache_hit and hit.request_id != generated.request_id
+
+    metrics = client.get("/metrics").get_data(as_text=True)
+    assert 'travelplanner_model_tokens_total{purpose="itinerary",kind="prompt"}' in metrics
+    assert 'travelplanner_model_calls_total{purpose="itinerary",outcome="cache_hit"}' in metrics
+    assert 'travelplanner_http_request_seconds_count{route="/generate",method="POST",status="200"}' in metrics
+
+    with application.app_context():
+        usage = application.test_cli_runner().invoke(args=["model-usage", "--days", "1"]).output
+    assert "itinerary" in usage.splitlines()[1]
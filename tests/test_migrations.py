@@ -0,0 +1,117 @@
+import json
+import sqlite3
+
+from sqlalchemy import inspect, text
+
+from conftest import SAMPLE_ITINERARY
+from itinerary_storage import storage_tag
+from migrations import MIGRATIONS
+
+# The user and itinerary tables as the first release created them
+LEGACY_SCHEMA = """
+CREATE TABLE user (
+    id INTEGER PRIMARY KEY,
+    email VARCHAR(100) NOT NULL UNIQUE,
+    password VARCHAR(200) NOT NULL,
+    created_at DATETIME
+);
+CREATE TABLE itinerary (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES user (id),
+    home_country VARCHAR(100) NOT NULL,
+    destination VARCHAR(100) NOT NULL,
+    duration VARCHAR(20) NOT NULL,
+    budget VARCHAR(50) NOT NULL,
+    interests TEXT,
+    itinerary_data TEXT NOT NULL,
+    party_size INTEGER NOT NULL,
+    created_at DATETIME
+);
+"""
+
+
+def legacy_database(path):
+    connection = sqlite3.connect(path)
+    connection.executescript(LEGACY_SCHEMA)
+    connection.execute("INSERT INTO user (id, email, password, created_at) "
+                       "VALUES (1, 'legacy@example.com', 'x', '2024-05-01 10:00:00')")
+    connection.execute(
+        "INSERT INTO itinerary (id, user_id, home_country, destination, duration, budget, interests, "
+        "itinerary_data, party_size, created_at) VALUES (1, 1, 'United States', 'Tokyo, Japan', '2', '2000', "
+        "'food', ?, 2, '2024-05-01 10:05:00')", (json.dumps(SAMPLE_ITINERARY),))
+    connection.commit()
+    connection.close()
+
+
+def test_legacy_database_is_migrated(app_module, tmp_path):
+    path = tmp_path / "legacy.db"
+    legacy_database(path)
+    application = app_module.create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{path}"})
+
+    with application.app_context():
+        app_module.init_database()
+
+        db = app_module.db
+        columns = {column["name"] for column in inspect(db.engine).get_columns("itinerary")}
+        assert {"total_cost", "day_count", "itinerary_blob", "storage_format", "itinerary_document",
+                "currency"} <= columns
+        versions = [row.version for row in db.session.execute(
+            text("SELECT version FROM schema_migrations ORDER BY version"))]
+        assert versions == sorted(version for version, _, _ in MIGRATIONS)
+
+        itinerary = db.session.get(app_module.Itinerary, 1)
+        assert json.loads(itinerary.itinerary_json) == SAMPLE_ITINERARY
+        assert itinerary.storage_format == storage_tag(app_module.ITINERARY_STORAGE)
+        assert (itinerary.total_cost, itinerary.day_count) == (1400, 2)
+        assert itinerary.currency == "USD"
+        assert len(itinerary.activities) == 3
+
+        rows, next_cursor = app_module.history_page(1)
+        assert [row.id for row in rows] == [1] and next_cursor is None
+
+        # A second run has nothing left to do
+        app_module.init_database()
+        assert db.session.execute(text("SELECT COUNT(*) FROM schema_migrations")).scalar() == len(MIGRATIONS)
+
+
+def test_legacy_itinerary_is_listed_and_downloaded(app_module, tmp_path):
+    path = tmp_path / "legacy.db"
+    legacy_database(path)
+    application = app_module.create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{path}", "TESTING": True})
+    with application.app_context():
+        app_module.init_database()
+    client = application.test_client()
+    with client.session_transaction() as session:
+        session["user_id"] = 1
+
+    assert "Planned cost:</strong> $1400" in client.get("/history").get_data(as_text=True)
+    response = client.get("/download/1")
+    assert response.status_code == 200 and response.mimetype == "application/pdf"
+
+
+def test_legacy_helper_file_is_imported(app_module, tmp_path, monkeypatch):
+    import db_helper
+    import migrations
+
+    path = tmp_path / "itineraries.db"
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE itineraries (id INTEGER PRIMARY KEY AUTOINCREMENT, destination TEXT NOT NULL, "
+                       "duration TEXT NOT NULL, budget TEXT NOT NULL, interests TEXT, itinerary_data TEXT NOT NULL, "
+                       "created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)")
+    connection.execute("INSERT INTO itineraries (destination, duration, budget, interests, itinerary_data, created_at) "
+                       "VALUES ('Paris', '3', '1000', 'art', ?, '2024-05-01 10:00:00')", (json.dumps(SAMPLE_ITINERARY),))
+    connection.commit()
+    connection.close()
+    monkeypatch.setattr(migrations, "LEGACY_ITINERARIES_DB", str(path))
+
+    application = app_module.create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'app.db'}"})
+    with application.app_context():
+        app_module.init_database()
+        history = db_helper.get_user_history()
+        assert [(row["destination"], row["budget"], str(row["created_at"])) for row in history] == \
+            [("Paris", "1000", "2024-05-01 10:00:00")]
+
+        # Imported once; saving goes on in the app database
+        app_module.init_database()
+        db_helper.save_itinerary("Rome", "2", "800", "food", SAMPLE_ITINERARY)
+        assert [row["destination"] for row in db_helper.get_user_history()] == ["Rome", "Paris"]
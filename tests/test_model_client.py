@@ -0,0 +1,70 @@
+import threading
+
+import pytest
+from google.genai.types import GenerateContentConfig
+
+import model_client
+from model_client import ModelClientPool, PoolTimeoutError
+
+CONFIG = GenerateContentConfig(response_modalities=["TEXT"])
+
+
+def generate(pool, timeout=None):
+    return pool.generate_content(model="gemini-2.0-flash", contents=["Plan a trip"], config=CONFIG, timeout=timeout)
+
+
+def test_calls_reuse_one_client_and_connection(fake_gemini):
+    pool = ModelClientPool("test-key", pool_size=2, base_url=fake_gemini.base_url)
+    try:
+        assert not pool.stats()["client_ready"]
+        for _ in range(3):
+            assert "daily_plans" in generate(pool).text
+        client = pool.client
+        generate(pool)
+        assert pool.client is client
+
+        stats = pool.stats()
+        assert (stats["calls"], stats["failures"], stats["connections_opened"]) == (4, 0, 1)
+        assert fake_gemini.stats()["calls"] == 4
+    finally:
+        pool.close()
+
+
+def test_calls_in_flight_are_bounded_by_the_pool(fake_gemini):
+    pool = ModelClientPool("test-key", pool_size=2, base_url=fake_gemini.base_url)
+    try:
+        threads = [threading.Thread(target=generate, args=(pool,)) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        stats = pool.stats()
+        assert stats["calls"] == 6 and stats["max_in_flight"] == 2
+        assert stats["connections_opened"] <= 2
+    finally:
+        pool.close()
+
+
+def test_waiting_for_a_slot_times_out(fake_gemini):
+    fake_gemini.latency = lambda: 0.5
+    pool = ModelClientPool("test-key", pool_size=1, base_url=fake_gemini.base_url)
+    try:
+        busy = threading.Thread(target=generate, args=(pool,))
+        busy.start()
+        while pool.stats()["in_flight"] == 0:
+            pass
+        with pytest.raises(PoolTimeoutError):
+            generate(pool, timeout=0.05)
+        busy.join(5)
+        assert pool.stats()["slot_timeouts"] == 1
+    finally:
+        pool.close()
+
+
+def test_shared_pool_needs_an_api_key(monkeypatch):
+    monkeypatch.setattr(model_client, "_pool", None)
+    monkeypatch.delenv("GOOGLE_API_KEY")
+    with pytest.raises(EnvironmentError):
+        model_client.get_model_pool()
+    monkeypatch.setenv("GOOGLE_API_KEY", "test-key")
+    assert model_client.get_model_pool() is model_client.get_model_pool()
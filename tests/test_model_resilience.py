@@ -0,0 +1,128 @@
+import httpx
+import pytest
+
+from model_client import PoolTimeoutError
+from model_resilience import (CircuitBreaker, CircuitOpenError, ModelUnavailableError, RateLimiter,
+                              ResilientCaller)
+from response_parser import ItineraryParseError
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def failing(*errors):
+    """An attempt that raises ``errors`` in turn and then returns "ok"; records its (timeout, retries)"""
+    remaining = list(errors)
+    calls = []
+
+    def attempt(timeout, retries):
+        calls.append((timeout, retries))
+        if remaining:
+            raise remaining.pop(0)
+        return "ok"
+    attempt.calls = calls
+    return attempt
+
+
+def test_breaker_opens_fails_fast_and_closes_after_a_good_trial():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=30, clock=clock)
+    breaker.record(healthy=False)
+    assert breaker.state == "closed"
+    breaker.record(healthy=False)
+    assert breaker.state == "open" and not breaker.allow()
+    assert breaker.retry_after() == 31
+
+    clock.now = 30
+    assert breaker.allow() and breaker.state == "half_open"
+    # Only one trial at a time
+    assert not breaker.allow()
+    breaker.record(healthy=True)
+    assert breaker.state == "closed" and breaker.allow()
+    assert breaker.stats()["opened"] == 1 and breaker.stats()["rejected"] == 2
+
+
+def test_failed_trial_reopens_the_circuit():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=5, reset_seconds=10, clock=clock)
+    for _ in range(5):
+        breaker.record(healthy=False)
+    clock.now = 10
+    assert breaker.allow()
+    breaker.record(healthy=False)
+    assert breaker.state == "open" and breaker.retry_after() == 11
+
+
+def test_retries_with_backoff_within_the_deadline():
+    clock = Clock()
+    caller = ResilientCaller(CircuitBreaker(clock=clock), max_attempts=3, attempt_timeout=60, deadline=150,
+                             clock=clock, sleep=clock.sleep)
+    attempt = failing(httpx.ConnectTimeout("slow"), httpx.ConnectError("reset"))
+    assert caller.call(attempt) == "ok"
+    assert [retries for _, retries in attempt.calls] == [0, 1, 2]
+    assert all(timeout <= 60 for timeout, _ in attempt.calls)
+    assert caller.stats()["retries"] == 2 and caller.breaker.state == "closed"
+
+
+def test_upstream_failures_outlasting_the_retries_make_the_model_unavailable():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=3, clock=clock)
+    caller = ResilientCaller(breaker, max_attempts=3, clock=clock, sleep=clock.sleep)
+    with pytest.raises(ModelUnavailableError):
+        caller.call(failing(*[httpx.ReadTimeout("slow")] * 3))
+    assert breaker.state == "open"
+
+    attempt = failing()
+    with pytest.raises(CircuitOpenError) as raised:
+        caller.call(attempt)
+    assert attempt.calls == [] and raised.value.retry_after > 0
+
+
+def test_malformed_replies_are_retried_without_opening_the_circuit():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=1, clock=clock)
+    caller = ResilientCaller(breaker, max_attempts=2, clock=clock, sleep=clock.sleep)
+    with pytest.raises(ItineraryParseError):
+        caller.call(failing(ItineraryParseError("no json"), ItineraryParseError("no json")))
+    assert breaker.state == "closed"
+
+    # Our own mistakes are neither retried nor held against the model
+    attempt = failing(ValueError("bad request"))
+    with pytest.raises(ValueError):
+        caller.call(attempt)
+    assert len(attempt.calls) == 1 and breaker.state == "closed"
+
+
+def test_pool_and_rate_limit_saturation():
+    clock = Clock()
+    caller = ResilientCaller(CircuitBreaker(clock=clock), limiter=RateLimiter(2, clock=clock, sleep=clock.sleep),
+                             deadline=10, clock=clock, sleep=clock.sleep)
+    with pytest.raises(ModelUnavailableError):
+        caller.call(failing(PoolTimeoutError("busy")))
+    assert caller.breaker.state == "closed"
+
+    assert caller.call(failing()) == "ok"
+    # The bucket is empty and the next token is 30 s away, past the 10 s deadline
+    with pytest.raises(ModelUnavailableError):
+        caller.call(failing())
+    assert caller.stats()["throttled"] == 1
+
+
+def test_open_circuit_answers_503_with_retry_after(app_module, application, monkeypatch):
+    def unavailable(**args):
+        raise CircuitOpenError("The itinerary planner is unavailable right now. Please try again shortly.",
+                               retry_after=12)
+
+    monkeypatch.setattr(app_module, "get_or_generate_itinerary", unavailable)
+    response = application.test_client().post("/generate", data={
+        "home_country": "United States", "destination": "Tokyo, Japan", "duration": "2", "budget": "2000",
+        "interests": "food", "party_size": "2"})
+    assert response.status_code == 503 and response.headers["Retry-After"] == "12"
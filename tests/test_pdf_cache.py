@@ -0,0 +1,60 @@
+import os
+
+from pdf_cache import PdfCache, RENDERER_VERSION, itinerary_content_hash
+from test_pricing import TRIP_FORM
+
+
+def write(text):
+    return lambda path: open(path, "w").write(text)
+
+
+def test_renders_are_kept_per_content_and_renderer_version(tmp_path):
+    cache = PdfCache(str(tmp_path))
+    content_hash = itinerary_content_hash({"day": 1}, "Tokyo", "classic")
+    assert content_hash != itinerary_content_hash({"day": 1}, "Tokyo", "modern")
+
+    assert cache.get(1, content_hash) is None
+    path = cache.get_or_render(1, content_hash, write("first"))
+    assert cache.get_or_render(1, content_hash, write("second")) == path
+    assert open(path).read() == "first"
+    assert cache.get(1, content_hash, renderer_version=RENDERER_VERSION + "-next") is None
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (1, 3)
+    assert [name for name in os.listdir(tmp_path) if name.endswith(".tmp")] == []
+
+
+def test_least_recently_used_renders_are_evicted(tmp_path):
+    cache = PdfCache(str(tmp_path), max_files=2)
+    paths = [cache.put(itinerary_id, "hash", write("pdf")) for itinerary_id in (1, 2)]
+    os.utime(paths[0], (1, 1))
+    os.utime(paths[1], (2, 2))
+    cache.get(1, "hash")
+    cache.put(3, "hash", write("pdf"))
+
+    assert cache.get(2, "hash") is None
+    assert cache.get(1, "hash") and cache.get(3, "hash")
+    assert cache.stats()["evictions"] == 1
+
+
+def test_download_is_rendered_once_and_revalidated(app_module, application, user_client, pool, tmp_path,
+                                                   monkeypatch):
+    monkeypatch.setattr(app_module, "pdf_cache", PdfCache(str(tmp_path / "pdf_cache")))
+    user_client.post("/generate", data=TRIP_FORM)
+    with application.app_context():
+        itinerary_id = app_module.Itinerary.query.one().id
+
+    first = user_client.get(f"/download/{itinerary_id}")
+    assert first.status_code == 200 and first.mimetype == "application/pdf"
+    etag = first.headers["ETag"].strip('"')
+    assert etag.endswith(f"-v{RENDERER_VERSION}")
+    assert "private" in first.headers["Cache-Control"]
+
+    second = user_client.get(f"/download/{itinerary_id}")
+    assert second.data == first.data
+    assert app_module.pdf_cache.stats()["hits"] == 1
+
+    unchanged = user_client.get(f"/download/{itinerary_id}", headers={"If-None-Match": f'"{etag}"'})
+    assert unchanged.status_code == 304 and unchanged.data == b""
+
+    # Priced in another currency it is another document
+    other = user_client.get(f"/download/{itinerary_id}?currency=EUR", headers={"If-None-Match": f'"{etag}"'})
+    assert other.status_code == 200 and other.headers["ETag"].strip('"') != etag
@@ -0,0 +1,64 @@
+from conftest import SAMPLE_ITINERARY
+from pdf_generator import PdfRenderer
+
+DETAILS = {"home_country": "United States", "destination": "Tokyo, Japan", "duration": "2", "budget": "2000",
+           "interests": "food", "time_difference": "13 hours ahead", "party_size": 2}
+
+
+def test_pdf_is_built_in_memory_and_rewound():
+    pdf = PdfRenderer().render(SAMPLE_ITINERARY, DETAILS)
+    assert not pdf._rolled
+    assert pdf.tell() == 0 and pdf.read(5) == b"%PDF-"
+
+
+def test_large_pdf_spills_to_disk(tmp_path):
+    pdf = PdfRenderer(spool_max_bytes=1024).render(SAMPLE_ITINERARY, DETAILS)
+    assert pdf._rolled and pdf.read(5) == b"%PDF-"
+
+    path = tmp_path / "itinerary.pdf"
+    assert PdfRenderer().render(SAMPLE_ITINERARY, DETAILS, output=str(path)) == str(path)
+    assert path.read_bytes().startswith(b"%PDF-")
+
+
+def test_anonymous_download_is_served_from_memory(app_module, application, pool, tmp_path, monkeypatch):
+    from pdf_cache import PdfCache
+
+    monkeypatch.setattr(app_module, "pdf_cache", PdfCache(str(tmp_path / "pdf_cache")))
+    client = application.test_client()
+    client.post("/generate", data={"home_country": "United States", "destination": "Tokyo, Japan", "duration": "2",
+                                   "budget": "2000", "interests": "food", "party_size": "2"})
+    with client.session_transaction() as session:
+        itinerary_id = session["temp_itinerary_id"]
+
+    response = client.get(f"/download/{itinerary_id}")
+    assert response.status_code == 200 and response.data.startswith(b"%PDF-")
+    # One-off renders never reach the disk cache
+    assert app_module.pdf_cache.stats()["files"] == 0
+
+
+def test_every_listed_template_is_registered_and_renders():
+    from pdf_generator import TEMPLATES
+    from pdf_templates import TEMPLATE_LABELS
+
+    renderer = PdfRenderer()
+    assert set(TEMPLATES) == set(TEMPLATE_LABELS)
+    assert renderer.choices() == list(TEMPLATE_LABELS.items())
+    for name in TEMPLATES:
+        assert renderer.render(SAMPLE_ITINERARY, DETAILS, template=name).read(5) == b"%PDF-"
+    assert renderer.template_name("no-such-template") == "classic"
+
+
+def test_one_renderer_serves_concurrent_renders():
+    from concurrent.futures import ThreadPoolExecutor
+
+    renderer = PdfRenderer()
+    styles = renderer.templates["classic"].normal_style
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        pdfs = list(executor.map(lambda template: renderer.render(SAMPLE_ITINERARY, DETAILS, template=template).read(),
+                                 ["classic", "compact"] * 4))
+    assert all(pdf.startswith(b"%PDF-") and pdf.rstrip().endswith(b"%%EOF") for pdf in pdfs)
+    # Styles were built once, not per render
+    assert renderer.templates["classic"].normal_style is styles
+    # Older itineraries keep their tips under "tips"
+    legacy = {key: value for key, value in SAMPLE_ITINERARY.items() if key != "travel_tips"}
+    assert renderer.render(dict(legacy, tips=["Carry cash"]), DETAILS).read(5) == b"%PDF-"
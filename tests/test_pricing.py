@@ -0,0 +1,116 @@
+import copy
+
+import pytest
+
+from conftest import SAMPLE_ITINERARY, stream_events
+
+TRIP_FORM = {
+    "home_country": "United States",
+    "destination": "Tokyo, Japan",
+    "duration": "2",
+    "budget": "300000",
+    "interests": "food",
+    "style": "classic",
+    "currency": "JPY",
+    "party_size": "2",
+}
+
+
+def test_model_budget_round_trip(app_module):
+    assert app_module.model_budget("300000", "JPY") == "2000"
+    assert app_module.model_budget("2000", "USD") == "2000"
+    assert app_module.convert_budget(app_module.model_budget("1000", "EUR"), "USD", "EUR") == "€1000"
+
+
+def test_reprice_currency_round_trip(app_module):
+    engine = app_module.get_pricing_engine()
+    in_yen = engine.reprice(SAMPLE_ITINERARY, "JPY")
+    assert in_yen["currency"] == "JPY"
+    assert in_yen["flight_info"]["estimated_flight_cost"] == 135000
+    assert in_yen["budget_breakdown"]["Total"] == 210000
+
+    back = engine.reprice(in_yen, "USD")
+    assert back["currency"] == "USD"
+    assert back["budget_breakdown"] == SAMPLE_ITINERARY["budget_breakdown"]
+    assert back["daily_plans"] == SAMPLE_ITINERARY["daily_plans"]
+    assert "currency" not in SAMPLE_ITINERARY
+
+
+def test_reprice_party_round_trip(app_module):
+    engine = app_module.get_pricing_engine()
+    for_four = engine.reprice(SAMPLE_ITINERARY, party_size=4, from_party_size=2)
+    breakdown = for_four["budget_breakdown"]
+    # Per-person categories double; the room and transport are shared
+    assert (breakdown["Flights"], breakdown["Food"], breakdown["Accommodation"]) == (1800, 270, 300)
+    assert breakdown["Total"] == sum(amount for category, amount in breakdown.items() if category != "Total")
+
+    back = engine.reprice(for_four, party_size=2, from_party_size=4)
+    assert back["budget_breakdown"] == SAMPLE_ITINERARY["budget_breakdown"]
+
+
+def test_reprice_unknown_currency(app_module):
+    from exchange_rates import UnknownCurrencyError
+
+    with pytest.raises(UnknownCurrencyError):
+        app_module.get_pricing_engine().reprice(SAMPLE_ITINERARY, "XXX")
+
+
+def test_saved_in_usd_and_shown_in_form_currency(app_module, application, user_client, monkeypatch):
+    requested = []
+
+    def generate(**args):
+        requested.append(args)
+        return copy.deepcopy(SAMPLE_ITINERARY)
+
+    monkeypatch.setattr(app_module, "get_or_generate_itinerary", generate)
+    page = user_client.post("/generate", data=TRIP_FORM).get_data(as_text=True)
+    assert requested[0]["budget"] == "2000"
+    assert "¥210000" in page
+
+    with application.app_context():
+        itinerary = app_module.Itinerary.query.one()
+        assert (itinerary.budget, itinerary.currency, itinerary.total_cost) == ("2000", "JPY", 1400)
+        assert max(activity.estimated_cost for activity in itinerary.activities) == 120
+        itinerary_id = itinerary.id
+
+    history = user_client.get("/history").get_data(as_text=True)
+    assert "<strong>Budget:</strong> ¥300000" in history
+    assert "<strong>Planned cost:</strong> ¥210000" in history
+
+    pricing = user_client.get(f"/api/itineraries/{itinerary_id}/pricing").get_json()
+    assert (pricing["currency"], pricing["budget"]) == ("JPY", "¥300000")
+    assert pricing["itinerary"]["budget_breakdown"]["Total"] == 210000
+
+    pricing = user_client.get(f"/api/itineraries/{itinerary_id}/pricing?currency=usd&party_size=4").get_json()
+    assert (pricing["currency"], pricing["party_size"], pricing["budget"]) == ("USD", 4, "2000")
+    assert pricing["itinerary"]["budget_breakdown"]["Flights"] == 1800
+
+    assert user_client.get(f"/api/itineraries/{itinerary_id}/pricing?currency=XXX").status_code == 400
+
+
+@pytest.mark.parametrize("mode", ["sync", "async", "stream"])
+def test_unknown_currency_is_rejected(app_module, application, pool, mode):
+    client = application.test_client()
+    form = dict(TRIP_FORM, currency="XYZ")
+    if mode == "stream":
+        response = client.post("/generate/stream", data=form)
+        assert response.status_code == 400
+        assert stream_events(response) == [("error", {"error": "Unknown currency: XYZ"})]
+    else:
+        if mode == "async":
+            form["mode"] = "async"
+        response = client.post("/generate", data=form)
+        assert response.status_code == 400
+        assert "Unknown currency: XYZ" in response.get_data(as_text=True)
+    assert pool.prompts == []
+
+
+def test_similar_trip_notice_is_in_form_currency(app_module, application, pool):
+    args = ("United States", "Tokyo, Japan", "2", "2000", "food", 2)
+    with application.app_context():
+        app_module.cache_itinerary(app_module.itinerary_cache_key(*args), copy.deepcopy(SAMPLE_ITINERARY), args)
+
+    page = application.test_client().post("/generate", data=dict(TRIP_FORM, budget="1050", currency="EUR"))
+    body = page.get_data(as_text=True)
+    assert "a budget of €1000 for a party of 2" in body
+    assert pool.prompts == []
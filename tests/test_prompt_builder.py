@@ -0,0 +1,72 @@
+import pytest
+
+from prompt_builder import ITINERARY_SECTIONS, LEGACY_VERSION, PromptBuilder, compact_schema, itinerary_schema
+from test_pricing import TRIP_FORM
+
+TRIP = ("United States", "Tokyo, Japan", "3", "2000", "food", 2)
+
+
+def test_compact_schema_renders_one_line():
+    schema = itinerary_schema(("flight_info", "visa_requirements"))
+    assert compact_schema(schema) == (
+        '{"flight_info":{"estimated_flight_duration":str(e.g. 11 hours),"recommended_airlines":[str],'
+        '"flight_link":[str(booking URL, one per airline)],"estimated_flight_cost":number},'
+        '"visa_requirements":str(brief)}')
+    assert '"category":"Activity"|"Food"|"Transportation"|"Accommodation"' in compact_schema(
+        itinerary_schema(("daily_plans",)))
+
+
+@pytest.mark.parametrize("grounding, itinerary, days", [("all", True, True), ("route", True, False),
+                                                        ("none", False, False)])
+def test_grounding_modes(grounding, itinerary, days):
+    builder = PromptBuilder(grounding=grounding)
+    assert builder.itinerary(*TRIP).grounded is itinerary
+    day_prompt = builder.days(*TRIP, 1, 2, {"Food": 50})
+    assert day_prompt.grounded is days
+    assert day_prompt.version == ("2-search" if days else "2-json")
+    # Only grounded prompts spell the schema out
+    assert ('"daily_plans":[{' in day_prompt.text) is days
+
+
+def test_json_mode_config_sends_the_schema_and_no_tools():
+    builder = PromptBuilder(grounding="none")
+    prompt = builder.itinerary(*TRIP)
+    config = builder.config(prompt)
+    assert config.response_mime_type == "application/json" and not config.tools
+    assert list(config.response_schema["properties"]) == list(ITINERARY_SECTIONS)
+    assert builder.config(builder.itinerary("Canada", "Paris, France", "5", "3000", "art", 1)) is config
+
+
+def test_grounded_config_uses_search_without_a_schema():
+    builder = PromptBuilder(grounding="all")
+    config = builder.config(builder.itinerary(*TRIP))
+    assert config.tools[0].google_search is not None and config.response_schema is None
+
+
+def test_legacy_prompts_are_always_grounded_and_longer():
+    legacy = PromptBuilder(LEGACY_VERSION, grounding="none").itinerary(*TRIP)
+    compact = PromptBuilder(grounding="none").itinerary(*TRIP)
+    assert legacy.grounded and legacy.version == LEGACY_VERSION
+    assert len(compact.text) < len(legacy.text) / 2
+    assert PromptBuilder(LEGACY_VERSION).cache_version != PromptBuilder().cache_version != \
+        PromptBuilder(grounding="none").cache_version
+
+
+@pytest.mark.parametrize("version, grounding", [("3", "route"), ("2", "sometimes")])
+def test_unknown_settings_are_configuration_errors(version, grounding):
+    with pytest.raises(EnvironmentError):
+        PromptBuilder(version, grounding)
+
+
+def test_json_mode_generation_is_recorded_unrepaired(app_module, application, pool, monkeypatch):
+    monkeypatch.setattr(app_module, "prompts", PromptBuilder(grounding="none"))
+    response = application.test_client().post("/generate", data=dict(TRIP_FORM, bypass_cache="on"))
+    assert response.status_code == 200
+
+    prompt, config = pool.prompts[0]
+    assert config.response_mime_type == "application/json"
+    assert "Reply with only this JSON object" not in prompt
+    with application.app_context():
+        call = app_module.ModelCall.query.filter_by(purpose="itinerary").one()
+        assert (call.prompt_version, call.repaired, call.grounded) == ("2-json", False, False)
+
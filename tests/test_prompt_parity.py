@@ -0,0 +1,35 @@
+from conftest import stream_events
+from test_pricing import TRIP_FORM
+
+
+def test_stream_and_sync_send_the_same_prompt(app_module, application, pool):
+    form = dict(TRIP_FORM, bypass_cache="on")
+    client = application.test_client()
+
+    def forget_route():
+        # Each path learns the route from its reply; the other must start from the same table
+        with application.app_context():
+            app_module.RouteKnowledge.query.delete()
+            app_module.db.session.commit()
+
+    assert client.post("/generate", data=form).status_code == 200
+    forget_route()
+    events = stream_events(client.post("/generate/stream", data=form))
+    assert events[-1][0] == "done"
+
+    (sync_prompt, sync_config), (stream_prompt, stream_config) = pool.prompts
+    assert stream_prompt == sync_prompt
+    assert stream_config == sync_config
+    # Prompted in USD, not in the form's yen
+    assert "2000" in sync_prompt and "300000" not in sync_prompt
+
+
+def test_stream_shows_costs_in_form_currency(app_module, application, pool):
+    client = application.test_client()
+    events = stream_events(client.post("/generate/stream", data=dict(TRIP_FORM, bypass_cache="on")))
+
+    days = [data for name, data in events if name == "day"]
+    assert [activity["estimated_cost"] for activity in days[0]["activities"]] == [0, 18000]
+    done = events[-1][1]
+    assert done["itinerary"]["currency"] == "JPY"
+    assert done["itinerary"]["budget_breakdown"]["Total"] == 210000
@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+from conftest import SAMPLE_ITINERARY
+from response_parser import MISSING_TEXT, ItineraryParseError, parse_itinerary_response, parse_json_object
+
+
+def test_well_formed_reply_in_a_code_fence():
+    result = parse_itinerary_response("```json\n" + json.dumps(SAMPLE_ITINERARY) + "\n```")
+    assert result.data == SAMPLE_ITINERARY
+    assert not result.repaired and result.issues == []
+
+
+def test_comments_and_trailing_commas_are_removed():
+    text = '{"daily_plans": [{"day": 1, "activities": [{"description": "Walk // not a comment",' \
+           ' "estimated_cost": "$1,200",}, // more activities\n]}], /* tips */ "travel_tips": ["a",],}'
+    result = parse_itinerary_response(text)
+    assert result.repaired and set(result.issues) >= {"comments", "trailing_commas"}
+    activity = result.data["daily_plans"][0]["activities"][0]
+    assert activity["description"] == "Walk // not a comment"
+    assert activity["estimated_cost"] == 1200
+    assert result.data["travel_tips"] == ["a"]
+
+
+def test_truncated_reply_keeps_the_finished_days():
+    text = json.dumps(SAMPLE_ITINERARY)
+    cut = text[:text.index('"Ramen lunch"') + 5]
+    result = parse_itinerary_response(cut)
+    assert "truncated" in result.issues
+    assert [day["day"] for day in result.data["daily_plans"]] == [1, 2]
+    assert result.data["daily_plans"][1]["activities"] == []
+    # The breakdown came after the cut, so it is rebuilt from the activities
+    assert "rebuilt_budget_breakdown" in result.issues
+    assert result.data["budget_breakdown"]["Total"] == 900 + 120
+    assert result.data["visa_requirements"] == MISSING_TEXT
+
+
+@pytest.mark.parametrize("text", ["", "no json here", '{"daily_plans": []}', '{"a": 1]}'])
+def test_unusable_replies_raise(text):
+    with pytest.raises(ItineraryParseError):
+        parse_itinerary_response(text)
+
+
+def test_first_object_is_used():
+    data, issues = parse_json_object('Here you go: {"a": {"b": [1, 2]}} and {"c": 3}')
+    assert data == {"a": {"b": [1, 2]}} and issues == []
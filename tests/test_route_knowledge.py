@@ -0,0 +1,33 @@
+import copy
+
+from conftest import SAMPLE_ITINERARY
+from prompt_builder import LEGACY_VERSION, PromptBuilder
+
+
+def test_route_prompt_asks_for_a_fare_per_traveler():
+    for version in (LEGACY_VERSION, "2"):
+        text = PromptBuilder(version).route_knowledge("United States", "Tokyo, Japan").text
+        assert "round-trip economy fare for one traveler" in text
+
+
+def test_flight_cost_is_stored_per_person(app_module, application):
+    store = app_module.route_knowledge_store
+    with application.app_context():
+        # Planned for two: 900 for the party
+        store.remember("United States", "Tokyo, Japan", copy.deepcopy(SAMPLE_ITINERARY), party_size=2)
+        assert store.lookup("united states", "tokyo, japan")["flight_info"]["estimated_flight_cost"] == 450
+        assert store.lookup("United States", "Tokyo, Japan", 4)["flight_info"]["estimated_flight_cost"] == 1800
+
+
+def test_known_route_prompt_prices_flights_for_the_party(app_module, application, monkeypatch):
+    fetched = {key: copy.deepcopy(SAMPLE_ITINERARY[key])
+               for key in ("flight_info", "visa_requirements", "local_customs")}
+    monkeypatch.setattr(app_module.route_knowledge_store, "fetch", lambda home_country, destination: fetched)
+    with application.app_context():
+        # A route fetched on its own is priced for one traveler
+        app_module.route_knowledge_store.refresh("United States", "Tokyo, Japan")
+        prompt, route_knowledge = app_module.build_prompt_for_route(
+            "United States", "Tokyo, Japan", "2", "2000", "food", 2)
+    assert prompt.kind == "trip"
+    assert route_knowledge["flight_info"]["estimated_flight_cost"] == 1800
+    assert "Flights are already booked at about 1800" in prompt.text
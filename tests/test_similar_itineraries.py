@@ -0,0 +1,120 @@
+import copy
+
+import pytest
+
+from conftest import SAMPLE_ITINERARY
+from itinerary_cache import normalize_request
+from prompt_builder import PromptBuilder
+from similar_itineraries import SimilarityIndex, interest_terms, rescale_costs
+
+FORM = {"home_country": "United States", "destination": "Tokyo, Japan", "duration": "2", "budget": "2000",
+        "interests": "food", "style": "classic", "currency": "USD", "party_size": "2"}
+
+
+def request(budget=2000, party_size=2, interests="food, museums", home_country="United States", duration=2):
+    return normalize_request(home_country, "Tokyo, Japan", duration, budget, interests, party_size)
+
+
+class Candidates:
+    """Cached requests for SimilarityIndex, with the keys whose itineraries have expired"""
+
+    def __init__(self, *requests):
+        self.entries = [(f"key-{number}", request) for number, request in enumerate(requests)]
+        self.expired = set()
+        self.loads = 0
+
+    def __call__(self, destination):
+        self.loads += 1
+        return list(self.entries)
+
+    def load(self, key):
+        return None if key in self.expired else dict(copy.deepcopy(SAMPLE_ITINERARY), key=key)
+
+
+def test_interest_terms_drop_stop_words_and_plurals():
+    assert interest_terms(["museums and art", "the temples", "glass"]) == ["art", "glass", "museum", "temple"]
+
+
+def test_rescaling_to_a_bigger_budget_scales_every_cost():
+    data = rescale_costs(SAMPLE_ITINERARY, 2000, 2, 2400, 2)
+    assert data["budget_breakdown"]["Total"] == 1680
+    assert data["flight_info"]["estimated_flight_cost"] == 1080
+    assert data["daily_plans"][0]["activities"][1]["estimated_cost"] == 144
+    assert SAMPLE_ITINERARY["budget_breakdown"]["Total"] == 1400
+
+
+def test_rescaling_to_a_bigger_party_shifts_the_budget_to_per_person_costs():
+    data = rescale_costs(SAMPLE_ITINERARY, 2000, 2, 2000, 4)
+    breakdown = data["budget_breakdown"]
+    # Same share of the same budget (give or take rounding the categories), with more of it on
+    # flights and food and less on the shared room
+    assert breakdown["Total"] == sum(amount for category, amount in breakdown.items() if category != "Total")
+    assert abs(breakdown["Total"] - 1400) <= 1
+    assert breakdown["Flights"] > 900 and breakdown["Accommodation"] < 300
+
+
+def test_most_similar_interests_then_closest_budget_win():
+    candidates = Candidates(request(budget=2400, interests="museums, food"),
+                            request(budget=1900, interests="food, museums"),
+                            request(budget=2000, interests="food, nightlife"))
+    index = SimilarityIndex(candidates, candidates.load)
+    itinerary_data, match = index.find(request())
+    assert itinerary_data["key"] == "key-1"
+    assert match == {"budget": 1900.0, "party_size": 2, "similarity": 1.0}
+    assert abs(itinerary_data["budget_breakdown"]["Total"] - 1400 * 2000 / 1900) <= 1
+
+
+@pytest.mark.parametrize("changes", [{"home_country": "Canada"}, {"duration": 3}, {"budget": 3000},
+                                     {"party_size": 5}, {"interests": "nightlife, shopping"}])
+def test_requests_too_far_from_every_cached_trip_miss(changes):
+    candidates = Candidates(request())
+    index = SimilarityIndex(candidates, candidates.load)
+    assert index.find(request(**changes)) is None
+    assert index.stats()["matches"] == 0
+
+
+def test_expired_itinerary_falls_through_to_the_next_match():
+    candidates = Candidates(request(), request(budget=2200))
+    candidates.expired.add("key-0")
+    index = SimilarityIndex(candidates, candidates.load)
+    assert index.find(request())[0]["key"] == "key-1"
+    assert (index.stats()["expired"], index.stats()["matches"]) == (1, 1)
+
+
+def test_index_is_rebuilt_after_forget():
+    candidates = Candidates(request())
+    index = SimilarityIndex(candidates, candidates.load)
+    index.find(request())
+    index.find(request())
+    assert candidates.loads == 1
+    index.forget("tokyo, japan")
+    index.find(request())
+    assert candidates.loads == 2 and index.stats()["rebuilds"] == 2
+
+
+def test_similar_trip_is_served_with_a_notice(app_module, application, pool):
+    args = ("United States", "Tokyo, Japan", "2", "2200", "food", 2)
+    with application.app_context():
+        app_module.cache_itinerary(app_module.itinerary_cache_key(*args), copy.deepcopy(SAMPLE_ITINERARY), args)
+
+    client = application.test_client()
+    body = client.post("/generate", data=FORM).get_data(as_text=True)
+    assert "planned for a very similar trip" in body
+    assert pool.prompts == []
+
+    # Asking for exactly this trip generates one
+    body = client.post("/generate", data=dict(FORM, exact_match="on")).get_data(as_text=True)
+    assert "planned for a very similar trip" not in body
+    assert len(pool.prompts) == 1
+
+
+def test_itineraries_of_another_prompt_version_are_not_reused(app_module, application, pool, monkeypatch):
+    args = ("United States", "Tokyo, Japan", "2", "2200", "food", 2)
+    monkeypatch.setattr(app_module, "prompts", PromptBuilder(grounding="none"))
+    with application.app_context():
+        app_module.cache_itinerary(app_module.itinerary_cache_key(*args), copy.deepcopy(SAMPLE_ITINERARY), args)
+    monkeypatch.setattr(app_module, "prompts", PromptBuilder(grounding="route"))
+
+    body = application.test_client().post("/generate", data=FORM).get_data(as_text=True)
+    assert "planned for a very similar trip" not in body
+    assert pool.prompts
@@ -0,0 +1,110 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def run_concurrently(flight, fn, callers):
+    results = [None] * callers
+    threads = [threading.Thread(target=lambda i=i: results.__setitem__(i, flight.do("key", fn)))
+               for i in range(callers)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def test_concurrent_callers_share_one_call_and_own_their_copy():
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def generate():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {"days": [1, 2]}
+
+    flight = SingleFlight()
+    threads, results = run_concurrently(flight, generate, 1)
+    started.wait(5)
+    followers, follower_results = run_concurrently(flight, generate, 3)
+    while flight.stats()["coalesced"] < 3:
+        pass
+    release.set()
+    for thread in threads + followers:
+        thread.join(5)
+
+    everyone = results + follower_results
+    assert calls == [1]
+    assert all(result == {"days": [1, 2]} for result in everyone)
+    # Changing one caller's itinerary leaves everyone else's alone, the leader's included
+    everyone[0]["days"].append(3)
+    everyone[1]["days"].clear()
+    assert everyone[2] == {"days": [1, 2]} and everyone[3] == {"days": [1, 2]}
+    assert flight.stats()["leaders"] == 1 and flight.stats()["in_flight"] == 0
+
+
+def test_followers_get_the_leaders_exception():
+    started, release = threading.Event(), threading.Event()
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise Exception("Failed to generate itinerary")
+
+    flight = SingleFlight()
+    errors = []
+
+    def call():
+        try:
+            flight.do("key", fail)
+        except Exception as e:
+            errors.append(str(e))
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=call)
+    follower.start()
+    while flight.stats()["coalesced"] < 1:
+        pass
+    release.set()
+    leader.join(5)
+    follower.join(5)
+    assert errors == ["Failed to generate itinerary"] * 2
+    assert flight.stats()["failures"] == 1
+
+
+def test_lock_row_held_by_another_process(app_module, application):
+    with application.app_context():
+        flight = SingleFlight(db=app_module.db, model=app_module.GenerationLock, wait_seconds=5,
+                              poll_interval=0.01)
+        other = SingleFlight(db=app_module.db, model=app_module.GenerationLock)
+        token = other._acquire("key")
+        stored = []
+
+        def finish():
+            stored.append({"from": "other"})
+            with application.app_context():
+                other._release("key", token)
+
+        release = threading.Timer(0.1, finish)
+        release.start()
+        result = flight.do("key", lambda: pytest.fail("generated a second time"),
+                           recheck=lambda: stored[0] if stored else None)
+        assert result == {"from": "other"}
+        assert flight.stats()["remote_coalesced"] == 1
+
+
+def test_expired_lock_is_taken_over(app_module, application):
+    with application.app_context():
+        app_module.db.session.add(app_module.GenerationLock(
+            key="key", owner="crashed", acquired_at=datetime.utcnow() - timedelta(hours=1),
+            expires_at=datetime.utcnow() - timedelta(minutes=1)))
+        app_module.db.session.commit()
+
+        flight = SingleFlight(db=app_module.db, model=app_module.GenerationLock)
+        assert flight.do("key", lambda: {"fresh": True}) == {"fresh": True}
+        assert flight.stats()["takeovers"] == 1
+        assert app_module.GenerationLock.query.count() == 0
@@ -0,0 +1,41 @@
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+
+from conftest import ROOT
+
+# Run in a fresh interpreter, so modules other tests loaded do not count
+STARTUP = """
+import json, sys
+import app
+application = app.create_app()
+loaded = {"after_create_app": [name for name in ("google.genai", "reportlab") if name in sys.modules]}
+client = application.test_client()
+loaded["index"] = client.get("/").status_code
+loaded["health"] = client.get("/health").get_json()["model_pool"]
+loaded["after_requests"] = [name for name in ("google.genai", "reportlab") if name in sys.modules]
+print(json.dumps(loaded))
+"""
+
+
+def test_startup_loads_nothing_heavy_and_leaves_the_database_alone(tmp_path):
+    db_path = tmp_path / "startup.db"
+    env = dict(os.environ, SQLITE_DB_PATH=str(db_path), PDF_CACHE_DIR=str(tmp_path / "pdf_cache"))
+    env.pop("GOOGLE_API_KEY")
+    completed = subprocess.run([sys.executable, "-c", STARTUP], cwd=ROOT, env=env,
+                               capture_output=True, text=True, timeout=60)
+    assert completed.returncode == 0, completed.stderr
+    loaded = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    assert loaded["after_create_app"] == []
+    # The form page lists the PDF templates without ReportLab, and a missing key is reported, not raised
+    assert loaded["index"] == 200
+    assert "GOOGLE_API_KEY" in loaded["health"]["error"]
+    assert loaded["after_requests"] == []
+
+    if db_path.exists():
+        with sqlite3.connect(db_path) as connection:
+            assert connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall() == []
+
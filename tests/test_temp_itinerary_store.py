@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+from conftest import SAMPLE_ITINERARY
+from temp_itinerary_store import DatabaseTempItineraryStore, FileTempItineraryStore, KeyValueTempItineraryStore
+
+ENTRY = {"itinerary_data": SAMPLE_ITINERARY, "destination": "Tokyo, Japan"}
+
+
+class DictClient:
+    """The setex/get/delete subset of a Redis client"""
+
+    def __init__(self):
+        self.values = {}
+
+    def setex(self, key, seconds, value):
+        self.values[key] = value.encode("utf-8")
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+
+@pytest.fixture(params=["database", "filesystem", "key-value"])
+def make_store(request, app_module, application, tmp_path):
+    context = application.app_context()
+    context.push()
+    yield {
+        "database": lambda **kwargs: DatabaseTempItineraryStore(app_module.db, app_module.TempItinerary, **kwargs),
+        "filesystem": lambda **kwargs: FileTempItineraryStore(str(tmp_path / "temp"), **kwargs),
+        "key-value": lambda **kwargs: KeyValueTempItineraryStore(DictClient(), **kwargs),
+    }[request.param]
+    context.pop()
+
+
+def test_entries_round_trip_and_are_deleted(make_store):
+    store = make_store()
+    store.put("abc-123", ENTRY)
+    assert store.get("abc-123") == ENTRY
+    assert store.get("unknown") is None and store.get(None) is None
+    store.delete("abc-123")
+    assert store.get("abc-123") is None
+    assert (store.stats()["stored"], store.stats()["hits"], store.stats()["misses"]) == (1, 1, 3)
+
+
+def test_expired_entries_are_not_served_and_are_swept(make_store):
+    store = make_store(ttl_seconds=-1)
+    if store.backend == "key-value":
+        pytest.skip("the key-value server expires entries itself")
+    # The first write sweeps, then not again within sweep_interval
+    store.put("first", ENTRY)
+    store.put("second", ENTRY)
+    assert store.get("first") is None and store.get("second") is None
+    assert store.stats()["expired"] == 1
+    assert store.sweep() == 1
+
+
+def test_anonymous_session_cookie_only_holds_the_id(app_module, application, pool):
+    client = application.test_client()
+    page = client.post("/generate", data={"home_country": "United States", "destination": "Tokyo, Japan",
+                                          "duration": "2", "budget": "2000", "interests": "food", "party_size": "2"})
+    assert "Sushi dinner" in page.get_data(as_text=True)
+    with client.session_transaction() as session:
+        assert set(session) <= {"temp_itinerary_id", "_flashes"}
+        itinerary_id = session["temp_itinerary_id"]
+    with application.app_context():
+        entry = app_module.temp_itinerary_store.get(itinerary_id)
+    assert entry["destination"] == "Tokyo, Japan"
+    assert json.loads(entry["itinerary_data"])["daily_plans"] == SAMPLE_ITINERARY["daily_plans"]
+    assert len(client.get_cookie("session").value) < 200
@@ -0,0 +1,134 @@
+import threading
+import uuid
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from warmup import WARM_MARKER, WarmupScheduler, claim_daily_run, in_hours, parse_hours, popular_requests
+
+FORM = {"home_country": "United States", "destination": "Tokyo, Japan", "duration": "2", "budget": "2000",
+        "interests": "food", "style": "classic", "currency": "USD", "party_size": "2"}
+
+
+def save_requests(app_module, *trips):
+    """Saved itineraries for ``(count, destination, duration, budget, interests)`` trips"""
+    user = app_module.User(email=f"{uuid.uuid4().hex}@example.com", password="x")
+    app_module.db.session.add(user)
+    app_module.db.session.flush()
+    for count, destination, duration, budget, interests in trips:
+        for _ in range(count):
+            app_module.db.session.add(app_module.Itinerary(
+                user_id=user.id, home_country="United States", destination=destination, duration=duration,
+                budget=budget, interests=interests, itinerary_data="{}", party_size=2))
+    app_module.db.session.commit()
+
+
+def test_popular_requests_bucket_similar_budgets(app_module, application):
+    with application.app_context():
+        save_requests(app_module,
+                      (3, "Tokyo, Japan", "5", "2000", "food"),
+                      # Within 25% of 2000, and the same trip spelled differently
+                      (2, "tokyo, japan", "5", "2100", "food"),
+                      (2, "Tokyo, Japan", "5", "5000", "food"),
+                      (2, "Paris, France", "3", "1500", "art"),
+                      (1, "Rome, Italy", "4", "1800", "food"))
+        since = datetime.utcnow() - timedelta(days=1)
+        trips = popular_requests(app_module.db, app_module.Itinerary, since)
+        assert [(trip["destination"], trip["budget"], trip["requests"]) for trip in trips] == [
+            ("Tokyo, Japan", "2000", 5), ("Tokyo, Japan", "5000", 2), ("Paris, France", "1500", 2)]
+
+        assert len(popular_requests(app_module.db, app_module.Itinerary, since, max_routes=1, per_route=1)) == 1
+        assert popular_requests(app_module.db, app_module.Itinerary, datetime.utcnow() + timedelta(days=1)) == []
+
+
+def test_hours_wrap_past_midnight():
+    assert parse_hours("2-5") == (2, 5) and parse_hours("") is None
+    assert in_hours((23, 2), datetime(2026, 1, 1, 1)) and not in_hours((23, 2), datetime(2026, 1, 1, 2))
+    for value in ("2", "5-5", "22-25", "night"):
+        with pytest.raises(EnvironmentError):
+            parse_hours(value)
+
+
+def test_one_process_claims_the_day(app_module, application):
+    with application.app_context():
+        day = date(2026, 10, 18)
+        assert claim_daily_run(app_module.db, app_module.GenerationLock, day)
+        assert not claim_daily_run(app_module.db, app_module.GenerationLock, day)
+        assert claim_daily_run(app_module.db, app_module.GenerationLock, day + timedelta(days=1))
+
+
+class FakeWarmer:
+    """Callbacks for WarmupScheduler; every model call uses ``tokens``"""
+
+    def __init__(self, trips, tokens=1000, warm=(), failing=()):
+        self.trips = trips
+        self.tokens = tokens
+        self.warm = set(warm)
+        self.failing = set(failing)
+        self.routes = []
+        self.itineraries = []
+        self.lock = threading.Lock()
+
+    def warm_route(self, home_country, destination, request_id):
+        with self.lock:
+            self.routes.append(destination)
+        return True
+
+    def warm_itinerary(self, trip, request_id):
+        if trip["destination"] in self.failing:
+            raise Exception("Failed to generate itinerary")
+        if trip["destination"] in self.warm:
+            return False
+        with self.lock:
+            self.itineraries.append(trip["destination"])
+        return True
+
+    def scheduler(self, **options):
+        return WarmupScheduler(lambda: self.trips, self.warm_route, self.warm_itinerary,
+                               lambda request_id: self.tokens, **options)
+
+
+def trips(*destinations):
+    return [{"home_country": "United States", "destination": destination, "duration": "3", "budget": "2000",
+             "interests": "food", "party_size": 2, "requests": 2} for destination in destinations]
+
+
+def test_pass_refreshes_each_route_once_and_counts_outcomes():
+    warmer = FakeWarmer(trips("Tokyo, Japan", "Tokyo, Japan", "Paris, France", "Rome, Italy"),
+                        warm={"Paris, France"}, failing={"Rome, Italy"})
+    scheduler = warmer.scheduler(token_budget=100000, concurrency=2)
+    summary = scheduler.run()
+    assert sorted(warmer.routes) == ["Paris, France", "Rome, Italy", "Tokyo, Japan"]
+    assert (summary["routes_refreshed"], summary["itineraries_warmed"], summary["already_warm"],
+            summary["failures"]) == (3, 2, 1, 1)
+    # 1000 per model call; a failed trip still spent its tokens, an already warm one spent none
+    assert summary["tokens"] == 3000 + 2000 + 1000
+    assert scheduler.stats()["runs"] == 1 and scheduler.stats()["tokens_spent"] == 6000
+
+
+def test_pass_stops_starting_tasks_at_the_token_budget():
+    warmer = FakeWarmer(trips("Tokyo, Japan", "Paris, France", "Rome, Italy", "Lisbon, Portugal"), tokens=3000)
+    # Four routes at 3000 each leave 3000, one itinerary at the first estimate of 2000
+    summary = warmer.scheduler(token_budget=15000, concurrency=1, route_tokens=1000,
+                               itinerary_tokens=2000).run()
+    assert (summary["routes_refreshed"], summary["itineraries_warmed"]) == (4, 1)
+    # The next itinerary is estimated at the 3000 the first one used
+    assert summary["over_budget"] == 3
+    assert summary["tokens"] == 15000
+
+
+def test_warmed_itinerary_is_served_to_a_live_request(app_module, application, pool):
+    with application.app_context():
+        trip = dict(FORM, party_size=2)
+        assert app_module.warm_itinerary(trip, str(uuid.uuid4()))
+        # Fresh in the cache, so the next pass leaves it alone
+        assert not app_module.warm_itinerary(trip, str(uuid.uuid4()))
+        calls = len(pool.prompts)
+        hits = app_module.warmup_scheduler.stats()["warm_hits"]
+        purposes = {call.purpose for call in app_module.ModelCall.query.filter_by(cache_hit=False)}
+
+    page = application.test_client().post("/generate", data=FORM).get_data(as_text=True)
+    assert "Temple visit" in page and WARM_MARKER not in page
+    assert len(pool.prompts) == calls
+    assert app_module.warmup_scheduler.stats()["warm_hits"] == hits + 1
+    assert purposes == {"warmup"}
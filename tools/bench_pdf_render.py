@@ -0,0 +1,126 @@
+"""Benchmark PDF downloads rendered through a temp file versus in memory.
+
+The temp-file mode reproduces what /download used to do: render to a
+NamedTemporaryFile, read it back to send it and (unlike the old route)
+delete it. The in-memory mode renders into the spooled buffer create_pdf
+now returns by default. Synthetic 3-, 7- and 21-day itineraries are used,
+and disk I/O is read from /proc/self/io where the platform has it.
+
+    python tools/bench_pdf_render.py [--days 3 7 21] [--repeat N]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_pdf  # noqa: E402
+
+TIMES = ["Morning", "Late morning", "Lunch", "Afternoon", "Evening"]
+CATEGORIES = ["Activity", "Food", "Transportation", "Activity", "Food"]
+
+
+def synthetic_itinerary(days):
+    """An itinerary shaped like real model output, with five activities a day"""
+    return {
+        "flight_info": {
+            "estimated_flight_duration": "13 hours",
+            "recommended_airlines": ["Airline One", "Airline Two"],
+            "flight_link": ["https://example.com/one", "https://example.com/two"],
+            "estimated_flight_cost": 1200,
+        },
+        "daily_plans": [
+            {
+                "day": day,
+                "date": "Monday",
+                "activities": [
+                    {
+                        "time": TIMES[slot],
+                        "description": f"Day {day} stop {slot + 1}: a guided walk through the old town "
+                                       "with time for photos, a coffee break and the local market",
+                        "location": f"District {slot + 1}",
+                        "category": CATEGORIES[slot],
+                        "estimated_cost": 20 + slot * 5,
+                    }
+                    for slot in range(len(TIMES))
+                ],
+            }
+            for day in range(1, days + 1)
+        ],
+        "budget_breakdown": {
+            "Flights": 1200, "Accommodation": 150 * days, "Food": 60 * days,
+            "Transportation": 20 * days, "Activities": 50 * days, "Miscellaneous": 100,
+        },
+        "travel_tips": ["Carry some cash", "Book museums ahead", "Learn a few phrases"],
+        "visa_requirements": "Visa-free for short stays",
+        "local_customs": "Tipping is not expected",
+    }
+
+
+def disk_io():
+    """Bytes read from and written to storage by this process, or None"""
+    try:
+        with open("/proc/self/io") as f:
+            fields = dict(line.split(": ") for line in f.read().splitlines())
+    except OSError:
+        return None
+    return int(fields["rchar"]), int(fields["wchar"])
+
+
+def render_args(days):
+    return (synthetic_itinerary(days), "United States", "Japan", days, 5000,
+            "food, history", "+13 hours", 2)
+
+
+def download_via_temp_file(days):
+    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
+    temp_file.close()
+    try:
+        create_pdf(*render_args(days), output=temp_file.name)
+        with open(temp_file.name, "rb") as f:
+            return len(f.read())
+    finally:
+        os.unlink(temp_file.name)
+
+
+def download_in_memory(days):
+    pdf = create_pdf(*render_args(days))
+    with pdf:
+        return len(pdf.read())
+
+
+def measure(download, days, repeat):
+    """Return (best seconds, PDF size, file bytes read+written per download)"""
+    download(days)
+    before = disk_io()
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        size = download(days)
+        best = min(best, time.perf_counter() - started)
+    after = disk_io()
+    io = None
+    if before and after:
+        io = (after[0] - before[0] + after[1] - before[1]) // repeat
+    return best, size, io
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--days", type=int, nargs="+", default=[3, 7, 21])
+    arg_parser.add_argument("--repeat", type=int, default=20)
+    args = arg_parser.parse_args()
+
+    print(f"{'days':>4} {'pdf bytes':>10} {'temp file':>12} {'in memory':>12} {'temp I/O':>12} {'memory I/O':>12}")
+    for days in args.days:
+        temp_time, size, temp_io = measure(download_via_temp_file, days, args.repeat)
+        memory_time, _, memory_io = measure(download_in_memory, days, args.repeat)
+        fmt_io = lambda io: f"{io:10} B" if io is not None else "         n/a"
+        print(f"{days:4} {size:10} {temp_time * 1e3:9.2f} ms {memory_time * 1e3:9.2f} ms "
+              f"{fmt_io(temp_io)} {fmt_io(memory_io)}")
+
+
+if __name__ == "__main__":
+    main()
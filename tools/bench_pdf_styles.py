@@ -0,0 +1,86 @@
+"""Measure per-PDF CPU time with shared versus per-render PDF styles.
+
+Every usable response in the corpus is parsed into an itinerary and
+rendered with each template. "per render" sets up a new PdfRenderer for
+each PDF, which is what create_pdf used to do with its style sheet and
+paragraph styles; "shared" reuses one renderer as app.py now does.
+
+    python tools/bench_pdf_styles.py [corpus_dir] [--repeat N]
+"""
+import argparse
+import glob
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pdf_generator import PdfRenderer, TEMPLATES
+from response_parser import ItineraryParseError, parse_itinerary_response
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus", "responses")
+
+DETAILS = {
+    "home_country": "United States",
+    "destination": "Japan",
+    "duration": 7,
+    "budget": 5000,
+    "interests": "food, history",
+    "time_difference": "+13 hours",
+    "party_size": 2,
+}
+
+
+def load_itineraries(corpus):
+    itineraries = []
+    for path in sorted(glob.glob(os.path.join(corpus, "*.txt"))):
+        with open(path, encoding="utf-8") as f:
+            try:
+                itineraries.append(parse_itinerary_response(f.read()).data)
+            except ItineraryParseError:
+                continue
+    return itineraries
+
+
+def cpu_per_pdf(render, itineraries, template, repeat):
+    """Best CPU seconds per PDF over ``repeat`` passes through the batch"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.process_time()
+        for itinerary in itineraries:
+            render(itinerary, template)
+        best = min(best, (time.process_time() - started) / len(itineraries))
+    return best
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("corpus", nargs="?", default=DEFAULT_CORPUS)
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    args = arg_parser.parse_args()
+
+    itineraries = load_itineraries(args.corpus)
+    if not itineraries:
+        sys.exit(f"No usable responses found in {args.corpus}")
+
+    shared = PdfRenderer()
+
+    def per_render(itinerary, template):
+        PdfRenderer().render(itinerary, DETAILS, template=template, output=io.BytesIO())
+
+    def with_shared(itinerary, template):
+        shared.render(itinerary, DETAILS, template=template, output=io.BytesIO())
+
+    print(f"{len(itineraries)} itineraries, best of {args.repeat} passes")
+    print(f"{'template':10} {'per render':>12} {'shared':>12} {'saved':>8}")
+    for template in TEMPLATES:
+        # Warm up font and module caches before timing
+        with_shared(itineraries[0], template)
+        before = cpu_per_pdf(per_render, itineraries, template, args.repeat)
+        after = cpu_per_pdf(with_shared, itineraries, template, args.repeat)
+        print(f"{template:10} {before * 1e3:9.2f} ms {after * 1e3:9.2f} ms {1 - after / before:8.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Benchmark response parsing on the corpus of model responses.
+
+Compares the original split-on-backticks + json.loads cleanup with
+response_parser.parse_itinerary_response, reporting per-file parse time
+and how many responses each approach turns into a usable itinerary.
+
+    python tools/bench_response_parser.py [corpus_dir] [--repeat N]
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from response_parser import ItineraryParseError, parse_itinerary_response
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus", "responses")
+
+
+def legacy_parse(response_text):
+    """The cleanup generate_itinerary used before response_parser existed"""
+    if "```json" in response_text:
+        response_text = response_text.split("```json")[1].split("```")[0].strip()
+    elif "```" in response_text:
+        response_text = response_text.split("```")[1].split("```")[0].strip()
+    return json.loads(response_text)
+
+
+def new_parse(response_text):
+    return parse_itinerary_response(response_text).data
+
+
+def time_parser(parser, text, repeat):
+    """Return (succeeded, best seconds per parse)"""
+    try:
+        parser(text)
+    except (ValueError, IndexError, ItineraryParseError):
+        return False, None
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        parser(text)
+        best = min(best, time.perf_counter() - started)
+    return True, best
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("corpus", nargs="?", default=DEFAULT_CORPUS)
+    arg_parser.add_argument("--repeat", type=int, default=200)
+    args = arg_parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.corpus, "*.txt")))
+    if not paths:
+        sys.exit(f"No responses found in {args.corpus}")
+
+    print(f"{'response':32} {'bytes':>7} {'legacy':>12} {'parser':>12}  repairs")
+    legacy_ok = parser_ok = 0
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+        legacy_success, legacy_time = time_parser(legacy_parse, text, args.repeat)
+        parser_success, parser_time = time_parser(new_parse, text, args.repeat)
+        legacy_ok += legacy_success
+        parser_ok += parser_success
+        issues = ", ".join(parse_itinerary_response(text).issues) if parser_success else "-"
+        fmt = lambda ok, seconds: f"{seconds * 1e6:9.1f} us" if ok else "      failed"
+        print(f"{os.path.basename(path):32} {len(text):7} {fmt(legacy_success, legacy_time)} "
+              f"{fmt(parser_success, parser_time)}  {issues}")
+
+    total = len(paths)
+    print()
+    print(f"legacy cleanup recovered {legacy_ok}/{total} ({legacy_ok / total:.0%})")
+    print(f"response_parser recovered {parser_ok}/{total} ({parser_ok / total:.0%})")
+    print(f"regenerations avoided: {parser_ok - legacy_ok}")
+
+
+if __name__ == "__main__":
+    main()
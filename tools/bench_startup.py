@@ -0,0 +1,167 @@
+"""Measure app startup per worker: import time, create_app and time to first request.
+
+Starts --workers processes at once, as a pre-forking server would, against
+one scratch database that is migrated beforehand. Each worker times:
+- import: `import app`
+- create: create_app()
+- first request: GET / through the test client, and boot to first request
+  from the moment the process was spawned (interpreter start included)
+- the first /generate and /download next to a second one, so the cost of
+  loading the model client and ReportLab on first use shows as the
+  difference. The model is tools/fake_gemini.py answering at once.
+It also reports which heavy modules were loaded after create_app and the
+worker's peak RSS up to the first request.
+
+--root measures another checkout (e.g. a git worktree of an older commit);
+checkouts from before create_app are timed through their module-level app.
+
+    python tools/bench_startup.py [--workers 4] [--root path/to/checkout]
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+TOOLS = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(TOOLS)
+HEAVY_MODULES = ("google.genai", "reportlab")
+
+FORM = {
+    "home_country": "United States", "duration": "3", "budget": "2000", "interests": "food",
+    "style": "classic", "currency": "USD", "party_size": "2",
+}
+
+
+def build_app(module):
+    if hasattr(module, "create_app"):
+        return module.create_app()
+    return module.app
+
+
+def prepare(root):
+    """Child process: create and migrate the scratch database"""
+    sys.path.insert(0, root)
+    import app as module
+    application = build_app(module)
+    if hasattr(module, "init_database"):
+        with application.app_context():
+            module.init_database()
+
+
+def timed_generate(client, destination):
+    """Seconds for an anonymous /generate and the download of its PDF"""
+    started = time.perf_counter()
+    response = client.post("/generate", data=dict(FORM, destination=destination))
+    generate_seconds = time.perf_counter() - started
+    page = response.get_data(as_text=True)
+    marker = page.find("/download/")
+    if response.status_code != 200 or marker < 0:
+        raise RuntimeError(f"/generate for {destination} did not return an itinerary")
+    itinerary_id = page[marker + len("/download/"):].split("?", 1)[0].split('"', 1)[0]
+    started = time.perf_counter()
+    response = client.get(f"/download/{itinerary_id}")
+    download_seconds = time.perf_counter() - started
+    if response.mimetype != "application/pdf":
+        raise RuntimeError(f"/download/{itinerary_id} did not return a PDF")
+    return generate_seconds, download_seconds
+
+
+def worker(root, spawned_at):
+    """Child process: time one worker's startup and print the figures as JSON"""
+    sys.path.insert(0, root)
+    started = time.perf_counter()
+    import app as module
+    imported = time.perf_counter()
+    application = build_app(module)
+    created = time.perf_counter()
+    loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+
+    client = application.test_client()
+    client.get("/")
+    first_request = time.perf_counter()
+    boot_to_first_request = time.time() - spawned_at
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    first_generate, first_download = timed_generate(client, "Tokyo, Japan")
+    second_generate, second_download = timed_generate(client, "Paris, France")
+    print(json.dumps({
+        "import": imported - started,
+        "create": created - imported,
+        "first_request": first_request - created,
+        "boot_to_first_request": boot_to_first_request,
+        "first_generate": first_generate,
+        "second_generate": second_generate,
+        "first_download": first_download,
+        "second_download": second_download,
+        "loaded_at_start": loaded,
+        "rss_mb": rss_mb,
+    }))
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--workers", type=int, default=4)
+    arg_parser.add_argument("--root", default=ROOT, help="checkout to measure (default: this one)")
+    arg_parser.add_argument("--prepare", metavar="ROOT", help=argparse.SUPPRESS)
+    arg_parser.add_argument("--worker", nargs=2, metavar=("ROOT", "SPAWNED_AT"), help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+    if args.prepare:
+        prepare(args.prepare)
+        return
+    if args.worker:
+        worker(args.worker[0], float(args.worker[1]))
+        return
+
+    sys.path.insert(0, TOOLS)
+    from fake_gemini import FakeGemini, load_responses, parse_latency, start_server
+
+    scratch = tempfile.mkdtemp(prefix="bench-startup-")
+    server = start_server(FakeGemini(load_responses(os.path.join(TOOLS, "corpus", "responses")),
+                                     parse_latency("fixed:0")))
+    env = dict(os.environ,
+               GOOGLE_API_KEY="bench-startup",
+               GEMINI_BASE_URL=f"http://127.0.0.1:{server.server_port}",
+               SQLITE_DB_PATH=os.path.join(scratch, "startup.db"),
+               PDF_CACHE_DIR=os.path.join(scratch, "pdf_cache"),
+               TEMP_ITINERARY_DIR=os.path.join(scratch, "temp_itineraries"))
+    root = os.path.abspath(args.root)
+    subprocess.run([sys.executable, __file__, "--prepare", root], env=env, cwd=scratch, check=True,
+                   stdout=subprocess.DEVNULL)
+
+    processes = []
+    for _ in range(args.workers):
+        command = [sys.executable, __file__, "--worker", root, repr(time.time())]
+        processes.append(subprocess.Popen(command, env=env, cwd=scratch, stdout=subprocess.PIPE, text=True))
+    results = []
+    for process in processes:
+        output, _ = process.communicate()
+        if process.returncode != 0:
+            sys.exit(f"A worker failed (exit code {process.returncode})")
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    server.shutdown()
+    shutil.rmtree(scratch, ignore_errors=True)
+
+    print(f"{root}, {args.workers} workers started together")
+    print(f"{'worker':>6} {'import':>8} {'create':>8} {'1st req':>8} {'boot->1st':>9} "
+          f"{'gen 1st/2nd':>13} {'pdf 1st/2nd':>13} {'RSS MB':>7}  loaded at start")
+    for number, row in enumerate(results, 1):
+        print(f"{number:6} {row['import'] * 1000:6.0f}ms {row['create'] * 1000:6.0f}ms "
+              f"{row['first_request'] * 1000:6.0f}ms {row['boot_to_first_request'] * 1000:7.0f}ms "
+              f"{row['first_generate'] * 1000:6.0f}/{row['second_generate'] * 1000:.0f}ms "
+              f"{row['first_download'] * 1000:6.0f}/{row['second_download'] * 1000:.0f}ms "
+              f"{row['rss_mb']:7.1f}  {', '.join(row['loaded_at_start']) or '-'}")
+    median = {key: statistics.median(row[key] for row in results)
+              for key in ("import", "create", "first_request", "boot_to_first_request")}
+    print(f"median: import {median['import'] * 1000:.0f}ms, create_app {median['create'] * 1000:.0f}ms, "
+          f"first request {median['first_request'] * 1000:.0f}ms, "
+          f"boot to first request {median['boot_to_first_request'] * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""Run the same repository checks against SQLite and PostgreSQL.
+
+Each backend gets a fresh, throwaway database:
+- SQLite is a temporary file.
+- PostgreSQL is the server at --postgres-url when one is given. Otherwise
+  a temporary cluster is started with initdb/pg_ctl when those binaries
+  are on the PATH, and the backend is skipped when they are not.
+The app is imported against each database in a child process. The checks
+then exercise the models, migrations, storage formats, history paging,
+activity search, deletes and db_helper. PostgreSQL needs psycopg2
+(requirements.txt).
+
+    python tools/db_backend_check.py [--postgres-url postgresql://...] [--sqlite-only]
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import traceback
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SAMPLE_ITINERARY = {
+    "flight_info": {"estimated_flight_duration": "13 hours", "recommended_airlines": ["ANA"],
+                    "flight_link": ["https://example.com"], "estimated_flight_cost": 900},
+    "daily_plans": [
+        {"day": 1, "date": "Monday", "activities": [
+            {"time": "Morning", "description": "Temple visit", "location": "Asakusa",
+             "category": "Activity", "estimated_cost": 0},
+            {"time": "Evening", "description": "Sushi dinner", "location": "Ginza",
+             "category": "Food", "estimated_cost": 120},
+        ]},
+        {"day": 2, "date": "Tuesday", "activities": [
+            {"time": "Afternoon", "description": "Ramen lunch", "location": "Shinjuku",
+             "category": "Food", "estimated_cost": 15},
+        ]},
+    ],
+    "budget_breakdown": {"Flights": 900, "Accommodation": 300, "Food": 135, "Transportation": 40,
+                         "Activities": 0, "Miscellaneous": 25, "Total": 1400},
+    "travel_tips": ["Carry cash"],
+    "visa_requirements": "Visa-free for 90 days",
+    "local_customs": "Bow when greeting",
+}
+
+CHECKS = []
+
+
+def check(function):
+    CHECKS.append(function)
+    return function
+
+
+def params(destination="Tokyo"):
+    return {"home_country": "USA", "destination": destination, "duration": "2", "budget": "2000",
+            "interests": "food", "party_size": 2, "currency": "USD"}
+
+
+@check
+def migrations_recorded(app):
+    versions = [row.version for row in app.db.session.execute(
+        app.db.text("SELECT version FROM schema_migrations ORDER BY version"))]
+    from migrations import MIGRATIONS
+    assert versions == sorted(version for version, _, _ in MIGRATIONS), versions
+    # Running them again must be a no-op
+    app.run_migrations(app.db)
+
+
+@check
+def storage_formats_round_trip(app):
+    user = app.User(email="formats@example.com", password="x")
+    app.db.session.add(user)
+    app.db.session.commit()
+    expected = json.dumps(SAMPLE_ITINERARY)
+    for storage_format in app.STORAGE_FORMATS:
+        itinerary = app.Itinerary(user_id=user.id, party_size=2, **{
+            key: value for key, value in params().items() if key != "party_size"})
+        itinerary.store_itinerary_json(expected, storage_format)
+        app.db.session.add(itinerary)
+        app.db.session.commit()
+        itinerary_id = itinerary.id
+        app.db.session.expire_all()
+        stored = app.db.session.get(app.Itinerary, itinerary_id)
+        assert json.loads(stored.itinerary_json) == SAMPLE_ITINERARY, storage_format
+        assert list(json.loads(stored.itinerary_json)["budget_breakdown"]) == \
+            list(SAMPLE_ITINERARY["budget_breakdown"]), storage_format
+
+
+@check
+def save_and_page_history(app):
+    user = app.User(email="history@example.com", password="x")
+    app.db.session.add(user)
+    app.db.session.commit()
+    saved = [app.save_itinerary(params(f"City {i}"), SAMPLE_ITINERARY, user.id) for i in range(7)]
+    seen = []
+    cursor = None
+    while True:
+        rows, cursor = app.history_page(user.id, cursor, limit=3)
+        seen += [row.id for row in rows]
+        if not cursor:
+            break
+    assert sorted(seen) == sorted(saved) and len(seen) == len(set(seen)), seen
+    row = app.history_page(user.id, None, limit=1)[0][0]
+    assert row.total_cost == 1400 and row.day_count == 2, row
+
+
+@check
+def activity_search_and_delete(app):
+    user = app.User(email="activities@example.com", password="x")
+    app.db.session.add(user)
+    app.db.session.commit()
+    itinerary_id = app.save_itinerary(params("Tokyo"), SAMPLE_ITINERARY, user.id)
+    cheap = app.ItineraryActivity.query.filter(
+        app.ItineraryActivity.user_id == user.id,
+        app.ItineraryActivity.destination == "tokyo",
+        app.ItineraryActivity.estimated_cost <= 50,
+    ).count()
+    assert cheap == 2, cheap
+    app.db.session.delete(app.db.session.get(app.Itinerary, itinerary_id))
+    app.db.session.commit()
+    assert app.ItineraryActivity.query.filter_by(itinerary_id=itinerary_id).count() == 0
+
+
+@check
+def convert_storage_in_place(app):
+    with app.db.engine.begin() as connection:
+        app.convert_itinerary_storage(connection, "json")
+    app.db.session.expire_all()
+    assert {row.storage_format for row in app.Itinerary.query} == {"json"}
+    with app.db.engine.begin() as connection:
+        app.convert_itinerary_storage(connection, app.ITINERARY_STORAGE)
+    app.db.session.expire_all()
+    for itinerary in app.Itinerary.query:
+        assert json.loads(itinerary.itinerary_json) == SAMPLE_ITINERARY
+
+
+@check
+def db_helper_uses_app_database(app):
+    import db_helper
+    db_helper.init_db()
+    itinerary_id = db_helper.save_itinerary("Paris", "3", "1000", "art", SAMPLE_ITINERARY)
+    assert itinerary_id in [row["id"] for row in db_helper.get_user_history()]
+
+
+def run_checks(url):
+    """Child process: import the app against ``url`` and run every check"""
+    os.environ["DATABASE_URL"] = url
+    os.environ["PDF_CACHE_DIR"] = tempfile.mkdtemp()
+    sys.path.insert(0, ROOT)
+    import app
+
+    application = app.create_app()
+    with application.app_context():
+        app.init_database()
+    failures = 0
+    for function in CHECKS:
+        with application.app_context():
+            try:
+                function(app)
+                print(f"  PASS {function.__name__}")
+            except Exception:
+                failures += 1
+                print(f"  FAIL {function.__name__}")
+                traceback.print_exc()
+    shutil.rmtree(os.environ["PDF_CACHE_DIR"], ignore_errors=True)
+    return failures
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_postgres(directory):
+    """Start a throwaway cluster in ``directory``; returns its URL or None"""
+    if not (shutil.which("initdb") and shutil.which("pg_ctl")):
+        return None
+    data = os.path.join(directory, "data")
+    port = free_port()
+    subprocess.run(["initdb", "-D", data, "-U", "postgres", "--auth=trust"],
+                   check=True, stdout=subprocess.DEVNULL)
+    subprocess.run(["pg_ctl", "-D", data, "-w", "-l", os.path.join(directory, "postgres.log"),
+                    "-o", f"-p {port} -k {directory} -c listen_addresses=''", "start"],
+                   check=True, stdout=subprocess.DEVNULL)
+    return f"postgresql://postgres@/postgres?host={directory}&port={port}"
+
+
+def stop_postgres(directory):
+    subprocess.run(["pg_ctl", "-D", os.path.join(directory, "data"), "-m", "fast", "stop"],
+                   stdout=subprocess.DEVNULL)
+
+
+def run_backend(name, url):
+    print(f"{name}:")
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), "--run", url], cwd=ROOT)
+    return result.returncode == 0
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--postgres-url", help="an empty database on an existing server")
+    arg_parser.add_argument("--sqlite-only", action="store_true")
+    arg_parser.add_argument("--run", help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+
+    if args.run:
+        sys.exit(1 if run_checks(args.run) else 0)
+
+    ok = True
+    sqlite_dir = tempfile.mkdtemp()
+    try:
+        ok &= run_backend("sqlite", f"sqlite:///{os.path.join(sqlite_dir, 'check.db')}")
+    finally:
+        shutil.rmtree(sqlite_dir)
+
+    if not args.sqlite_only:
+        if args.postgres_url:
+            ok &= run_backend("postgresql", args.postgres_url)
+        else:
+            postgres_dir = tempfile.mkdtemp()
+            try:
+                url = start_postgres(postgres_dir)
+                if url is None:
+                    print("postgresql: skipped (no --postgres-url and no initdb/pg_ctl on PATH)")
+                else:
+                    try:
+                        ok &= run_backend("postgresql", url)
+                    finally:
+                        stop_postgres(postgres_dir)
+            finally:
+                shutil.rmtree(postgres_dir, ignore_errors=True)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Concurrent read/write load test of the SQLite settings in db_config.
+
+Writer and reader processes (standing in for app workers) hit a scratch
+database for a fixed time, first with SQLAlchemy's defaults (rollback
+journal, the driver's 5 second lock wait) and then with db_config's
+engine options and pragmas (WAL, busy_timeout, cache and mmap sizes).
+Writers insert itinerary-sized rows one transaction at a time, readers
+fetch a page of the newest rows. Throughput, p95 latency and "database
+is locked" errors are reported for each.
+
+    python tools/db_load_test.py [--writers 4] [--readers 8] [--seconds 10]
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from db_config import engine_options, install_sqlite_pragmas
+
+PAYLOAD = "x" * 4000
+
+
+def make_engine(uri, tuned):
+    if not tuned:
+        return create_engine(uri)
+    engine = create_engine(uri, **engine_options(uri))
+    install_sqlite_pragmas(engine)
+    return engine
+
+
+def worker(uri, tuned, role, seconds, results):
+    engine = make_engine(uri, tuned)
+    latencies = []
+    errors = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            if role == "writer":
+                with engine.begin() as conn:
+                    conn.execute(text("INSERT INTO itinerary (user_id, itinerary_data, created_at) "
+                                      "VALUES (:user_id, :data, CURRENT_TIMESTAMP)"),
+                                 {"user_id": os.getpid() % 50, "data": PAYLOAD})
+            else:
+                with engine.connect() as conn:
+                    conn.execute(text("SELECT id, created_at FROM itinerary WHERE user_id = :user_id "
+                                      "ORDER BY created_at DESC LIMIT 20"),
+                                 {"user_id": os.getpid() % 50}).fetchall()
+        except OperationalError as e:
+            if "locked" not in str(e):
+                raise
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - started)
+    engine.dispose()
+    results.put((role, latencies, errors))
+
+
+def run(tuned, args):
+    directory = tempfile.mkdtemp()
+    uri = f"sqlite:///{os.path.join(directory, 'load.db')}"
+    engine = make_engine(uri, tuned)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE itinerary (id INTEGER PRIMARY KEY, user_id INTEGER, "
+                          "itinerary_data TEXT, created_at TIMESTAMP)"))
+        conn.execute(text("CREATE INDEX ix_user_created ON itinerary (user_id, created_at)"))
+    engine.dispose()
+
+    results = multiprocessing.Queue()
+    roles = ["writer"] * args.writers + ["reader"] * args.readers
+    processes = [multiprocessing.Process(target=worker, args=(uri, tuned, role, args.seconds, results))
+                 for role in roles]
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    shutil.rmtree(directory)
+
+    summary = {}
+    for role in ("writer", "reader"):
+        latencies = sorted(latency for r, values, _ in collected if r == role for latency in values)
+        errors = sum(count for r, _, count in collected if r == role)
+        p95 = latencies[int(len(latencies) * 0.95)] if latencies else 0
+        summary[role] = (len(latencies) / args.seconds, p95, errors)
+    return summary
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--writers", type=int, default=4)
+    arg_parser.add_argument("--readers", type=int, default=8)
+    arg_parser.add_argument("--seconds", type=float, default=10)
+    args = arg_parser.parse_args()
+
+    print(f"{args.writers} writer and {args.readers} reader processes, {args.seconds:g}s per run")
+    print(f"{'settings':10} {'role':7} {'ops/s':>9} {'p95':>10} {'locked':>7}")
+    for name, tuned in (("default", False), ("db_config", True)):
+        summary = run(tuned, args)
+        for role, (throughput, p95, errors) in summary.items():
+            print(f"{name:10} {role:7} {throughput:9.0f} {p95 * 1e3:7.1f} ms {errors:7}")
+
+
+if __name__ == "__main__":
+    main()
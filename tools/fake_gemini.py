@@ -0,0 +1,349 @@
+"""Local stand-in for the Gemini API that replays recorded model responses.
+
+Serves generateContent and streamGenerateContent for any model, answering
+with a response from tools/corpus/responses (the raw text, so the app's
+parser does its usual work) wrapped in the Gemini JSON shape, with token
+counts and, when the request enables Google Search, grounding queries.
+Requests in JSON mode (responseMimeType application/json) get the same
+itinerary as bare, complete JSON, as the model sends it, and their
+response schema counts towards the prompt tokens (estimated from its
+compact rendering).
+Latency is drawn from a distribution per call; streamed replies send the
+first chunk after a share of it and spread the rest over the chunks.
+A share of calls can fail with an HTTP error, hang, or reply without JSON,
+to exercise the app's retries and circuit breaker. GET /stats returns the
+calls served so far.
+
+Point the app at it with GEMINI_BASE_URL (any GOOGLE_API_KEY will do):
+
+    python tools/fake_gemini.py [--port 8765] [--latency lognormal:6,0.5] [--error-rate 0.02]
+    GEMINI_BASE_URL=http://127.0.0.1:8765 GOOGLE_API_KEY=fake python app.py
+
+Every option can also be set with a FAKE_GEMINI_<OPTION> environment
+variable, e.g. FAKE_GEMINI_LATENCY=fixed:0.5.
+
+Latency distributions (seconds):
+    fixed:S               always S
+    uniform:LOW,HIGH      uniform between LOW and HIGH
+    lognormal:MEDIAN,SIGMA  log-normal with that median; the long tail real calls have
+"""
+import argparse
+import glob
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prompt_builder import compact_schema
+from response_parser import ItineraryParseError, parse_itinerary_response
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus", "responses")
+
+# Share of the latency before the first streamed chunk arrives
+FIRST_CHUNK_SHARE = 0.25
+
+ERROR_STATUS_NAMES = {
+    400: "INVALID_ARGUMENT",
+    429: "RESOURCE_EXHAUSTED",
+    500: "INTERNAL",
+    503: "UNAVAILABLE",
+    504: "DEADLINE_EXCEEDED",
+}
+
+MALFORMED_REPLY = "I'm sorry, but I can't put together an itinerary for that request right now."
+
+
+def parse_latency(spec):
+    """Turn a latency spec (see the module docstring) into a function returning seconds"""
+    kind, _, values = spec.partition(":")
+    try:
+        numbers = [float(value) for value in values.split(",")] if values else []
+        if kind == "fixed" and len(numbers) == 1:
+            return lambda: numbers[0]
+        if kind == "uniform" and len(numbers) == 2:
+            return lambda: random.uniform(numbers[0], numbers[1])
+        if kind == "lognormal" and len(numbers) == 2:
+            return lambda: random.lognormvariate(math.log(numbers[0]), numbers[1])
+    except ValueError:
+        pass
+    raise argparse.ArgumentTypeError(f"Invalid latency {spec!r}; use fixed:S, uniform:LOW,HIGH or lognormal:MEDIAN,SIGMA")
+
+
+def load_responses(corpus, include_unparseable=False):
+    """Recorded response texts, leaving out the ones the parser cannot recover unless asked"""
+    responses = []
+    for path in sorted(glob.glob(os.path.join(corpus, "*.txt"))):
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+        if not include_unparseable:
+            try:
+                parse_itinerary_response(text)
+            except ItineraryParseError:
+                continue
+        responses.append(text)
+    return responses
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+def prompt_text(request_body):
+    """Concatenated text parts of a generateContent request"""
+    parts = []
+    for content in request_body.get("contents") or []:
+        for part in content.get("parts") or []:
+            parts.append(part.get("text") or "")
+    return "\n".join(parts)
+
+
+def uses_search(request_body):
+    return any("googleSearch" in tool or "google_search" in tool for tool in request_body.get("tools") or [])
+
+
+def generation_config(request_body):
+    return request_body.get("generationConfig") or {}
+
+
+def json_mode(request_body):
+    return generation_config(request_body).get("responseMimeType") == "application/json"
+
+
+def compact_json(text):
+    """A recorded response as JSON mode returns it: the whole itinerary, without whitespace"""
+    return json.dumps(parse_itinerary_response(text).data, separators=(",", ":"), ensure_ascii=False)
+
+
+class FakeGemini:
+    """Response choice, fault injection and counters shared by the request handlers"""
+
+    def __init__(self, responses, latency, error_rate=0.0, error_statuses=(429, 500, 503),
+                 hang_rate=0.0, hang_seconds=600.0, malformed_rate=0.0, stream_chunk=200):
+        if not responses:
+            raise ValueError("No recorded responses to replay")
+        self.responses = responses
+        self.json_responses = []
+        for text in responses:
+            try:
+                self.json_responses.append(compact_json(text))
+            except ItineraryParseError:
+                pass
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_statuses = tuple(error_statuses)
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.malformed_rate = malformed_rate
+        self.stream_chunk = stream_chunk
+        self._lock = threading.Lock()
+        self._counters = {"calls": 0, "streamed": 0, "errors": 0, "hangs": 0, "malformed": 0,
+                          "prompt_tokens": 0, "output_tokens": 0}
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters)
+
+    def outcome(self):
+        """What this call does: ("error", status), ("hang", None), ("malformed", None) or ("ok", None)"""
+        roll = random.random()
+        if roll < self.error_rate:
+            return "error", random.choice(self.error_statuses)
+        roll -= self.error_rate
+        if roll < self.hang_rate:
+            return "hang", None
+        roll -= self.hang_rate
+        if roll < self.malformed_rate:
+            return "malformed", None
+        return "ok", None
+
+    def reply(self, text, request_body, prompt_tokens, output_tokens, final=True):
+        """A GenerateContentResponse (or one streamed chunk of it) carrying ``text``"""
+        candidate = {"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}
+        if final:
+            candidate["finishReason"] = "STOP"
+            if uses_search(request_body):
+                candidate["groundingMetadata"] = {"webSearchQueries": ["flights to destination",
+                                                                       "things to do in destination"]}
+        body = {"candidates": [candidate], "modelVersion": "fake-gemini"}
+        if final:
+            body["usageMetadata"] = {
+                "promptTokenCount": prompt_tokens,
+                "candidatesTokenCount": output_tokens,
+                "totalTokenCount": prompt_tokens + output_tokens,
+            }
+        return body
+
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    fake = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def write_chunk(self, data):
+        self.wfile.write(b"%x\r\n" % len(data) + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/stats":
+            self.send_json(200, self.fake.stats())
+        else:
+            self.send_json(404, {"error": {"code": 404, "message": "Not found", "status": "NOT_FOUND"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            request_body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            request_body = {}
+        streaming = ":streamGenerateContent" in self.path
+        if not streaming and ":generateContent" not in self.path:
+            self.send_json(404, {"error": {"code": 404, "message": "Not found", "status": "NOT_FOUND"}})
+            return
+
+        fake = self.fake
+        fake.count("calls")
+        latency = max(0.0, fake.latency())
+        outcome, status = fake.outcome()
+
+        if outcome == "hang":
+            fake.count("hangs")
+            time.sleep(fake.hang_seconds)
+            self.close_connection = True
+            return
+        if outcome == "error":
+            fake.count("errors")
+            time.sleep(latency * FIRST_CHUNK_SHARE)
+            headers = {"Retry-After": "1"} if status == 429 else None
+            self.send_json(status, {"error": {"code": status, "message": "Injected failure from fake_gemini",
+                                              "status": ERROR_STATUS_NAMES.get(status, "UNKNOWN")}}, headers)
+            return
+
+        if outcome == "malformed":
+            fake.count("malformed")
+            text = MALFORMED_REPLY
+        elif json_mode(request_body) and fake.json_responses:
+            text = random.choice(fake.json_responses)
+        else:
+            text = random.choice(fake.responses)
+        prompt = prompt_text(request_body)
+        if "responseSchema" in generation_config(request_body):
+            prompt += compact_schema(generation_config(request_body)["responseSchema"])
+        prompt_tokens = estimate_tokens(prompt)
+        output_tokens = estimate_tokens(text)
+        fake.count("prompt_tokens", prompt_tokens)
+        fake.count("output_tokens", output_tokens)
+
+        if not streaming:
+            time.sleep(latency)
+            self.send_json(200, fake.reply(text, request_body, prompt_tokens, output_tokens))
+            return
+
+        fake.count("streamed")
+        chunks = [text[i:i + fake.stream_chunk] for i in range(0, len(text), fake.stream_chunk)] or [""]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        time.sleep(latency * FIRST_CHUNK_SHARE)
+        interval = latency * (1 - FIRST_CHUNK_SHARE) / max(1, len(chunks) - 1)
+        for position, chunk in enumerate(chunks):
+            if position:
+                time.sleep(interval)
+            final = position == len(chunks) - 1
+            body = fake.reply(chunk, request_body, prompt_tokens, output_tokens, final=final)
+            try:
+                self.write_chunk(f"data: {json.dumps(body)}\r\n\r\n".encode())
+            except (BrokenPipeError, ConnectionResetError):
+                return
+        self.write_chunk(b"")
+
+
+def start_server(fake, host="127.0.0.1", port=0):
+    """Serve ``fake`` from a background thread; returns the server (``server_port`` has the port)"""
+    handler = type("Handler", (FakeGeminiHandler,), {"fake": fake})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def env_default(name, default):
+    return os.environ.get(f"FAKE_GEMINI_{name}", default)
+
+
+def build_parser():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--host", default=env_default("HOST", "127.0.0.1"))
+    arg_parser.add_argument("--port", type=int, default=int(env_default("PORT", 8765)))
+    arg_parser.add_argument("--corpus", default=env_default("CORPUS", DEFAULT_CORPUS))
+    arg_parser.add_argument("--include-unparseable", action="store_true",
+                            default=env_default("INCLUDE_UNPARSEABLE", "") == "1",
+                            help="also replay recorded responses the parser cannot recover")
+    arg_parser.add_argument("--latency", type=parse_latency, default=env_default("LATENCY", "lognormal:6,0.5"),
+                            help="latency distribution per call (default lognormal:6,0.5)")
+    arg_parser.add_argument("--error-rate", type=float, default=float(env_default("ERROR_RATE", 0)),
+                            help="share of calls answered with an HTTP error")
+    arg_parser.add_argument("--error-statuses", default=env_default("ERROR_STATUSES", "429,500,503"),
+                            help="comma-separated statuses the injected errors are drawn from")
+    arg_parser.add_argument("--hang-rate", type=float, default=float(env_default("HANG_RATE", 0)),
+                            help="share of calls that never answer")
+    arg_parser.add_argument("--hang-seconds", type=float, default=float(env_default("HANG_SECONDS", 600)))
+    arg_parser.add_argument("--malformed-rate", type=float, default=float(env_default("MALFORMED_RATE", 0)),
+                            help="share of calls answered with text but no JSON")
+    arg_parser.add_argument("--stream-chunk", type=int, default=int(env_default("STREAM_CHUNK", 200)),
+                            help="characters per streamed chunk")
+    arg_parser.add_argument("--seed", type=int, default=env_default("SEED", None))
+    return arg_parser
+
+
+def fake_from_args(args):
+    if args.seed is not None:
+        random.seed(int(args.seed))
+    return FakeGemini(
+        load_responses(args.corpus, args.include_unparseable),
+        args.latency,
+        error_rate=args.error_rate,
+        error_statuses=[int(status) for status in args.error_statuses.split(",") if status.strip()],
+        hang_rate=args.hang_rate,
+        hang_seconds=args.hang_seconds,
+        malformed_rate=args.malformed_rate,
+        stream_chunk=args.stream_chunk,
+    )
+
+
+def main():
+    args = build_parser().parse_args()
+    fake = fake_from_args(args)
+    server = start_server(fake, args.host, args.port)
+    print(f"Fake Gemini replaying {len(fake.responses)} responses on http://{args.host}:{server.server_port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
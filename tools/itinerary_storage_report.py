@@ -0,0 +1,88 @@
+"""Report on-disk size and read latency of the itinerary storage formats.
+
+The same itineraries are written to a scratch SQLite database once per
+format: plain JSON (how rows were stored before), zlib without a
+dictionary, and zlib with the shared dictionary (the 'zlib' storage
+format). Each database is vacuumed and its file size reported, followed
+by the time to read one row by id and turn it back into a dict.
+
+    python tools/itinerary_storage_report.py [--db instance/travelapp.db] [--rows N]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from itinerary_storage import ZLIB_FORMAT, decode_itinerary, encode_itinerary
+from train_itinerary_dictionary import DEFAULT_CORPUS, corpus_samples, database_samples
+
+
+def plain_zlib(itinerary_json):
+    return zlib.compress(itinerary_json.encode("utf-8"), 9)
+
+
+FORMATS = [
+    ("json", lambda itinerary_json: itinerary_json,
+     lambda value: value),
+    ("zlib", plain_zlib,
+     lambda value: zlib.decompress(value).decode("utf-8")),
+    ("zlib + dictionary", lambda itinerary_json: encode_itinerary(itinerary_json, ZLIB_FORMAT)["itinerary_blob"],
+     lambda value: decode_itinerary(f"{ZLIB_FORMAT}:1", "", value)),
+]
+
+
+def measure(samples, encode, decode, rows):
+    """Return (file bytes, stored bytes, microseconds per read) for one format"""
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    try:
+        connection = sqlite3.connect(path)
+        connection.execute("CREATE TABLE itinerary (id INTEGER PRIMARY KEY, data)")
+        connection.executemany("INSERT INTO itinerary (id, data) VALUES (?, ?)",
+                               ((i, encode(samples[i % len(samples)])) for i in range(rows)))
+        connection.commit()
+        connection.execute("VACUUM")
+        stored = connection.execute("SELECT SUM(LENGTH(data)) FROM itinerary").fetchone()[0]
+
+        started = time.perf_counter()
+        for i in range(rows):
+            value = connection.execute("SELECT data FROM itinerary WHERE id = ?", (i,)).fetchone()[0]
+            json.loads(decode(value))
+        per_read = (time.perf_counter() - started) / rows
+        connection.close()
+        return os.path.getsize(path), stored, per_read * 1e6
+    finally:
+        os.unlink(path)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    arg_parser.add_argument("--db", help="SQLite database whose itineraries are used as well")
+    arg_parser.add_argument("--rows", type=int, default=2000, help="rows written per format")
+    args = arg_parser.parse_args()
+
+    samples = corpus_samples(args.corpus)
+    if args.db:
+        samples += database_samples(args.db)
+    if not samples:
+        sys.exit("No itineraries to measure")
+
+    print(f"{args.rows} rows drawn from {len(samples)} itineraries")
+    print(f"{'format':20} {'file':>10} {'stored':>10} {'per row':>8} {'read':>10}")
+    baseline = None
+    for name, encode, decode in FORMATS:
+        file_size, stored, read_us = measure(samples, encode, decode, args.rows)
+        baseline = baseline or file_size
+        print(f"{name:20} {file_size / 1024:7.0f} KB {stored / 1024:7.0f} KB {stored // args.rows:8} "
+              f"{read_us:7.1f} us  ({file_size / baseline:.0%} of json)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+"""Load test of the full request path: register, login, generate, history, download.
+
+Each virtual user registers its own account, logs in, generates
+--generations itineraries (destinations drawn from a small list, so
+later users hit the itinerary cache as real traffic does), opens its
+history and downloads every itinerary as a PDF. Users start evenly over
+--ramp-up seconds and run concurrently on one asyncio loop. The report
+gives requests, errors, p50/p95/p99 latency and throughput per route.
+
+Run it against an app that talks to tools/fake_gemini.py, never the real
+API. --spawn starts both on free ports with a scratch database and stops
+them afterwards:
+
+    python tools/loadtest.py --spawn [--users 20] [--generations 2] [--fake-latency lognormal:6,0.5]
+    python tools/loadtest.py --base-url http://127.0.0.1:5000 [--mode async]
+
+--save writes the results as JSON, and --compare prints each route's
+change against such a file; keep one from before a performance change
+as the baseline.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DESTINATIONS = [
+    "Tokyo, Japan", "Paris, France", "Rome, Italy", "Bangkok, Thailand", "Lisbon, Portugal",
+    "New York, USA", "Cape Town, South Africa", "Mexico City, Mexico",
+]
+INTERESTS = ["food, museums", "hiking, nature", "nightlife, shopping", "history, architecture"]
+DOWNLOAD_LINK = re.compile(r"/download/([\w-]+)")
+ERROR_TEXT = re.compile(r'class="error-container".*?<p>(.*?)</p>', re.S)
+
+
+class Results:
+    """Latencies and errors per route"""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+
+    def record(self, route, seconds, ok):
+        self.latencies.setdefault(route, []).append(seconds)
+        if not ok:
+            self.errors[route] = self.errors.get(route, 0) + 1
+
+    def summary(self, elapsed):
+        summary = {}
+        for route, latencies in self.latencies.items():
+            latencies = sorted(latencies)
+            summary[route] = {
+                "requests": len(latencies),
+                "errors": self.errors.get(route, 0),
+                "p50": percentile(latencies, 50),
+                "p95": percentile(latencies, 95),
+                "p99": percentile(latencies, 99),
+                "throughput": len(latencies) / elapsed,
+            }
+        return summary
+
+
+def percentile(ordered, pct):
+    """Nearest-rank percentile of an ascending list"""
+    if not ordered:
+        return 0.0
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def error_message(page):
+    match = ERROR_TEXT.search(page)
+    return match.group(1) if match else "no itinerary in the page"
+
+
+async def timed(results, route, request, expect=(200,)):
+    """Send ``request`` (a coroutine), record its latency under ``route``; returns the response or None"""
+    started = time.perf_counter()
+    try:
+        response = await request
+    except httpx.HTTPError as e:
+        results.record(route, time.perf_counter() - started, ok=False)
+        print(f"{route}: {type(e).__name__}: {e}")
+        return None
+    results.record(route, time.perf_counter() - started, ok=response.status_code in expect)
+    return response
+
+
+def generation_form(rng, args):
+    return {
+        "home_country": "United States",
+        "destination": rng.choice(DESTINATIONS[:args.destinations]),
+        "duration": str(rng.choice((3, 5, 7))),
+        "budget": str(rng.choice((1500, 3000))),
+        "interests": rng.choice(INTERESTS),
+        "style": "classic",
+        "currency": "USD",
+        "party_size": "2",
+    }
+
+
+async def generate_async(client, results, form, args):
+    """Queue a generation, poll its job until it finishes and fetch the result page"""
+    started = time.perf_counter()
+    response = await timed(results, "POST /generate (async submit)",
+                           client.post("/generate", data=dict(form, mode="async"),
+                                       headers={"Accept": "application/json"}), expect=(202,))
+    if response is None or response.status_code != 202:
+        results.record("POST /generate (async end-to-end)", time.perf_counter() - started, ok=False)
+        return None
+    job = response.json()
+    while not job.get("result_url"):
+        await asyncio.sleep(args.poll_interval)
+        status = await client.get(job["status_url"])
+        if status.status_code != 200:
+            results.record("POST /generate (async end-to-end)", time.perf_counter() - started, ok=False)
+            return None
+        job = status.json()
+    response = await client.get(job["result_url"])
+    results.record("POST /generate (async end-to-end)", time.perf_counter() - started,
+                   ok=response.status_code == 200 and job.get("status") != "failed")
+    return response
+
+
+async def virtual_user(number, args, results):
+    rng = random.Random(args.seed * 1000 + number)
+    await asyncio.sleep(args.ramp_up * number / max(1, args.users))
+    email = f"loadtest-{uuid.uuid4().hex[:12]}@example.com"
+    password = "loadtest-password"
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout) as client:
+        response = await timed(results, "POST /register",
+                               client.post("/register", data={"email": email, "password": password,
+                                                              "confirm_password": password}), expect=(302,))
+        if response is None:
+            return
+        response = await timed(results, "POST /login",
+                               client.post("/login", data={"email": email, "password": password}), expect=(302,))
+        if response is None or "/dashboard" not in response.headers.get("Location", ""):
+            return
+
+        itinerary_ids = []
+        for _ in range(args.generations):
+            form = generation_form(rng, args)
+            route = "POST /generate (async end-to-end)" if args.mode == "async" else "POST /generate"
+            if args.mode == "async":
+                response = await generate_async(client, results, form, args)
+            else:
+                response = await timed(results, route, client.post("/generate", data=form))
+            if response is None or response.status_code != 200:
+                continue
+            links = DOWNLOAD_LINK.findall(response.text)
+            if links:
+                itinerary_ids.append(links[0])
+            else:
+                # The error page comes back as 200
+                results.errors[route] = results.errors.get(route, 0) + 1
+                if args.verbose:
+                    print(f"{route}: {error_message(response.text)}")
+
+        await timed(results, "GET /history", client.get("/history"))
+        for itinerary_id in itinerary_ids:
+            response = await timed(results, "GET /download/<id>", client.get(f"/download/{itinerary_id}"))
+            if response is not None and response.headers.get("Content-Type") != "application/pdf":
+                results.errors["GET /download/<id>"] = results.errors.get("GET /download/<id>", 0) + 1
+
+
+async def run_load(args):
+    results = Results()
+    started = time.perf_counter()
+    await asyncio.gather(*(virtual_user(number, args, results) for number in range(args.users)))
+    elapsed = time.perf_counter() - started
+    return results.summary(elapsed), elapsed
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(url, seconds=30):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {seconds}s")
+
+
+def spawn(args, scratch):
+    """Start fake_gemini and the app on free ports; returns (processes, app base url)"""
+    fake_port, app_port = free_port(), free_port()
+    fake_command = [sys.executable, os.path.join(ROOT, "tools", "fake_gemini.py"), "--port", str(fake_port),
+                    "--latency", args.fake_latency, "--error-rate", str(args.fake_error_rate)]
+    if args.seed is not None:
+        fake_command += ["--seed", str(args.seed)]
+    fake = subprocess.Popen(fake_command, stdout=subprocess.DEVNULL)
+    env = dict(os.environ,
+               PORT=str(app_port),
+               GOOGLE_API_KEY="loadtest",
+               GEMINI_BASE_URL=f"http://127.0.0.1:{fake_port}",
+               SQLITE_DB_PATH=os.path.join(scratch, "loadtest.db"),
+               PDF_CACHE_DIR=os.path.join(scratch, "pdf_cache"),
+               TEMP_ITINERARY_DIR=os.path.join(scratch, "temp_itineraries"))
+    log = open(os.path.join(scratch, "app.log"), "w")
+    app = subprocess.Popen([sys.executable, os.path.join(ROOT, "app.py")], cwd=scratch, env=env,
+                           stdout=log, stderr=subprocess.STDOUT)
+    base_url = f"http://127.0.0.1:{app_port}"
+    try:
+        wait_for(f"http://127.0.0.1:{fake_port}/stats")
+        wait_for(f"{base_url}/health")
+    except RuntimeError:
+        for process in (fake, app):
+            process.terminate()
+        raise
+    return [fake, app], base_url, f"http://127.0.0.1:{fake_port}"
+
+
+def print_report(summary, elapsed, baseline=None):
+    print(f"{'route':34} {'reqs':>6} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>7}")
+    for route, row in sorted(summary.items()):
+        print(f"{route:34} {row['requests']:6} {row['errors']:6} {row['p50'] * 1000:9.1f} "
+              f"{row['p95'] * 1000:9.1f} {row['p99'] * 1000:9.1f} {row['throughput']:7.2f}")
+        before = (baseline or {}).get(route)
+        if before:
+            changes = []
+            for key in ("p50", "p95", "p99", "throughput"):
+                if before[key]:
+                    changes.append(f"{key} {(row[key] - before[key]) / before[key] * 100:+.0f}%")
+            print(f"{'  vs baseline':34} " + ", ".join(changes))
+    print(f"{sum(row['requests'] for row in summary.values())} requests in {elapsed:.1f}s")
+
+
+def build_parser():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--base-url", default="http://127.0.0.1:5000")
+    arg_parser.add_argument("--spawn", action="store_true",
+                            help="start fake_gemini and the app with a scratch database and use them")
+    arg_parser.add_argument("--fake-latency", default="lognormal:6,0.5", help="fake_gemini --latency (with --spawn)")
+    arg_parser.add_argument("--fake-error-rate", type=float, default=0.0, help="fake_gemini --error-rate (with --spawn)")
+    arg_parser.add_argument("--users", type=int, default=20)
+    arg_parser.add_argument("--generations", type=int, default=2, help="itineraries per user")
+    arg_parser.add_argument("--destinations", type=int, default=4, choices=range(1, len(DESTINATIONS) + 1),
+                            metavar=f"1-{len(DESTINATIONS)}", help="how many destinations users pick from")
+    arg_parser.add_argument("--mode", default="sync", choices=("sync", "async"),
+                            help="blocking /generate or mode=async with job polling")
+    arg_parser.add_argument("--ramp-up", type=float, default=5.0, help="seconds over which users start")
+    arg_parser.add_argument("--poll-interval", type=float, default=0.5)
+    arg_parser.add_argument("--timeout", type=float, default=300.0, help="per-request timeout in seconds")
+    arg_parser.add_argument("--seed", type=int, default=1)
+    arg_parser.add_argument("--verbose", action="store_true", help="print why generations failed")
+    arg_parser.add_argument("--save", help="write the results to this JSON file")
+    arg_parser.add_argument("--compare", help="JSON file from an earlier --save to compare against")
+    return arg_parser
+
+
+def main():
+    args = build_parser().parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["routes"]
+
+    processes, scratch, fake_url = [], None, None
+    if args.spawn:
+        scratch = tempfile.mkdtemp(prefix="loadtest-")
+        processes, args.base_url, fake_url = spawn(args, scratch)
+        print(f"App on {args.base_url}, fake Gemini on {fake_url}")
+    try:
+        summary, elapsed = asyncio.run(run_load(args))
+        model_calls = httpx.get(f"{fake_url}/stats").json() if fake_url else None
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+        if scratch:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    print(f"{args.users} users x {args.generations} generations ({args.mode})")
+    print_report(summary, elapsed, baseline)
+    if model_calls:
+        print(f"Fake Gemini: {model_calls['calls']} calls, {model_calls['errors']} injected errors")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"users": args.users, "generations": args.generations, "mode": args.mode,
+                       "elapsed": elapsed, "routes": summary, "model_calls": model_calls}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
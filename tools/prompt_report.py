@@ -0,0 +1,183 @@
+"""Compare prompt versions: input and output tokens, JSON repairs and end-to-end latency.
+
+First prints the size of every kind of prompt in each variant (the
+PROMPT_VERSION and GEMINI_GROUNDING combinations) as estimated tokens,
+counting the response schema of JSON-mode prompts. Then runs the same trips
+through /generate once per variant, each in its own process with a scratch
+database, and reports per variant the prompt and output tokens the model
+reported, the replies whose JSON needed repair, search queries and the
+p50/p95 latency of /generate. Repeated destinations use the route knowledge
+table, and trips of 10 days or more the fanout, as in production.
+
+The model is tools/fake_gemini.py unless --real is given, which sends every
+trip to the Gemini API configured by GOOGLE_API_KEY (and GEMINI_BASE_URL).
+
+    python tools/prompt_report.py [--variants 1,2-route,2-none] [--real] [--fake-latency lognormal:6,0.5]
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+TOOLS = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(TOOLS)
+sys.path.insert(0, ROOT)
+
+from prompt_builder import GROUNDING_MODES, LEGACY_VERSION, PROMPT_VERSIONS, PromptBuilder, compact_schema
+from route_knowledge import estimate_tokens
+
+VARIANTS = [LEGACY_VERSION] + [f"{version}-{grounding}" for version in PROMPT_VERSIONS if version != LEGACY_VERSION
+                               for grounding in GROUNDING_MODES]
+
+# (destination, days); repeated destinations hit the route knowledge table
+TRIPS = [
+    ("Tokyo, Japan", 3), ("Tokyo, Japan", 5), ("Paris, France", 4), ("Paris, France", 12),
+    ("Rome, Italy", 3), ("Rome, Italy", 7), ("Lisbon, Portugal", 5), ("Bangkok, Thailand", 4),
+]
+FORM = {"home_country": "United States", "budget": "3000", "interests": "food, museums", "style": "classic",
+        "currency": "USD", "party_size": "2"}
+
+
+def builder(variant):
+    version, _, grounding = variant.partition("-")
+    return PromptBuilder(version=version, grounding=grounding or "route")
+
+
+def variant_env(variant):
+    version, _, grounding = variant.partition("-")
+    return {"PROMPT_VERSION": version, "GEMINI_GROUNDING": grounding or "route"}
+
+
+def sample_prompts(prompts):
+    """One prompt of every kind for a 12-day trip, keyed by kind"""
+    trip = ("United States", "Paris, France", 12, 3000, "food, museums", 2)
+    route_knowledge = {"flight_info": {"estimated_flight_cost": 900}}
+    return {
+        "itinerary": prompts.itinerary(*trip),
+        "trip": prompts.trip(*trip, route_knowledge),
+        "route_knowledge": prompts.route_knowledge(*trip[:2]),
+        "skeleton": prompts.skeleton(*trip),
+        "days": prompts.days(*trip, 1, 3, {"Accommodation": 300, "Food": 150, "Transportation": 60,
+                                           "Activities": 120}),
+    }
+
+
+def print_prompt_sizes(variants):
+    kinds = list(sample_prompts(builder(variants[0])))
+    print("Estimated input tokens per prompt (in JSON mode, text + the response schema's compact rendering)")
+    print(f"{'variant':10} " + " ".join(f"{kind:>16}" for kind in kinds))
+    for variant in variants:
+        cells = []
+        for prompt in sample_prompts(builder(variant)).values():
+            tokens = estimate_tokens(prompt.text)
+            if not prompt.grounded:
+                tokens += estimate_tokens(compact_schema(prompt.schema))
+            cells.append(f"{tokens:>6} {prompt.version:>9}")
+        print(f"{variant:10} " + " ".join(cells))
+    print()
+
+
+def worker(trips):
+    """Child process: run the trips through /generate and print the figures as JSON"""
+    import app as module
+    application = module.create_app()
+    with application.app_context():
+        module.init_database()
+    client = application.test_client()
+    latencies = []
+    failures = 0
+    for destination, days in trips:
+        started = time.perf_counter()
+        response = client.post("/generate", data=dict(FORM, destination=destination, duration=str(days)))
+        latencies.append(time.perf_counter() - started)
+        if response.status_code != 200 or "/download/" not in response.get_data(as_text=True):
+            failures += 1
+    with application.app_context():
+        ModelCall, db = module.ModelCall, module.db
+        calls, repaired, prompt_tokens, output_tokens, searches = db.session.query(
+            db.func.count(ModelCall.id),
+            db.func.sum(db.case((ModelCall.repaired.is_(True), 1), else_=0)),
+            db.func.sum(ModelCall.prompt_tokens),
+            db.func.sum(ModelCall.output_tokens),
+            db.func.sum(ModelCall.search_queries),
+        ).filter(ModelCall.cache_hit.is_(False)).one()
+    print(json.dumps({
+        "generations": len(trips), "failures": failures, "calls": calls, "repaired": repaired or 0,
+        "prompt_tokens": prompt_tokens or 0, "output_tokens": output_tokens or 0, "searches": searches or 0,
+        "latencies": latencies,
+    }))
+
+
+def run_variant(variant, env, trips):
+    scratch = tempfile.mkdtemp(prefix="prompt-report-")
+    env = dict(env, **variant_env(variant),
+               SQLITE_DB_PATH=os.path.join(scratch, "report.db"),
+               PDF_CACHE_DIR=os.path.join(scratch, "pdf_cache"),
+               TEMP_ITINERARY_DIR=os.path.join(scratch, "temp_itineraries"))
+    try:
+        output = subprocess.run([sys.executable, __file__, "--worker", json.dumps(trips)], env=env, cwd=scratch,
+                                check=True, stdout=subprocess.PIPE, text=True).stdout
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--variants", default=",".join(VARIANTS),
+                            help=f"comma-separated variants (default {','.join(VARIANTS)})")
+    arg_parser.add_argument("--trips", type=int, default=len(TRIPS), choices=range(1, len(TRIPS) + 1),
+                            metavar=f"1-{len(TRIPS)}", help="how many of the sample trips to generate")
+    arg_parser.add_argument("--real", action="store_true", help="call the real Gemini API instead of fake_gemini")
+    arg_parser.add_argument("--fake-latency", default="lognormal:6,0.5", help="fake_gemini latency distribution")
+    arg_parser.add_argument("--sizes-only", action="store_true", help="only print the prompt sizes")
+    arg_parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+    if args.worker:
+        worker(json.loads(args.worker))
+        return
+
+    variants = [variant.strip() for variant in args.variants.split(",") if variant.strip()]
+    for variant in variants:
+        try:
+            builder(variant)
+        except EnvironmentError as e:
+            arg_parser.error(f"{variant}: {e}")
+    print_prompt_sizes(variants)
+    if args.sizes_only:
+        return
+
+    env = dict(os.environ)
+    server = None
+    if not args.real:
+        sys.path.insert(0, TOOLS)
+        from fake_gemini import DEFAULT_CORPUS, FakeGemini, load_responses, parse_latency, start_server
+        server = start_server(FakeGemini(load_responses(DEFAULT_CORPUS), parse_latency(args.fake_latency)))
+        env.update(GOOGLE_API_KEY="prompt-report", GEMINI_BASE_URL=f"http://127.0.0.1:{server.server_port}")
+    elif not env.get("GOOGLE_API_KEY"):
+        sys.exit("--real needs GOOGLE_API_KEY")
+
+    trips = TRIPS[:args.trips]
+    print(f"{len(trips)} trips per variant against {'the Gemini API' if args.real else 'fake_gemini'}")
+    print(f"{'variant':10} {'calls':>6} {'failed':>6} {'repaired':>8} {'prompt tok/gen':>14} "
+          f"{'output tok/gen':>14} {'searches':>8} {'p50 s':>7} {'p95 s':>7}")
+    try:
+        for variant in variants:
+            row = run_variant(variant, env, trips)
+            latencies = sorted(row["latencies"])
+            p95 = latencies[max(0, -(-len(latencies) * 95 // 100) - 1)]
+            print(f"{variant:10} {row['calls']:6} {row['failures']:6} {row['repaired']:8} "
+                  f"{row['prompt_tokens'] / row['generations']:14.0f} {row['output_tokens'] / row['generations']:14.0f} "
+                  f"{row['searches']:8} {statistics.median(latencies):7.2f} {p95:7.2f}")
+    finally:
+        if server is not None:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
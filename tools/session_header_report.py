@@ -0,0 +1,124 @@
+"""Report session cookie and header sizes with anonymous itineraries in the
+cookie (before) and in the server-side store (after).
+
+For a small, a median and the largest itinerary in the corpus, plus
+synthetic 7-, 14- and 21-day trips (recorded responses are short trips),
+the session an anonymous user ends up with is built both ways:
+- before: the whole temp_itinerary dict in the signed cookie.
+- after: only temp_itinerary_id in the cookie.
+The report gives the Cookie request header and Set-Cookie response header
+sizes, and whether the cookie is over the browser's 4096 byte limit (the
+browser then drops it silently). It also gives the time per request spent
+on the session and the time to fetch the itinerary: verifying the cookie
+before, and a temp store lookup after (on the download only). Those times
+are measured by timing many requests to a trivial route through the test
+client.
+
+    python tools/session_header_report.py [--requests 2000] [--store database|filesystem]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+
+from werkzeug.http import dump_cookie
+
+from train_itinerary_dictionary import DEFAULT_CORPUS, corpus_samples
+
+COOKIE_LIMIT = 4096
+
+
+def temp_entry(itinerary_json):
+    return {
+        "home_country": "United States", "destination": "Tokyo, Japan", "duration": "7",
+        "style": "classic", "currency": "USD", "total_budget": "3000", "budget": "3000",
+        "interests": "food, temples, museums", "party_size": 2,
+        "itinerary_data": itinerary_json,
+        "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+def cookie_headers(app, session_data):
+    """(Cookie request header, Set-Cookie response header) for a session"""
+    value = app.session_interface.get_signing_serializer(app).dumps(session_data)
+    name = app.config["SESSION_COOKIE_NAME"]
+    return f"Cookie: {name}={value}", "Set-Cookie: " + dump_cookie(name, value, httponly=True, path="/")
+
+
+def time_requests(client, cookie_header, requests):
+    """Median microseconds for a trivial request carrying ``cookie_header``"""
+    cookie = cookie_header[len("Cookie: "):]
+    timings = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        client.get("/_session_probe", headers={"Cookie": cookie})
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1e6
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    arg_parser.add_argument("--requests", type=int, default=2000, help="timed requests per case")
+    arg_parser.add_argument("--store", default="database", choices=("database", "filesystem"))
+    args = arg_parser.parse_args()
+
+    scratch = tempfile.mkdtemp()
+    os.environ["SQLITE_DB_PATH"] = os.path.join(scratch, "report.db")
+    os.environ["TEMP_ITINERARY_DIR"] = os.path.join(scratch, "temp_itineraries")
+    os.environ["TEMP_ITINERARY_STORE"] = args.store
+    import app as travel_app
+    from bench_pdf_render import synthetic_itinerary
+    from flask import session
+
+    app = travel_app.create_app()
+    with app.app_context():
+        travel_app.init_database()
+    app.add_url_rule("/_session_probe", "_session_probe", lambda: session.get("user_id", "") or "")
+    client = app.test_client()
+
+    samples = sorted(corpus_samples(args.corpus), key=len)
+    if not samples:
+        sys.exit("No itineraries in the corpus")
+    picks = [("small", samples[0]), ("median", samples[len(samples) // 2]), ("largest", samples[-1])]
+    picks += [(f"{days} days", json.dumps(synthetic_itinerary(days))) for days in (7, 14, 21)]
+
+    print(f"{'itinerary':10} {'json':>7} {'layout':7} {'Cookie':>8} {'Set-Cookie':>11} {'>4KB':>5} "
+          f"{'request':>10} {'fetch':>9}")
+    for label, itinerary_json in picks:
+        entry = temp_entry(itinerary_json)
+        itinerary_id = str(uuid.uuid4())
+        before = {"temp_itinerary": dict(entry, id=itinerary_id)}
+        after = {"temp_itinerary_id": itinerary_id}
+        with app.app_context():
+            travel_app.temp_itinerary_store.put(itinerary_id, entry)
+
+        serializer = app.session_interface.get_signing_serializer(app)
+        for layout, session_data in (("before", before), ("after", after)):
+            cookie, set_cookie = cookie_headers(app, session_data)
+            request_us = time_requests(client, cookie, args.requests)
+            # What the download route does to get the itinerary back
+            value = cookie.split("=", 1)[1]
+            started = time.perf_counter()
+            with app.app_context():
+                for _ in range(200):
+                    data = serializer.loads(value)
+                    if layout == "after":
+                        travel_app.temp_itinerary_store.get(data["temp_itinerary_id"])
+            fetch_us = (time.perf_counter() - started) / 200 * 1e6
+            over = "yes" if len(set_cookie) - len("Set-Cookie: ") > COOKIE_LIMIT else "no"
+            print(f"{label:10} {len(itinerary_json):7} {layout:7} {len(cookie):8} {len(set_cookie):11} "
+                  f"{over:>5} {request_us:7.0f} us {fetch_us:6.0f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Train the zlib preset dictionary used for compressed itinerary storage.
+
+Samples are the usable responses in the corpus, plus every itinerary in a
+database when --db is given. The dictionary is written to
+zdicts/itinerary-v<version>.bin; when retraining for a deployed app, bump
+itinerary_storage.DICTIONARY_VERSION and pass the new --version so rows
+compressed with the old dictionary can still be read.
+
+    python tools/train_itinerary_dictionary.py [--db instance/travelapp.db] [--version N]
+"""
+import argparse
+import glob
+import json
+import os
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from itinerary_storage import DICTIONARY_DIR, DICTIONARY_VERSION, decode_itinerary, dictionary_path, train_dictionary
+from response_parser import ItineraryParseError, parse_itinerary_response
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus", "responses")
+
+
+def corpus_samples(corpus):
+    samples = []
+    for path in sorted(glob.glob(os.path.join(corpus, "*.txt"))):
+        with open(path, encoding="utf-8") as f:
+            try:
+                samples.append(json.dumps(parse_itinerary_response(f.read()).data))
+            except ItineraryParseError:
+                continue
+    return samples
+
+
+def database_samples(db_path):
+    connection = sqlite3.connect(db_path)
+    columns = {row[1] for row in connection.execute("PRAGMA table_info(itinerary)")}
+    if "storage_format" in columns:
+        document = "itinerary_document" if "itinerary_document" in columns else "NULL"
+        rows = connection.execute(f"SELECT storage_format, itinerary_data, itinerary_blob, {document} FROM itinerary")
+        samples = [decode_itinerary(*row) for row in rows]
+    else:
+        samples = [row[0] for row in connection.execute("SELECT itinerary_data FROM itinerary")]
+    connection.close()
+    return samples
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    arg_parser.add_argument("--db", help="SQLite database whose itineraries are added to the samples")
+    arg_parser.add_argument("--version", type=int, default=DICTIONARY_VERSION)
+    arg_parser.add_argument("--max-size", type=int, default=16 * 1024)
+    args = arg_parser.parse_args()
+
+    samples = corpus_samples(args.corpus)
+    if args.db:
+        samples += database_samples(args.db)
+    if not samples:
+        sys.exit("No itineraries to train on")
+
+    dictionary = train_dictionary(samples, args.max_size)
+    os.makedirs(DICTIONARY_DIR, exist_ok=True)
+    path = dictionary_path(args.version)
+    with open(path, "wb") as f:
+        f.write(dictionary)
+    print(f"Trained a {len(dictionary)}-byte dictionary on {len(samples)} itineraries: {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+import json
+import math
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from itinerary_cache import normalize_request
+
+# Budgets within about 25% of each other share a bucket
+BUDGET_BUCKET_RATIO = 1.25
+
+# Key of the itinerary field that marks a cached itinerary as warmed
+WARM_MARKER = "warmed_at"
+
+
+def budget_bucket(budget):
+    if not isinstance(budget, (int, float)) or budget <= 0:
+        return None
+    return round(math.log(budget, BUDGET_BUCKET_RATIO))
+
+
+def parse_hours(value):
+    """``"2-5"`` -> ``(2, 5)``: local hours [start, end), wrapping past midnight; None when unset"""
+    if not value:
+        return None
+    try:
+        start, end = (int(part) for part in value.split("-"))
+    except ValueError:
+        raise EnvironmentError(f"Invalid WARMUP_HOURS: {value} (expected e.g. 2-5)")
+    if not (0 <= start < 24 and 0 <= end <= 24) or start == end:
+        raise EnvironmentError(f"Invalid WARMUP_HOURS: {value} (expected e.g. 2-5)")
+    return start, end
+
+
+def in_hours(hours, moment):
+    start, end = hours
+    if start < end:
+        return start <= moment.hour < end
+    return moment.hour >= start or moment.hour < end
+
+
+def popular_requests(db, model, since, max_routes=30, per_route=3, min_requests=2):
+    """The most requested trips saved since ``since``, most popular first.
+
+    Saved itineraries (``model``, see ``Itinerary`` in models.py) are
+    grouped by route, then by duration and budget bucket. Each of the
+    ``max_routes`` busiest routes yields its ``per_route`` most common
+    buckets with at least ``min_requests`` requests, represented by the
+    bucket's most common request. Returns dicts with the generation inputs
+    and ``requests``, the bucket's count.
+    """
+    columns = (model.home_country, model.destination, model.duration, model.budget, model.interests,
+               model.party_size)
+    rows = db.session.query(*columns, func.count(model.id)).filter(model.created_at >= since).group_by(*columns)
+
+    routes = {}
+    for home_country, destination, duration, budget, interests, party_size, count in rows:
+        normalized = normalize_request(home_country, destination, duration, budget, interests, party_size)
+        route = routes.setdefault((normalized["home_country"], normalized["destination"]),
+                                  {"requests": 0, "buckets": {}})
+        route["requests"] += count
+        bucket = route["buckets"].setdefault((normalized["duration"], budget_bucket(normalized["budget"])),
+                                             {"requests": 0, "variants": {}})
+        bucket["requests"] += count
+        variant = bucket["variants"].setdefault(json.dumps(normalized, sort_keys=True), {
+            "requests": 0,
+            "request": {"home_country": home_country, "destination": destination, "duration": duration,
+                        "budget": budget, "interests": interests, "party_size": party_size},
+        })
+        variant["requests"] += count
+
+    busiest = sorted(routes.values(), key=lambda route: route["requests"], reverse=True)[:max_routes]
+    candidates = []
+    for route in busiest:
+        buckets = sorted(route["buckets"].values(), key=lambda bucket: bucket["requests"], reverse=True)
+        for bucket in buckets[:per_route]:
+            if bucket["requests"] < min_requests:
+                break
+            variant = max(bucket["variants"].values(), key=lambda variant: variant["requests"])
+            candidates.append(dict(variant["request"], requests=bucket["requests"]))
+    candidates.sort(key=lambda candidate: candidate["requests"], reverse=True)
+    return candidates
+
+
+def claim_daily_run(db, model, day, lease_seconds=86400):
+    """Take the lock row for ``day``'s warm-up in ``model`` (see ``GenerationLock``); False if taken.
+
+    The row is left to expire, so one process runs the warm-up each day.
+    """
+    table = model.__table__
+    key = f"warmup:{day.isoformat()}"
+    now = datetime.utcnow()
+    with db.engine.begin() as connection:
+        connection.execute(table.delete().where(table.c.key == key, table.c.expires_at <= now))
+    try:
+        with db.engine.begin() as connection:
+            connection.execute(table.insert().values(
+                key=key, owner=uuid.uuid4().hex, acquired_at=now,
+                expires_at=now + timedelta(seconds=lease_seconds)
+            ))
+    except IntegrityError:
+        return False
+    return True
+
+
+class WarmupScheduler:
+    """Warms the itinerary cache and route knowledge for popular trips.
+
+    ``find_requests()`` returns the trips to warm, most popular first (see
+    ``popular_requests``). A pass first runs ``warm_route(home_country,
+    destination, request_id)`` for each of their routes, then
+    ``warm_itinerary(request, request_id)`` for each trip; both return
+    whether they called the model, and ``tokens_used(request_id)`` gives
+    the tokens those calls used. Up to ``concurrency`` tasks run at once.
+    Each task reserves the average tokens of its kind so far (initially
+    ``route_tokens`` or ``itinerary_tokens``), and none starts once the
+    tokens spent and reserved would exceed ``token_budget``.
+
+    With ``hours`` set, ``start()`` runs a daily pass in a background
+    thread during those local hours, if ``claim_run(day)`` lets this
+    process have that day's pass. Work runs inside ``app_context()`` when
+    one is given. Live requests served from a warmed itinerary are counted
+    through ``record_hit()``.
+    """
+
+    def __init__(self, find_requests, warm_route, warm_itinerary, tokens_used, token_budget=200000, concurrency=2,
+                 hours=None, claim_run=None, app_context=None, registry=None, route_tokens=1500,
+                 itinerary_tokens=8000, check_seconds=300):
+        self.find_requests = find_requests
+        self.warm_route = warm_route
+        self.warm_itinerary = warm_itinerary
+        self.tokens_used = tokens_used
+        self.token_budget = token_budget
+        self.concurrency = concurrency
+        self.hours = hours
+        self.claim_run = claim_run
+        self.app_context = app_context
+        self.check_seconds = check_seconds
+        self._initial_estimates = {"route": route_tokens, "itinerary": itinerary_tokens}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._last_day = None
+        self._last_run = None
+        self._counters = {
+            "runs": 0,
+            "routes_refreshed": 0,
+            "itineraries_warmed": 0,
+            "already_warm": 0,
+            "failures": 0,
+            "over_budget": 0,
+            "tokens_spent": 0,
+            "warm_hits": 0,
+        }
+        self._warm_hits = registry.counter(
+            "travelplanner_warm_hits_total", "Live requests served an itinerary warmed ahead of time"
+        ) if registry is not None else None
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def record_hit(self):
+        self._count("warm_hits")
+        if self._warm_hits is not None:
+            self._warm_hits.inc()
+
+    def _in_context(self, fn, *args):
+        if self.app_context is None:
+            return fn(*args)
+        with self.app_context():
+            return fn(*args)
+
+    def run(self, token_budget=None, deadline=None):
+        """Run one warm-up pass now; returns its summary.
+
+        ``deadline`` (a time.monotonic() value) stops new tasks from starting.
+        """
+        token_budget = self.token_budget if token_budget is None else token_budget
+        summary = {"started_at": datetime.utcnow().isoformat(), "trips": 0, "routes_refreshed": 0,
+                   "itineraries_warmed": 0, "already_warm": 0, "failures": 0, "over_budget": 0, "tokens": 0}
+        spent = {"route": [], "itinerary": []}
+        reserved = [0]
+        budget_lock = threading.Lock()
+
+        def estimate(kind):
+            return sum(spent[kind]) / len(spent[kind]) if spent[kind] else self._initial_estimates[kind]
+
+        def task(kind, fn, args):
+            with budget_lock:
+                expected = estimate(kind)
+                if summary["tokens"] + reserved[0] + expected > token_budget or (
+                        deadline is not None and time.monotonic() >= deadline):
+                    summary["over_budget"] += 1
+                    return
+                reserved[0] += expected
+            request_id = str(uuid.uuid4())
+            called = True
+            outcome = "failures"
+            try:
+                called = fn(*args, request_id)
+                outcome = ("routes_refreshed" if kind == "route" else "itineraries_warmed") if called else "already_warm"
+            except Exception as e:
+                route = args if kind == "route" else (args[0]["home_country"], args[0]["destination"])
+                print(f"Warm-up of {kind} {route[0]} -> {route[1]} failed: {e}")
+            finally:
+                used = self.tokens_used(request_id) if called else 0
+                with budget_lock:
+                    reserved[0] -= expected
+                    summary["tokens"] += used
+                    summary[outcome] += 1
+                    if used:
+                        spent[kind].append(used)
+
+        def run_tasks(kind, fn, items):
+            with ThreadPoolExecutor(max_workers=max(1, self.concurrency)) as executor:
+                # list() re-raises anything the tasks did not handle
+                list(executor.map(lambda args: self._in_context(task, kind, fn, args), items))
+
+        requests = self.find_requests()
+        summary["trips"] = len(requests)
+        routes = list(dict.fromkeys((request["home_country"], request["destination"]) for request in requests))
+        run_tasks("route", self.warm_route, routes)
+        run_tasks("itinerary", self.warm_itinerary, [(request,) for request in requests])
+
+        summary["finished_at"] = datetime.utcnow().isoformat()
+        with self._lock:
+            self._counters["runs"] += 1
+            for name in ("routes_refreshed", "itineraries_warmed", "already_warm", "failures", "over_budget"):
+                self._counters[name] += summary[name]
+            self._counters["tokens_spent"] += summary["tokens"]
+            self._last_run = summary
+        return summary
+
+    def start(self):
+        """Start the daily background pass (once per process) when ``hours`` is set"""
+        if self.hours is None or self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._loop, name="warmup-scheduler", daemon=True)
+        self._thread.start()
+
+    def _window_end(self, now):
+        """time.monotonic() value at which the current warm-up window closes"""
+        end = now.replace(hour=self.hours[1] % 24, minute=0, second=0, microsecond=0)
+        if end <= now:
+            end += timedelta(days=1)
+        return time.monotonic() + (end - now).total_seconds()
+
+    def _loop(self):
+        while True:
+            now = datetime.now()
+            if in_hours(self.hours, now) and self._last_day != now.date():
+                self._last_day = now.date()
+                try:
+                    if self.claim_run is None or self._in_context(self.claim_run, now.date()):
+                        summary = self._in_context(self.run, None, self._window_end(now))
+                        print(f"Warm-up: {summary['itineraries_warmed']} itineraries and "
+                              f"{summary['routes_refreshed']} routes warmed, {summary['tokens']} tokens")
+                except Exception as e:
+                    print(f"Warm-up failed: {e}")
+            time.sleep(self.check_seconds)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["last_run"] = self._last_run
+        stats["hours"] = "-".join(str(hour) for hour in self.hours) if self.hours else None
+        stats["token_budget"] = self.token_budget
+        stats["concurrency"] = self.concurrency
+        return stats
@@ -0,0 +1,4 @@
+# Entry point for WSGI servers, e.g. `gunicorn wsgi:app`; run `flask --app app migrate` before starting them
+from app import create_app
+
+app = create_app()